@@ -0,0 +1,176 @@
+import os
+import json
+
+import numpy as np
+
+"""Adaptacyjny skan zgrubny -> dokładny (quadtree na regularnej siatce).
+
+Siatka docelowa jest ta sama co w zwykłym skanie (points_x × points_y, krok
+step_x/step_y). Najpierw mierzymy co `coarse_stride`-ty punkt, potem dla
+każdej komórki liczymy różnicę widm w jej narożnikach; komórki powyżej progu
+dzielimy na cztery i mierzymy nowe punkty (środki krawędzi i środek), aż do
+kroku siatki. Komórki, których nie dzielimy (liście), zapisujemy w
+`points_<session>/adaptive_grid.json` – HeatMapWindow interpoluje z nich
+brakujące punkty (dwuliniowo z czterech zmierzonych narożników).
+"""
+
+ADAPTIVE_GRID_FILE = "adaptive_grid.json"
+
+
+def spectral_difference(a, b):
+    """Względna różnica widm: ||a - b|| / max(||a||, ||b||)."""
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    scale = max(float(np.linalg.norm(a)), float(np.linalg.norm(b)), 1e-12)
+    return float(np.linalg.norm(a - b)) / scale
+
+
+def _axis_nodes(n, stride):
+    nodes = list(range(0, n, max(1, int(stride))))
+    if nodes[-1] != n - 1:
+        nodes.append(n - 1)
+    return nodes
+
+
+def _split(lo, hi):
+    return [lo, (lo + hi) // 2, hi] if hi - lo > 1 else [lo, hi]
+
+
+def order_path(points, start=None):
+    """Uporządkuj punkty w krótką ścieżkę stolika (najbliższy sąsiad od `start`)."""
+    remaining = list(points)
+    if not remaining:
+        return []
+    path = []
+    current = start if start is not None else remaining[0]
+    while remaining:
+        idx = min(range(len(remaining)),
+                  key=lambda i: abs(remaining[i][0] - current[0]) + abs(remaining[i][1] - current[1]))
+        current = remaining.pop(idx)
+        path.append(current)
+    return path
+
+
+class AdaptiveGridPlanner:
+    """Kolejne partie punktów do zmierzenia w skanie adaptacyjnym."""
+
+    def __init__(self, points_x, points_y, coarse_stride=4, threshold=0.1):
+        self.points_x = int(points_x)
+        self.points_y = int(points_y)
+        self.coarse_stride = max(1, int(coarse_stride))
+        self.threshold = float(threshold)
+        self.measured = {}
+        self.leaves = []
+        xs = _axis_nodes(self.points_x, self.coarse_stride)
+        ys = _axis_nodes(self.points_y, self.coarse_stride)
+        self._coarse = (xs, ys)
+        x_pairs = list(zip(xs, xs[1:])) or [(xs[0], xs[0])]
+        y_pairs = list(zip(ys, ys[1:])) or [(ys[0], ys[0])]
+        self._cells = [(x0, y0, x1, y1) for (y0, y1) in y_pairs for (x0, x1) in x_pairs]
+        self.level = 0
+
+    def coarse_points(self, starting_corner='top-left'):
+        """Punkty siatki zgrubnej w kolejności węża od narożnika startowego."""
+        xs, ys = self._coarse
+        if starting_corner not in ['top-left', 'bottom-left']:
+            xs = xs[::-1]
+        if starting_corner not in ['top-left', 'top-right']:
+            ys = ys[::-1]
+        points = []
+        for iy, gy in enumerate(ys):
+            row = xs if iy % 2 == 0 else xs[::-1]
+            points.extend((gx, gy) for gx in row)
+        return points
+
+    def add(self, grid_x, grid_y, spectrum):
+        self.measured[(int(grid_x), int(grid_y))] = np.asarray(spectrum, dtype=float)
+
+    def _cell_metric(self, cell):
+        x0, y0, x1, y1 = cell
+        corners = {(x0, y0), (x1, y0), (x0, y1), (x1, y1)}
+        spectra = [self.measured[c] for c in corners if c in self.measured]
+        worst = 0.0
+        for i in range(len(spectra)):
+            for j in range(i + 1, len(spectra)):
+                worst = max(worst, spectral_difference(spectra[i], spectra[j]))
+        return worst
+
+    def refine(self):
+        """Podziel komórki powyżej progu; zwróć nowe (niezmierzone) punkty.
+
+        Komórki, które nie wymagają podziału, trafiają do `leaves`. Pusta
+        lista oznacza koniec skanu.
+        """
+        new_cells = []
+        new_points = set()
+        for cell in self._cells:
+            x0, y0, x1, y1 = cell
+            if (x1 - x0 <= 1 and y1 - y0 <= 1) or self._cell_metric(cell) <= self.threshold:
+                self.leaves.append(cell)
+                continue
+            xs = _split(x0, x1)
+            ys = _split(y0, y1)
+            for gy in ys:
+                for gx in xs:
+                    if (gx, gy) not in self.measured:
+                        new_points.add((gx, gy))
+            new_cells.extend((xa, ya, xb, yb) for ya, yb in zip(ys, ys[1:]) for xa, xb in zip(xs, xs[1:]))
+        self._cells = new_cells
+        self.level += 1
+        return sorted(new_points)
+
+    def finish(self):
+        """Zamknij skan: pozostałe komórki stają się liśćmi."""
+        self.leaves.extend(self._cells)
+        self._cells = []
+
+    def save(self, points_folder):
+        state = {
+            'points_x': self.points_x,
+            'points_y': self.points_y,
+            'coarse_stride': self.coarse_stride,
+            'threshold': self.threshold,
+            'measured_points': len(self.measured),
+            'leaves': [list(map(int, c)) for c in self.leaves],
+        }
+        with open(os.path.join(points_folder, ADAPTIVE_GRID_FILE), "w", encoding="utf-8") as f:
+            json.dump(state, f)
+
+
+def load_leaves(points_folder):
+    """Liście skanu adaptacyjnego albo None, gdy pomiar nie był adaptacyjny."""
+    try:
+        with open(os.path.join(points_folder, ADAPTIVE_GRID_FILE), "r", encoding="utf-8") as f:
+            return [tuple(c) for c in json.load(f).get('leaves', [])]
+    except Exception:
+        return None
+
+
+def fill_from_leaves(cube, mask, leaves):
+    """Uzupełnij brakujące punkty kostki [nx, ny, L] dwuliniowo z narożników liści.
+
+    `mask` (nx, ny) – True dla zmierzonych punktów; jest aktualizowana dla
+    uzupełnionych. Zwraca liczbę uzupełnionych punktów.
+    """
+    filled = 0
+    nx, ny = mask.shape
+    for x0, y0, x1, y1 in leaves:
+        if x1 >= nx or y1 >= ny:
+            continue
+        if not (mask[x0, y0] and mask[x1, y0] and mask[x0, y1] and mask[x1, y1]):
+            continue
+        block = ~mask[x0:x1 + 1, y0:y1 + 1]
+        if not block.any():
+            continue
+        tx = (np.arange(x0, x1 + 1) - x0) / max(1, x1 - x0)
+        ty = (np.arange(y0, y1 + 1) - y0) / max(1, y1 - y0)
+        wx, wy = np.meshgrid(tx, ty, indexing='ij')
+        interp = (((1 - wx) * (1 - wy))[..., None] * cube[x0, y0]
+                  + (wx * (1 - wy))[..., None] * cube[x1, y0]
+                  + ((1 - wx) * wy)[..., None] * cube[x0, y1]
+                  + (wx * wy)[..., None] * cube[x1, y1])
+        sub = cube[x0:x1 + 1, y0:y1 + 1]
+        sub[block] = interp[block]
+        mask[x0:x1 + 1, y0:y1 + 1] |= block
+        filled += int(block.sum())
+    return filled
@@ -0,0 +1,140 @@
+import time
+
+import cv2
+import numpy as np
+
+"""Autofokus i stosy Z (oś Z na osobnym sterowniku, `port_z` w options.json).
+
+Miara ostrości: wariancja laplasjanu klatki kamery USB zmniejszonej
+`scale` razy (kilka ms na klatkę). Szukanie maksimum:
+
+1. zgrubnie – `coarse_points` pozycji w zakresie ±range_um/2 wokół bieżącej
+   pozycji; najlepsza z nich wyznacza przedział [sąsiad lewy, sąsiad prawy],
+2. dokładnie – złoty podział w tym przedziale (jedna nowa pozycja na
+   iterację) aż do `tol_um`,
+3. parabola przez trzy najlepsze punkty wokół maksimum daje pozycję końcową.
+
+Pozycje są zaokrąglane do impulsu silnika, a zmierzone pozycje zapamiętywane,
+więc żaden punkt nie jest mierzony dwa razy. Ruchy Z są blokujące
+(MotorController.move_z_to czeka na koniec ruchu).
+"""
+
+GOLDEN = (np.sqrt(5.0) - 1.0) / 2.0
+
+
+def sharpness(frame, scale=0.25):
+    """Wariancja laplasjanu klatki zmniejszonej `scale` razy (większa = ostrzej)."""
+    frame = np.asarray(frame)
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    if scale < 1.0:
+        frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(frame, cv2.CV_32F, ksize=3).var())
+
+
+def parabola_peak(xs, ys):
+    """Wierzchołek paraboli przez trzy punkty (None, gdy nie ma maksimum)."""
+    if len(xs) != 3:
+        return None
+    a, b, _ = np.polyfit(np.asarray(xs, dtype=float), np.asarray(ys, dtype=float), 2)
+    if a >= 0:
+        return None
+    return float(-b / (2 * a))
+
+
+def golden_section_max(f, lo, hi, tol):
+    """Maksimum funkcji unimodalnej w [lo, hi] złotym podziałem."""
+    c = hi - GOLDEN * (hi - lo)
+    d = lo + GOLDEN * (hi - lo)
+    fc, fd = f(c), f(d)
+    while hi - lo > tol:
+        if fc >= fd:
+            hi, d, fd = d, c, fc
+            c = hi - GOLDEN * (hi - lo)
+            fc = f(c)
+        else:
+            lo, c, fc = c, d, fd
+            d = lo + GOLDEN * (hi - lo)
+            fd = f(d)
+    return (lo + hi) / 2.0
+
+
+def z_stack_offsets(count, step_um):
+    """Przesunięcia Z (μm) stosu wokół ogniska, np. 3 x 5 μm -> [-5, 0, 5]."""
+    count = max(1, int(count))
+    return [(i - (count - 1) / 2.0) * float(step_um) for i in range(count)]
+
+
+class Autofocus:
+    """Szukanie ogniska ruchem osi Z i miarą ostrości z kamery USB.
+
+    motors - MotorController z podłączoną osią Z (move_z_to, position_z_um),
+    frame_source - fn() -> klatka kamery USB.
+    """
+
+    def __init__(self, motors, frame_source, range_um=100.0, tol_um=2.0, coarse_points=7,
+                 scale=0.25, settle_s=0.15, frames=2):
+        self.motors = motors
+        self.frame_source = frame_source
+        self.range_um = float(range_um)
+        self.tol_um = max(float(tol_um), float(motors.MICROMETERS_PER_PULSE))
+        self.coarse_points = max(3, int(coarse_points))
+        self.scale = float(scale)
+        self.settle_s = float(settle_s)
+        self.frames = max(1, int(frames))
+        self.evaluations = {}
+
+    def measure(self, z_um):
+        """Przejedź na z_um (zaokrąglone do impulsu) i zmierz ostrość."""
+        pulse = self.motors.MICROMETERS_PER_PULSE
+        z_um = round(z_um / pulse) * pulse
+        if z_um in self.evaluations:
+            return self.evaluations[z_um]
+        self.motors.move_z_to(z_um)
+        time.sleep(self.settle_s)
+        values = []
+        for _ in range(self.frames):
+            frame = self.frame_source()
+            if frame is not None:
+                values.append(sharpness(frame, self.scale))
+            # Następna klatka kamery USB (~30 kl./s)
+            time.sleep(0.04)
+        value = float(np.mean(values)) if values else 0.0
+        self.evaluations[z_um] = value
+        return value
+
+    def run(self, center_um=None):
+        """Znajdź ognisko wokół center_um (domyślnie bieżąca pozycja Z) i tam stań.
+
+        Zwraca pozycję Z ogniska (μm) albo None, gdy nie ma klatek z kamery.
+        """
+        if self.frame_source() is None:
+            print("Autofocus: no USB camera frame")
+            return None
+        t0 = time.time()
+        self.evaluations = {}
+        center = self.motors.position_z_um if center_um is None else float(center_um)
+        half = self.range_um / 2.0
+
+        # 1) Zgrubnie: równomiernie w całym zakresie
+        coarse = np.linspace(center - half, center + half, self.coarse_points)
+        scores = [self.measure(z) for z in coarse]
+        best = int(np.argmax(scores))
+        lo = coarse[max(0, best - 1)]
+        hi = coarse[min(len(coarse) - 1, best + 1)]
+
+        # 2) Dokładnie: złoty podział w przedziale wokół najlepszego punktu
+        golden_section_max(self.measure, lo, hi, self.tol_um)
+
+        # 3) Parabola przez najlepszy punkt i jego sąsiadów
+        zs = sorted(self.evaluations)
+        i = int(np.argmax([self.evaluations[z] for z in zs]))
+        focus = zs[i]
+        if 0 < i < len(zs) - 1:
+            peak = parabola_peak(zs[i - 1:i + 2], [self.evaluations[z] for z in zs[i - 1:i + 2]])
+            if peak is not None and zs[i - 1] <= peak <= zs[i + 1]:
+                focus = peak
+        self.motors.move_z_to(focus)
+        print(f"🔍 Autofocus: Z = {focus:.1f} μm (sharpness {self.evaluations[zs[i]]:.1f}, "
+              f"{len(self.evaluations)} positions, {time.time() - t0:.1f}s)")
+        return focus
@@ -0,0 +1,325 @@
+import time
+import threading
+
+import numpy as np
+
+from generate_sequence_like_measurements import _generate_spectrum
+
+"""Symulowany backend kamery PixeLink.
+
+SpectrometerManager rozmawia z kamerą wyłącznie przez obiekt o interfejsie
+PxLApi (initialize, setStreamState, getNextNumPyFrame, setFeature, ...).
+Ten moduł dostarcza klasę SimulatedPxLApi z tym samym podzbiorem API, więc
+cała ścieżka akwizycji (pętla pollingu, GUI, sekwencja, zapis plików) może
+działać bez kamery – np. do powtarzalnego profilowania.
+
+Klatka to obraz 2D z poziomym paskiem widmowym (kształty widm jak w
+generate_sequence_like_measurements._generate_spectrum), o zadanej
+rozdzielczości, głębi bitowej, maksymalnym frame rate i odpowiedzi na
+czas ekspozycji / gain.
+
+Włączenie w aplikacji (options.json):
+
+    "camera_backend": "simulated",
+    "simulated_camera": {"width": 2048, "height": 2048, "frame_rate": 30.0}
+
+Szybki pomiar przepustowości samego symulatora:
+
+    python camera_simulator.py
+"""
+
+
+class _SimFrameDesc:
+    """Minimalny odpowiednik PxLApi._FrameDesc (pola używane w aplikacji)."""
+
+    def __init__(self, frame_number, frame_time, exposure_s, gain):
+        self.uFrameNumber = frame_number
+        self.fFrameTime = frame_time
+        self.fExposure = exposure_s
+        self.fGain = gain
+
+
+class SimulatedPxLApi:
+    """Symulowana kamera z interfejsem zgodnym z używanym podzbiorem PxLApi."""
+
+    class ReturnCode:
+        ApiSuccess = 0
+        ApiUnknownError = -2147483647
+        ApiInvalidHandleError = -2147483646
+        ApiStreamStopped = -2147483630
+        ApiNoCameraAvailableError = -2147483625
+
+    class StreamState:
+        START = 0
+        PAUSE = 1
+        STOP = 2
+
+    class FeatureId:
+        EXPOSURE = 7
+        GAIN = 8
+
+    class FeatureFlags:
+        PRESENCE = 1
+        MANUAL = 2
+        AUTO = 4
+
+    class Settings:
+        SETTINGS_FACTORY = 0
+
+    DEFAULTS = {
+        'width': 2048,
+        'height': 2048,
+        'bit_depth': 8,
+        'frame_rate': 30.0,          # maksymalny frame rate (ograniczony też ekspozycją)
+        'exposure_ms': 10.0,
+        'gain': 1.0,
+        'counts_per_ms': 2.0,        # odpowiedź: zliczenia / ms na szczycie paska przy gain = 1
+        'dark_level': 4.0,           # offset ciemny (zliczenia)
+        'read_noise': 1.5,           # szum odczytu (zliczenia RMS)
+        'stripe_center': 0.5,        # położenie paska (ułamek wysokości)
+        'stripe_sigma': 40.0,        # szerokość paska (piksele, sigma)
+        'spectrum_center': 0.5,      # położenie maksimum widma (ułamek szerokości)
+        'scene_points': 100,         # liczba "punktów" przez które przechodzi pik
+        'advance_per_frame': True,   # przesuwaj pik co klatkę (zmienna scena)
+        'seed': 0,
+    }
+
+    def __init__(self, **config):
+        cfg = dict(self.DEFAULTS)
+        cfg.update({k: v for k, v in config.items() if v is not None})
+        self.width = max(1, int(cfg['width']))
+        self.height = max(1, int(cfg['height']))
+        self.bit_depth = min(16, max(8, int(cfg['bit_depth'])))
+        self.frame_rate = max(0.1, float(cfg['frame_rate']))
+        self.exposure_ms = float(cfg['exposure_ms'])
+        self.gain = float(cfg['gain'])
+        self.counts_per_ms = float(cfg['counts_per_ms'])
+        self.dark_level = float(cfg['dark_level'])
+        self.read_noise = float(cfg['read_noise'])
+        self.stripe_center = float(cfg['stripe_center'])
+        self.stripe_sigma = max(1.0, float(cfg['stripe_sigma']))
+        self.spectrum_center = float(cfg['spectrum_center'])
+        self.scene_points = max(1, int(cfg['scene_points']))
+        self.advance_per_frame = bool(cfg['advance_per_frame'])
+        self.point_index = 0
+
+        self._rng = np.random.default_rng(int(cfg['seed']))
+        self._lock = threading.Lock()
+        self._handles = set()
+        self._next_handle = 1
+        self._streaming = False
+        self._stream_t0 = 0.0
+        self._next_frame_time = 0.0
+        self._frame_number = 0
+        self._template_key = None
+        self._template = None
+        self._peak_column = None
+        self._noise_bank = None
+        # Bank szumu od razu – pierwsza klatka nie może czekać na losowanie matrycy
+        self._ensure_noise_bank()
+
+    @classmethod
+    def from_options(cls, opts):
+        """Zbuduj symulator z sekcji 'simulated_camera' w options.json."""
+        cfg = dict((opts or {}).get('simulated_camera', {}) or {})
+        cfg.setdefault('exposure_ms', (opts or {}).get('exposure_time', cls.DEFAULTS['exposure_ms']))
+        cfg.setdefault('gain', (opts or {}).get('gain', cls.DEFAULTS['gain']))
+        return cls(**cfg)
+
+    # ------------------------------------------------------------------
+    # Podzbiór PxLApi
+    # ------------------------------------------------------------------
+    @staticmethod
+    def apiSuccess(rc):
+        return rc >= 0
+
+    def initialize(self, serialNumber=0, flags=0):
+        with self._lock:
+            handle = self._next_handle
+            self._next_handle += 1
+            self._handles.add(handle)
+        return (self.ReturnCode.ApiSuccess, handle)
+
+    def uninitialize(self, hCamera):
+        with self._lock:
+            if hCamera not in self._handles:
+                return (self.ReturnCode.ApiInvalidHandleError,)
+            self._handles.discard(hCamera)
+            if not self._handles:
+                self._streaming = False
+        return (self.ReturnCode.ApiSuccess,)
+
+    def loadSettings(self, hCamera, channel):
+        self.exposure_ms = self.DEFAULTS['exposure_ms']
+        self.gain = self.DEFAULTS['gain']
+        return (self.ReturnCode.ApiSuccess,)
+
+    def setStreamState(self, hCamera, streamState):
+        if hCamera not in self._handles:
+            return (self.ReturnCode.ApiInvalidHandleError,)
+        with self._lock:
+            if streamState == self.StreamState.START:
+                if not self._streaming:
+                    self._streaming = True
+                    self._stream_t0 = time.perf_counter()
+                    self._next_frame_time = self._stream_t0
+            else:
+                self._streaming = False
+        return (self.ReturnCode.ApiSuccess,)
+
+    def setFeature(self, hCamera, featureId, flags, params):
+        if hCamera not in self._handles:
+            return (self.ReturnCode.ApiInvalidHandleError,)
+        try:
+            value = float(params[0])
+        except Exception:
+            return (self.ReturnCode.ApiUnknownError,)
+        if featureId == self.FeatureId.EXPOSURE:
+            # PxLApi pracuje w sekundach
+            self.exposure_ms = max(0.01, value * 1000.0)
+        elif featureId == self.FeatureId.GAIN:
+            self.gain = max(0.0, value)
+        else:
+            return (self.ReturnCode.ApiUnknownError,)
+        return (self.ReturnCode.ApiSuccess,)
+
+    def getFeature(self, hCamera, featureId, params=None):
+        if hCamera not in self._handles:
+            return (self.ReturnCode.ApiInvalidHandleError,)
+        if featureId == self.FeatureId.EXPOSURE:
+            return (self.ReturnCode.ApiSuccess, self.FeatureFlags.MANUAL, [self.exposure_ms / 1000.0])
+        if featureId == self.FeatureId.GAIN:
+            return (self.ReturnCode.ApiSuccess, self.FeatureFlags.MANUAL, [self.gain])
+        return (self.ReturnCode.ApiUnknownError,)
+
+    def getNextNumPyFrame(self, hCamera, frame=None):
+        """Zablokuj do czasu następnej klatki i wypełnij bufor jak PxLGetNextFrame.
+
+        Tak jak prawdziwe API, dane są zapisywane liniowo od początku bufora
+        (bufor 2048x2048 przy innej rozdzielczości nie jest przeformatowywany).
+        """
+        if hCamera not in self._handles:
+            return (self.ReturnCode.ApiNoCameraAvailableError,)
+        if not self._streaming:
+            return (self.ReturnCode.ApiStreamStopped,)
+
+        # Tempo klatek: min(frame_rate, 1 / ekspozycja)
+        period = max(1.0 / self.frame_rate, self.exposure_ms / 1000.0)
+        now = time.perf_counter()
+        if self._next_frame_time > now:
+            time.sleep(self._next_frame_time - now)
+            now = self._next_frame_time
+        self._next_frame_time = max(now, self._next_frame_time) + period
+
+        image = self.render_frame()
+        frame_number = self._frame_number
+        self._frame_number += 1
+        if self.advance_per_frame:
+            self.point_index = (self.point_index + 1) % self.scene_points
+
+        if frame is not None and frame.size > 0:
+            if frame.dtype == np.uint8 and self.bit_depth > 8:
+                image = (image >> (self.bit_depth - 8)).astype(np.uint8)
+            flat_src = image.reshape(-1)
+            flat_dst = frame.reshape(-1)
+            n = min(flat_src.size, flat_dst.size)
+            flat_dst[:n] = flat_src[:n]
+
+        desc = _SimFrameDesc(frame_number, float(now - self._stream_t0),
+                             self.exposure_ms / 1000.0, self.gain)
+        return (self.ReturnCode.ApiSuccess, desc)
+
+    # ------------------------------------------------------------------
+    # Generowanie obrazu
+    # ------------------------------------------------------------------
+    @property
+    def max_value(self):
+        return (1 << self.bit_depth) - 1
+
+    def _stripe_rows(self):
+        """Zakres wierszy, w których pasek ma istotny sygnał (±5 sigma)."""
+        center = self.stripe_center * (self.height - 1)
+        half = int(np.ceil(5.0 * self.stripe_sigma))
+        r0 = max(0, int(center) - half)
+        r1 = min(self.height, int(center) + half + 1)
+        return r0, max(r0, r1)
+
+    def _build_template(self):
+        """Bezszumowy pasek (float32, zliczenia ponad poziom ciemny) dla bieżących parametrów.
+
+        Szablon to samo widmo bazowe (bez piku punktu); pik zależny od
+        `point_index` jest dodawany przy renderowaniu (`_peak_span`), więc
+        szablon zależy tylko od ekspozycji i gain.
+        """
+        spectrum = _generate_spectrum(self.width, self.spectrum_center, 1.0, 0, 0)
+        peak = float(np.max(spectrum)) if spectrum.size else 1.0
+        scale = 1.0 / (peak if peak > 0 else 1.0)
+
+        r0, r1 = self._stripe_rows()
+        rows = np.arange(r0, r1, dtype=np.float32)
+        center = self.stripe_center * (self.height - 1)
+        profile = np.exp(-((rows - center) ** 2) / (2.0 * self.stripe_sigma ** 2))
+
+        signal = self.counts_per_ms * self.exposure_ms * self.gain
+        template = np.outer(profile, spectrum * scale).astype(np.float32)
+        template *= np.float32(signal)
+        # Kolumna piku punktu (+500 jak w _generate_spectrum), w tej samej skali
+        self._peak_column = (profile[:, None] * (500.0 * scale * signal)).astype(np.float32)
+        return template
+
+    def _peak_span(self):
+        """Kolumny piku dla bieżącego `point_index` (jak w _generate_spectrum)."""
+        peak_pos = int((self.point_index / max(1, self.scene_points - 1)) * (self.width - 1))
+        peak_width = max(3, self.width // 200)
+        return max(0, peak_pos - peak_width), min(self.width, peak_pos + peak_width)
+
+    def _ensure_noise_bank(self):
+        if self._noise_bank is None:
+            # Kilka gotowych klatek szumu – losowanie 4M wartości na klatkę
+            # zdominowałoby czas symulacji zamiast mierzonej ścieżki.
+            dtype = np.uint8 if self.bit_depth <= 8 else np.uint16
+            noise = [
+                self._rng.normal(self.dark_level, self.read_noise, (self.height, self.width)).astype(np.float32)
+                for _ in range(4)
+            ]
+            # (szum float dla pasa, gotowe tło ciemne w docelowym typie)
+            self._noise_bank = [
+                (n, np.clip(np.rint(n), 0, self.max_value).astype(dtype)) for n in noise
+            ]
+        return self._noise_bank
+
+    def render_frame(self):
+        """Zwróć pojedynczą klatkę (uint8 lub uint16 zależnie od bit_depth).
+
+        Poza pasem widmowym klatka to gotowe tło ciemne z banku szumu, więc
+        koszt renderowania zależy od szerokości paska, a nie od całej matrycy.
+        """
+        key = (self.exposure_ms, self.gain)
+        if key != self._template_key:
+            self._template = self._build_template()
+            self._template_key = key
+
+        noise, dark = self._ensure_noise_bank()[self._frame_number % 4]
+        image = dark.copy()
+        r0, r1 = self._stripe_rows()
+        band = self._template + noise[r0:r1]
+        k0, k1 = self._peak_span()
+        band[:, k0:k1] += self._peak_column
+        np.clip(np.rint(band, out=band), 0, self.max_value, out=band)
+        image[r0:r1] = band
+        return image
+
+
+if __name__ == "__main__":
+    api = SimulatedPxLApi(frame_rate=1000.0, exposure_ms=1.0)
+    handle = api.initialize(0)[1]
+    buffer = np.zeros((2048, 2048), dtype=np.uint8)
+    api.setStreamState(handle, api.StreamState.START)
+    count = 100
+    t0 = time.perf_counter()
+    for _ in range(count):
+        api.getNextNumPyFrame(handle, buffer)
+    dt = time.perf_counter() - t0
+    api.setStreamState(handle, api.StreamState.STOP)
+    api.uninitialize(handle)
+    print(f"Simulated {count} frames {api.width}x{api.height} in {dt:.2f}s ({count / dt:.1f} fps)")
@@ -0,0 +1,181 @@
+import time
+import threading
+
+import numpy as np
+
+"""Skan ciągły ("on-the-fly") – jeden wiersz rastra przy stałej prędkości.
+
+Zamiast ruchu punkt-po-punkcie (ruch, pauza, ekspozycja) stolik X przejeżdża
+cały wiersz ze stałą prędkością, a kamera w tym czasie strumieniuje klatki.
+Każdej klatce przypisujemy położenie stolika interpolując czas klatki
+(fFrameTime z deskryptora PixeLink) względem chwili startu ruchu, a potem
+klatki są grupowane (binning) w komórki siatki o kroku step_x.
+
+Moduł nie zależy od Tk – potrzebuje tylko SpectrometerManager (słuchacze
+klatek) i MotorController (move / set_speed).
+"""
+
+
+def choose_row_velocity(step_um, frame_period_s, frames_per_cell=3, max_velocity=None):
+    """Prędkość (μm/s), przy której na komórkę siatki przypada `frames_per_cell` klatek."""
+    frames_per_cell = max(1, int(frames_per_cell))
+    frame_period_s = max(1e-4, float(frame_period_s))
+    velocity = float(step_um) / (frames_per_cell * frame_period_s)
+    if max_velocity is not None and max_velocity > 0:
+        velocity = min(velocity, float(max_velocity))
+    return max(velocity, 1e-3)
+
+
+def descriptor_exposure_ms(descriptor):
+    """Ekspozycja klatki (ms) z deskryptora (symulator: fExposure, PxLApi: Shutter.fValue); None, gdy brak."""
+    exposure_s = getattr(descriptor, 'fExposure', None)
+    if exposure_s is None:
+        exposure_s = getattr(getattr(descriptor, 'Shutter', None), 'fValue', None)
+    return None if exposure_s is None else float(exposure_s) * 1000.0
+
+
+def exposure_matches(actual_ms, expected_ms):
+    """Czy ekspozycja klatki odpowiada ustawionej (tolerancja 5%, min. 0.05 ms)."""
+    return abs(actual_ms - expected_ms) <= max(0.05, 0.05 * expected_ms)
+
+
+def frame_host_times(host_times, frame_times, exposure_s):
+    """Przelicz czasy klatek z zegara kamery na zegar hosta (środek ekspozycji).
+
+    Przesunięcie zegarów to minimum (host - kamera): klatka odebrana z
+    najmniejszym opóźnieniem najlepiej wyznacza offset. Bez czasów kamery
+    (None) używamy chwili odbioru pomniejszonej o pół ekspozycji.
+    """
+    host_times = np.asarray(host_times, dtype=float)
+    if frame_times is None or len(frame_times) != len(host_times) or any(t is None for t in frame_times):
+        return host_times - 0.5 * exposure_s
+    frame_times = np.asarray(frame_times, dtype=float)
+    offset = float(np.min(host_times - frame_times))
+    return frame_times + offset - 0.5 * exposure_s
+
+
+def interpolate_positions(times, t_move_start, velocity, span):
+    """Położenie stolika (0..span, μm od początku wiersza) dla podanych czasów."""
+    travelled = (np.asarray(times, dtype=float) - t_move_start) * velocity
+    return np.clip(travelled, 0.0, span)
+
+
+def bin_row(positions, spectra, step_um, points):
+    """Pogrupuj widma wiersza w `points` komórek siatki.
+
+    `positions` to odległości od pierwszego punktu wiersza (μm), komórka i
+    obejmuje [i*step - step/2, i*step + step/2). Zwraca (widma [points, L],
+    liczba klatek na komórkę). Puste komórki są uzupełniane liniowo z
+    sąsiadów, żeby wiersz zawsze miał pełną długość.
+    """
+    spectra = np.asarray(spectra, dtype=float)
+    if spectra.ndim != 2 or spectra.shape[0] == 0:
+        raise ValueError("bin_row: no frames recorded for this row")
+
+    idx = np.rint(np.asarray(positions, dtype=float) / float(step_um)).astype(int)
+    idx = np.clip(idx, 0, points - 1)
+
+    counts = np.bincount(idx, minlength=points)
+    sums = np.zeros((points, spectra.shape[1]), dtype=float)
+    np.add.at(sums, idx, spectra)
+
+    filled = counts > 0
+    binned = np.zeros_like(sums)
+    binned[filled] = sums[filled] / counts[filled, None]
+
+    if not np.all(filled):
+        cells = np.arange(points)
+        for col in range(binned.shape[1]):
+            binned[~filled, col] = np.interp(cells[~filled], cells[filled], binned[filled, col])
+    return binned, counts
+
+
+class ContinuousRowScanner:
+    """Nagrywa klatki podczas przejazdu jednego wiersza i przypisuje im położenie."""
+
+    def __init__(self, spectrometer_manager, motor_controller, extract, start_latency=0.05):
+        self.spectrometer_manager = spectrometer_manager
+        self.motor_controller = motor_controller
+        self.extract = extract
+        self.start_latency = float(start_latency)
+        self._records = []
+        self._lock = threading.Lock()
+        self._recording = False
+        self._exposure_ms = None
+        self._saved_poll_interval = None
+
+    def __enter__(self):
+        # W trakcie skanu pętla akwizycji odbiera klatki bez przerw
+        sm = self.spectrometer_manager
+        if sm is not None:
+            self._saved_poll_interval = getattr(sm, 'poll_interval', None)
+            sm.poll_interval = 0.0
+            sm.add_frame_listener(self._on_frame)
+            # Pętla akwizycji może jeszcze spać ze starym interwałem
+            if self._saved_poll_interval:
+                time.sleep(min(float(self._saved_poll_interval), 1.0))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        sm = self.spectrometer_manager
+        if sm is not None:
+            sm.remove_frame_listener(self._on_frame)
+            if self._saved_poll_interval is not None:
+                sm.poll_interval = self._saved_poll_interval
+        return False
+
+    def _on_frame(self, frame, descriptor):
+        if not self._recording:
+            return
+        host_t = time.perf_counter()
+        # Klatka naświetlana jeszcze przed zmianą ekspozycji nie należy do tego przejazdu
+        actual_ms = descriptor_exposure_ms(descriptor)
+        if actual_ms is not None and self._exposure_ms is not None and not exposure_matches(actual_ms, self._exposure_ms):
+            return
+        frame_t = getattr(descriptor, 'fFrameTime', None)
+        try:
+            spectrum = self.extract(frame)
+        except Exception as e:
+            print(f"Continuous scan extract error: {e}")
+            return
+        if spectrum is None:
+            return
+        with self._lock:
+            self._records.append((host_t, frame_t, np.asarray(spectrum, dtype=float)))
+
+    def scan_row(self, move, direction, span_um, velocity, exposure_s, should_stop=None):
+        """Przejedź wiersz i zwróć (pozycje μm od startu wiersza, widma).
+
+        `move(direction, distance_um)` wysyła ruch (np. move_motor_tracked z
+        sekwencji) – wywołujemy go raz dla całego wiersza. Klatki o innej
+        ekspozycji w deskryptorze niż `exposure_s` są pomijane.
+        """
+        with self._lock:
+            self._records = []
+        self._exposure_ms = float(exposure_s) * 1000.0
+        self._recording = True
+        duration = span_um / velocity if velocity > 0 else 0.0
+        try:
+            t_cmd = time.perf_counter()
+            if span_um > 0:
+                move(direction, span_um)
+            t_move_start = t_cmd + self.start_latency
+            deadline = t_move_start + duration + max(0.1, 2.0 * exposure_s)
+            while time.perf_counter() < deadline:
+                if should_stop is not None and should_stop():
+                    break
+                time.sleep(0.01)
+        finally:
+            self._recording = False
+
+        with self._lock:
+            records = list(self._records)
+        if not records:
+            return np.zeros(0), np.zeros((0, 0))
+
+        host_times = [r[0] for r in records]
+        frame_times = [r[1] for r in records]
+        spectra = np.vstack([r[2] for r in records])
+        times = frame_host_times(host_times, frame_times, exposure_s)
+        positions = interpolate_positions(times, t_move_start, velocity, span_um)
+        return positions, spectra
@@ -0,0 +1,126 @@
+import os
+import csv
+import time
+
+import cv2
+import numpy as np
+
+"""Kompensacja dryfu stolika/próbki podczas długich skanów (kamera USB).
+
+Na starcie skanu, w punkcie odniesienia (narożnik startowy), zapamiętujemy
+klatkę z kamery USB. Co `drift_check_rows` wierszy sekwencja wraca do tego
+punktu, a przesunięcie obrazu względem klatki odniesienia (korelacja fazowa,
+cv2.phaseCorrelate, dokładność subpikselowa) to dryf, który narósł od
+ostatniej korekty. Przeliczony na μm stolika:
+
+    um = px · drift_um_per_px / lens_magnification
+
+(`drift_um_per_px` – μm na piksel kamery USB przy powiększeniu 1×), jest
+korygowany ruchem MotorController bez zmiany logicznej pozycji sekwencji,
+więc dalsza część siatki trafia w te same miejsca próbki. Porównujemy klatki
+z tej samej pozycji stolika – przepływ Farnebacka całkowany klatka po
+klatce zawierałby też ruchy stolika między punktami.
+
+`drift_axis_sign` ([sx, sy]) ustala kierunek korekty względem przesunięcia
+obrazu (zależy od montażu kamery i odbicia obrazu); jeśli dryf w drift.csv
+rośnie zamiast maleć, zmień znak danej osi.
+"""
+
+DRIFT_FILE = "drift.csv"
+
+
+def to_gray(frame):
+    """Klatka BGR / mono -> float32 w skali szarości."""
+    frame = np.asarray(frame)
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return frame.astype(np.float32)
+
+
+class DriftTracker:
+    """Przesunięcie obrazu kamery USB względem klatki odniesienia, w μm stolika.
+
+    frame_source - fn() -> aktualna klatka (bez nakładek, np. krzyża celownika).
+    """
+
+    def __init__(self, frame_source, um_per_px=1.0, lens_magnification=1.0, axis_sign=(1, 1),
+                 min_response=0.1, max_shift_um=50.0, frames=3):
+        self.frame_source = frame_source
+        lens_mag = float(lens_magnification) if lens_magnification and lens_magnification > 0 else 1.0
+        self.um_per_px = float(um_per_px) / lens_mag
+        self.axis_sign = (float(axis_sign[0]), float(axis_sign[1]))
+        self.min_response = float(min_response)
+        self.max_shift_um = float(max_shift_um)
+        self.frames = max(1, int(frames))
+        self.reference = None
+        self.window = None
+        # Suma zastosowanych korekt (μm stolika, x w prawo, y w dół)
+        self.total_um = [0.0, 0.0]
+        self.log = []
+
+    def _grab(self):
+        """Średnia z kilku kolejnych klatek (mniej szumu w korelacji)."""
+        acc = None
+        count = 0
+        deadline = time.time() + 2.0
+        while count < self.frames and time.time() < deadline:
+            frame = self.frame_source()
+            # Kamera USB daje ~30 kl./s – odstęp ~1,5 klatki
+            time.sleep(0.05)
+            if frame is None:
+                continue
+            gray = to_gray(frame)
+            acc = gray if acc is None else acc + gray
+            count += 1
+        return None if acc is None else acc / count
+
+    def set_reference(self):
+        """Zapamiętaj klatkę odniesienia (stolik w punkcie odniesienia)."""
+        gray = self._grab()
+        if gray is None:
+            print("Drift: no USB camera frame - drift compensation disabled")
+            return False
+        self.reference = gray
+        self.window = cv2.createHanningWindow((gray.shape[1], gray.shape[0]), cv2.CV_32F)
+        return True
+
+    def measure(self):
+        """Dryf od klatki odniesienia: (dx_um, dy_um, response) albo None.
+
+        dx/dy to już korekta dla stolika (ze znakiem `axis_sign`).
+        """
+        if self.reference is None:
+            return None
+        gray = self._grab()
+        if gray is None or gray.shape != self.reference.shape:
+            return None
+        (sx, sy), response = cv2.phaseCorrelate(self.reference, gray, self.window)
+        dx = self.axis_sign[0] * sx * self.um_per_px
+        dy = self.axis_sign[1] * sy * self.um_per_px
+        return dx, dy, float(response)
+
+    def accept(self, dx_um, dy_um, response, min_um=0.5):
+        """Czy pomiar nadaje się do korekty (pewna korelacja, rozsądny i niezerowy)."""
+        if response < self.min_response:
+            print(f"Drift: low correlation ({response:.2f}) - no correction")
+            return False
+        if max(abs(dx_um), abs(dy_um)) > self.max_shift_um:
+            print(f"Drift: shift ({dx_um:.1f}, {dy_um:.1f}) μm above drift_max_um - no correction")
+            return False
+        return max(abs(dx_um), abs(dy_um)) >= min_um
+
+    def record(self, row, dx_um, dy_um, response, applied):
+        if applied:
+            self.total_um[0] += dx_um
+            self.total_um[1] += dy_um
+        self.log.append((time.strftime('%H:%M:%S'), row, round(dx_um, 3), round(dy_um, 3),
+                         round(response, 3), int(applied), round(self.total_um[0], 3), round(self.total_um[1], 3)))
+
+    def save(self, folder):
+        """Zapisz historię korekt do <folder>/drift.csv."""
+        if not self.log:
+            return
+        with open(os.path.join(folder, DRIFT_FILE), "w", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["time", "row", "dx_um", "dy_um", "response", "applied", "total_x_um", "total_y_um"])
+            w.writerows(self.log)
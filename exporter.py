@@ -0,0 +1,349 @@
+import os
+import json
+import zipfile
+
+import numpy as np
+
+from sequence_checkpoint import load_checkpoint, points_folder_for
+from wavelength_calibration import spectral_axis
+
+"""Strumieniowy eksport pomiarów (CSV, NPZ, kostka float32 + JSON, ENVI).
+
+Eksport z zakładki Results wczytywał każdy plik w całości do list Pythona
+i pisał wiersz po wierszu csv.writerem w wątku Tk. Tutaj pliki
+`*_spectra.csv` są czytane porcjami wierszy (`chunk_rows`), a każda
+porcja od razu trafia do wyjścia – pamięć zależy od porcji, nie od skanu:
+
+- 'csv'  – jeden plik, wszystkie sesje po kolei, format jak plik pomiaru
+  (x, y, widmo; bez nagłówka),
+- 'npz'  – archiwum numpy na sesję: `spectra` [punkt, lambda], `x`, `y`,
+  `wavelength`; tablica `spectra` jest pisana do zipa porcjami (nagłówek
+  .npy z kształtem z pierwszego przebiegu),
+- 'cube' – surowa kostka float32 (little-endian) na sesję + `<plik>.json`
+  z kształtem, przeplotem i osią,
+- 'envi' – ta sama kostka jako `<plik>.raw` + nagłówek ENVI `<plik>.hdr`
+  (samples = x, lines = y, bands = lambda).
+
+Kostki są pisane przez np.memmap, punkty niezmierzone mają NaN. Przeplot
+(`export_interleave` w options.json): 'bsq' (domyślnie, pasmo po paśmie),
+'bil' albo 'bip'. Przy kilku sesjach formaty binarne tworzą osobny plik na
+sesję: `<nazwa>_<sesja>.<rozszerzenie>`.
+
+Eksport wołany jest z wątku w tle: `progress(zrobione, wszystkie)` w
+wierszach, `cancel` (threading.Event) przerywa po bieżącej porcji i usuwa
+niedokończone pliki (ExportCancelled).
+"""
+
+EXPORT_FORMATS = {
+    'csv': ".csv",
+    'npz': ".npz",
+    'cube': ".f32",
+    'envi': ".hdr",
+}
+EXPORT_FILETYPES = [
+    ("CSV files", "*.csv"),
+    ("NumPy archive", "*.npz"),
+    ("Raw float32 cube + JSON", "*.f32"),
+    ("ENVI cube", "*.hdr"),
+]
+INTERLEAVES = ('bsq', 'bil', 'bip')
+
+
+class ExportCancelled(Exception):
+    """Eksport przerwany przez użytkownika."""
+
+
+def format_for(filename, default='csv'):
+    """Format eksportu z rozszerzenia pliku docelowego."""
+    ext = os.path.splitext(filename)[1].lower()
+    for fmt, fmt_ext in EXPORT_FORMATS.items():
+        if ext == fmt_ext:
+            return fmt
+    if ext in ('.raw', '.img'):
+        return 'envi'
+    if ext in ('.bin', '.json'):
+        return 'cube'
+    return default
+
+
+def scan_session(filename):
+    """Pierwszy, lekki przebieg: liczba wierszy, siatka (max x / y + 1), najmniejsze x / y i długość widma."""
+    rows = 0
+    x_max = y_max = -1
+    x_min = y_min = None
+    length = 0
+    with open(filename, 'rb') as f:
+        for line in f:
+            parts = line.split(b',', 2)
+            if len(parts) < 3:
+                continue
+            if not length:
+                length = line.count(b',') - 1
+            rows += 1
+            x, y = int(float(parts[0])), int(float(parts[1]))
+            x_max, y_max = max(x_max, x), max(y_max, y)
+            x_min = x if x_min is None else min(x_min, x)
+            y_min = y if y_min is None else min(y_min, y)
+    return {'rows': rows, 'nx': x_max + 1, 'ny': y_max + 1, 'x_min': x_min or 0, 'y_min': y_min or 0,
+            'length': length}
+
+
+def read_chunks(filename, chunk_rows=1000):
+    """Porcje wierszy pliku pomiaru jako tablice [wiersz, 2 + lambda]."""
+    with open(filename) as f:
+        while True:
+            try:
+                block = np.loadtxt(f, delimiter=',', max_rows=chunk_rows, ndmin=2)
+            except ValueError:
+                break
+            if block.size == 0:
+                break
+            yield block
+            if len(block) < chunk_rows:
+                break
+
+
+def session_axis(filename, length, opts=None):
+    """Oś widma sesji (z checkpointu, gdy pasuje długością) i czy jest skalibrowana."""
+    axis = spectral_axis(opts or {})
+    state = load_checkpoint(points_folder_for(filename)) or {}
+    values = state.get('axis')
+    if not values or len(values) != length:
+        values = axis.resampled(length)
+    return np.asarray(values, dtype=np.float64), axis.calibrated
+
+
+def session_id_of(filename):
+    base = os.path.basename(filename)
+    if base.startswith("measurement_") and base.endswith("_spectra.csv"):
+        return base[len("measurement_"):-len("_spectra.csv")]
+    return os.path.splitext(base)[0]
+
+
+def output_paths(files, target, fmt):
+    """Plik wyjściowy dla każdej sesji (CSV – jeden wspólny)."""
+    if fmt == 'csv' or len(files) == 1:
+        return [target] * len(files)
+    stem, ext = os.path.splitext(target)
+    return [f"{stem}_{session_id_of(f)}{ext or EXPORT_FORMATS[fmt]}" for f in files]
+
+
+def _fit(spectra, length):
+    """Widma przycięte / dopełnione NaN do długości `length`."""
+    if spectra.shape[1] == length:
+        return spectra
+    if spectra.shape[1] > length:
+        return spectra[:, :length]
+    out = np.full((spectra.shape[0], length), np.nan)
+    out[:, :spectra.shape[1]] = spectra
+    return out
+
+
+def _format_block(block):
+    """Porcja -> tekst CSV (x, y jako liczby całkowite, widmo %.10g)."""
+    row = "%d,%d" + ",%.10g" * (block.shape[1] - 2) + "\n"
+    return (row * block.shape[0]) % tuple(block.ravel().tolist())
+
+
+def _remove(paths):
+    for path in paths:
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError:
+            pass
+
+
+class _Progress:
+    def __init__(self, total, progress, cancel):
+        self.total = total
+        self.done = 0
+        self.progress = progress
+        self.cancel = cancel
+
+    def step(self, rows):
+        self.done += rows
+        if self.progress is not None:
+            self.progress(self.done, self.total)
+        if self.cancel is not None and self.cancel.is_set():
+            raise ExportCancelled()
+
+
+def _export_csv(files, target, chunk_rows, tracker):
+    with open(target, 'w', newline='') as out:
+        for filename in files:
+            for block in read_chunks(filename, chunk_rows):
+                out.write(_format_block(block))
+                tracker.step(len(block))
+
+
+def _write_npy_header(stream, shape, dtype):
+    np.lib.format.write_array_header_2_0(
+        stream, {'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)), 'fortran_order': False, 'shape': shape})
+
+
+def _export_npz(filename, target, info, opts, chunk_rows, tracker):
+    length = info['length']
+    axis, calibrated = session_axis(filename, length, opts)
+    xs, ys = [], []
+    with zipfile.ZipFile(target, 'w', zipfile.ZIP_STORED, allowZip64=True) as zf:
+        with zf.open('spectra.npy', 'w', force_zip64=True) as out:
+            _write_npy_header(out, (info['rows'], length), np.float64)
+            written = 0
+            for block in read_chunks(filename, chunk_rows):
+                block = block[:info['rows'] - written]
+                xs.append(block[:, 0].astype(np.int32))
+                ys.append(block[:, 1].astype(np.int32))
+                out.write(np.ascontiguousarray(_fit(block[:, 2:], length), dtype='<f8').tobytes())
+                written += len(block)
+                tracker.step(len(block))
+            if written < info['rows']:
+                # Wiersz, którego nie dało się odczytać – kształt z nagłówka musi się zgadzać
+                missing = info['rows'] - written
+                out.write(np.full((missing, length), np.nan, dtype='<f8').tobytes())
+                xs.append(np.full(missing, -1, np.int32))
+                ys.append(np.full(missing, -1, np.int32))
+        arrays = {
+            'x': np.concatenate(xs) if xs else np.zeros(0, np.int32),
+            'y': np.concatenate(ys) if ys else np.zeros(0, np.int32),
+            'wavelength': axis,
+            'calibrated': np.array(calibrated),
+            'grid_shape': np.array([info['ny'], info['nx']]),
+            'session_id': np.array(session_id_of(filename)),
+        }
+        for name, arr in arrays.items():
+            with zf.open(f"{name}.npy", 'w') as out:
+                np.lib.format.write_array(out, np.asarray(arr), allow_pickle=False)
+
+
+def _cube_storage(path, shape_yxb, interleave):
+    """Memmap kostki w układzie pliku i widok [y, x, lambda] do wpisywania punktów."""
+    ny, nx, bands = shape_yxb
+    if interleave == 'bsq':
+        mm = np.memmap(path, dtype='<f4', mode='w+', shape=(bands, ny, nx))
+        view = mm.transpose(1, 2, 0)
+    elif interleave == 'bil':
+        mm = np.memmap(path, dtype='<f4', mode='w+', shape=(ny, bands, nx))
+        view = mm.transpose(0, 2, 1)
+    else:
+        mm = np.memmap(path, dtype='<f4', mode='w+', shape=(ny, nx, bands))
+        view = mm
+    # Wypełnienie NaN warstwa po warstwie (pamięć: jedna warstwa)
+    for i in range(mm.shape[0]):
+        mm[i] = np.nan
+    return mm, view
+
+
+def _write_cube(filename, data_path, info, interleave, chunk_rows, tracker):
+    ny, nx, length = info['ny'], info['nx'], info['length']
+    mm, view = _cube_storage(data_path, (ny, nx, length), interleave)
+    try:
+        for block in read_chunks(filename, chunk_rows):
+            x = block[:, 0].astype(np.intp)
+            y = block[:, 1].astype(np.intp)
+            keep = (x >= 0) & (y >= 0) & (x < nx) & (y < ny)
+            view[y[keep], x[keep], :] = _fit(block[keep, 2:], length)
+            tracker.step(len(block))
+        mm.flush()
+    finally:
+        del view, mm
+
+
+def cube_paths(fmt, path):
+    """(plik danych, plik nagłówka) kostki: ENVI .raw + .hdr, kostka float32 + .json."""
+    stem, ext = os.path.splitext(path)
+    if fmt == 'envi':
+        return stem + ".raw", stem + ".hdr"
+    return (path if ext and ext != ".json" else stem + EXPORT_FORMATS['cube']), stem + ".json"
+
+
+def _export_cube(filename, data_path, header_path, info, opts, interleave, chunk_rows, tracker):
+    axis, calibrated = session_axis(filename, info['length'], opts)
+    _write_cube(filename, data_path, info, interleave, chunk_rows, tracker)
+    shape = {'bsq': ['band', 'y', 'x'], 'bil': ['y', 'band', 'x'], 'bip': ['y', 'x', 'band']}[interleave]
+    sizes = {'band': info['length'], 'y': info['ny'], 'x': info['nx']}
+    header = {
+        'format': 'raw float32 cube',
+        'data_file': os.path.basename(data_path),
+        'dtype': 'float32',
+        'byte_order': 'little',
+        'interleave': interleave,
+        'dims': shape,
+        'shape': [sizes[d] for d in shape],
+        'missing_value': 'NaN',
+        'session_id': session_id_of(filename),
+        'source': os.path.basename(filename),
+        'points': info['rows'],
+        'wavelength_units': 'nm' if calibrated else 'px',
+        'wavelength': [float(a) for a in axis],
+    }
+    with open(header_path, 'w', encoding='utf-8') as f:
+        json.dump(header, f, indent=2)
+
+
+def _export_envi(filename, data_path, header_path, info, opts, interleave, chunk_rows, tracker):
+    axis, calibrated = session_axis(filename, info['length'], opts)
+    _write_cube(filename, data_path, info, interleave, chunk_rows, tracker)
+    lines = [
+        "ENVI",
+        f"description = {{Spectrometer export {session_id_of(filename)}}}",
+        f"samples = {info['nx']}",
+        f"lines = {info['ny']}",
+        f"bands = {info['length']}",
+        "header offset = 0",
+        "file type = ENVI Standard",
+        "data type = 4",
+        f"interleave = {interleave}",
+        "byte order = 0",
+        "data ignore value = NaN",
+        f"wavelength units = {'Nanometers' if calibrated else 'Unknown'}",
+        "wavelength = {" + ", ".join(f"{a:.6g}" for a in axis) + "}",
+    ]
+    with open(header_path, 'w', encoding='ascii') as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def export_sessions(files, target, fmt=None, opts=None, chunk_rows=1000, progress=None, cancel=None):
+    """Eksport sesji do `target`; zwraca listę zapisanych plików.
+
+    fmt - 'csv' / 'npz' / 'cube' / 'envi' (domyślnie z rozszerzenia),
+    progress(zrobione, wszystkie) - postęp w wierszach (wołany z wątku eksportu),
+    cancel - threading.Event; ustawiony przerywa eksport (ExportCancelled).
+    """
+    opts = opts or {}
+    fmt = fmt or format_for(target)
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"unknown export format: {fmt}")
+    interleave = opts.get('export_interleave', 'bsq')
+    if interleave not in INTERLEAVES:
+        interleave = 'bsq'
+    chunk_rows = max(1, int(opts.get('export_chunk_rows', chunk_rows)))
+    infos = []
+    for filename in files:
+        if cancel is not None and cancel.is_set():
+            raise ExportCancelled()
+        infos.append(scan_session(filename))
+    tracker = _Progress(sum(i['rows'] for i in infos), progress, cancel)
+    written = []
+    try:
+        if fmt == 'csv':
+            written.append(target)
+            _export_csv(files, target, chunk_rows, tracker)
+            return written
+        # Pliki trafiają na listę przed zapisem – przerwany eksport usuwa także bieżący
+        for filename, info, path in zip(files, infos, output_paths(files, target, fmt)):
+            if info['rows'] == 0:
+                print(f"Export: {filename} has no points - skipped")
+                continue
+            if fmt == 'npz':
+                written.append(path)
+                _export_npz(filename, path, info, opts, chunk_rows, tracker)
+            else:
+                data_path, header_path = cube_paths(fmt, path)
+                written += [data_path, header_path]
+                write = _export_cube if fmt == 'cube' else _export_envi
+                write(filename, data_path, header_path, info, opts, interleave, chunk_rows, tracker)
+        return written
+    except BaseException:
+        _remove(set(written))
+        raise
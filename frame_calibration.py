@@ -0,0 +1,259 @@
+import os
+import re
+import glob
+import threading
+
+import numpy as np
+
+from smile_correction import SmileModel
+from optimal_extraction import StripeProfile
+
+"""Korekcja klatek PixeLink: ciemne klatki, flat field i maska złych pikseli.
+
+Klatki wzorcowe (mediana z serii klatek, float32) leżą w folderze
+`calibration/` jako pliki .npy:
+
+- dark_<ekspozycja>ms_g<gain>.npy – ciemna klatka (zasłonięta szczelina) dla
+  każdego czasu ekspozycji i wzmocnienia,
+- flat_g<gain>.npy – równomierne oświetlenie, po odjęciu ciemnej klatki,
+  znormalizowane do średniej 1,
+- bad_pixels.npy – maska (True = zły piksel): gorące piksele w ciemnej
+  klatce i martwe / nadczułe w flat field.
+
+Widmo to średnia kolumn klatki, więc całą korekcję da się policzyć z góry:
+wagi W = dobre / flat / liczba dobrych pikseli w kolumnie oraz wektor
+offset = Σ dark·W. Dla każdej klatki zostaje jedna operacja
+profil = Σ_wiersze klatka·W − offset (np.einsum na surowej klatce uint8,
+bez kopii float). Klatki wzorcowe i gotowe korekcje są trzymane w pamięci
+(klucz: ekspozycja, wzmocnienie, rozmiar klatki).
+
+Przy korekcji krzywizny szczeliny (smile_correction.py) klatka jest najpierw
+prostowana, więc dark / flat / maska są prostowane tym samym modelem raz,
+przy budowie korekcji (`straightened=True`).
+"""
+
+CALIBRATION_FOLDER = "calibration"
+BAD_PIXELS_FILE = "bad_pixels.npy"
+_DARK_RE = re.compile(r"dark_([0-9.]+)ms_g([0-9.]+)\.npy$")
+
+
+def dark_filename(exposure_ms, gain):
+    return f"dark_{float(exposure_ms):.1f}ms_g{float(gain):.2f}.npy"
+
+
+def flat_filename(gain):
+    return f"flat_g{float(gain):.2f}.npy"
+
+
+def master_frame(frames):
+    """Mediana serii klatek (odrzuca promienie kosmiczne i pojedyncze zakłócenia)."""
+    stack = np.stack([np.asarray(f, dtype=np.float32) for f in frames])
+    return np.median(stack, axis=0).astype(np.float32)
+
+
+def find_bad_pixels(dark=None, flat=None, nsigma=6.0, flat_limits=(0.5, 1.5)):
+    """Maska złych pikseli: gorące w ciemnej klatce (> mediana + nsigma·MAD)
+    oraz martwe / nadczułe we flat field (poza flat_limits)."""
+    shape = dark.shape if dark is not None else flat.shape
+    bad = np.zeros(shape, dtype=bool)
+    if dark is not None:
+        med = float(np.median(dark))
+        mad = float(np.median(np.abs(dark - med))) * 1.4826
+        bad |= dark > med + nsigma * max(mad, 1.0)
+    if flat is not None:
+        bad |= ~np.isfinite(flat) | (flat < flat_limits[0]) | (flat > flat_limits[1])
+    return bad
+
+
+class FrameCorrection:
+    """Gotowa korekcja dla jednej (ekspozycja, wzmocnienie, rozmiar klatki)."""
+
+    def __init__(self, shape, dark=None, flat=None, bad=None):
+        self.shape = tuple(shape)
+        good = np.ones(self.shape, dtype=bool) if bad is None else ~bad
+        if flat is not None:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                gain_map = np.where(good & (flat > 1e-3), 1.0 / flat, 0.0)
+        else:
+            gain_map = good.astype(np.float64)
+        counts = np.count_nonzero(gain_map, axis=0)
+        # Kolumny bez dobrych pikseli są interpolowane z sąsiadów
+        self.dead_columns = np.where(counts == 0)[0]
+        col_norm = np.where(counts > 0, 1.0 / np.maximum(counts, 1), 0.0)
+        self.weight = (gain_map * col_norm).astype(np.float32)
+        # Mapy per piksel dla ekstrakcji optymalnej (optimal_extraction.py)
+        self.gain_map = gain_map.astype(np.float32)
+        self.dark = None if dark is None else dark.astype(np.float32)
+        if dark is not None:
+            self.offset = np.einsum('ij,ij->j', dark.astype(np.float32), self.weight)
+        else:
+            self.offset = np.zeros(self.shape[1], dtype=np.float32)
+
+    def apply(self, gray):
+        """Profil kolumn (klatka − dark) / flat po dobrych pikselach – jedno przejście."""
+        profile = np.einsum('ij,ij->j', gray, self.weight) - self.offset
+        if len(self.dead_columns) and len(self.dead_columns) < len(profile):
+            live = np.setdiff1d(np.arange(len(profile)), self.dead_columns)
+            profile[self.dead_columns] = np.interp(self.dead_columns, live, profile[live])
+        return profile
+
+
+class FrameCalibration:
+    """Klatki wzorcowe na dysku + pamięć podręczna gotowych korekcji."""
+
+    def __init__(self, folder=CALIBRATION_FOLDER):
+        self.folder = folder
+        self._masters = {}
+        self._corrections = {}
+        self._lock = threading.Lock()
+        self.smile = SmileModel.load(folder)
+        self.stripe = StripeProfile.load(folder)
+
+    def _load(self, name):
+        if name not in self._masters:
+            path = os.path.join(self.folder, name)
+            try:
+                self._masters[name] = np.load(path) if os.path.exists(path) else None
+            except Exception as e:
+                print(f"Calibration file error {path}: {e}")
+                self._masters[name] = None
+        return self._masters[name]
+
+    def _save(self, name, array):
+        os.makedirs(self.folder, exist_ok=True)
+        np.save(os.path.join(self.folder, name), array)
+        with self._lock:
+            self._masters[name] = array
+            self._corrections.clear()
+
+    def dark_exposures(self, gain):
+        """Czasy ekspozycji (ms), dla których jest ciemna klatka przy danym wzmocnieniu."""
+        found = []
+        for path in glob.glob(os.path.join(self.folder, "dark_*ms_g*.npy")):
+            m = _DARK_RE.search(os.path.basename(path))
+            if m and abs(float(m.group(2)) - float(gain)) < 1e-3:
+                found.append(float(m.group(1)))
+        return sorted(found)
+
+    def dark_for(self, exposure_ms, gain):
+        """Ciemna klatka dla ekspozycji: dokładna, interpolowana liniowo
+        między sąsiednimi czasami (prąd ciemny ~ czas) albo najbliższa."""
+        exact = self._load(dark_filename(exposure_ms, gain))
+        if exact is not None:
+            return exact
+        times = self.dark_exposures(gain)
+        if not times:
+            return None
+        below = [t for t in times if t < exposure_ms]
+        above = [t for t in times if t > exposure_ms]
+        if below and above:
+            t0, t1 = below[-1], above[0]
+            d0 = self._load(dark_filename(t0, gain))
+            d1 = self._load(dark_filename(t1, gain))
+            w = (exposure_ms - t0) / (t1 - t0)
+            return ((1.0 - w) * d0 + w * d1).astype(np.float32)
+        nearest = min(times, key=lambda t: abs(t - exposure_ms))
+        return self._load(dark_filename(nearest, gain))
+
+    def correction(self, exposure_ms, gain, shape, straightened=False):
+        """FrameCorrection dla bieżących ustawień kamery albo None (brak klatek wzorcowych).
+
+        straightened - klatki są prostowane modelem self.smile przed korekcją.
+        """
+        if exposure_ms is None:
+            return None
+        gain = 1.0 if gain is None else float(gain)
+        smile = self.smile if straightened and self.smile is not None and self.smile.shape == tuple(shape) else None
+        key = (round(float(exposure_ms), 1), round(gain, 2), tuple(shape), smile is not None)
+        with self._lock:
+            if key in self._corrections:
+                return self._corrections[key]
+        dark = self.dark_for(key[0], gain)
+        flat = self._load(flat_filename(gain))
+        bad = self._load(BAD_PIXELS_FILE)
+        parts = [a for a in (dark, flat, bad) if a is not None]
+        if not parts or any(a.shape != key[2] for a in parts):
+            correction = None
+        else:
+            if smile is not None:
+                dark = None if dark is None else smile.apply(dark)
+                flat = None if flat is None else smile.apply(flat)
+                bad = None if bad is None else smile.apply(bad.astype(np.float32)) > 0.01
+            correction = FrameCorrection(key[2], dark, flat, bad)
+        with self._lock:
+            self._corrections[key] = correction
+        return correction
+
+    def save_dark(self, frames, exposure_ms, gain):
+        master = master_frame(frames)
+        self._save(dark_filename(exposure_ms, gain), master)
+        print(f"Master dark saved: {exposure_ms:.1f} ms, gain {gain:.2f} "
+              f"(mean {float(master.mean()):.2f}, {len(frames)} frames)")
+        return master
+
+    def save_flat(self, frames, exposure_ms, gain):
+        """Flat field: mediana − ciemna klatka, znormalizowany do średniej 1."""
+        master = master_frame(frames)
+        dark = self.dark_for(exposure_ms, gain)
+        if dark is not None and dark.shape == master.shape:
+            master = master - dark
+        mean = float(np.mean(master[master > 0])) if np.any(master > 0) else 0.0
+        if mean <= 0:
+            print("Flat field too dark - not saved")
+            return None
+        flat = (master / mean).astype(np.float32)
+        self._save(flat_filename(gain), flat)
+        print(f"Master flat saved: gain {gain:.2f} ({len(frames)} frames)")
+        return flat
+
+    def save_smile(self, model):
+        model.save(self.folder)
+        with self._lock:
+            self.smile = model
+            self._corrections.clear()
+
+    def save_stripe(self, stripe):
+        stripe.save(self.folder)
+        self.stripe = stripe
+
+    def update_bad_pixels(self, gain):
+        """Maska złych pikseli z najdłuższej ciemnej klatki i flat field."""
+        times = self.dark_exposures(gain)
+        dark = self._load(dark_filename(times[-1], gain)) if times else None
+        flat = self._load(flat_filename(gain))
+        if dark is None and flat is None:
+            return None
+        if dark is not None and flat is not None and dark.shape != flat.shape:
+            flat = None
+        bad = find_bad_pixels(dark, flat)
+        self._save(BAD_PIXELS_FILE, bad)
+        print(f"Bad pixel mask: {int(bad.sum())} pixels ({100.0 * bad.mean():.3f}%)")
+        return bad
+
+
+def collect_frames(spectrometer, count=16, timeout_s=30.0):
+    """Zbierz `count` kolejnych klatek ze strumienia SpectrometerManager.
+
+    Pierwsza klatka jest odrzucana – mogła być naświetlana przed zmianą ustawień.
+    """
+    frames = []
+    done = threading.Event()
+
+    def on_frame(frame, descriptor):
+        if len(frames) <= count:
+            frames.append(np.array(frame, copy=True))
+            if len(frames) > count:
+                done.set()
+
+    saved = spectrometer.poll_interval
+    spectrometer.poll_interval = 0.0
+    spectrometer.add_frame_listener(on_frame)
+    try:
+        done.wait(timeout_s)
+    finally:
+        spectrometer.remove_frame_listener(on_frame)
+        spectrometer.poll_interval = saved
+    frames = frames[1:]
+    if len(frames) < count:
+        print(f"Calibration: only {len(frames)} of {count} frames received")
+    return frames
@@ -6,6 +6,8 @@ from typing import Tuple
 
 import numpy as np
 
+from wavelength_calibration import spectral_axis
+
 """Generator plików pomiarowych zgodnych z aktualną sekwencją z index.py.
 
 Uruchom z katalogu projektu:
@@ -134,35 +136,13 @@ def _compute_grid_from_options(opts: dict) -> Tuple[int, int, int, int, str]:
 
 
 def _compute_axis_with_roi(opts: dict) -> np.ndarray:
-    """Odtwórz oś lambda/piksele z uwzględnieniem aktualnego ROI (jak w index.py).
+    """Oś lambda/piksele z uwzględnieniem aktualnego ROI (wspólna SpectralAxis jak w index.py).
 
     Zwraca wektor długości N (N <= 2048), używany jako kolumna "lambda" w
     plikach punktowych oraz jako baza do długości widma.
     """
     try:
-        calibrated = bool(opts.get("lambda_calibration_enabled", False)) and (
-            "lambda_min" in opts and "lambda_max" in opts
-        )
-
-        if calibrated:
-            base_min = float(opts.get("lambda_min", 400.0))
-            base_max = float(opts.get("lambda_max", 700.0))
-            base_axis = np.linspace(base_min, base_max, 2048)
-        else:
-            base_min, base_max = 0.0, 2048.0
-            base_axis = np.linspace(base_min, base_max, 2048)
-
-        roi_min = float(opts.get("spectrum_range_min", base_min))
-        roi_max = float(opts.get("spectrum_range_max", base_max))
-        if roi_min >= roi_max:
-            roi_min, roi_max = base_min, base_max
-
-        mask = (base_axis >= roi_min) & (base_axis <= roi_max)
-        if not np.any(mask):
-            mask = np.ones_like(base_axis, dtype=bool)
-
-        axis_vals = base_axis[mask]
-        return axis_vals.astype(float)
+        return np.array(spectral_axis(opts).axis, dtype=float)
     except Exception:
         # awaryjnie prosta oś pikselowa
         return np.linspace(0.0, 2048.0, 2048)
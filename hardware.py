@@ -0,0 +1,736 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import serial
+import serial.tools.list_ports
+
+try:
+    from pixelinkWrapper import PxLApi
+except ImportError:
+    # Bez SDK aplikacja nadal działa z symulowanym backendem kamery
+    # ("camera_backend": "simulated" w options.json).
+    PxLApi = None
+
+"""Sprzęt: kamera USB (podgląd), kamera PixeLink (spektrometr) i silniki SHOT.
+
+Bez zależności od Tk – używany przez GUI (index.py) i przez silnik sekwencji
+uruchamiany bez ekranu (sequence_engine.py).
+"""
+
+
+def create_camera_api(opts):
+    """Wybierz backend kamery wg options.json ('pixelink' lub 'simulated')."""
+    backend = str((opts or {}).get('camera_backend', 'pixelink')).strip().lower()
+    if backend == 'simulated':
+        from camera_simulator import SimulatedPxLApi
+        print("Using simulated PixeLink camera backend")
+        return SimulatedPxLApi.from_options(opts)
+    return PxLApi
+
+
+MOTION_METHODS = ('phase', 'lk', 'farneback', 'off')
+
+
+class MotionEstimator:
+    """Coarse image motion between consecutive USB camera frames.
+
+    'phase' - phase correlation on a frame downscaled by `scale` (default),
+    'lk' - sparse Lucas-Kanade on up to `max_corners` tracked corners,
+    'farneback' - dense Farneback flow on the full frame (old behaviour),
+    'off' - no motion estimation.
+    `cost_ms` is the running average time per frame.
+    """
+
+    def __init__(self, method='phase', scale=0.25, max_corners=30):
+        if method not in MOTION_METHODS:
+            print(f"Unknown motion estimator '{method}', using 'phase'")
+            method = 'phase'
+        self.method = method
+        self.scale = float(scale)
+        self.max_corners = int(max_corners)
+        self.cost_ms = 0.0
+        self._prev = None
+        self._window = None
+        self._corners = None
+
+    def _small(self, gray):
+        if self.scale >= 1.0:
+            return gray
+        return cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+
+    def _phase(self, gray):
+        cur = self._small(gray).astype(np.float32)
+        prev, self._prev = self._prev, cur
+        if prev is None or prev.shape != cur.shape:
+            self._window = cv2.createHanningWindow((cur.shape[1], cur.shape[0]), cv2.CV_32F)
+            return None
+        (dx, dy), _ = cv2.phaseCorrelate(prev, cur, self._window)
+        return dx / self.scale, dy / self.scale
+
+    def _lk(self, gray):
+        cur = self._small(gray)
+        prev, self._prev = self._prev, cur
+        if prev is None or prev.shape != cur.shape:
+            self._corners = None
+            return None
+        if self._corners is None or len(self._corners) < max(4, self.max_corners // 3):
+            self._corners = cv2.goodFeaturesToTrack(prev, self.max_corners, 0.01, 8)
+            if self._corners is None:
+                return None
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(prev, cur, self._corners, None, winSize=(15, 15), maxLevel=2)
+        good = status.ravel() == 1
+        if not np.any(good):
+            self._corners = None
+            return None
+        flow = np.median((moved[good] - self._corners[good]).reshape(-1, 2), axis=0)
+        self._corners = moved[good].reshape(-1, 1, 2)
+        return flow[0] / self.scale, flow[1] / self.scale
+
+    def _farneback(self, gray):
+        prev, self._prev = self._prev, gray
+        if prev is None or prev.shape != gray.shape:
+            return None
+        flow = cv2.calcOpticalFlowFarneback(prev, gray, None, 0.5, 3, 15, 3, 5, 1.2, 0)
+        mean_flow = np.mean(flow, axis=(0, 1))
+        return mean_flow[0], mean_flow[1]
+
+    def update(self, gray):
+        """Shift (dx, dy) in full-frame pixels since the previous frame, or None."""
+        if self.method == 'off':
+            return None
+        t0 = time.perf_counter()
+        if self.method == 'phase':
+            shift = self._phase(gray)
+        elif self.method == 'lk':
+            shift = self._lk(gray)
+        else:
+            shift = self._farneback(gray)
+        dt_ms = (time.perf_counter() - t0) * 1000.0
+        self.cost_ms = dt_ms if self.cost_ms == 0.0 else 0.9 * self.cost_ms + 0.1 * dt_ms
+        return shift
+
+    def direction(self, gray):
+        """Direction label ('Left', 'Right', 'Up', 'Down' or 'No movement')."""
+        shift = self.update(gray)
+        if shift is None:
+            return "No movement"
+        dx, dy = shift
+        if np.hypot(dx, dy) <= 0.1:
+            return "No movement"
+        if abs(dx) > abs(dy):
+            return 'Right' if dx > 0 else 'Left'
+        return 'Down' if dy > 0 else 'Up'
+
+
+class CameraManager:
+    """Manages camera operations in separate thread"""
+    
+    def __init__(self, camera_index=1, motion_method='phase'):
+        self.camera_index = camera_index
+        self.detector = None
+        self.running = False
+        self.thread = None
+        self.motion = MotionEstimator(motion_method)
+        self.frame = None
+        # Klatka bez krzyża celownika (pomiar dryfu, drift_tracker.py)
+        self.raw_frame = None
+        self.direction = "No movement"
+        
+    def start(self):
+        """Start camera thread"""
+        if not self.running:
+            self.running = True
+            # Remove CAP_DSHOW for Linux compatibility
+            self.detector = cv2.VideoCapture(self.camera_index)
+            
+            # Check if camera opened successfully
+            if not self.detector.isOpened():
+                print(f"Failed to open camera {self.camera_index}")
+                self.detector = None
+                self.running = False
+                return False
+                
+            print(f"USB camera motion estimator: {self.motion.method}")
+            self.thread = threading.Thread(target=self._camera_loop, daemon=True)
+            self.thread.start()
+            return True
+        return False
+    
+    def stop(self):
+        """Stop camera thread"""
+        self.running = False
+        if self.detector:
+            self.detector.release()
+        if self.thread:
+            self.thread.join(timeout=1.0)
+    
+    def _camera_loop(self):
+        """Main camera loop running in thread"""
+        while self.running:
+            try:
+                # Check if detector is valid before reading
+                if not self.detector or not self.detector.isOpened():
+                    time.sleep(0.1)
+                    continue
+                    
+                ret, frame = self.detector.read()
+                if not ret:
+                    continue
+                    
+                frame = cv2.flip(frame, 1)
+                
+                # Motion detection (MotionEstimator, method from options 'motion_estimator')
+                if self.motion.method != 'off':
+                    direction = self.motion.direction(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+                else:
+                    direction = "No movement"
+                self.raw_frame = frame.copy()
+                
+                # Add crosshair
+                height, width, _ = frame.shape
+                center_x, center_y = width // 2, height // 2
+                cv2.line(frame, (center_x - 20, center_y), (center_x + 20, center_y), (150, 150, 150), 1)
+                cv2.line(frame, (center_x, center_y - 20), (center_x, center_y + 20), (150, 150, 150), 1)
+                if self.motion.method != 'off':
+                    cv2.putText(frame, f"{self.motion.method} {self.motion.cost_ms:.1f} ms", (8, height - 8),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 150, 150), 1)
+                
+                # Store frame and direction directly
+                self.direction = direction
+                self.frame = frame
+                
+                time.sleep(0.033)  # ~30 FPS
+                
+            except Exception as e:
+                print(f"Camera error: {e}")
+                time.sleep(0.1)
+    
+    def get_current_frame(self):
+        """Get the current frame from camera"""
+        return self.frame
+    
+    def get_raw_frame(self):
+        """Get the current frame without the crosshair overlay"""
+        return self.raw_frame
+    
+    def get_current_direction(self):
+        """Get the current movement direction"""
+        return self.direction
+
+    def get_motion_cost_ms(self):
+        """Average motion estimation time per frame (ms)"""
+        return self.motion.cost_ms
+
+
+class SpectrometerManager:
+    """Simplified Pixelink camera manager based on samples/getNextNumPyFrame.py
+
+    `api` is the camera backend: the PxLApi module (default) or any object
+    exposing the same subset, e.g. camera_simulator.SimulatedPxLApi.
+    """
+    
+    def __init__(self, api=None):
+        self.api = api if api is not None else PxLApi
+        self.hCamera = None
+        self.running = False
+        self.thread = None
+        
+        # Create buffer with reasonable size for PixeLink cameras
+        MAX_WIDTH = 2048   # in pixels - more reasonable for most PixeLink models  
+        MAX_HEIGHT = 2048  # in pixels - sufficient for most applications
+        self.frame_buffer = np.zeros([MAX_HEIGHT, MAX_WIDTH], dtype=np.uint8)
+        
+        # Pause between frames in the capture loop (seconds); continuous
+        # scanning sets it to 0 so every frame reaches the listeners.
+        self.poll_interval = 0.5
+        # Callbacks called from the capture thread as fn(frame_buffer, frameDescriptor)
+        self._frame_listeners = []
+        # Last exposure (ms) / gain set through this manager (frame calibration keys)
+        self.exposure_ms = None
+        self.gain = None
+        
+        # Check USB device availability
+        self._check_usb_device()
+        
+    def _check_usb_device(self):
+        """Check if PixeLink USB device is detected and accessible"""
+        try:
+            import subprocess
+            result = subprocess.run(['lsusb'], capture_output=True, text=True)
+            # Silent USB device check - detailed status shown during initialization
+                
+        except Exception as e:
+            print(f"USB device check failed: {e}")
+        
+    def initialize(self):
+        """Initialize camera exactly like sample"""
+        if self.api is None:
+            print("PixeLink SDK not available - set camera_backend to 'simulated' to run without camera")
+            return False
+        try:
+            # Initialize any camera - exactly like samples
+            ret = self.api.initialize(0)
+            if not self.api.apiSuccess(ret[0]):
+                error_code = ret[0]
+                print(f"PixeLink initialize failed with error code: {error_code}")
+                return False
+
+            self.hCamera = ret[1]
+            return True
+                
+        except Exception as e:
+            # print(f"Pixelink initialization exception: {e}")
+            print(f"   Exception type: {type(e).__name__}")
+            
+            # Handle specific permission errors
+            if "Permission denied" in str(e) or "Access denied" in str(e):
+                print("Permission Issue Detected:")
+                print("   • Add user to plugdev group: sudo usermod -a -G plugdev $USER")
+                print("   • Or temporarily use: sudo python script.py")
+                print("   • Then logout/login to apply group changes")
+            
+            # Try factory settings as fallback
+            try:
+                if hasattr(self, 'hCamera') and self.hCamera:
+                    self.api.loadSettings(self.hCamera, self.api.Settings.SETTINGS_FACTORY)
+                    time.sleep(0.1)
+                    return self.initialize()  # Recursive retry
+            except:
+                pass
+                
+            return False
+    
+    def start(self):
+        """Start streaming exactly like sample"""
+        if self.hCamera and not self.running:
+            self.running = True
+            self.thread = threading.Thread(target=self._capture_loop, daemon=True)
+            self.thread.start()
+    
+    def stop(self):
+        """Stop streaming exactly like sample"""
+        self.running = False
+        
+        if self.thread:
+            self.thread.join(timeout=2.0)
+            
+        if self.hCamera:
+            try:
+                self.api.setStreamState(self.hCamera, self.api.StreamState.STOP)
+                self.api.uninitialize(self.hCamera)
+                print("PixeLink camera stopped and uninitialized")
+            except Exception as e:
+                print(f"Error stopping PixeLink: {e}")
+                
+        self.hCamera = None
+
+    def get_next_frame(self, maxTries=5):
+        """Robust wrapper around getNextFrame exactly like sample"""
+        ret = (self.api.ReturnCode.ApiUnknownError,)
+        
+        for _ in range(maxTries):
+            ret = self.api.getNextNumPyFrame(self.hCamera, self.frame_buffer)
+            if self.api.apiSuccess(ret[0]):
+                return ret
+            else:
+                # If the streaming is turned off, or worse yet -- is gone?
+                if self.api.ReturnCode.ApiStreamStopped == ret[0] or \
+                   self.api.ReturnCode.ApiNoCameraAvailableError == ret[0]:
+                    return ret
+                else:
+                    print(f"    Hmmm... getNextFrame returned {ret[0]}")
+        
+        # Ran out of tries
+        return ret
+
+    def _capture_loop(self):
+        """Main capture loop - exactly like sample getNextNumPyFrame.py"""
+        if not self.hCamera or not self.frame_buffer.size:
+            return
+            
+        # Start the stream exactly like sample
+        ret = self.api.setStreamState(self.hCamera, self.api.StreamState.START)
+        if not self.api.apiSuccess(ret[0]):
+            print(f"setStreamState with StreamState.START failed, rc = {ret[0]}")
+            return
+
+        while self.running:
+            try:
+                # Use robust wrapper exactly like sample
+                ret = self.get_next_frame(1)
+                
+                if self.api.apiSuccess(ret[0]):
+                    # ret[1] is frameDescriptor, frame_buffer already contains image data
+                    frameDescriptor = ret[1]
+                    # Listeners use frameDescriptor.uFrameNumber / fFrameTime (continuous scan)
+                    for listener in list(self._frame_listeners):
+                        try:
+                            listener(self.frame_buffer, frameDescriptor)
+                        except Exception as e:
+                            print(f"Frame listener error: {e}")
+
+                if self.poll_interval > 0:
+                    time.sleep(self.poll_interval)  # 500ms like sample by default
+                
+            except Exception as e:
+                print(f"PixeLink capture error: {e}")
+                time.sleep(0.1)
+        
+        # Stop streaming when loop ends
+        try:
+            ret = self.api.setStreamState(self.hCamera, self.api.StreamState.STOP)
+        except Exception as e:
+            print(f"Stop streaming error: {e}")
+
+    def add_frame_listener(self, listener):
+        """Register fn(frame_buffer, frameDescriptor) called for every captured frame"""
+        if listener not in self._frame_listeners:
+            self._frame_listeners.append(listener)
+
+    def remove_frame_listener(self, listener):
+        """Unregister a frame listener"""
+        try:
+            self._frame_listeners.remove(listener)
+        except ValueError:
+            pass
+
+    def set_exposure(self, exposure_ms):
+        """Set camera exposure time in milliseconds"""
+        if not self.hCamera:
+            print("Camera not initialized - cannot set exposure")
+            return False
+        
+        try:
+            # Convert milliseconds to seconds (PixeLink uses seconds)
+            exposure_seconds = exposure_ms / 1000.0
+            params = [exposure_seconds]
+            
+            ret = self.api.setFeature(self.hCamera, self.api.FeatureId.EXPOSURE, self.api.FeatureFlags.MANUAL, params)
+            if self.api.apiSuccess(ret[0]):
+                print(f"Exposure set to {exposure_ms} ms")
+                self.exposure_ms = float(exposure_ms)
+                return True
+            else:
+                print(f"Failed to set exposure: {ret[0]}")
+                return False
+        except Exception as e:
+            print(f"Exposure setting error: {e}")
+            return False
+    
+    def set_gain(self, gain_value):
+        """Set camera gain value"""
+        if not self.hCamera:
+            print("Camera not initialized - cannot set gain")
+            return False
+        
+        try:
+            params = [float(gain_value)]
+            
+            ret = self.api.setFeature(self.hCamera, self.api.FeatureId.GAIN, self.api.FeatureFlags.MANUAL, params)
+            if self.api.apiSuccess(ret[0]):
+                print(f"Gain set to {gain_value}")
+                self.gain = float(gain_value)
+                return True
+            else:
+                print(f"Failed to set gain: {ret[0]}")
+                return False
+        except Exception as e:
+            print(f"Gain setting error: {e}")
+            return False
+
+    def get_exposure(self):
+        """Get current camera exposure time"""
+        if not self.hCamera:
+            return None
+        
+        try:
+            ret = self.api.getFeature(self.hCamera, self.api.FeatureId.EXPOSURE)
+            if self.api.apiSuccess(ret[0]):
+                # Convert seconds to milliseconds
+                exposure_ms = ret[2][0] * 1000.0
+                return exposure_ms
+            else:
+                return None
+        except Exception as e:
+            print(f"Get exposure error: {e}")
+            return None
+
+    def get_gain(self):
+        """Get current camera gain"""
+        if not self.hCamera:
+            return None
+        
+        try:
+            ret = self.api.getFeature(self.hCamera, self.api.FeatureId.GAIN)
+            if self.api.apiSuccess(ret[0]):
+                return ret[2][0]
+            else:
+                return None
+        except Exception as e:
+            print(f"Get gain error: {e}")
+            return None
+
+
+class MotorController:
+    """Controls stepper motors"""
+    
+    def __init__(self, port_x='COM5', port_y='COM9', options=None, port_z=None):
+        self.ports = []
+        self.connected = False
+        # Optional focus axis on its own controller (same SHOT protocol)
+        self.port_z = None
+        self.z_connected = False
+        self.position_z_um = 0
+        # Options dict (step_x / step_y used for moves without an explicit step)
+        self.options = options if options is not None else {}
+        # One worker: moves are written in submission order, and a no-op
+        # submitted afterwards (home) completes only after all of them
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        # Motor resolution: 1 pulse = 2 micrometers
+        self.MICROMETERS_PER_PULSE = 2
+        # Position (μm) counted from the last homing ('o'); x: 'r' = +, y: 'u' = +
+        self.position_um = [0, 0]
+        self.homed = False
+        
+        try:
+            if self._check_ports(port_x, port_y):
+                self.ports = [serial.Serial(port_x), serial.Serial(port_y)]
+                self.connected = True
+                # Store port names for status display
+                self.port_x = port_x
+                self.port_y = port_y
+                print("Motors connected")
+                # Update status in main app if available
+                if hasattr(self, '_app_ref'):
+                    self._app_ref.motors_ready = True
+        except Exception as e:
+            print(f"Motor connection error: {e}")
+
+        if port_z:
+            try:
+                if port_z in [p.device for p in serial.tools.list_ports.comports()]:
+                    self.port_z = serial.Serial(port_z)
+                    self.z_connected = True
+                    print("Focus (Z) motor connected")
+            except Exception as e:
+                print(f"Focus motor connection error: {e}")
+    
+    def micrometers_to_pulses(self, micrometers):
+        """Convert micrometers to motor pulses (1 pulse = 2 μm)"""
+        return max(1, int(micrometers / self.MICROMETERS_PER_PULSE))
+    
+    def _check_ports(self, port_x, port_y):
+        """Check if ports are available"""
+        available_ports = [p.device for p in serial.tools.list_ports.comports()]
+        return port_x in available_ports and port_y in available_ports
+    
+    def move(self, direction, step=None):
+        """Move motors asynchronously - step parameter is in micrometers"""
+        if not self.connected:
+            return
+            
+        if step is None:
+            # Convert micrometers to pulses for default steps
+            step_x_pulses = self.micrometers_to_pulses(self.options.get('step_x', 20))
+            step_y_pulses = self.micrometers_to_pulses(self.options.get('step_y', 20))
+        else:
+            # Convert provided step (in micrometers) to pulses
+            step_x_pulses = step_y_pulses = self.micrometers_to_pulses(step)
+            
+        # Track commanded position (in whole pulses, as sent to the controller)
+        if direction == 'r':
+            self.position_um[0] += step_x_pulses * self.MICROMETERS_PER_PULSE
+        elif direction == 'l':
+            self.position_um[0] -= step_x_pulses * self.MICROMETERS_PER_PULSE
+        elif direction == 'u':
+            self.position_um[1] += step_y_pulses * self.MICROMETERS_PER_PULSE
+        elif direction == 'd':
+            self.position_um[1] -= step_y_pulses * self.MICROMETERS_PER_PULSE
+        elif direction == 'o':
+            self.position_um = [0, 0]
+            self.homed = True
+
+        def _move():
+            try:
+                if direction == 'r':
+                    self.ports[0].write(f"M:1+P{step_x_pulses}\r\n".encode())
+                    self.ports[0].write('G:\r\n'.encode())
+                elif direction == 'l':
+                    self.ports[0].write(f"M:1-P{step_x_pulses}\r\n".encode())
+                    self.ports[0].write('G:\r\n'.encode())
+                elif direction == 'u':
+                    self.ports[1].write(f"M:1+P{step_y_pulses}\r\n".encode())
+                    self.ports[1].write('G:\r\n'.encode())
+                elif direction == 'd':
+                    self.ports[1].write(f"M:1-P{step_y_pulses}\r\n".encode())
+                    self.ports[1].write('G:\r\n'.encode())
+                elif direction == 'o':
+                    self.ports[0].write("H:1\r\n".encode())
+                    self.ports[1].write("H:1\r\n".encode())
+            except Exception as e:
+                print(f"Motor move error: {e}")
+        
+        self.executor.submit(_move)
+    
+    def set_speed(self, axis, um_per_s, accel_ms=100):
+        """Set axis speed in micrometers per second (SHOT 'D:' command).
+
+        Used by continuous scanning, where the X stage sweeps a whole row at
+        constant velocity. axis is 'x' or 'y'.
+        """
+        if not self.connected:
+            return
+        pulses_per_s = max(1, int(um_per_s / self.MICROMETERS_PER_PULSE))
+        slow = max(1, min(pulses_per_s, pulses_per_s // 2))
+        port = self.ports[0] if axis == 'x' else self.ports[1]
+        # Written synchronously so it cannot be reordered after a move
+        # queued on the executor right afterwards.
+        try:
+            port.write(f"D:1S{slow}F{pulses_per_s}R{int(accel_ms)}\r\n".encode())
+        except Exception as e:
+            print(f"Motor speed error: {e}")
+
+    def measure_speed(self, axis, distance_um=1000, timeout_s=30.0):
+        """Measure real travel speed (μm/s) of one axis.
+
+        Moves `distance_um` forward, polls the controller busy flag
+        (SHOT '!:' -> 'B'/'R') until ready, then moves back. Blocking, so
+        call it from a worker thread. Returns None on failure.
+        """
+        if not self.connected:
+            return None
+        port = self.ports[0] if axis == 'x' else self.ports[1]
+        pulses = self.micrometers_to_pulses(distance_um)
+        old_timeout = port.timeout
+
+        def _wait_ready():
+            return self._wait_ready(port, timeout_s)
+
+        try:
+            port.timeout = 0.5
+            port.reset_input_buffer()
+            t0 = time.perf_counter()
+            port.write(f"M:1+P{pulses}\r\n".encode())
+            port.write('G:\r\n'.encode())
+            # 'M:'/'G:' odpowiadają 'OK' - odczytaj je przed odpytywaniem
+            port.readline()
+            port.readline()
+            if not _wait_ready():
+                print(f"Motor speed measurement timeout on axis {axis}")
+                return None
+            elapsed = time.perf_counter() - t0
+            port.write(f"M:1-P{pulses}\r\n".encode())
+            port.write('G:\r\n'.encode())
+            port.readline()
+            port.readline()
+            _wait_ready()
+            speed = pulses * self.MICROMETERS_PER_PULSE / elapsed if elapsed > 0 else None
+            if speed:
+                print(f"Measured axis {axis} speed: {speed:.0f} μm/s")
+            return speed
+        except Exception as e:
+            print(f"Motor speed measurement error: {e}")
+            return None
+        finally:
+            port.timeout = old_timeout
+
+    def _wait_ready(self, port, timeout_s):
+        """Poll the controller busy flag ('!:' -> 'B'/'R') until ready.
+
+        The port must have a read timeout set.
+        """
+        deadline = time.perf_counter() + timeout_s
+        while time.perf_counter() < deadline:
+            port.write("!:\r\n".encode())
+            reply = port.readline().decode(errors='ignore').strip().upper()
+            if reply.startswith('R'):
+                return True
+            time.sleep(0.005)
+        return False
+
+    def home(self, timeout_s=120.0):
+        """Home both axes (H:1) and wait until they stop. Blocking.
+
+        Waits for the moves already queued on the executor first, so the
+        position counter is reset only after they are sent.
+        """
+        if not self.connected:
+            return False
+        self.executor.submit(lambda: None).result()
+        ok = True
+        for port in self.ports:
+            old_timeout = port.timeout
+            try:
+                port.timeout = 0.5
+                # Drop stale replies so readline() below reads the H:1 acknowledgement
+                port.reset_input_buffer()
+                port.write("H:1\r\n".encode())
+                port.readline()
+                ok = self._wait_ready(port, timeout_s) and ok
+            except Exception as e:
+                print(f"Motor homing error: {e}")
+                ok = False
+            finally:
+                port.timeout = old_timeout
+        if ok:
+            self.position_um = [0, 0]
+            self.homed = True
+        return ok
+
+    def move_to(self, x_um, y_um):
+        """Move (asynchronously) to a position counted from the last homing."""
+        dx = x_um - self.position_um[0]
+        dy = y_um - self.position_um[1]
+        if abs(dx) >= self.MICROMETERS_PER_PULSE:
+            self.move('r' if dx > 0 else 'l', abs(dx))
+        if abs(dy) >= self.MICROMETERS_PER_PULSE:
+            self.move('u' if dy > 0 else 'd', abs(dy))
+
+    def move_z(self, distance_um, timeout_s=30.0):
+        """Move the focus axis by distance_um (+ = up) and wait until it stops. Blocking."""
+        if not self.z_connected:
+            return False
+        pulses = int(round(abs(distance_um) / self.MICROMETERS_PER_PULSE))
+        if pulses == 0:
+            return True
+        sign = '+' if distance_um > 0 else '-'
+        port = self.port_z
+        old_timeout = port.timeout
+        try:
+            port.timeout = 0.5
+            port.reset_input_buffer()
+            port.write(f"M:1{sign}P{pulses}\r\n".encode())
+            port.write('G:\r\n'.encode())
+            port.readline()
+            port.readline()
+            self.position_z_um += (1 if distance_um > 0 else -1) * pulses * self.MICROMETERS_PER_PULSE
+            if not self._wait_ready(port, timeout_s):
+                print("Focus motor move timeout")
+                return False
+            return True
+        except Exception as e:
+            print(f"Focus motor move error: {e}")
+            return False
+        finally:
+            port.timeout = old_timeout
+
+    def move_z_to(self, z_um):
+        """Move the focus axis to z_um (counted from connection). Blocking."""
+        return self.move_z(z_um - self.position_z_um)
+
+    def close(self):
+        """Close motor connections"""
+        self.executor.shutdown(wait=True)
+        if self.port_z is not None:
+            try:
+                self.port_z.close()
+            except Exception:
+                pass
+        for port in self.ports:
+            try:
+                port.close()
+            except:
+                pass
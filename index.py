@@ -7,13 +7,13 @@ import os
 import sys
 import time
 import threading
-from concurrent.futures import ThreadPoolExecutor
 from tkinter import *
 from tkinter import ttk, filedialog, messagebox
 import json
 import csv
 import glob
-import shutil
+from dataclasses import replace
+from collections import OrderedDict
 
 # Third-party imports
 import cv2
@@ -24,7 +24,26 @@ from matplotlib.gridspec import GridSpec
 from matplotlib.patches import Rectangle
 from PIL import Image, ImageTk
 import serial.tools.list_ports
-from pixelinkWrapper import PxLApi
+
+from spectrum_processing import frame_to_spectrum
+from scan_planner import ScanParameters, plan_scan, format_plan
+from scan_order import EXPOSURE_ORDERS
+from sequence_checkpoint import find_interrupted
+from scan_queue import ScanQueue, ScanJob, CORNERS, nearest_corner
+from hardware import CameraManager, SpectrometerManager, MotorController, create_camera_api
+from sequence_engine import SequenceConfig, SequenceEngine
+from autofocus import Autofocus
+from frame_calibration import FrameCalibration, collect_frames, master_frame
+from smile_correction import SmileModel
+from wavelength_calibration import spectral_axis, calibrate, LAMP_LINES
+from optimal_extraction import StripeProfile, OptimalExtractor
+from peak_tracker import PeakTracker
+from spectrum_filters import FILTERS, make_filter
+from saturation import SaturationMonitor, SATURATION_ACTIONS
+from measurement_catalog import MeasurementCatalog, SORT_KEYS, STATUSES
+from thumbnail_cache import ThumbnailCache
+from exporter import export_sessions, format_for, ExportCancelled, EXPORT_FILETYPES
+from session_cube import open_cube, cube_is_current, remove_cube
 
 
 # Load configuration
@@ -45,7 +64,56 @@ except FileNotFoundError:
         'gain': 1.0,  # Camera gain multiplier
         # Optional list of exposure times (ms) for sequence measurements, as comma-separated string
         # Example: "10, 50, 200" -> three spectra per point
-        'sequence_exposure_times': ""
+        'sequence_exposure_times': "",
+        # Camera backend: 'pixelink' (real camera) or 'simulated' (camera_simulator.py)
+        'camera_backend': 'pixelink',
+        # Scan mode: 'point' (stop-and-go) or 'continuous' (X sweeps whole rows)
+        'scan_mode': 'point',
+        'motor_speed': 2000.0,  # Normal stage travel speed in μm/s
+        'continuous_frames_per_cell': 3,  # Frames averaged per grid cell in continuous mode
+        # Exposure order with several exposure times: 'point', 'row' or 'pass'
+        'exposure_order': 'point',
+        'adaptive_coarse_stride': 4,  # Adaptive scan: coarse grid every N points
+        'adaptive_threshold': 0.1,  # Adaptive scan: relative spectral difference that triggers refinement
+        'heatmap_missing': 'interpolate',  # Unmeasured grid cells in heatmap: 'interpolate' or 'mask'
+        'scan_region': '',  # Optional region file (points/polygon .json, mask .npy/.png); '' = full rectangle
+        'frames_per_point': 1,  # Point scan: frames averaged per exposure at each point
+        'queue_rehome_every': 0,  # Scan queue: re-home the stage before every N-th job (0 = never)
+        'motion_estimator': 'phase',  # USB camera motion: 'phase' (downscaled), 'lk', 'farneback' or 'off'
+        'drift_compensation': False,  # Correct stage drift from the USB camera at row boundaries
+        'drift_um_per_px': 1.0,  # Stage μm per USB camera pixel at 1× (divided by lens_magnification)
+        'drift_check_rows': 1,  # Drift check every N rows (returns to the scan start corner)
+        'port_z': '',  # Optional focus (Z) motor controller port; '' = no Z axis
+        'autofocus': 'off',  # Sequence autofocus: 'off', 'start' or 'row' (USB camera sharpness)
+        'autofocus_range_um': 100.0,  # Autofocus search range around the current Z
+        'z_stack_count': 1,  # Z planes per point (> 1 = Z-stack around focus)
+        'z_stack_step_um': 5.0,  # Z-stack plane spacing
+        'frame_calibration': False,  # Dark-frame / flat-field / bad-pixel correction of PixeLink frames
+        'calibration_frames': 16,  # Frames per master dark / flat (median)
+        'smile_correction': False,  # Straighten the curved slit image (calibration/smile.npz) before averaging
+        'lambda_coefficients': [],  # Pixel -> nm polynomial (np.polyval) from 'Calibrate λ'; [] = linear lambda_min..lambda_max
+        'lamp_lines': 'hg-ar',  # Reference lamp for 'Calibrate λ': 'hg-ar' or 'ne'
+        'lambda_fit_degree': 3,  # Polynomial degree of the wavelength calibration
+        'extraction': 'mean',  # Spectrum from the frame: 'mean' (all rows) or 'optimal' (stripe-profile weighted)
+        'read_noise_dn': 2.0,  # Optimal extraction: camera read noise (DN)
+        'gain_e_per_dn': 1.0,  # Optimal extraction: electrons per DN (photon noise)
+        'peak_tracking': False,  # Track peak centre / FWHM / amplitude (live plot and sequence peaks.csv)
+        'peak_max_count': 8,  # Max. number of tracked peaks
+        'live_filter': 'off',  # Live spectrum temporal filter: 'off', 'ema', 'mean' or 'median'
+        'live_filter_frames': 8,  # Frames in the running mean / median window
+        'live_filter_alpha': 0.2,  # EMA weight of the newest frame
+        'frame_timeout': 2.0,  # Seconds (beyond exposure) a sequence waits for a fresh PixeLink frame
+        'first_frame_timeout': 10.0,  # Seconds a sequence waits for the first frame before failing
+        'saturation_action': 'flag',  # Saturated point in a sequence: 'flag', 'reject' (re-acquire) or 'reduce' (shorter exposure)
+        'saturation_level': 0,  # Saturated pixel value; 0 = full scale of the frame type (255 for 8-bit)
+        'saturation_max_pixels': 0,  # Saturated pixels tolerated in a frame before the point is flagged
+        'saturation_overlay': True,  # Mark saturated columns on the live spectrum
+        'raw_archive': False,  # Keep the raw spectral band of every sequence frame (points_<session>/raw_frames.bin)
+        'raw_archive_codec': 'zlib',  # Raw archive compression: 'zlib' or 'lz4' (needs the lz4 package)
+        'results_page_size': 500,  # Sessions per page in the Results tab (catalog query; tiles are virtualized)
+        'export_interleave': 'bsq',  # Cube export layout (.f32 / ENVI): 'bsq', 'bil' or 'bip'
+        'export_chunk_rows': 1000,  # Rows read per chunk during export (bounds export memory)
+        'repeatability_threshold': 0.9  # Min. R² when a point is revisited for another exposure
     }
 
 # Color constants
@@ -68,395 +136,6 @@ class StreamToFunction:
         pass
 
 
-class CameraManager:
-    """Manages camera operations in separate thread"""
-    
-    def __init__(self, camera_index=1):
-        self.camera_index = camera_index
-        self.detector = None
-        self.running = False
-        self.thread = None
-        self.frame = None
-        self.direction = "No movement"
-        
-    def start(self):
-        """Start camera thread"""
-        if not self.running:
-            self.running = True
-            # Remove CAP_DSHOW for Linux compatibility
-            self.detector = cv2.VideoCapture(self.camera_index)
-            
-            # Check if camera opened successfully
-            if not self.detector.isOpened():
-                print(f"Failed to open camera {self.camera_index}")
-                self.detector = None
-                self.running = False
-                return False
-                
-            self.thread = threading.Thread(target=self._camera_loop, daemon=True)
-            self.thread.start()
-            return True
-        return False
-    
-    def stop(self):
-        """Stop camera thread"""
-        self.running = False
-        if self.detector:
-            self.detector.release()
-        if self.thread:
-            self.thread.join(timeout=1.0)
-    
-    def _camera_loop(self):
-        """Main camera loop running in thread"""
-        prev_frame = None
-        
-        while self.running:
-            try:
-                # Check if detector is valid before reading
-                if not self.detector or not self.detector.isOpened():
-                    time.sleep(0.1)
-                    continue
-                    
-                ret, frame = self.detector.read()
-                if not ret:
-                    continue
-                    
-                frame = cv2.flip(frame, 1)
-                
-                # Motion detection
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                direction = "No movement"
-                
-                if prev_frame is not None:
-                    flow = cv2.calcOpticalFlowFarneback(
-                        prev_frame, gray, None, 0.5, 3, 15, 3, 5, 1.2, 0
-                    )
-                    mean_flow = np.mean(flow, axis=(0, 1))
-                    magnitude = np.linalg.norm(mean_flow)
-                    
-                    if magnitude > 0.1:
-                        if abs(mean_flow[0]) > abs(mean_flow[1]):
-                            direction = 'Right' if mean_flow[0] > 0 else 'Left'
-                        else:
-                            direction = 'Down' if mean_flow[1] > 0 else 'Up'
-                
-                prev_frame = gray
-                
-                # Add crosshair
-                height, width, _ = frame.shape
-                center_x, center_y = width // 2, height // 2
-                cv2.line(frame, (center_x - 20, center_y), (center_x + 20, center_y), (150, 150, 150), 1)
-                cv2.line(frame, (center_x, center_y - 20), (center_x, center_y + 20), (150, 150, 150), 1)
-                
-                # Store frame and direction directly
-                self.direction = direction
-                self.frame = frame
-                
-                time.sleep(0.033)  # ~30 FPS
-                
-            except Exception as e:
-                print(f"Camera error: {e}")
-                time.sleep(0.1)
-    
-    def get_current_frame(self):
-        """Get the current frame from camera"""
-        return self.frame
-    
-    def get_current_direction(self):
-        """Get the current movement direction"""
-        return self.direction
-
-
-class SpectrometerManager:
-    """Simplified Pixelink camera manager based on samples/getNextNumPyFrame.py"""
-    
-    def __init__(self):
-        self.hCamera = None
-        self.running = False
-        self.thread = None
-        
-        # Create buffer with reasonable size for PixeLink cameras
-        MAX_WIDTH = 2048   # in pixels - more reasonable for most PixeLink models  
-        MAX_HEIGHT = 2048  # in pixels - sufficient for most applications
-        self.frame_buffer = np.zeros([MAX_HEIGHT, MAX_WIDTH], dtype=np.uint8)
-        
-        # Check USB device availability
-        self._check_usb_device()
-        
-    def _check_usb_device(self):
-        """Check if PixeLink USB device is detected and accessible"""
-        try:
-            import subprocess
-            result = subprocess.run(['lsusb'], capture_output=True, text=True)
-            # Silent USB device check - detailed status shown during initialization
-                
-        except Exception as e:
-            print(f"USB device check failed: {e}")
-        
-    def initialize(self):
-        """Initialize camera exactly like sample"""
-        try:
-            # Initialize any camera - exactly like samples
-            ret = PxLApi.initialize(0)
-            if not PxLApi.apiSuccess(ret[0]):
-                error_code = ret[0]
-                print(f"PixeLink initialize failed with error code: {error_code}")
-                return False
-
-            self.hCamera = ret[1]
-            return True
-                
-        except Exception as e:
-            # print(f"Pixelink initialization exception: {e}")
-            print(f"   Exception type: {type(e).__name__}")
-            
-            # Handle specific permission errors
-            if "Permission denied" in str(e) or "Access denied" in str(e):
-                print("Permission Issue Detected:")
-                print("   • Add user to plugdev group: sudo usermod -a -G plugdev $USER")
-                print("   • Or temporarily use: sudo python script.py")
-                print("   • Then logout/login to apply group changes")
-            
-            # Try factory settings as fallback
-            try:
-                if hasattr(self, 'hCamera') and self.hCamera:
-                    PxLApi.loadSettings(self.hCamera, PxLApi.Settings.SETTINGS_FACTORY)
-                    time.sleep(0.1)
-                    return self.initialize()  # Recursive retry
-            except:
-                pass
-                
-            return False
-    
-    def start(self):
-        """Start streaming exactly like sample"""
-        if self.hCamera and not self.running:
-            self.running = True
-            self.thread = threading.Thread(target=self._capture_loop, daemon=True)
-            self.thread.start()
-    
-    def stop(self):
-        """Stop streaming exactly like sample"""
-        self.running = False
-        
-        if self.thread:
-            self.thread.join(timeout=2.0)
-            
-        if self.hCamera:
-            try:
-                PxLApi.setStreamState(self.hCamera, PxLApi.StreamState.STOP)
-                PxLApi.uninitialize(self.hCamera)
-                print("PixeLink camera stopped and uninitialized")
-            except Exception as e:
-                print(f"Error stopping PixeLink: {e}")
-                
-        self.hCamera = None
-
-    def get_next_frame(self, maxTries=5):
-        """Robust wrapper around getNextFrame exactly like sample"""
-        ret = (PxLApi.ReturnCode.ApiUnknownError,)
-        
-        for _ in range(maxTries):
-            ret = PxLApi.getNextNumPyFrame(self.hCamera, self.frame_buffer)
-            if PxLApi.apiSuccess(ret[0]):
-                return ret
-            else:
-                # If the streaming is turned off, or worse yet -- is gone?
-                if PxLApi.ReturnCode.ApiStreamStopped == ret[0] or \
-                   PxLApi.ReturnCode.ApiNoCameraAvailableError == ret[0]:
-                    return ret
-                else:
-                    print(f"    Hmmm... getNextFrame returned {ret[0]}")
-        
-        # Ran out of tries
-        return ret
-
-    def _capture_loop(self):
-        """Main capture loop - exactly like sample getNextNumPyFrame.py"""
-        if not self.hCamera or not self.frame_buffer.size:
-            return
-            
-        # Start the stream exactly like sample
-        ret = PxLApi.setStreamState(self.hCamera, PxLApi.StreamState.START)
-        if not PxLApi.apiSuccess(ret[0]):
-            print(f"setStreamState with StreamState.START failed, rc = {ret[0]}")
-            return
-
-        while self.running:
-            try:
-                # Use robust wrapper exactly like sample
-                ret = self.get_next_frame(1)
-                
-                if PxLApi.apiSuccess(ret[0]):
-                    # ret[1] is frameDescriptor, frame_buffer already contains image data
-                    frameDescriptor = ret[1]
-                    # Could use frameDescriptor.uFrameNumber, frameDescriptor.fFrameTime etc if needed
-
-                time.sleep(0.5)  # 500ms like sample
-                
-            except Exception as e:
-                print(f"PixeLink capture error: {e}")
-                time.sleep(0.1)
-        
-        # Stop streaming when loop ends
-        try:
-            ret = PxLApi.setStreamState(self.hCamera, PxLApi.StreamState.STOP)
-        except Exception as e:
-            print(f"Stop streaming error: {e}")
-
-    def set_exposure(self, exposure_ms):
-        """Set camera exposure time in milliseconds"""
-        if not self.hCamera:
-            print("Camera not initialized - cannot set exposure")
-            return False
-        
-        try:
-            # Convert milliseconds to seconds (PixeLink uses seconds)
-            exposure_seconds = exposure_ms / 1000.0
-            params = [exposure_seconds]
-            
-            ret = PxLApi.setFeature(self.hCamera, PxLApi.FeatureId.EXPOSURE, PxLApi.FeatureFlags.MANUAL, params)
-            if PxLApi.apiSuccess(ret[0]):
-                print(f"Exposure set to {exposure_ms} ms")
-                return True
-            else:
-                print(f"Failed to set exposure: {ret[0]}")
-                return False
-        except Exception as e:
-            print(f"Exposure setting error: {e}")
-            return False
-    
-    def set_gain(self, gain_value):
-        """Set camera gain value"""
-        if not self.hCamera:
-            print("Camera not initialized - cannot set gain")
-            return False
-        
-        try:
-            params = [float(gain_value)]
-            
-            ret = PxLApi.setFeature(self.hCamera, PxLApi.FeatureId.GAIN, PxLApi.FeatureFlags.MANUAL, params)
-            if PxLApi.apiSuccess(ret[0]):
-                print(f"Gain set to {gain_value}")
-                return True
-            else:
-                print(f"Failed to set gain: {ret[0]}")
-                return False
-        except Exception as e:
-            print(f"Gain setting error: {e}")
-            return False
-
-    def get_exposure(self):
-        """Get current camera exposure time"""
-        if not self.hCamera:
-            return None
-        
-        try:
-            ret = PxLApi.getFeature(self.hCamera, PxLApi.FeatureId.EXPOSURE)
-            if PxLApi.apiSuccess(ret[0]):
-                # Convert seconds to milliseconds
-                exposure_ms = ret[2][0] * 1000.0
-                return exposure_ms
-            else:
-                return None
-        except Exception as e:
-            print(f"Get exposure error: {e}")
-            return None
-
-    def get_gain(self):
-        """Get current camera gain"""
-        if not self.hCamera:
-            return None
-        
-        try:
-            ret = PxLApi.getFeature(self.hCamera, PxLApi.FeatureId.GAIN)
-            if PxLApi.apiSuccess(ret[0]):
-                return ret[2][0]
-            else:
-                return None
-        except Exception as e:
-            print(f"Get gain error: {e}")
-            return None
-
-
-class MotorController:
-    """Controls stepper motors"""
-    
-    def __init__(self, port_x='COM5', port_y='COM9'):
-        self.ports = []
-        self.connected = False
-        self.executor = ThreadPoolExecutor(max_workers=2)
-        # Motor resolution: 1 pulse = 2 micrometers
-        self.MICROMETERS_PER_PULSE = 2
-        
-        try:
-            if self._check_ports(port_x, port_y):
-                self.ports = [serial.Serial(port_x), serial.Serial(port_y)]
-                self.connected = True
-                # Store port names for status display
-                self.port_x = port_x
-                self.port_y = port_y
-                print("Motors connected")
-                # Update status in main app if available
-                if hasattr(self, '_app_ref'):
-                    self._app_ref.motors_ready = True
-        except Exception as e:
-            print(f"Motor connection error: {e}")
-    
-    def micrometers_to_pulses(self, micrometers):
-        """Convert micrometers to motor pulses (1 pulse = 2 μm)"""
-        return max(1, int(micrometers / self.MICROMETERS_PER_PULSE))
-    
-    def _check_ports(self, port_x, port_y):
-        """Check if ports are available"""
-        available_ports = [p.device for p in serial.tools.list_ports.comports()]
-        return port_x in available_ports and port_y in available_ports
-    
-    def move(self, direction, step=None):
-        """Move motors asynchronously - step parameter is in micrometers"""
-        if not self.connected:
-            return
-            
-        if step is None:
-            # Convert micrometers to pulses for default steps
-            step_x_pulses = self.micrometers_to_pulses(options['step_x'])
-            step_y_pulses = self.micrometers_to_pulses(options['step_y'])
-        else:
-            # Convert provided step (in micrometers) to pulses
-            step_x_pulses = step_y_pulses = self.micrometers_to_pulses(step)
-            
-        def _move():
-            try:
-                if direction == 'r':
-                    self.ports[0].write(f"M:1+P{step_x_pulses}\r\n".encode())
-                    self.ports[0].write('G:\r\n'.encode())
-                elif direction == 'l':
-                    self.ports[0].write(f"M:1-P{step_x_pulses}\r\n".encode())
-                    self.ports[0].write('G:\r\n'.encode())
-                elif direction == 'u':
-                    self.ports[1].write(f"M:1+P{step_y_pulses}\r\n".encode())
-                    self.ports[1].write('G:\r\n'.encode())
-                elif direction == 'd':
-                    self.ports[1].write(f"M:1-P{step_y_pulses}\r\n".encode())
-                    self.ports[1].write('G:\r\n'.encode())
-                elif direction == 'o':
-                    self.ports[0].write("H:1\r\n".encode())
-                    self.ports[1].write("H:1\r\n".encode())
-            except Exception as e:
-                print(f"Motor move error: {e}")
-        
-        self.executor.submit(_move)
-    
-    def close(self):
-        """Close motor connections"""
-        self.executor.shutdown(wait=True)
-        for port in self.ports:
-            try:
-                port.close()
-            except:
-                pass
-
-
 class CustomWindow:
     """Custom window base class"""
     
@@ -669,10 +348,117 @@ class CustomToplevel(Toplevel, CustomWindow):
             return False
 
 
+class ScanQueueWindow(CustomToplevel):
+    """Kolejka zadań skanowania: lista, dodawanie z bieżących ustawień, start/stop."""
+
+    def __init__(self, parent, queue):
+        CustomToplevel.__init__(self, parent)
+        self.title('Scan Queue')
+        self.parent = parent
+        self.queue = queue
+        self.geometry(f'900x420+{self.winfo_screenwidth() // 2 - 450}+{self.winfo_screenheight() // 2 - 210}')
+        self._create_widgets()
+        self.refresh()
+
+    def _create_widgets(self):
+        list_frame = Frame(self.window, bg=self.DGRAY)
+        list_frame.pack(fill=BOTH, expand=True, padx=10, pady=5)
+        self.job_list = Listbox(list_frame, bg=self.RGRAY, fg='white', selectbackground='gray',
+                                font=('Consolas', 9), highlightthickness=0)
+        self.job_list.pack(side=LEFT, fill=BOTH, expand=True)
+        scrollbar = Scrollbar(list_frame, command=self.job_list.yview)
+        scrollbar.pack(side=RIGHT, fill=Y)
+        self.job_list.config(yscrollcommand=scrollbar.set)
+
+        # Nowe zadanie: obszar/kroki/czasy z Settings, tu tylko nazwa, położenie i klatki
+        add_frame = Frame(self.window, bg=self.DGRAY)
+        add_frame.pack(fill=X, padx=10, pady=5)
+        self.name_var = StringVar(value='')
+        self.offset_x_var = StringVar(value='0')
+        self.offset_y_var = StringVar(value='0')
+        self.frames_var = StringVar(value=str(self.parent.options.get('frames_per_point', 1)))
+        self.corner_var = StringVar(value='nearest')
+        for text, var, width in (("Name:", self.name_var, 14), ("Offset X (μm):", self.offset_x_var, 8),
+                                 ("Offset Y (μm):", self.offset_y_var, 8), ("Frames/point:", self.frames_var, 4)):
+            Label(add_frame, text=text, bg=self.DGRAY, fg='white').pack(side=LEFT)
+            Entry(add_frame, textvariable=var, width=width, bg=self.RGRAY, fg='white').pack(side=LEFT, padx=(2, 8))
+        ttk.Combobox(add_frame, textvariable=self.corner_var, values=['nearest'] + list(CORNERS),
+                     state='readonly', width=12).pack(side=LEFT, padx=(0, 8))
+        CButton(add_frame, text="Add Job (current settings)", command=self.add_job).pack(side=LEFT)
+
+        btn_frame = Frame(self.window, bg=self.DGRAY)
+        btn_frame.pack(fill=X, padx=10, pady=5)
+        CButton(btn_frame, text="Up", command=lambda: self._move(-1)).pack(side=LEFT, padx=2)
+        CButton(btn_frame, text="Down", command=lambda: self._move(1)).pack(side=LEFT, padx=2)
+        CButton(btn_frame, text="Remove", command=self.remove_job).pack(side=LEFT, padx=2)
+        CButton(btn_frame, text="Reset", command=self.reset_job).pack(side=LEFT, padx=2)
+        CButton(btn_frame, text="Stop Queue", command=self.parent.stop_scan_queue).pack(side=RIGHT, padx=2)
+        CButton(btn_frame, text="Start Queue", command=self.parent.start_scan_queue).pack(side=RIGHT, padx=2)
+
+        self.status_label = Label(self.window, text="", bg=self.DGRAY, fg='lightgray', anchor=W)
+        self.status_label.pack(fill=X, padx=10, pady=(0, 5))
+
+    def refresh(self):
+        selected = self._selected_id()
+        self.job_list.delete(0, END)
+        colors = {'running': 'lightgreen', 'completed': 'gray', 'interrupted': 'orange', 'failed': 'red'}
+        for i, job in enumerate(self.queue.jobs):
+            line = f"[{job.status:<11}] {job.describe()}"
+            if job.filename:
+                line += f" -> {job.filename}"
+            self.job_list.insert(END, line)
+            self.job_list.itemconfig(i, fg=colors.get(job.status, 'white'))
+            if job.job_id == selected:
+                self.job_list.selection_set(i)
+        pending = sum(1 for job in self.queue.jobs if job.status == 'pending')
+        running = "running" if getattr(self.parent, '_queue_running', False) else "idle"
+        self.status_label.config(text=f"Queue {running}: {pending} pending / {len(self.queue.jobs)} jobs ({self.queue.path})")
+
+    def _selected_id(self):
+        sel = self.job_list.curselection() if hasattr(self, 'job_list') else ()
+        if not sel or sel[0] >= len(self.queue.jobs):
+            return None
+        return self.queue.jobs[sel[0]].job_id
+
+    def add_job(self):
+        try:
+            job = self.parent.job_from_current_settings(
+                name=self.name_var.get().strip(),
+                offset_x=float(self.offset_x_var.get() or 0),
+                offset_y=float(self.offset_y_var.get() or 0),
+                frames_per_point=int(self.frames_var.get() or 1),
+                starting_corner=self.corner_var.get(),
+            )
+        except ValueError as e:
+            messagebox.showerror("Scan Queue", f"Invalid job parameters: {e}")
+            return
+        self.queue.add(job)
+        self.name_var.set('')
+        self.refresh()
+
+    def remove_job(self):
+        job_id = self._selected_id()
+        if job_id:
+            self.queue.remove(job_id)
+            self.refresh()
+
+    def reset_job(self):
+        job_id = self._selected_id()
+        if job_id:
+            self.queue.reset(job_id)
+            self.refresh()
+
+    def _move(self, delta):
+        job_id = self._selected_id()
+        if job_id:
+            self.queue.move(job_id, delta)
+            self.refresh()
+
+
 class HeatMapWindow(CustomToplevel):
     """Heatmap + spectrum window (GUI tylko do podglądu danych)."""
     
-    def __init__(self, parent, measurement_index, data):
+    def __init__(self, parent, measurement_index, cube, source_file=None):
         CustomToplevel.__init__(self, parent)
         self.title(f'Measurement {measurement_index}')
         
@@ -685,105 +471,54 @@ class HeatMapWindow(CustomToplevel):
         y = (screen_height - window_height) // 2
         self.geometry(f'{window_width}x{window_height}+{x}+{y}')
         
-        # Ensure data is a numpy array of objects and normalize spectrum lengths
-        self.data = np.array(data, dtype=object)
+        # Kostka sesji (session_cube.SessionCube): memmap [lambda, y, x] float32
+        self.cube = cube
         self.parent = parent
+        self.source_file = source_file
+        # Okna otwarte na sesji są zamykane przed jej usunięciem / przebudową kostki
+        if hasattr(parent, 'heatmap_windows'):
+            parent.heatmap_windows.add(self)
+        self.bind('<Destroy>', self._on_destroy, add='+')
         self._setup_data()
-        # Stały zakres kolorów dla wszystkich długości fali
-        self.vmin = float(np.min(self.cube)) if self.cube.size else 0.0
-        self.vmax = float(np.max(self.cube)) if self.cube.size else 1.0
+        # Stały zakres kolorów dla wszystkich długości fali – policzony przy budowie kostki
+        self.vmin = cube.vmin
+        self.vmax = cube.vmax
         self._create_widgets()
 
         # Od razu narysuj pierwszy widok dokładnie tą samą
         # ścieżką, którą uruchamia użytkownik przesuwając suwak.
         try:
-            if self.cube.shape[2] > 0:
+            if self.cube.bands > 0:
                 self.slider.set(0)
                 self.on_slider(0)
         except Exception:
             # Awaryjnie spróbuj chociaż zwykłego odświeżenia
             self._update_plots()
     
+    def _on_destroy(self, event):
+        """Zamknij memmap kostki razem z oknem (<Destroy> przychodzi też od widżetów potomnych)."""
+        if event.widget is not self or self.cube is None:
+            return
+        self.cube.close()
+        self.cube = None
+        if hasattr(self.parent, 'heatmap_windows'):
+            self.parent.heatmap_windows.discard(self)
+
     def _setup_data(self):
-        """Przygotuj dane do wizualizacji (siatka X/Y + widma)."""
-        # Osie budujemy wyłącznie na podstawie współrzędnych (x, y) z pliku
-        xs = sorted({row[0] for row in self.data})
-        ys = sorted({row[1] for row in self.data})
-        nx, ny = len(xs), len(ys)
-        # Stały zakres osi X/Y dla wszystkich aktualizacji
-        self.x_extent = (0, nx)
-        self.y_extent = (0, ny)
-        
-        # Use length of first spectrum as reference and trim/ignore others if longer
-        first_len = len(self.data[0][2]) if len(self.data) > 0 else 0
-        spectrum_len = first_len
-        self.cube = np.zeros((nx, ny, spectrum_len), dtype=float)
-        
+        """Przygotuj dane do wizualizacji (siatka X/Y + oś widma)."""
+        # Pełna regularna siatka indeksów (x, y) z pliku – niezmierzone punkty
+        # są w kostce uzupełnione (skan adaptacyjny) albo zamaskowane (NaN)
+        self.x_extent = (0, self.cube.nx)
+        self.y_extent = (0, self.cube.ny)
+        self.missing_cells = self.cube.missing_cells
+        self.interpolated_cells = self.cube.interpolated_cells
         self.current_lambda = 0
         
-        # Tymczasowo: wizualne przesunięcie co drugiego wiersza o 3 klocki.
-        # Wartość ujemna = w lewo, dodatnia = w prawo.
-        shift_cols = 0
-        for row in self.data:
-            x_idx = xs.index(row[0])
-            y_idx = ys.index(row[1])
-
-            # Dla nieparzystych wierszy (co drugi) przesuwamy indeks X o shift_cols.
-            if y_idx % 2 == 1:
-                x_target = x_idx + shift_cols
-                # Jeżeli wyjdziemy poza siatkę, pomijamy ten punkt (brzeg obcięty).
-                if x_target < 0 or x_target >= nx:
-                    continue
-            else:
-                x_target = x_idx
+        # Wspólna oś z options.json (wavelength_calibration.spectral_axis), jak wykres na żywo
+        axis = spectral_axis(getattr(self.parent, 'options', {}) or {})
+        self.lambdas = axis.resampled(self.cube.bands)
+        self.calibrated = axis.calibrated
 
-            spectrum = np.array(row[2], dtype=float)
-            # Trim or pad spectrum to match reference length
-            if len(spectrum) >= spectrum_len:
-                self.cube[x_target, y_idx, :] = spectrum[:spectrum_len]
-            else:
-                padded_spectrum = np.zeros(spectrum_len, dtype=float)
-                padded_spectrum[:len(spectrum)] = spectrum
-                self.cube[x_target, y_idx, :] = padded_spectrum
-        
-        # Use calibration from options.json if available
-        if hasattr(self.parent, 'options') and 'lambda_calibration_enabled' in self.parent.options:
-            if self.parent.options['lambda_calibration_enabled']:
-                # Calibrated in wavelength (nm) with optional spectrum range (ROI)
-                base_min = float(self.parent.options.get('lambda_min', 400.0))
-                base_max = float(self.parent.options.get('lambda_max', 700.0))
-                roi_min = float(self.parent.options.get('spectrum_range_min', base_min))
-                roi_max = float(self.parent.options.get('spectrum_range_max', base_max))
-                if roi_min >= roi_max:
-                    roi_min, roi_max = base_min, base_max
-                lambda_min, lambda_max = roi_min, roi_max
-                self.lambdas = np.linspace(lambda_min, lambda_max, spectrum_len)
-                self.calibrated = True
-            else:
-                # Use pixel-based calibration from xmin/xmax
-                self.xmin = float(self.parent.xmin_var.get())
-                self.xmax = float(self.parent.xmax_var.get())
-                base_min = self.xmin
-                base_max = self.xmax
-                roi_min = float(self.parent.options.get('spectrum_range_min', base_min))
-                roi_max = float(self.parent.options.get('spectrum_range_max', base_max))
-                if roi_min >= roi_max:
-                    roi_min, roi_max = base_min, base_max
-                self.lambdas = np.linspace(roi_min, roi_max, spectrum_len)
-                self.calibrated = False
-        else:
-            # Fallback to pixel-based calibration
-            self.xmin = float(self.parent.xmin_var.get())
-            self.xmax = float(self.parent.xmax_var.get())
-            base_min = self.xmin
-            base_max = self.xmax
-            roi_min = float(getattr(self.parent.options, 'get', lambda k, d: d)('spectrum_range_min', base_min))
-            roi_max = float(getattr(self.parent.options, 'get', lambda k, d: d)('spectrum_range_max', base_max))
-            if roi_min >= roi_max:
-                roi_min, roi_max = base_min, base_max
-            self.lambdas = np.linspace(roi_min, roi_max, spectrum_len)
-            self.calibrated = False
-    
     def _create_widgets(self):
         """Create GUI widgets"""
         # Main control frame at top
@@ -805,7 +540,7 @@ class HeatMapWindow(CustomToplevel):
         
         # Extended wavelength slider
         self.slider = Scale(
-            left_frame, from_=0, to=self.cube.shape[2] - 1,
+            left_frame, from_=0, to=self.cube.bands - 1,
             orient=HORIZONTAL, command=self.on_slider,
             bg=self.DGRAY, fg='lightgray', length=500,  # Increased from 300 to 500
             highlightthickness=0, troughcolor=self.RGRAY,
@@ -834,6 +569,12 @@ class HeatMapWindow(CustomToplevel):
         cal_color = 'lightgreen' if self.calibrated else 'orange'
         Label(bottom_row, text="Scale:", bg=self.DGRAY, fg='white', font=('Arial', 9)).pack(side=LEFT)
         Label(bottom_row, text=cal_text, bg=self.DGRAY, fg=cal_color, font=('Arial', 9, 'bold')).pack(side=LEFT, padx=(5,20))
+
+        # Informacja o niezmierzonych punktach siatki (skan adaptacyjny / przerwany)
+        if self.missing_cells:
+            masked = self.missing_cells - self.interpolated_cells
+            Label(bottom_row, text=f"Unmeasured cells: {self.interpolated_cells} interpolated, {masked} masked",
+                  bg=self.DGRAY, fg='orange', font=('Arial', 9)).pack(side=LEFT)
         
         # Figure: 2D heatmap (góra) + widmo (dół)
         self.fig = plt.figure(figsize=(12, 8), facecolor=self.DGRAY)
@@ -878,10 +619,10 @@ class HeatMapWindow(CustomToplevel):
             lambda_val = self.lambdas[self.current_lambda]
             unit = "nm" if self.calibrated else "px"
             
-            # 2D heatmap z ustalonym zakresem kolorów i stałymi osiami
-            data = self.cube[:, :, self.current_lambda]
+            # 2D heatmap z ustalonym zakresem kolorów i stałymi osiami (jedno pasmo z dysku)
+            data = self.cube.band(self.current_lambda)
             im = self.ax2d.imshow(
-                data.T,
+                data,
                 cmap=cmap,
                 origin='lower',
                 extent=[self.x_extent[0], self.x_extent[1],
@@ -926,7 +667,7 @@ class HeatMapWindow(CustomToplevel):
                     pass
             
             # Spectrum plot (bottom, full width)
-            mean_profile = self.cube.mean(axis=(0, 1))
+            mean_profile = self.cube.mean_profile
             self.ax_spectrum.plot(self.lambdas, mean_profile, color='orange', linewidth=2, 
                                 label="Average Spectrum", alpha=0.8)
             self.ax_spectrum.axvline(lambda_val, color='red', linestyle='--', linewidth=2, 
@@ -998,11 +739,16 @@ class SpektrometerApp(CustomTk):
         self.camera_index = int(options.get('camera_index', 0))
 
         # Initialize managers
-        self.camera_manager = CameraManager(camera_index=self.camera_index)
-        self.spectrometer_manager = SpectrometerManager()
+        self.camera_manager = CameraManager(camera_index=self.camera_index,
+                                            motion_method=options.get('motion_estimator', 'phase'))
+        self.spectrometer_manager = SpectrometerManager(api=self._create_camera_api())
+        # Ciemne klatki / flat field (folder calibration/), wspólne z sekwencją
+        self.frame_calibration = FrameCalibration(options.get('calibration_folder', 'calibration'))
         self.motor_controller = MotorController(
             options.get('port_x', 'COM10'),
-            options.get('port_y', 'COM11')
+            options.get('port_y', 'COM11'),
+            options=options,
+            port_z=options.get('port_z') or None
         )
         # Add reference to this app for status updates
         self.motor_controller._app_ref = self
@@ -1013,6 +759,13 @@ class SpektrometerApp(CustomTk):
         
         # Variables
         self.measurement_files = []  # Store filenames only, not data
+        # Katalog sesji (measurement_catalog.py); measurement_files = bieżąca strona zakładki Results
+        self.catalog = MeasurementCatalog("measurement_data")
+        self.measurement_rows = []
+        self.results_page = 0
+        self.results_total = 0
+        self._cubes_building = set()
+        self.heatmap_windows = set()
         self.current_image = None
         self.spectrum_data = np.zeros(2048)
         # Status variables for hardware
@@ -1048,6 +801,10 @@ class SpektrometerApp(CustomTk):
         # Keep track of after() calls to cancel them during cleanup
         self._after_ids = []
 
+    def _create_camera_api(self):
+        """Wybierz backend kamery wg options.json ('pixelink' lub 'simulated')."""
+        return create_camera_api(self.options)
+
     def _create_widgets(self):
         """Create main GUI widgets"""
         # Notebook for tabs
@@ -1117,6 +874,12 @@ class SpektrometerApp(CustomTk):
         self.stop_seq_btn = CButton(control_frame, text="Stop Sequence", command=self.stop_measurement_sequence)
         self.stop_seq_btn.pack(side=LEFT, padx=5)
         self.stop_seq_btn.config(state=DISABLED)  # Initially disabled
+
+        # Resume the latest interrupted sequence (checkpoint in points_<session>)
+        CButton(control_frame, text="Resume Sequence", command=self.resume_measurement_sequence).pack(side=LEFT, padx=5)
+
+        # Kolejka zadań skanowania (scan_queue.py)
+        CButton(control_frame, text="Scan Queue", command=self.open_scan_queue).pack(side=LEFT, padx=5)
         
         # Initial state based on calibration
         self._update_start_seq_state()
@@ -1186,6 +949,9 @@ class SpektrometerApp(CustomTk):
         Button(direction_frame, text="↓", command=lambda: self.move_motor('d'), 
                width=4, bg=RGRAY, fg='white', font=("Arial", 10)).grid(row=2, column=1, padx=2, pady=2)
         
+        # Autofocus (optional focus motor, port_z)
+        CButton(motor_controls_frame, text="Autofocus", command=self.run_autofocus).pack(pady=(10, 0))
+
         # Motor status
         self.motor_status = Label(motor_controls_frame, bg=self.DGRAY, fg='lightgray', 
                                  text="Motor Status: Checking...", font=("Arial", 9), wraplength=150)
@@ -1468,6 +1234,111 @@ class SpektrometerApp(CustomTk):
             bg=self.RGRAY, fg='white', width=24
         ).pack(side=LEFT, padx=(5, 0))
 
+        # Surowe klatki sekwencji do ponownego przeliczenia (raw_archive.py)
+        self.raw_archive_var = BooleanVar(value=bool(self.options.get('raw_archive', False)))
+        Checkbutton(
+            seq_frame, text="Archive raw frames",
+            variable=self.raw_archive_var,
+            command=self.save_options,
+            bg=self.DGRAY, fg='white', selectcolor=self.RGRAY,
+            activebackground=self.DGRAY, activeforeground='white', font=("Arial", 8)
+        ).pack(side=LEFT, padx=(10, 0))
+
+        # Korekcja klatek: ciemna klatka / flat field / złe piksele (frame_calibration.py)
+        calib_frame = Frame(controls_frame, bg=self.DGRAY)
+        calib_frame.pack(fill=X, padx=15, pady=(2, 0))
+
+        self.calibration_enabled_var = BooleanVar(value=bool(self.options.get('frame_calibration', False)))
+        Checkbutton(
+            calib_frame, text="Dark/flat correction",
+            variable=self.calibration_enabled_var,
+            command=self.save_options,
+            bg=self.DGRAY, fg='white', selectcolor=self.RGRAY,
+            activebackground=self.DGRAY, activeforeground='white', font=("Arial", 8)
+        ).pack(side=LEFT)
+        CButton(calib_frame, text="Dark Frames", command=self.acquire_dark_frames).pack(side=LEFT, padx=(10, 0))
+        CButton(calib_frame, text="Flat Field", command=self.acquire_flat_field).pack(side=LEFT, padx=(5, 0))
+
+        self.smile_enabled_var = BooleanVar(value=bool(self.options.get('smile_correction', False)))
+        Checkbutton(
+            calib_frame, text="Slit curvature",
+            variable=self.smile_enabled_var,
+            command=self.save_options,
+            bg=self.DGRAY, fg='white', selectcolor=self.RGRAY,
+            activebackground=self.DGRAY, activeforeground='white', font=("Arial", 8)
+        ).pack(side=LEFT, padx=(10, 0))
+        CButton(calib_frame, text="Fit Curvature", command=self.fit_slit_curvature).pack(side=LEFT, padx=(5, 0))
+        CButton(calib_frame, text="Calibrate λ", command=self.calibrate_wavelength).pack(side=LEFT, padx=(10, 0))
+
+        extraction_frame = Frame(controls_frame, bg=self.DGRAY)
+        extraction_frame.pack(fill=X, padx=15, pady=(2, 0))
+        self.optimal_extraction_var = BooleanVar(value=self.options.get('extraction', 'mean') == 'optimal')
+        Checkbutton(
+            extraction_frame, text="Optimal extraction",
+            variable=self.optimal_extraction_var,
+            command=self.save_options,
+            bg=self.DGRAY, fg='white', selectcolor=self.RGRAY,
+            activebackground=self.DGRAY, activeforeground='white', font=("Arial", 8)
+        ).pack(side=LEFT)
+        CButton(extraction_frame, text="Fit Stripe", command=self.fit_stripe_profile).pack(side=LEFT, padx=(10, 0))
+
+        # Śledzenie pików na żywo (peak_tracker.py)
+        self.peak_tracker = PeakTracker(int(self.options.get('peak_max_count', 8)))
+        self.peak_tracking_var = BooleanVar(value=bool(self.options.get('peak_tracking', False)))
+        Checkbutton(
+            extraction_frame, text="Track peaks",
+            variable=self.peak_tracking_var,
+            command=self._on_peak_tracking_toggle,
+            bg=self.DGRAY, fg='white', selectcolor=self.RGRAY,
+            activebackground=self.DGRAY, activeforeground='white', font=("Arial", 8)
+        ).pack(side=LEFT, padx=(10, 0))
+        CButton(extraction_frame, text="Reset Peaks", command=self.peak_tracker.reset).pack(side=LEFT, padx=(5, 0))
+        CButton(extraction_frame, text="Save Peaks", command=self.save_peak_series).pack(side=LEFT, padx=(5, 0))
+        self.peak_label = Label(extraction_frame, text="", bg=self.DGRAY, fg='orange', font=("Arial", 8))
+        self.peak_label.pack(side=LEFT, padx=(10, 0))
+
+        # Filtr czasowy widma na żywo (spectrum_filters.py) – tylko podgląd, sekwencja bez zmian
+        filter_frame = Frame(controls_frame, bg=self.DGRAY)
+        filter_frame.pack(fill=X, padx=15, pady=(2, 0))
+        Label(filter_frame, text="Live filter:", bg=self.DGRAY, fg='white', font=("Arial", 8)).pack(side=LEFT)
+        self.live_filter_var = StringVar(value=str(self.options.get('live_filter', 'off')))
+        live_filter_combo = ttk.Combobox(filter_frame, textvariable=self.live_filter_var, values=list(FILTERS),
+                                         state='readonly', width=8)
+        live_filter_combo.pack(side=LEFT, padx=(5, 0))
+        live_filter_combo.bind('<<ComboboxSelected>>', lambda e: self._apply_live_filter())
+        Label(filter_frame, text="N:", bg=self.DGRAY, fg='white', font=("Arial", 8)).pack(side=LEFT, padx=(10, 2))
+        self.live_filter_frames_var = IntVar(value=int(self.options.get('live_filter_frames', 8)))
+        frames_entry = Entry(filter_frame, textvariable=self.live_filter_frames_var, bg=self.RGRAY, fg='white', width=4)
+        frames_entry.pack(side=LEFT)
+        frames_entry.bind("<Return>", lambda e: self._apply_live_filter())
+        Label(filter_frame, text="α:", bg=self.DGRAY, fg='white', font=("Arial", 8)).pack(side=LEFT, padx=(10, 2))
+        self.live_filter_alpha_var = DoubleVar(value=float(self.options.get('live_filter_alpha', 0.2)))
+        alpha_entry = Entry(filter_frame, textvariable=self.live_filter_alpha_var, bg=self.RGRAY, fg='white', width=5)
+        alpha_entry.pack(side=LEFT)
+        alpha_entry.bind("<Return>", lambda e: self._apply_live_filter())
+        self.live_filter = make_filter(self.live_filter_var.get(), self.live_filter_frames_var.get(),
+                                       self.live_filter_alpha_var.get())
+
+        # Nasycenie klatki (saturation.py): znaczniki na wykresie i reakcja sekwencji
+        self.saturation_monitor = SaturationMonitor(int(self.options.get('saturation_level', 0) or 0))
+        self.saturation_mask = None
+        self.saturation_overlay_var = BooleanVar(value=bool(self.options.get('saturation_overlay', True)))
+        Checkbutton(
+            filter_frame, text="Mark saturated",
+            variable=self.saturation_overlay_var,
+            command=self.save_options,
+            bg=self.DGRAY, fg='white', selectcolor=self.RGRAY,
+            activebackground=self.DGRAY, activeforeground='white', font=("Arial", 8)
+        ).pack(side=LEFT, padx=(15, 0))
+        Label(filter_frame, text="Sequence:", bg=self.DGRAY, fg='white', font=("Arial", 8)).pack(side=LEFT, padx=(10, 2))
+        self.saturation_action_var = StringVar(value=str(self.options.get('saturation_action', 'flag')))
+        saturation_combo = ttk.Combobox(filter_frame, textvariable=self.saturation_action_var,
+                                        values=list(SATURATION_ACTIONS), state='readonly', width=7)
+        saturation_combo.pack(side=LEFT)
+        saturation_combo.bind('<<ComboboxSelected>>', lambda e: self.save_options())
+        self.saturation_label = Label(filter_frame, text="", bg=self.DGRAY, fg='red', font=("Arial", 8))
+        self.saturation_label.pack(side=LEFT, padx=(10, 0))
+
         # ---- Spectrum ROI + Auto spectrum (moved from Settings tab) ----
         spectrum_ctrl_frame = Frame(controls_frame, bg=self.DGRAY)
         spectrum_ctrl_frame.pack(fill=X, padx=15, pady=(5, 0))
@@ -1544,6 +1415,8 @@ class SpektrometerApp(CustomTk):
             axis_len = 2048
         self.spectrum_data = np.zeros(axis_len)
         self.spectrum_line, = self.spectrum_ax.plot(self.x_axis, self.spectrum_data, color='green', linewidth=1)
+        self.peak_markers, = self.spectrum_ax.plot([], [], 'v', color='orange', markersize=6)
+        self.saturation_markers, = self.spectrum_ax.plot([], [], '|', color='red', markersize=8)
         
         # Style - larger fonts for better readability
         self.spectrum_ax.set_xlabel("Pixel", color='white', fontsize=14)  # Increased from 12
@@ -1936,7 +1809,40 @@ class SpektrometerApp(CustomTk):
         
         CButton(control_frame, text="Refresh", command=self.load_measurements).pack(side=LEFT, padx=5)
         CButton(control_frame, text="Export All", command=self.export_measurements).pack(side=LEFT, padx=5)
+        self.export_cancel_btn = CButton(control_frame, text="Cancel Export", command=self.cancel_export,
+                                         state=DISABLED)
+        self.export_cancel_btn.pack(side=LEFT, padx=5)
         CButton(control_frame, text="Delete All", command=self.delete_all_measurements).pack(side=LEFT, padx=5)
+
+        # Filtrowanie, sortowanie i strony – zapytania do katalogu
+        Label(control_frame, text="Filter:", bg=self.DGRAY, fg='white', font=("Arial", 8)).pack(side=LEFT, padx=(15, 2))
+        self.results_filter_var = StringVar(value="")
+        filter_entry = Entry(control_frame, textvariable=self.results_filter_var, bg=self.RGRAY, fg='white', width=16)
+        filter_entry.pack(side=LEFT)
+        filter_entry.bind("<Return>", lambda e: self._query_measurements(page=0))
+        self.results_status_var = StringVar(value='all')
+        status_combo = ttk.Combobox(control_frame, textvariable=self.results_status_var, values=list(STATUSES),
+                                    state='readonly', width=9)
+        status_combo.pack(side=LEFT, padx=(5, 0))
+        status_combo.bind('<<ComboboxSelected>>', lambda e: self._query_measurements(page=0))
+        Label(control_frame, text="Sort:", bg=self.DGRAY, fg='white', font=("Arial", 8)).pack(side=LEFT, padx=(10, 2))
+        self.results_sort_var = StringVar(value='date')
+        sort_combo = ttk.Combobox(control_frame, textvariable=self.results_sort_var, values=list(SORT_KEYS),
+                                  state='readonly', width=9)
+        sort_combo.pack(side=LEFT)
+        sort_combo.bind('<<ComboboxSelected>>', lambda e: self._query_measurements(page=0))
+        self.results_desc_var = BooleanVar(value=True)
+        Checkbutton(
+            control_frame, text="Desc",
+            variable=self.results_desc_var,
+            command=lambda: self._query_measurements(page=0),
+            bg=self.DGRAY, fg='white', selectcolor=self.RGRAY,
+            activebackground=self.DGRAY, activeforeground='white', font=("Arial", 8)
+        ).pack(side=LEFT, padx=(5, 0))
+        CButton(control_frame, text="<", command=lambda: self._query_measurements(page=self.results_page - 1),
+                width=2).pack(side=LEFT, padx=(10, 0))
+        CButton(control_frame, text=">", command=lambda: self._query_measurements(page=self.results_page + 1),
+                width=2).pack(side=LEFT, padx=(2, 0))
         
         # Info label
         self.results_info = Label(
@@ -1955,19 +1861,17 @@ class SpektrometerApp(CustomTk):
         v_scrollbar = Scrollbar(main_frame, orient=VERTICAL, command=self.results_canvas.yview)
         h_scrollbar = Scrollbar(main_frame, orient=HORIZONTAL, command=self.results_canvas.xview)
         
-        # Scrollable frame inside canvas
-        self.results_frame = Frame(self.results_canvas, bg=self.DGRAY)
-        
-        # Configure scrolling
+        # Wirtualna siatka kafelków: rysowane są tylko widoczne (draw_measurements)
         self.results_canvas.configure(
             yscrollcommand=v_scrollbar.set,
             xscrollcommand=h_scrollbar.set
         )
-        
-        # Create window in canvas
-        self.canvas_frame = self.results_canvas.create_window(
-            (0, 0), window=self.results_frame, anchor="nw"
-        )
+        v_scrollbar.configure(command=self._results_yview)
+        self.thumbnail_cache = ThumbnailCache("measurement_data", self.THUMB_SIZE)
+        self._thumbnails = OrderedDict()  # plik -> PhotoImage (LRU)
+        self._thumbnail_redraw = False
+        self._visible_range = None
+        self._visible_files = set()
         
         # Pack scrollbars and canvas
         v_scrollbar.pack(side=RIGHT, fill=Y)
@@ -1976,10 +1880,12 @@ class SpektrometerApp(CustomTk):
         
         # Bind canvas resize
         self.results_canvas.bind('<Configure>', self._on_canvas_configure)
-        self.results_frame.bind('<Configure>', self._on_frame_configure)
+        self.results_canvas.bind('<Button-1>', self._on_results_click)
         
         # Bind mousewheel to canvas
         self.results_canvas.bind("<MouseWheel>", self._on_mousewheel)
+        self.results_canvas.bind("<Button-4>", lambda e: self._results_yview('scroll', -1, 'units'))
+        self.results_canvas.bind("<Button-5>", lambda e: self._results_yview('scroll', 1, 'units'))
 
     def _setup_settings_tab(self):
         """Setup settings tab"""
@@ -2019,8 +1925,29 @@ class SpektrometerApp(CustomTk):
         self.corner_combo = ttk.Combobox(settings_frame, textvariable=self.starting_corner, values=corner_options, state='readonly')
         self.corner_combo.grid(row=corner_row, column=1, sticky=EW, pady=5)
 
+        # Scan mode: point-by-point (stop-and-go) or continuous on-the-fly rows
+        Label(settings_frame, text="Scan Mode:", bg=self.DGRAY, fg='white').grid(row=corner_row+1, column=0, sticky=W, pady=5)
+        self.scan_mode_var = StringVar(value=options.get('scan_mode', 'point'))
+        self.scan_mode_combo = ttk.Combobox(settings_frame, textvariable=self.scan_mode_var, values=['point', 'continuous', 'adaptive'], state='readonly')
+        self.scan_mode_combo.grid(row=corner_row+1, column=1, sticky=EW, pady=5)
+
+        # Exposure order for several sequence exposure times (point scan mode)
+        Label(settings_frame, text="Exposure Order:", bg=self.DGRAY, fg='white').grid(row=corner_row+2, column=0, sticky=W, pady=5)
+        self.exposure_order_var = StringVar(value=options.get('exposure_order', 'point'))
+        self.exposure_order_combo = ttk.Combobox(settings_frame, textvariable=self.exposure_order_var, values=list(EXPOSURE_ORDERS), state='readonly')
+        self.exposure_order_combo.grid(row=corner_row+2, column=1, sticky=EW, pady=5)
+
+        # Optional scan region (points / polygon JSON or mask image) instead of the full rectangle
+        Label(settings_frame, text="Scan Region (optional):", bg=self.DGRAY, fg='white').grid(row=corner_row+3, column=0, sticky=W, pady=5)
+        self.scan_region_var = StringVar(value=options.get('scan_region', ''))
+        Entry(settings_frame, textvariable=self.scan_region_var, bg=self.RGRAY, fg='white').grid(row=corner_row+3, column=1, sticky=EW, pady=5)
+        region_btns = Frame(settings_frame, bg=self.DGRAY)
+        region_btns.grid(row=corner_row+3, column=2, padx=10, sticky=W)
+        CButton(region_btns, text="Browse", command=self._browse_scan_region).pack(side=LEFT)
+        CButton(region_btns, text="Clear", command=lambda: self.scan_region_var.set('')).pack(side=LEFT, padx=5)
+
         # Port settings only (moved camera + calibration to Camera & Controls)
-        row_base = len(settings_data) + 3
+        row_base = len(settings_data) + 5
         Label(settings_frame, text="Port Settings", font=("Arial", 14, "bold"), 
               bg=self.DGRAY, fg='white').grid(row=row_base, column=0, columnspan=3, pady=10, sticky=W)
 
@@ -2078,9 +2005,72 @@ class SpektrometerApp(CustomTk):
         
         Label(apply_frame, text="Click to save all changes to options.json", 
               bg=self.DGRAY, fg='lightgray', font=("Arial", 9)).pack()
+
+        # Pre-scan estimate (time / disk / memory) and motor speed measurement
+        plan_frame = Frame(apply_frame, bg=self.DGRAY)
+        plan_frame.pack(pady=5)
+        CButton(plan_frame, text="Estimate Scan", command=self._show_scan_plan).pack(side=LEFT, padx=5)
+        CButton(plan_frame, text="Measure Motor Speed", command=self._measure_motor_speed).pack(side=LEFT, padx=5)
         
         settings_frame.columnconfigure(1, weight=1)
 
+    def _browse_scan_region(self):
+        filename = filedialog.askopenfilename(
+            title="Select Scan Region",
+            filetypes=[("Region files", "*.json *.npy *.png *.bmp *.jpg"), ("All files", "*.*")]
+        )
+        if filename:
+            self.scan_region_var.set(filename)
+
+    def _current_scan_options(self):
+        """Opcje skanu z bieżących pól GUI (bez zapisu do options.json)."""
+        opts = dict(self.options)
+        try:
+            opts.update({
+                'step_x': self.step_x.get(),
+                'step_y': self.step_y.get(),
+                'width': self.scan_width.get(),
+                'height': self.scan_height.get(),
+                'lens_magnification': float(self.lens_magnification_var.get()),
+                'sequence_sleep': float(self.sequence_sleep_var.get()),
+                'scan_mode': self.scan_mode_var.get(),
+                'exposure_order': self.exposure_order_var.get(),
+                'scan_region': self.scan_region_var.get().strip(),
+            })
+        except Exception as e:
+            print(f"Scan plan: invalid settings value ({e}), using saved options")
+        return opts
+
+    def _show_scan_plan(self):
+        """Oszacuj czas, objętość danych i pamięć skanu dla bieżących ustawień."""
+        try:
+            spectrum_length = len(self.x_axis) if hasattr(self, 'x_axis') else None
+            params = ScanParameters.from_options(
+                self._current_scan_options(),
+                exposures_ms=self._get_sequence_exposure_list_ms(),
+                spectrum_length=spectrum_length,
+            )
+            report = format_plan(plan_scan(params))
+            print(report)
+            messagebox.showinfo("Scan Plan", report)
+        except Exception as e:
+            print(f"Scan plan error: {e}")
+
+    def _measure_motor_speed(self):
+        """Zmierz prędkość osi X i Y i zapisz ją w opcjach (motor_speed_x/y)."""
+        if not self.motor_controller.connected:
+            print("ERROR: Motors are not connected!")
+            return
+
+        def worker():
+            for axis in ('x', 'y'):
+                speed = self.motor_controller.measure_speed(axis)
+                if speed:
+                    self.options[f'motor_speed_{axis}'] = round(speed, 1)
+            self.after(0, self.save_options)
+
+        threading.Thread(target=worker, daemon=True).start()
+
     def refresh_ports(self):
         try:
             ports = [p.device for p in serial.tools.list_ports.comports()]
@@ -2142,6 +2132,12 @@ class SpektrometerApp(CustomTk):
                 self.options['starting_corner'] = self.starting_corner.get()
             if hasattr(self, 'lens_magnification_var'):
                 self.options['lens_magnification'] = float(self.lens_magnification_var.get())
+            if hasattr(self, 'scan_mode_var'):
+                self.options['scan_mode'] = self.scan_mode_var.get()
+            if hasattr(self, 'exposure_order_var'):
+                self.options['exposure_order'] = self.exposure_order_var.get()
+            if hasattr(self, 'scan_region_var'):
+                self.options['scan_region'] = self.scan_region_var.get().strip()
             
             if hasattr(self, 'port_x_var'):
                 self.options['port_x'] = self.port_x_var.get()
@@ -2153,6 +2149,23 @@ class SpektrometerApp(CustomTk):
 
             if hasattr(self, 'sequence_exposure_var'):
                 self.options['sequence_exposure_times'] = self.sequence_exposure_var.get()
+            if hasattr(self, 'calibration_enabled_var'):
+                self.options['frame_calibration'] = bool(self.calibration_enabled_var.get())
+            if hasattr(self, 'smile_enabled_var'):
+                self.options['smile_correction'] = bool(self.smile_enabled_var.get())
+            if hasattr(self, 'optimal_extraction_var'):
+                self.options['extraction'] = 'optimal' if self.optimal_extraction_var.get() else 'mean'
+            if hasattr(self, 'peak_tracking_var'):
+                self.options['peak_tracking'] = bool(self.peak_tracking_var.get())
+            if hasattr(self, 'live_filter_var'):
+                self.options['live_filter'] = self.live_filter_var.get()
+                self.options['live_filter_frames'] = int(self.live_filter_frames_var.get())
+                self.options['live_filter_alpha'] = float(self.live_filter_alpha_var.get())
+            if hasattr(self, 'raw_archive_var'):
+                self.options['raw_archive'] = bool(self.raw_archive_var.get())
+            if hasattr(self, 'saturation_action_var'):
+                self.options['saturation_action'] = self.saturation_action_var.get()
+                self.options['saturation_overlay'] = bool(self.saturation_overlay_var.get())
 
             if hasattr(self, 'spectrum_range_min_var'):
                 self.options['spectrum_range_min'] = float(self.spectrum_range_min_var.get())
@@ -2173,17 +2186,20 @@ class SpektrometerApp(CustomTk):
         style.map('TNotebook.Tab', background=[('selected', self.RGRAY)])
 
     def _on_canvas_configure(self, event):
-        """Handle canvas resize"""
-        canvas_width = event.width
-        self.results_canvas.itemconfig(self.canvas_frame, width=canvas_width)
+        """Handle canvas resize: new column count re-lays the tile grid"""
+        if max(1, event.width // self.TILE_W) != getattr(self, '_results_columns', None):
+            self.draw_measurements()
+        else:
+            self._draw_visible_tiles()
 
-    def _on_frame_configure(self, event):
-        """Handle frame resize"""
-        self.results_canvas.configure(scrollregion=self.results_canvas.bbox("all"))
+    def _results_yview(self, *args):
+        """Scroll the Results canvas and draw the tiles that came into view"""
+        self.results_canvas.yview(*args)
+        self._draw_visible_tiles()
 
     def _on_mousewheel(self, event):
         """Handle mouse wheel scrolling"""
-        self.results_canvas.yview_scroll(int(-1*(event.delta/120)), "units")
+        self._results_yview('scroll', int(-1*(event.delta/120)), 'units')
 
     def console_output(self, message):
         try:
@@ -2465,26 +2481,55 @@ class SpektrometerApp(CustomTk):
             if frame is None or frame.size == 0:
                 return
                 
-            if len(frame.shape) == 3:
-                frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.shape[2] == 3 else frame[:,:,0]
-            else:
-                frame_gray = frame
-                
-            spectrum_profile = np.mean(frame_gray, axis=0)
-            
-            if len(spectrum_profile) != 2048:
-                x_old = np.linspace(0, 1, len(spectrum_profile))
-                x_new = np.linspace(0, 1, 2048)
-                spectrum_profile = np.interp(x_new, x_old, spectrum_profile)
+            monitor = getattr(self, 'saturation_monitor', None)
+            spectrum_profile = frame_to_spectrum(frame, correction=self._frame_correction(frame),
+                                                 smile=self._smile_model(), extractor=self._extractor(),
+                                                 saturation=monitor)
             
             # Apply configured spectrum range (ROI)
             spectrum_profile = self._apply_spectrum_roi(spectrum_profile)
+            if monitor is not None:
+                # Punkty widma z nasyconą kolumną klatki, po tym samym ROI co widmo
+                self.saturation_mask = (self._apply_spectrum_roi(monitor.spectrum_mask(2048))
+                                        if monitor.pixels else None)
+            if getattr(self, 'live_filter', None) is not None:
+                spectrum_profile = self.live_filter.update(spectrum_profile)
+            if hasattr(self, 'peak_tracking_var') and self.peak_tracking_var.get():
+                self.peak_tracker.update(spectrum_profile, self.x_axis)
             self.spectrum_data = spectrum_profile
             self.after_idle(self._update_spectrum_plot)
                 
         except Exception:
             pass
 
+    def _frame_correction(self, frame):
+        """FrameCorrection for the current exposure/gain, None when disabled or not acquired."""
+        if not (hasattr(self, 'calibration_enabled_var') and self.calibration_enabled_var.get()):
+            return None
+        sm = self.spectrometer_manager
+        exposure_ms = sm.exposure_ms if sm.exposure_ms is not None else self.options.get('exposure_time', 10.0)
+        gain = sm.gain if sm.gain is not None else self.options.get('gain', 1.0)
+        return self.frame_calibration.correction(exposure_ms, gain, np.shape(frame)[:2],
+                                                 straightened=self._smile_model() is not None)
+
+    def _extractor(self):
+        """Preview OptimalExtractor (own buffers) when enabled and a stripe profile exists."""
+        if not (hasattr(self, 'optimal_extraction_var') and self.optimal_extraction_var.get()):
+            return None
+        stripe = self.frame_calibration.stripe
+        if stripe is None:
+            return None
+        if getattr(self, '_preview_extractor', None) is None or self._preview_extractor.stripe is not stripe:
+            self._preview_extractor = OptimalExtractor(stripe, float(self.options.get('read_noise_dn', 2.0)),
+                                                       float(self.options.get('gain_e_per_dn', 1.0)))
+        return self._preview_extractor
+
+    def _smile_model(self):
+        """Slit-curvature model when enabled and fitted, otherwise None."""
+        if hasattr(self, 'smile_enabled_var') and self.smile_enabled_var.get():
+            return self.frame_calibration.smile
+        return None
+
     def _apply_spectrum_roi(self, spectrum_array):
         """Apply current spectrum ROI to a 1D spectrum array."""
         try:
@@ -2508,47 +2553,32 @@ class SpektrometerApp(CustomTk):
 
     def _update_spectrum_axes(self):
         try:
-            calibrated = (hasattr(self, 'options') and 
-                          self.options.get('lambda_calibration_enabled', False) and
-                          'lambda_min' in self.options and 'lambda_max' in self.options)
-
-            if calibrated:
-                base_min = float(self.options['lambda_min'])
-                base_max = float(self.options['lambda_max'])
-                base_axis = np.linspace(base_min, base_max, 2048)
-                xlabel = "Wavelength (nm)"
-                default_title = f"Spectrum ({base_min:.0f}-{base_max:.0f} nm)"
-            else:
-                base_min, base_max = 0.0, 2048.0
-                base_axis = np.linspace(base_min, base_max, 2048)
-                xlabel = "Pixel"
-                default_title = "Spectrum"
-
-            roi_min = float(self.options.get('spectrum_range_min', base_min)) if hasattr(self, 'options') else base_min
-            roi_max = float(self.options.get('spectrum_range_max', base_max)) if hasattr(self, 'options') else base_max
-            if roi_min >= roi_max:
-                roi_min, roi_max = base_min, base_max
-
-            mask = (base_axis >= roi_min) & (base_axis <= roi_max)
-            if not np.any(mask):
-                mask = np.ones_like(base_axis, dtype=bool)
-
-            self.spectrum_roi_indices = np.where(mask)[0]
-            self.x_axis = base_axis[self.spectrum_roi_indices]
-
-            if calibrated:
-                if roi_min == base_min and roi_max == base_max:
-                    title = default_title
+            # Jedna wspólna oś (z pamięci podręcznej) dla wykresu, sekwencji i heatmapy
+            axis = spectral_axis(self.options if hasattr(self, 'options') else {})
+            self.spectrum_roi_indices = axis.roi_indices
+            self.x_axis = axis.axis
+            self.spectrum_axis_calibrated = axis.calibrated
+
+            # Inna oś (ROI, długość, kalibracja) - śledzone piki są w starych jednostkach
+            key = (axis.calibrated, len(axis.axis), float(axis.axis[0]), float(axis.axis[-1])) if len(axis.axis) else None
+            if key != getattr(self, '_peak_axis_key', None):
+                self._peak_axis_key = key
+                if hasattr(self, 'peak_tracker'):
+                    self.peak_tracker.reset()
+
+            if axis.calibrated:
+                if axis.full_range:
+                    title = f"Spectrum ({axis.base_min:.0f}-{axis.base_max:.0f} nm)"
                 else:
-                    title = f"Spectrum ({roi_min:.0f}-{roi_max:.0f} nm)"
+                    title = f"Spectrum ({axis.roi_min:.0f}-{axis.roi_max:.0f} nm)"
             else:
-                if roi_min == base_min and roi_max == base_max:
-                    title = default_title
+                if axis.full_range:
+                    title = "Spectrum"
                 else:
-                    title = f"Spectrum (pixels {roi_min:.0f}-{roi_max:.0f})"
+                    title = f"Spectrum (pixels {axis.roi_min:.0f}-{axis.roi_max:.0f})"
             
             if hasattr(self, 'spectrum_ax'):
-                self.spectrum_ax.set_xlabel(xlabel, color='white', fontsize=10)
+                self.spectrum_ax.set_xlabel(axis.xlabel, color='white', fontsize=10)
                 self.spectrum_ax.set_title(title, color='white', fontsize=12)
                 
         except Exception:
@@ -2563,6 +2593,8 @@ class SpektrometerApp(CustomTk):
             if hasattr(self, 'spectrum_line'):
                 self.spectrum_line.set_xdata(self.x_axis)
                 self.spectrum_line.set_ydata(self.spectrum_data)
+                self._update_peak_markers()
+                self._update_saturation_overlay()
                 
                 if hasattr(self, 'x_axis') and len(self.x_axis) > 0:
                     self.spectrum_ax.set_xlim(self.x_axis[0], self.x_axis[-1])
@@ -2589,6 +2621,81 @@ class SpektrometerApp(CustomTk):
         except Exception:
             pass
 
+    def _update_peak_markers(self):
+        """Markers and label for the tracked peaks (empty when tracking is off)."""
+        tracker = getattr(self, 'peak_tracker', None)
+        if tracker is None or not hasattr(self, 'peak_markers'):
+            return
+        center, fwhm, amplitude = tracker.center, tracker.fwhm, tracker.amplitude
+        if not self.peak_tracking_var.get() or center is None:
+            self.peak_markers.set_data([], [])
+            self.peak_label.config(text="")
+            return
+        ok = np.isfinite(center)
+        # Marker nad wierzchołkiem piku (amplituda jest liczona nad tłem)
+        heights = np.interp(center[ok], self.x_axis, self.spectrum_data) if len(self.x_axis) == len(self.spectrum_data) else amplitude[ok]
+        self.peak_markers.set_data(center[ok], heights)
+        unit = "nm" if getattr(self, 'spectrum_axis_calibrated', False) else "px"
+        self.peak_label.config(text="  ".join(f"{c:.2f}/{w:.2f} {unit}" for c, w in zip(center[ok][:4], fwhm[ok][:4])))
+
+    def _update_saturation_overlay(self):
+        """Red ticks over saturated spectrum points and the saturated/hot pixel count."""
+        monitor = getattr(self, 'saturation_monitor', None)
+        if monitor is None or not hasattr(self, 'saturation_markers'):
+            return
+        mask = self.saturation_mask
+        if (mask is not None and self.saturation_overlay_var.get()
+                and len(mask) == len(self.spectrum_data) == len(self.x_axis)):
+            self.saturation_markers.set_data(np.asarray(self.x_axis)[mask], np.asarray(self.spectrum_data)[mask])
+        else:
+            self.saturation_markers.set_data([], [])
+        text = f"SATURATED {monitor.pixels} px / {monitor.columns} col" if monitor.pixels else ""
+        if monitor.hot:
+            text += f"  hot {monitor.hot} px"
+        self.saturation_label.config(text=text.strip())
+
+    def _apply_live_filter(self):
+        """Replace the live spectrum filter (new, empty state) after a settings change."""
+        try:
+            frames = max(1, int(self.live_filter_frames_var.get()))
+            alpha = min(1.0, max(0.001, float(self.live_filter_alpha_var.get())))
+        except Exception:
+            frames, alpha = 8, 0.2
+        self.live_filter_frames_var.set(frames)
+        self.live_filter_alpha_var.set(alpha)
+        self.live_filter = make_filter(self.live_filter_var.get(), frames, alpha)
+        self.save_options()
+
+    def _on_peak_tracking_toggle(self):
+        self.peak_tracker.reset()
+        self.save_options()
+
+    def save_peak_series(self):
+        """Save the tracked peak time series (centre, FWHM, amplitude) to CSV"""
+        t, center, fwhm, amplitude = self.peak_tracker.series()
+        if len(t) == 0:
+            messagebox.showinfo("Info", "No tracked peaks")
+            return
+        filename = filedialog.asksaveasfilename(
+            title="Save Peaks",
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+        )
+        if not filename:
+            return
+        try:
+            n = center.shape[1]
+            with open(filename, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(["time_s"] + [f"center_{i}" for i in range(n)]
+                                + [f"fwhm_{i}" for i in range(n)] + [f"amplitude_{i}" for i in range(n)])
+                for k in range(len(t)):
+                    writer.writerow([round(float(t[k] - t[0]), 3)] + [round(float(v), 4) for v in
+                                                                       np.concatenate([center[k], fwhm[k], amplitude[k]])])
+            print(f"Peaks saved: {filename} ({len(t)} samples)")
+        except Exception as e:
+            print(f"Peak save error: {e}")
+
     def init_pixelink(self):
         try:
             self._set_pixelink_status("Connecting...", 'orange')
@@ -2665,6 +2772,9 @@ class SpektrometerApp(CustomTk):
             print("Sequence stop requested - cleanup will follow")
 
     def start_measurement_sequence(self):
+        if getattr(self, '_queue_running', False):
+            print("Scan queue is running - stop it first")
+            return
         print("Starting measurement sequence...")
         
         # Check hardware availability using status variables
@@ -2682,6 +2792,189 @@ class SpektrometerApp(CustomTk):
             return
         
         # Zablokuj edycję ROI na czas sekwencji, żeby format danych był stały
+        self._lock_roi_controls()
+
+        # Start sequence immediately - the sequence logic will handle missing components
+        self._start_sequence_thread()
+
+    def resume_measurement_sequence(self):
+        """Wznów ostatnią przerwaną sekwencję od ostatniego ukończonego punktu."""
+        if getattr(self, '_sequence_running', False):
+            print("Sequence already running")
+            return
+
+        states = find_interrupted()
+        if not states:
+            messagebox.showinfo("Resume Sequence", "No interrupted sequences to resume")
+            return
+
+        state = states[0]
+        total = int(state.get('points_x', 0)) * int(state.get('points_y', 0))
+        if not messagebox.askyesno(
+            "Resume Sequence",
+            f"Resume session {state.get('session_id')}?\n\n"
+            f"{state.get('completed_count', 0)}/{total} points measured (last update {state.get('updated', '?')}).\n"
+            "The stage will be re-homed and moved back to the scan center."
+        ):
+            return
+
+        self._lock_roi_controls()
+        self._start_sequence_thread(resume_state=state)
+
+    def _get_scan_queue(self):
+        if getattr(self, 'scan_queue', None) is None:
+            self.scan_queue = ScanQueue()
+        return self.scan_queue
+
+    def open_scan_queue(self):
+        """Okno kolejki zadań skanowania."""
+        window = getattr(self, 'scan_queue_window', None)
+        try:
+            if window is not None and window.winfo_exists():
+                window.lift()
+                return
+        except Exception:
+            pass
+        self.scan_queue_window = ScanQueueWindow(self, self._get_scan_queue())
+
+    def _refresh_scan_queue_window(self):
+        window = getattr(self, 'scan_queue_window', None)
+        try:
+            if window is not None and window.winfo_exists():
+                window.refresh()
+        except Exception:
+            pass
+
+    def job_from_current_settings(self, name='', offset_x=0.0, offset_y=0.0, frames_per_point=1, starting_corner='nearest'):
+        """Zadanie kolejki z bieżących ustawień skanu (obszar, kroki, czasy, tryb)."""
+        try:
+            exposures_ms = self._get_sequence_exposure_list_ms()
+        except Exception:
+            exposures_ms = [self._get_effective_sequence_exposure_ms()]
+        return ScanJob(
+            name=name,
+            offset_x=float(offset_x),
+            offset_y=float(offset_y),
+            width=float(self.scan_width.get()),
+            height=float(self.scan_height.get()),
+            step_x=int(self.step_x.get()),
+            step_y=int(self.step_y.get()),
+            exposures_ms=[float(e) for e in exposures_ms],
+            frames_per_point=max(1, int(frames_per_point)),
+            starting_corner=starting_corner,
+            scan_mode=self.scan_mode_var.get() if hasattr(self, 'scan_mode_var') else options.get('scan_mode', 'point'),
+            exposure_order=self.exposure_order_var.get() if hasattr(self, 'exposure_order_var') else options.get('exposure_order', 'point'),
+        )
+
+    def start_scan_queue(self):
+        """Uruchom oczekujące zadania kolejki jedno po drugim (bez operatora)."""
+        if getattr(self, '_sequence_running', False) or getattr(self, '_queue_running', False):
+            print("Sequence already running")
+            return
+        queue = self._get_scan_queue()
+        if queue.next_pending() is None:
+            messagebox.showinfo("Scan Queue", "No pending jobs in the queue")
+            return
+        if not getattr(self, 'motors_ready', False) and not getattr(self, 'pixelink_ready', False):
+            messagebox.showerror("Scan Queue", "Cannot start the queue:\n\nNo hardware available.")
+            return
+        self._queue_running = True
+        self._queue_stop_requested = False
+        threading.Thread(target=self._run_scan_queue, daemon=True).start()
+
+    def stop_scan_queue(self, now=False):
+        """Zatrzymaj kolejkę po bieżącym zadaniu (now=True – przerwij też bieżące)."""
+        if getattr(self, '_queue_running', False):
+            self._queue_stop_requested = True
+            print("Scan queue will stop after the current job")
+            if now:
+                self.stop_measurement_sequence()
+
+    def _run_scan_queue(self):
+        """Wątek kolejki: zadania po kolei, stolik jedzie prosto do następnego obszaru.
+
+        Pozycja stolika jest śledzona względem punktu startu kolejki (x w prawo,
+        y w dół – jak pos_x/pos_y w sekwencji). Po ostatnim zadaniu (albo po
+        zatrzymaniu) stolik wraca do punktu startu. Przy queue_rehome_every > 0
+        i zbazowanym stoliku co N zadań stolik jest bazowany, co kasuje błąd
+        pozycji narosły przez wiele godzin skanów.
+        """
+        queue = self._get_scan_queue()
+        mc = self.motor_controller
+        stage = [0.0, 0.0]
+        origin_abs = list(mc.position_um) if mc.connected and mc.homed else None
+        rehome_every = int(self.options.get('queue_rehome_every', 0))
+        speed = float(self.options.get('motor_speed', 2000.0))
+        speed_x = float(self.options.get('motor_speed_x', speed)) or speed
+        speed_y = float(self.options.get('motor_speed_y', speed)) or speed
+        try:
+            lens_mag = float(self.lens_magnification_var.get()) if hasattr(self, 'lens_magnification_var') else float(self.options.get('lens_magnification', 1.0))
+        except Exception:
+            lens_mag = float(self.options.get('lens_magnification', 1.0))
+        if lens_mag <= 0:
+            lens_mag = 1.0
+        jobs_done = 0
+        try:
+            while not self._queue_stop_requested:
+                job = queue.next_pending()
+                if job is None:
+                    break
+
+                if rehome_every > 0 and jobs_done > 0 and jobs_done % rehome_every == 0 and origin_abs is not None:
+                    print("🏠 Re-homing stage between queue jobs...")
+                    if not mc.home():
+                        print("ERROR: Stage homing failed - stopping the queue")
+                        break
+                    # Baza: position_um = (0, 0); y w position_um rośnie w górę
+                    stage = [-origin_abs[0], origin_abs[1]]
+
+                scan_width = int(job.width * lens_mag)
+                scan_height = int(job.height * lens_mag)
+                center = (float(job.offset_x), float(job.offset_y))
+                corner = job.starting_corner
+                if corner not in CORNERS:
+                    corner = nearest_corner(stage, center, scan_width, scan_height, speed_x, speed_y)
+
+                params = job.to_dict()
+                params.update({
+                    'starting_corner': corner,
+                    'center': center,
+                    'start_pos': (stage[0] - center[0], stage[1] - center[1]),
+                })
+                queue.update(job.job_id, status='running', message=f"corner {corner}")
+                self.after(0, self._refresh_scan_queue_window)
+                print(f"▶️  Queue job {jobs_done + 1}: {job.describe()}")
+
+                self._lock_roi_controls()
+                self._start_sequence_thread(job=params).join()
+
+                stage = list(params.get('end_pos', stage))
+                result = params.get('result', 'failed')
+                queue.update(job.job_id, status=result, filename=params.get('filename', ''),
+                             points_folder=params.get('points_folder', ''))
+                print(f"⏹️  Queue job {job.name}: {result}")
+                jobs_done += 1
+                self.after(0, self._refresh_scan_queue_window)
+                if params.get('stopped'):
+                    print("Scan queue stopped")
+                    break
+        except Exception as e:
+            print(f"Scan queue error: {e}")
+        finally:
+            # Powrót do punktu startu kolejki
+            try:
+                if mc.connected:
+                    if stage[0]:
+                        mc.move('l' if stage[0] > 0 else 'r', abs(stage[0]))
+                    if stage[1]:
+                        mc.move('u' if stage[1] > 0 else 'd', abs(stage[1]))
+            except Exception as e:
+                print(f"Error while returning to the queue start: {e}")
+            self._queue_running = False
+            print(f"Scan queue finished ({jobs_done} jobs run)")
+            self.after(0, self._refresh_scan_queue_window)
+
+    def _lock_roi_controls(self):
         try:
             if hasattr(self, 'spectrum_range_min_entry'):
                 self.spectrum_range_min_entry.config(state=DISABLED)
@@ -2693,14 +2986,139 @@ class SpektrometerApp(CustomTk):
                 self.spectrum_apply_btn.config(state=DISABLED)
         except Exception:
             pass
-
-        # Start sequence immediately - the sequence logic will handle missing components
-        self._start_sequence_thread()
     
-    def _start_sequence_thread(self):
-        """Start the actual measurement sequence in thread"""
+    def _sequence_config(self, resume_state=None, job=None):
+        """SequenceConfig (sequence_engine.py) from the Settings fields.
+
+        resume_state - checkpoint of an interrupted sequence: parameters stored there;
+        job - scan queue job: its area, steps, exposures and corner, no preview.
+        """
+        if resume_state:
+            return SequenceConfig.from_checkpoint(resume_state, self.options)
+
+        # Lista czasów ekspozycji w sekwencji (ms)
+        try:
+            exposures_ms = self._get_sequence_exposure_list_ms()
+        except Exception:
+            # awaryjnie spróbuj chociaż pojedynczej wartości
+            try:
+                exposures_ms = [self._get_effective_sequence_exposure_ms()]
+            except Exception:
+                exposures_ms = [10.0]
+
+        # User enters scan width/height in sample plane; convert
+        # to stage travel using lens magnification.
+        try:
+            lens_mag = float(self.lens_magnification_var.get()) if hasattr(self, 'lens_magnification_var') else float(self.options.get('lens_magnification', 1.0))
+        except Exception:
+            lens_mag = float(self.options.get('lens_magnification', 1.0))
+        # Prevent non-positive magnification
+        if lens_mag <= 0:
+            lens_mag = 1.0
+
+        # Zamroź aktualne ROI dla całej sekwencji; self.x_axis jest już przycięte do ROI
+        roi_indices = getattr(self, 'spectrum_roi_indices', None)
+        axis = getattr(self, 'x_axis', None)
+        if axis is not None and roi_indices is not None and len(axis) != len(roi_indices):
+            axis = None
+
+        exposure_order = str(self.options.get('exposure_order', 'point'))
+        if hasattr(self, 'exposure_order_var'):
+            exposure_order = str(self.exposure_order_var.get())
+        scan_region = str(self.options.get('scan_region', '') or '')
+        if hasattr(self, 'scan_region_var'):
+            scan_region = str(self.scan_region_var.get() or '').strip()
+
+        config = SequenceConfig.from_options(
+            self.options,
+            step_x=max(1, int(self.step_x.get())),
+            step_y=max(1, int(self.step_y.get())),
+            scan_width=int(self.scan_width.get() * lens_mag),
+            scan_height=int(self.scan_height.get() * lens_mag),
+            lens_magnification=lens_mag,
+            exposures_ms=[float(e) for e in exposures_ms],
+            starting_corner=self.starting_corner.get(),
+            scan_mode=str(self.scan_mode_var.get() if hasattr(self, 'scan_mode_var') else self.options.get('scan_mode', 'point')),
+            exposure_order=exposure_order,
+            scan_region=scan_region,
+            roi_indices=None if roi_indices is None else [int(i) for i in roi_indices],
+            axis=None if axis is None else [float(a) for a in axis],
+            frame_calibration=bool(self.calibration_enabled_var.get()) if hasattr(self, 'calibration_enabled_var') else bool(self.options.get('frame_calibration', False)),
+            smile_correction=bool(self.smile_enabled_var.get()) if hasattr(self, 'smile_enabled_var') else bool(self.options.get('smile_correction', False)),
+            extraction='optimal' if hasattr(self, 'optimal_extraction_var') and self.optimal_extraction_var.get() else 'mean',
+        )
+        if job:
+            # Zadania z kolejki działają bez operatora – bez podglądu i bez powrotu do środka
+            config = replace(
+                config,
+                step_x=max(1, int(job['step_x'])),
+                step_y=max(1, int(job['step_y'])),
+                scan_width=int(float(job['width']) * lens_mag),
+                scan_height=int(float(job['height']) * lens_mag),
+                exposures_ms=[float(e) for e in job['exposures_ms']],
+                starting_corner=job['starting_corner'],
+                scan_mode=job.get('scan_mode', 'point'),
+                exposure_order=job.get('exposure_order', 'point'),
+                scan_region='',
+                frames_per_point=max(1, int(job['frames_per_point'])),
+                preview_perimeter=False,
+                return_to_center=False,
+                start_pos=tuple(job['start_pos']),
+                job_id=job['job_id'],
+            )
+        return config
+
+    def _confirm_area_from_thread(self):
+        """Show _confirm_area in the Tk thread and wait for the answer (sequence thread)."""
+        from threading import Event
+        confirm_event = Event()
+        confirm_result = {'ok': False}
+
+        def ask_confirm():
+            try:
+                # Bring main window to front so the confirm dialog is visible
+                try:
+                    self.lift()
+                    self.focus_force()
+                except Exception:
+                    pass
+                # Use existing helper that already handles CustomWindow/messagebox
+                result = self._confirm_area()
+            except Exception:
+                result = False
+            confirm_result['ok'] = bool(result)
+            confirm_event.set()
+
+        # Schedule confirmation dialog in UI thread and wait here
+        self.after(0, ask_confirm)
+        confirm_event.wait()
+        return confirm_result['ok']
+
+    def _usb_camera_frame(self):
+        """USB camera frame for drift compensation (None when the camera is off)."""
+        cm = getattr(self, 'camera_manager', None)
+        if cm is None or not cm.running:
+            return None
+        return cm.get_raw_frame()
+
+    def _start_sequence_thread(self, resume_state=None, job=None):
+        """Start the actual measurement sequence in thread.
+
+        The scan itself runs in SequenceEngine (sequence_engine.py); the GUI
+        builds its configuration, confirms the area and updates the buttons.
+        resume_state - checkpoint of an interrupted sequence (sequence_checkpoint.py);
+        the scan continues in the same files with the parameters stored there.
+        job - scan queue job (ScanJob fields + 'center' and 'start_pos', see
+        _run_scan_queue); runs without the perimeter preview and confirmation,
+        does not return to the center and writes 'result', 'filename',
+        'points_folder' and 'end_pos' back into the dict.
+        Returns the sequence thread.
+        """
+        if job is not None:
+            job['result'] = 'failed'
         
         def sequence():
+            result = None
             try:
                 self._sequence_running = True
                 self._sequence_stop_requested = False
@@ -2730,475 +3148,37 @@ class SpektrometerApp(CustomTk):
                 else:
                     print("✅ Both motors and PixeLink ready for sequence")
 
-                # Lista czasów ekspozycji w sekwencji (ms)
-                try:
-                    exposures_ms = self._get_sequence_exposure_list_ms()
-                    try:
-                        times_str = ", ".join(f"{e:.1f}" for e in exposures_ms)
-                        print(f"Sequence exposure times (ms): {times_str}")
-                    except Exception:
-                        pass
-                except Exception:
-                    # awaryjnie spróbuj chociaż pojedynczej wartości
-                    try:
-                        exposures_ms = [self._get_effective_sequence_exposure_ms()]
-                    except Exception:
-                        exposures_ms = [10.0]
-
-                # Zamroź aktualne ROI dla całej sekwencji
-                # (długość widma w pliku i w plikach punktowych = aktualny zakres, nie pełne 2048).
-                sequence_roi_indices = getattr(self, 'spectrum_roi_indices', None)
-
-                def apply_roi_for_sequence(spectrum_array):
-                    """Zastosuj ROI z chwili startu sekwencji (stałe dla całego skanu)."""
-                    try:
-                        if spectrum_array is None:
-                            return spectrum_array
-                        arr = np.asarray(spectrum_array)
-                        if sequence_roi_indices is None:
-                            return arr
-                        # Upewnij się, że nie wychodzimy poza długość tablicy
-                        valid_idx = [i for i in sequence_roi_indices if i < len(arr)]
-                        if not valid_idx:
-                            return arr
-                        return arr[valid_idx]
-                    except Exception:
-                        return np.asarray(spectrum_array)
-
-                # Przygotuj oś (lambda / piksele) dla aktualnego ROI – używana w plikach (x,y)
-                try:
-                    if hasattr(self, 'x_axis') and sequence_roi_indices is not None:
-                        base_axis = np.asarray(self.x_axis)
-                        axis_vals = base_axis[sequence_roi_indices]
-                    elif hasattr(self, 'x_axis'):
-                        axis_vals = np.asarray(self.x_axis)
-                    else:
-                        test_profile = np.zeros(2048)
-                        roi_profile = apply_roi_for_sequence(test_profile)
-                        axis_vals = np.arange(len(roi_profile), dtype=float)
-                except Exception:
-                    test_profile = np.zeros(2048)
-                    roi_profile = apply_roi_for_sequence(test_profile)
-                    axis_vals = np.arange(len(roi_profile), dtype=float)
-                
-                # Track current position relative to the CENTER of the area (in micrometers)
-                # We assume sequence always starts in the center.
-                pos_x = 0
-                pos_y = 0
-
-                def move_motor_tracked(direction, distance_um):
-                    """Move motors and track relative position from center (only if connected)."""
-                    nonlocal pos_x, pos_y
-                    if not motor_connected:
-                        # In simulation mode we do not physically move, but we also
-                        # do not change the logical position so that returning
-                        # to center is a no-op.
-                        return
-                    try:
-                        self.motor_controller.move(direction, distance_um)
-                        if direction == 'r':
-                            pos_x += distance_um
-                        elif direction == 'l':
-                            pos_x -= distance_um
-                        elif direction == 'd':
-                            pos_y += distance_um
-                        elif direction == 'u':
-                            pos_y -= distance_um
-                    except Exception as e:
-                        print(f"Motor move error (tracked): {e}")
-
-                def return_to_center():
-                    """Return stage to center based on tracked position."""
-                    nonlocal pos_x, pos_y
-                    if not motor_connected:
-                        return
-                    try:
-                        # First correct X
-                        if pos_x > 0:
-                            self.motor_controller.move('l', pos_x)
-                        elif pos_x < 0:
-                            self.motor_controller.move('r', -pos_x)
-                        # Then correct Y
-                        if pos_y > 0:
-                            self.motor_controller.move('u', pos_y)
-                        elif pos_y < 0:
-                            self.motor_controller.move('d', -pos_y)
-                    except Exception as e:
-                        print(f"Return to center error: {e}")
-                    finally:
-                        pos_x = 0
-                        pos_y = 0
-
-                # Create data folder
-                folder = "measurement_data"
-                os.makedirs(folder, exist_ok=True)
-                session_id = time.strftime('%Y%m%d_%H%M%S')
-                filename = os.path.join(folder, f"measurement_{session_id}_spectra.csv")
-                points_folder = os.path.join(folder, f"points_{session_id}")
-                os.makedirs(points_folder, exist_ok=True)
-                
-                # Get image dimensions for scan parameters
-                if hasattr(self, 'pixelink_image_data') and self.pixelink_image_data is not None:
-                    h, w = self.pixelink_image_data.shape[:2]
-                    x, y = 0, 0  # Start from top-left corner
-                else:
-                    # Default image size if no camera data
-                    w, h = 640, 480
-                    x, y = 0, 0
-                    
-                step_x = self.step_x.get()
-                step_y = self.step_y.get()
-                
-                # Calculate number of scan points
-                nx = max(1, (w // step_x) + 1)
-                ny = max(1, (h // step_y) + 1)
-                total_points = nx * ny
-                
-                print(f"Scan area: {w}x{h} px, starting from ({x}, {y})")
-                print(f"Scan points: {nx} x {ny} = {total_points} points")
-                
-                # Initialize progress tracking
-                start_time = time.time()
-                scan_completed = False
-                
-                with open(filename, "w", newline="") as f:
-                    writer = csv.writer(f)
-                    
-                    # NO HEADER - format compatible with existing measurements
-                    # Format: x_pixel, y_pixel, spectrum_value_0, spectrum_value_1, ...
-                    
-                    # Use settings from options.json for scanning area
-                    scan_step_x = self.step_x.get()
-                    scan_step_y = self.step_y.get()
-
-                    # User enters scan width/height in sample plane; convert
-                    # to stage travel using lens magnification.
-                    sample_width = self.scan_width.get()
-                    sample_height = self.scan_height.get()
-                    try:
-                        lens_mag = float(self.lens_magnification_var.get()) if hasattr(self, 'lens_magnification_var') else float(self.options.get('lens_magnification', 1.0))
-                    except Exception:
-                        lens_mag = float(self.options.get('lens_magnification', 1.0))
-                    # Prevent non-positive magnification
-                    if lens_mag <= 0:
-                        lens_mag = 1.0
-
-                    scan_width = int(sample_width * lens_mag)
-                    scan_height = int(sample_height * lens_mag)
-                    
-                    # Calculate number of points in each direction
-                    points_x = (scan_width // scan_step_x) + 1
-                    points_y = (scan_height // scan_step_y) + 1
-                    total_points = points_x * points_y
-                    
-                    starting_corner = self.starting_corner.get()
-                    
-                    offset_x = -scan_width // 2
-                    offset_y = -scan_height // 2
-                    
-                    if starting_corner == 'top-right':
-                        offset_x = scan_width // 2
-                        offset_y = -scan_height // 2
-                    elif starting_corner == 'bottom-left':
-                        offset_x = -scan_width // 2
-                        offset_y = scan_height // 2
-                    elif starting_corner == 'bottom-right':
-                        offset_x = scan_width // 2
-                        offset_y = scan_height // 2
-                    
-                    # Helper: perform a preview perimeter pass (end at starting corner)
-                    def preview_perimeter():
-                        try:
-                            print("🔁 Performing perimeter pass around scan area...")
-
-                            # 1) Move from current center to selected starting corner of scan area
-                            if offset_x != 0:
-                                dir_x = 'l' if offset_x < 0 else 'r'
-                                move_motor_tracked(dir_x, abs(offset_x))
-                            if offset_y != 0:
-                                dir_y = 'u' if offset_y < 0 else 'd'
-                                move_motor_tracked(dir_y, abs(offset_y))
-
-                            # Allow motors to finish initial move
-                            time.sleep(1)
-
-                            # 2) Perimeter pass: drive around the edges of the scan area once
-                            perim_moves = []
-                            if starting_corner == 'top-left':
-                                perim_moves = [('r', scan_width), ('d', scan_height), ('l', scan_width), ('u', scan_height)]
-                            elif starting_corner == 'top-right':
-                                perim_moves = [('l', scan_width), ('d', scan_height), ('r', scan_width), ('u', scan_height)]
-                            elif starting_corner == 'bottom-left':
-                                perim_moves = [('r', scan_width), ('u', scan_height), ('l', scan_width), ('d', scan_height)]
-                            elif starting_corner == 'bottom-right':
-                                perim_moves = [('l', scan_width), ('u', scan_height), ('r', scan_width), ('d', scan_height)]
-
-                            # Execute perimeter moves with small pauses for stabilization
-                            for d, s in perim_moves:
-                                print(f"➡️ Perimeter move: {d} {s} μm")
-                                try:
-                                    move_motor_tracked(d, s)
-                                except Exception as _e:
-                                    print(f"Perimeter move failed: {_e}")
-                                # small delay to allow mechanical movement (may be adjusted)
-                                time.sleep(0.2)
-                            print("🔁 Perimeter pass completed")
-                            print("✅ Preview finished, stage at starting corner")
-                        except Exception as e:
-                            print(f"Perimeter pass error: {e}")
-
-                    # Perform preview perimeter pass if motor controller is connected
-                    # (use low-level connection flag, not the higher-level status).
-                    if motor_connected:
-                        preview_perimeter()
-
-                    # After perimeter pass, confirm that the scanned area is correct
-                    # We must show the dialog in the main Tk thread.
-                    from threading import Event
-                    confirm_event = Event()
-                    confirm_result = {'ok': False}
-
-                    def ask_confirm():
-                        try:
-                            # Bring main window to front so the confirm dialog is visible
-                            try:
-                                self.lift()
-                                self.focus_force()
-                            except Exception:
-                                pass
-                            # Use existing helper that already handles CustomWindow/messagebox
-                            result = self._confirm_area()
-                        except Exception:
-                            result = False
-                        confirm_result['ok'] = bool(result)
-                        confirm_event.set()
-
-                    # Schedule confirmation dialog in UI thread and wait here
-                    self.after(0, ask_confirm)
-                    confirm_event.wait()
-
-                    if not confirm_result['ok']:
-                        print("Sequence cancelled by user after area preview. Returning to center...")
-                        # User rejected area - explicitly return to center
-                        if motor_connected:
-                            return_to_center()
-                        return
+                engine = SequenceEngine(
+                    self._sequence_config(resume_state, job),
+                    spectrometer=getattr(self, 'spectrometer_manager', None),
+                    motors=getattr(self, 'motor_controller', None),
+                    # Klatka z podglądu PixeLink, awaryjnie aktualne widmo z GUI
+                    frame_source=lambda: getattr(self, 'pixelink_image_data', None),
+                    spectrum_fallback=lambda: getattr(self, 'spectrum_data', None),
+                    confirm_area=self._confirm_area_from_thread,
+                    should_stop=lambda: self._sequence_stop_requested,
+                    camera_frame_source=self._usb_camera_frame,
+                    calibration=self.frame_calibration,
+                )
+                result = engine.run(resume_state)
 
-                    # User confirmed area: we are already at the starting corner
-                    # (if motors are connected), so we can start the scan immediately.
-                    if motor_connected:
-                        # Small pause to let mechanics settle before measurements
-                        time.sleep(1)
-
-                    point_index = 0
-
-                    # Main scanning loop (snake pattern)
-                    for iy in range(points_y):
-                        # Check for stop request
-                        if self._sequence_stop_requested:
-                            break
-
-                        # Czy startujemy od lewej strony próbki?
-                        left_side_start = starting_corner in ['top-left', 'bottom-left']
-
-                        # Ustal kierunek przebiegu wiersza (snake)
-                        if iy % 2 == 0:
-                            # Parzysty wiersz: bazowy kierunek
-                            if left_side_start:
-                                x_range = range(points_x)
-                            else:
-                                x_range = range(points_x - 1, -1, -1)
-                        else:
-                            # Nieparzysty wiersz: odwrócony kierunek
-                            if left_side_start:
-                                x_range = range(points_x - 1, -1, -1)
-                            else:
-                                x_range = range(points_x)
-
-                        last_ix_in_row = x_range[-1]
-
-                        for ix in x_range:
-                            # Check for stop request
-                            if self._sequence_stop_requested:
-                                break
-
-                            point_index += 1
-
-                            # Oblicz fizyczny indeks kolumny/rzędu niezależny
-                            # od kierunku snake i wybranego narożnika.
-                            if starting_corner in ['top-left', 'bottom-left']:
-                                # Lewe narożniki: X rośnie od lewej do prawej
-                                if iy % 2 == 0:
-                                    phys_x = ix
-                                else:
-                                    phys_x = (points_x - 1) - ix
-                            else:
-                                # Prawe narożniki: X rośnie też od lewej do prawej
-                                if iy % 2 == 0:
-                                    phys_x = (points_x - 1) - ix
-                                else:
-                                    phys_x = ix
-
-                            if starting_corner in ['top-left', 'top-right']:
-                                # Górne narożniki: Y rośnie z góry na dół
-                                phys_y = iy
-                            else:
-                                # Dolne narożniki: odwróć oś Y tak, aby 0 było u góry
-                                phys_y = (points_y - 1) - iy
-
-                            grid_x = int(phys_x)
-                            grid_y = int(phys_y)
-                            
-                            # Zbierz widma dla wszystkich czasów ekspozycji w tym punkcie
-                            spectra_for_point = []
-
-                            for exp_ms in exposures_ms:
-                                # Umożliw natychmiastowe przerwanie również w trakcie listy czasów
-                                if self._sequence_stop_requested:
-                                    break
-
-                                # Ustaw ekspozycję w kamerze (tylko na warstwie API, bez dotykania GUI)
-                                try:
-                                    if hasattr(self, 'spectrometer_manager') and self.spectrometer_manager:
-                                        self.spectrometer_manager.set_exposure(exp_ms)
-                                except Exception as e:
-                                    print(f"Exposure set error in sequence: {e}")
-
-                                # Smart delay bazujący na aktualnym czasie ekspozycji
-                                exposure_time_ms = float(exp_ms)
-                                exposure_time_s = exposure_time_ms / 1000.0
-                                min_frame_time = exposure_time_s + 0.1  # ekspozycja + ~100 ms buforu
-                                configured_sleep = float(self.options.get('sequence_sleep', 0.5))
-                                actual_sleep = max(configured_sleep, min_frame_time)
-
-                                print(f"🕒 Point ({grid_x},{grid_y}) exp {exposure_time_ms:.1f} ms -> wait {actual_sleep:.2f}s")
-                                time.sleep(actual_sleep)
-
-                                # Acquire fresh spectrum data from current camera frame
-                                if hasattr(self, 'pixelink_image_data') and self.pixelink_image_data is not None:
-                                    frame = self.pixelink_image_data
-                                    if len(frame.shape) == 3:  # Color image
-                                        frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                                    else:
-                                        frame_gray = frame
-
-                                    # Calculate spectrum by averaging vertically (horizontal profile)
-                                    spectrum_profile = np.mean(frame_gray, axis=0)
-
-                                    # Resample to 2048 points jeśli potrzeba (bazowa oś)
-                                    if len(spectrum_profile) != 2048:
-                                        x_old = np.linspace(0, 1, len(spectrum_profile))
-                                        x_new = np.linspace(0, 1, 2048)
-                                        spectrum_profile = np.interp(x_new, x_old, spectrum_profile)
-
-                                    # Zastosuj ROI zamrożone przy starcie sekwencji
-                                    spectrum_roi = apply_roi_for_sequence(spectrum_profile)
-                                else:
-                                    # Fallback do aktualnego widma z GUI lub zera
-                                    if hasattr(self, 'spectrum_data') and self.spectrum_data is not None and len(self.spectrum_data) > 0:
-                                        spectrum_roi = np.asarray(self.spectrum_data).copy()
-                                    else:
-                                        print("⚠️  Warning: No spectrum data available, using dummy data")
-                                        spectrum_roi = np.zeros_like(axis_vals, dtype=float)
-
-                                spectra_for_point.append(spectrum_roi)
-
-                            if not spectra_for_point:
-                                continue
-
-                            # Dla kompatybilności z istniejącym GUI zapisujemy w głównym pliku
-                            # tylko widmo dla pierwszego czasu ekspozycji.
-                            primary_spectrum = spectra_for_point[0]
-
-                            # Save measurement data with grid coordinates (x_pixel, y_pixel, spectrum_values)
-                            writer.writerow([grid_x, grid_y] + primary_spectrum.tolist())
-
-                            # Dodatkowo zapisz osobny plik dla tego punktu (x,y) z kolumnami:
-                            # lambda, I_t1, I_t2, ...
-                            try:
-                                point_file = os.path.join(points_folder, f"point_x{grid_x}_y{grid_y}.csv")
-                                with open(point_file, "w", newline="") as pf:
-                                    pw = csv.writer(pf)
-                                    header = ["lambda"] + [f"I_{exp:.1f}ms" for exp in exposures_ms]
-                                    pw.writerow(header)
-
-                                    for idx in range(len(axis_vals)):
-                                        row = [float(axis_vals[idx])]
-                                        for spec in spectra_for_point:
-                                            row.append(float(spec[idx]))
-                                        pw.writerow(row)
-                            except Exception as e:
-                                print(f"Error writing point file for ({grid_x},{grid_y}): {e}")
-                            
-                            # Progress update
-                            elapsed = time.time() - start_time
-                            progress = (point_index / total_points) * 100
-                            eta = (elapsed / point_index * (total_points - point_index)) if point_index > 0 else 0
-                            eta_str = self._format_seconds_hms(eta)
-
-                            print(
-                                f"📊 Punkt {point_index}/{total_points} ({progress:.1f}%) - "
-                                f"Siatka: ({grid_x}, {grid_y}) μm - ETA: {eta_str}"
-                            )
-                            
-                            # RUCH: przejście do kolejnego punktu siatki (po wykonaniu wszystkich ekspozycji w punkcie)
-                            if ix != last_ix_in_row:
-                                # Ruch w poziomie w obrębie tego samego wiersza
-                                if starting_corner in ['top-left', 'bottom-left']:
-                                    if iy % 2 == 0:
-                                        move_motor_tracked('r', scan_step_x)  # Even row: right
-                                    else:
-                                        move_motor_tracked('l', scan_step_x)  # Odd row: left
-                                else:
-                                    if iy % 2 == 0:
-                                        move_motor_tracked('l', scan_step_x)  # Even row: left
-                                    else:
-                                        move_motor_tracked('r', scan_step_x)  # Odd row: right
-                            elif iy != points_y - 1:
-                                # Koniec wiersza, przejście w pionie do kolejnego
-                                if starting_corner in ['top-left', 'top-right']:
-                                    move_motor_tracked('d', scan_step_y)
-                                else:
-                                    move_motor_tracked('u', scan_step_y)
-
-                            # Krótka pauza na ustabilizowanie po ruchu
-                            time.sleep(0.01)
-                
-                # If we reached this point and no stop was requested, the scan finished
-                if not self._sequence_stop_requested:
-                    total_time = time.time() - start_time
-                    print("SCAN COMPLETED!")
-                    print(f"Saved {total_points} measurements to: {filename}")
-                    total_str = self._format_seconds_hms(total_time)
-                    print(f"Scan time: {total_str}")
-                    scan_completed = True
+                if result['status'] in ('completed', 'interrupted'):
                     self.after(100, self.load_measurements)
+                # Zmierzony czas zmiany ekspozycji (PxLApi.setFeature) – dla planera skanu
+                if result['exposure_change_time'] is not None:
+                    self.options['exposure_change_time'] = result['exposure_change_time']
                 
             except Exception as e:
                 print(f"Sequence error: {e}")
             finally:
-                # Always try to return to the center of the scan area
-                try:
-                    print("🔙 Returning to center position...")
-                    return_to_center()
-                    print("✅ Returned to center")
-                except Exception as e:
-                    print(f"Error while returning to center: {e}")
-
-                # If scan was interrupted, delete the incomplete file
-                if not scan_completed and 'filename' in locals():
-                    try:
-                        if os.path.exists(filename):
-                            os.remove(filename)
-                    except:
-                        pass
-                # Usuń również częściowo zapisane pliki punktowe
-                if not scan_completed and 'points_folder' in locals():
-                    try:
-                        if os.path.isdir(points_folder):
-                            shutil.rmtree(points_folder)
-                    except Exception as e:
-                        print(f"Error while removing point folder {points_folder}: {e}")
+                if job is not None and result is not None:
+                    # Zadanie z kolejki: następne zadanie rusza z bieżącej pozycji
+                    job['end_pos'] = (job['center'][0] + result['end_pos'][0], job['center'][1] + result['end_pos'][1])
+                    job['stopped'] = result['stopped']
+                    if result['status'] in ('completed', 'interrupted'):
+                        job['result'] = result['status']
+                    job['filename'] = result['filename']
+                    job['points_folder'] = result['points_folder']
                 
                 # Reset sequence flags and button states
                 self._sequence_running = False
@@ -3222,9 +3202,9 @@ class SpektrometerApp(CustomTk):
                     pass
         
         # Run sequence in separate thread regardless of motor connection
-        if not self.motor_controller.connected:
-            print("Motor controller not connected — running in simulation (no moves).")
-        threading.Thread(target=sequence, daemon=True).start()
+        thread = threading.Thread(target=sequence, daemon=True)
+        thread.start()
+        return thread
 
     def apply_settings(self):
         """Apply and save settings"""
@@ -3274,15 +3254,23 @@ class SpektrometerApp(CustomTk):
             'spectrum_range_min': float(self.spectrum_range_min_var.get()) if hasattr(self, 'spectrum_range_min_var') else options.get('spectrum_range_min', options.get('lambda_min', 0.0)),
             'spectrum_range_max': float(self.spectrum_range_max_var.get()) if hasattr(self, 'spectrum_range_max_var') else options.get('spectrum_range_max', options.get('lambda_max', 2048.0)),
             'sequence_exposure_times': self.sequence_exposure_var.get() if hasattr(self, 'sequence_exposure_var') else options.get('sequence_exposure_times', ""),
+            'scan_mode': self.scan_mode_var.get() if hasattr(self, 'scan_mode_var') else options.get('scan_mode', 'point'),
+            'exposure_order': self.exposure_order_var.get() if hasattr(self, 'exposure_order_var') else options.get('exposure_order', 'point'),
+            'scan_region': self.scan_region_var.get().strip() if hasattr(self, 'scan_region_var') else options.get('scan_region', ''),
+            'frame_calibration': bool(self.calibration_enabled_var.get()) if hasattr(self, 'calibration_enabled_var') else options.get('frame_calibration', False),
+            'smile_correction': bool(self.smile_enabled_var.get()) if hasattr(self, 'smile_enabled_var') else options.get('smile_correction', False),
+            'extraction': ('optimal' if self.optimal_extraction_var.get() else 'mean') if hasattr(self, 'optimal_extraction_var') else options.get('extraction', 'mean'),
+            'saturation_action': self.saturation_action_var.get() if hasattr(self, 'saturation_action_var') else options.get('saturation_action', 'flag'),
+            'raw_archive': bool(self.raw_archive_var.get()) if hasattr(self, 'raw_archive_var') else options.get('raw_archive', False),
             'await': 0.01
         }
         
         try:
+            # Zachowaj pozostałe klucze (np. camera_backend) – zapisujemy całość opcji
+            options.update(settings)
             with open('options.json', 'w') as f:
-                json.dump(settings, f, indent=4)
+                json.dump(options, f, indent=4)
             print("Settings saved successfully")
-            
-            options.update(settings)
 
             # Update spectrum axis and clear spectrum data to match new range
             try:
@@ -3295,7 +3283,9 @@ class SpektrometerApp(CustomTk):
             self.motor_controller.close()
             self.motor_controller = MotorController(
                 self.port_x_var.get(),
-                self.port_y_var.get()
+                self.port_y_var.get(),
+                options=options,
+                port_z=options.get('port_z') or None
             )
             # Force immediate motor status update
             self.after(100, self._update_motor_status)  # Szybsza aktualizacja
@@ -3303,7 +3293,8 @@ class SpektrometerApp(CustomTk):
             new_cam = settings.get('camera_index', 0)
             if new_cam != self.camera_index:
                 self.camera_manager.stop()
-                self.camera_manager = CameraManager(camera_index=new_cam)
+                self.camera_manager = CameraManager(camera_index=new_cam,
+                                                    motion_method=options.get('motion_estimator', 'phase'))
                 self.camera_index = new_cam
             
         except Exception as e:
@@ -3355,81 +3346,124 @@ class SpektrometerApp(CustomTk):
     # Removed unused helper functions
     
     def load_measurements(self):
-        """Load measurement files list without caching data"""
-        folder = "measurement_data"
-        self.measurement_files = []  # Store only filenames, not data
-        if not os.path.exists(folder):
-            os.makedirs(folder)
-        
-        # Just collect filenames - don't load data into memory
-        for filename in sorted(glob.glob(os.path.join(folder, "*_spectra.csv"))):
-            self.measurement_files.append(filename)
-            
-        self.draw_measurements()
-    
-    def _load_measurement_data_on_demand(self, filename):
-        """Load measurement data only when needed - optimized with numpy"""
-        data = []
-        try:
-            # Use numpy for faster loading of large files
-            raw_data = np.loadtxt(filename, delimiter=',')
-            if raw_data.ndim == 1:
-                raw_data = raw_data.reshape(1, -1)
-            
-            for row in raw_data:
-                if len(row) < 3:
-                    continue
-                x = int(row[0])
-                y = int(row[1])
-                spectrum = row[2:].tolist()
-                data.append([x, y, spectrum])
+        """Sync the measurement catalog with the data folder (background) and show the current page"""
+        def worker():
+            try:
+                added, removed = self.catalog.sync()
+                if added or removed:
+                    print(f"Catalog: {added} sessions indexed, {removed} removed")
+            except Exception as e:
+                print(f"Catalog sync error: {e}")
+            self.after(0, self._query_measurements)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _results_filter(self):
+        """Catalog query arguments from the Results tab controls."""
+        if not hasattr(self, 'results_filter_var'):
+            return {}
+        return {
+            'text': self.results_filter_var.get().strip(),
+            'status': self.results_status_var.get(),
+            'sort': self.results_sort_var.get(),
+            'descending': bool(self.results_desc_var.get()),
+        }
+
+    def _query_measurements(self, page=None):
+        """One page of sessions from the catalog (filter, sort, paging done in SQLite)."""
+        page_size = max(1, int(self.options.get('results_page_size', 500)))
+        query = self._results_filter()
+        try:
+            self.results_total = self.catalog.count(query.get('text', ''), query.get('status', 'all'))
+            pages = max(1, (self.results_total + page_size - 1) // page_size)
+            self.results_page = min(max(0, self.results_page if page is None else page), pages - 1)
+            self.measurement_rows = self.catalog.query(limit=page_size, offset=self.results_page * page_size, **query)
         except Exception as e:
-            print(f"Error loading file {filename}: {e}")
-        return data
+            print(f"Catalog query error: {e}")
+            self.measurement_rows = []
+        self.measurement_files = [r['filename'] for r in self.measurement_rows]
+        self.draw_measurements()
+
+    def _filtered_measurement_files(self):
+        """All sessions matching the current filter, in display order."""
+        return [r['filename'] for r in self.catalog.query(**self._results_filter())]
     
     def export_measurements(self):
-        """Export all measurements to a single file"""
-        if not self.measurement_files:
+        """Export filtered measurements in the background (CSV / NPZ / float32 cube / ENVI)"""
+        if getattr(self, '_export_cancel', None) is not None:
+            messagebox.showinfo("Info", "Export already running")
+            return
+        files = self._filtered_measurement_files()
+        if not files:
             messagebox.showinfo("Info", "No measurements to export")
             return
         
-        # Ask for save location
+        # Format z rozszerzenia pliku (przy kilku sesjach formaty binarne: plik na sesję)
         filename = filedialog.asksaveasfilename(
             title="Export Measurements",
             defaultextension=".csv",
-            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+            filetypes=EXPORT_FILETYPES + [("All files", "*.*")]
         )
-        
-        if filename:
+        if not filename:
+            return
+        fmt = format_for(filename)
+        opts = dict(self.options)
+        cancel = threading.Event()
+        self._export_cancel = cancel
+        self._export_progress_at = 0.0
+        self.export_cancel_btn.config(state=NORMAL)
+        self.results_info.config(text=f"Export {fmt}: 0%")
+
+        def progress(done, total):
+            # Odświeżenie etykiety najwyżej kilka razy na sekundę
+            now = time.time()
+            if now - self._export_progress_at >= 0.2 or done >= total:
+                self._export_progress_at = now
+                pct = 100.0 * done / total if total else 100.0
+                self.after(0, lambda: self.results_info.config(text=f"Export {fmt}: {pct:.0f}% ({done}/{total})"))
+
+        def worker():
             try:
-                with open(filename, 'w', newline='') as f:
-                    writer = csv.writer(f)
-                    
-                    # NO HEADER - compatible format: x_pixel, y_pixel, spectrum_values
-                    # writer.writerow(['measurement_id', 'x', 'y'] + [f'wavelength_{i}' for i in range(2048)])
-                    
-                    # Write all measurements - load on demand
-                    for measurement_id, measurement_file in enumerate(self.measurement_files):
-                        measurement_data = self._load_measurement_data_on_demand(measurement_file)
-                        for point in measurement_data:
-                            x, y, spectrum = point
-                            writer.writerow([x, y] + spectrum)
-                    
-                    messagebox.showinfo("Success", f"Measurements exported to:\n{filename}")
-                    
+                written = export_sessions(files, filename, fmt, opts, progress=progress, cancel=cancel)
+                result = ('ok', written)
+            except ExportCancelled:
+                result = ('cancelled', None)
             except Exception as e:
                 print(f"Export error: {e}")
-                messagebox.showerror("Error", f"Cannot export measurements:\n{e}")
+                result = ('error', e)
+            self.after(0, lambda: self._export_finished(*result))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def cancel_export(self):
+        """Stop the running export after the current chunk (partial files are removed)"""
+        cancel = getattr(self, '_export_cancel', None)
+        if cancel is not None:
+            cancel.set()
+            self.results_info.config(text="Export: cancelling...")
+
+    def _export_finished(self, status, result):
+        self._export_cancel = None
+        self.export_cancel_btn.config(state=DISABLED)
+        self._update_results_info()
+        if status == 'ok':
+            shown = "\n".join(result[:10]) + (f"\n... ({len(result)} files)" if len(result) > 10 else "")
+            messagebox.showinfo("Success", f"Measurements exported to:\n{shown}")
+        elif status == 'cancelled':
+            messagebox.showinfo("Info", "Export cancelled")
+        else:
+            messagebox.showerror("Error", f"Cannot export measurements:\n{result}")
 
     def delete_all_measurements(self):
         """Delete all measurements"""
-        if not self.measurement_files:
+        total = self.catalog.count()
+        if not total:
             messagebox.showinfo("Info", "No measurements to delete")
             return
         
         result = messagebox.askyesno(
             "Delete All Measurements",
-            f"Are you sure you want to delete all {len(self.measurement_files)} measurements?\n"
+            f"Are you sure you want to delete all {total} measurements?\n"
             "This action cannot be undone!"
         )
         
@@ -3437,15 +3471,18 @@ class SpektrometerApp(CustomTk):
             try:
                 folder = "measurement_data"
                 deleted_count = 0
+                self.close_heatmap_windows()
                 
                 # Delete all CSV files
                 for filename in glob.glob(os.path.join(folder, "*_spectra.csv")):
                     if os.path.exists(filename):
                         os.remove(filename)
+                        remove_cube(filename)
+                        self.thumbnail_cache.forget(filename)
                         deleted_count += 1
                 
                 self.measurement_files.clear()
-                self.draw_measurements()
+                self.load_measurements()
                 
                 messagebox.showinfo("Success", f"Deleted {deleted_count} measurements")
                 
@@ -3465,86 +3502,188 @@ class SpektrometerApp(CustomTk):
             if result:
                 try:
                     file_to_delete = self.measurement_files[measurement_index]
+                    self.close_heatmap_windows(file_to_delete)
                     os.remove(file_to_delete)
-                    
-                    self.measurement_files.pop(measurement_index)
-                    self.draw_measurements()
+                    remove_cube(file_to_delete)
+                    self.catalog.remove(file_to_delete)
+                    self.thumbnail_cache.forget(file_to_delete)
+                    self._query_measurements()
                     
                 except Exception as e:
                     print(f"Error deleting measurement: {e}")
                     messagebox.showerror("Error", f"Cannot delete measurement:\n{e}")
 
+    # Kafelek zakładki Results (piksele płótna)
+    TILE_W = 190
+    TILE_H = 165
+    THUMB_SIZE = 96
+
     def draw_measurements(self):
-        """Draw measurement buttons in grid layout"""
-        # Clear existing buttons
-        for widget in self.results_frame.winfo_children():
-            widget.destroy()
-        
-        if not self.measurement_files:
-            # Show message if no measurements
-            Label(
-                self.results_frame, 
-                text="No measurements\nRun measurement sequence to create data",
-                bg=self.DGRAY, fg='lightgray', font=("Arial", 12),
-                justify=CENTER
-            ).grid(row=0, column=0, padx=20, pady=20)
-        else:
-            # Create grid of measurement buttons
-            buttons_per_row = 5  # Number of buttons per row
-            
-            for i, filename in enumerate(self.measurement_files):
-                row = i // buttons_per_row
-                col = i % buttons_per_row
-                
-                # Create button frame for better styling
-                button_frame = Frame(self.results_frame, bg=self.DGRAY, relief='raised', bd=1)
-                button_frame.grid(row=row, column=col, padx=5, pady=5, sticky='nsew')
-                
-                # Main button
-                btn = CButton(
-                    button_frame,
-                    text=f"Pomiar {i+1}",
-                    command=lambda idx=i: self.show_measurement_by_index(idx),
-                    width=12, height=2,
-                    font=("Arial", 10, "bold")
-                )
-                btn.pack(fill=BOTH, expand=True, padx=2, pady=2)
-                
-                # Info label with filename
-                basename = os.path.basename(filename)
-                info_label = Label(
-                    button_frame,
-                    text=basename.replace('_spectra.csv', ''),
-                    bg=self.RGRAY, fg='lightgray',
-                    font=("Arial", 8), justify=CENTER
-                )
-                info_label.pack(fill=X, padx=2, pady=(0, 2))
-                
-                # Delete button (small)
-                delete_btn = Button(
-                    button_frame,
-                    text="×",
-                    command=lambda idx=i: self.delete_measurement(idx),
-                    bg='darkred', fg='white', font=("Arial", 8, "bold"),
-                    width=2, height=1, bd=0
-                )
-                delete_btn.pack(side=RIGHT, anchor='ne', padx=2, pady=2)
-            
-            # Configure grid weights for proper resizing
-            for i in range(buttons_per_row):
-                self.results_frame.columnconfigure(i, weight=1)
-        
-        # Update info label
+        """Lay out the virtual tile grid for the current page; only visible tiles are drawn"""
+        canvas = self.results_canvas
+        n = len(self.measurement_files)
+        width = max(canvas.winfo_width(), self.TILE_W)
+        self._results_columns = max(1, width // self.TILE_W)
+        rows = (n + self._results_columns - 1) // self._results_columns
+        canvas.configure(scrollregion=(0, 0, self._results_columns * self.TILE_W, max(rows * self.TILE_H, 1)))
+        canvas.yview_moveto(0)
+        self._visible_range = None
+        self._draw_visible_tiles()
+
+        self._update_results_info()
+
+    def _update_results_info(self):
+        """Session count and page in the Results info label"""
         if hasattr(self, 'results_info'):
-            self.results_info.config(text=f"Pomiary: {len(self.measurement_files)}")
+            page_size = max(1, int(self.options.get('results_page_size', 500)))
+            pages = max(1, (self.results_total + page_size - 1) // page_size)
+            self.results_info.config(text=f"Pomiary: {self.results_total} (strona {self.results_page + 1}/{pages})")
+
+    def _draw_visible_tiles(self, force=False):
+        """(Re)draw only the tiles inside the visible part of the canvas."""
+        canvas = self.results_canvas
+        n = len(self.measurement_files)
+        cols = getattr(self, '_results_columns', 1)
+        top = canvas.canvasy(0)
+        bottom = top + canvas.winfo_height()
+        first = max(0, int(top // self.TILE_H)) * cols
+        last = min(n, (int(bottom // self.TILE_H) + 1) * cols)
+        if not force and self._visible_range == (first, last, n):
+            return
+        self._visible_range = (first, last, n)
+        self._visible_files = set(self.measurement_files[first:last])
+        canvas.delete("tile")
+        if n == 0:
+            canvas.create_text(20, 20, anchor='nw', tags="tile", fill='lightgray', font=("Arial", 12),
+                               text="No measurements\nRun measurement sequence to create data")
+            return
+        page_first = self.results_page * max(1, int(self.options.get('results_page_size', 500)))
+        for i in range(first, last):
+            self._draw_tile(i, page_first + i + 1)
+
+    def _draw_tile(self, i, number):
+        canvas = self.results_canvas
+        filename = self.measurement_files[i]
+        meta = self.measurement_rows[i] if i < len(self.measurement_rows) else {}
+        cols = self._results_columns
+        x0 = (i % cols) * self.TILE_W + 4
+        y0 = (i // cols) * self.TILE_H + 4
+        x1, y1 = x0 + self.TILE_W - 8, y0 + self.TILE_H - 8
+        partial = meta.get('status') == 'partial'
+        canvas.create_rectangle(x0, y0, x1, y1, fill=self.RGRAY, outline='orange' if partial else 'gray', tags="tile")
+        cx = (x0 + x1) // 2
+        thumb = self._thumbnails.get(filename)
+        if thumb is not None:
+            self._thumbnails.move_to_end(filename)
+            canvas.create_image(cx, y0 + 6 + self.THUMB_SIZE // 2, image=thumb, tags="tile")
+        else:
+            half = self.THUMB_SIZE // 2
+            canvas.create_rectangle(cx - half, y0 + 6, cx + half, y0 + 6 + self.THUMB_SIZE,
+                                    fill=self.DGRAY, outline='', tags="tile")
+            self.thumbnail_cache.request(filename, self._on_thumbnail_ready,
+                                         still_needed=lambda f: f in self._visible_files)
+        name = os.path.basename(filename).replace('_spectra.csv', '')
+        details = f"{meta.get('points_x') or '?'}×{meta.get('points_y') or '?'}, {meta.get('points') or 0} pts"
+        exposures = ", ".join(f"{e:g}" for e in meta.get('exposures') or [])
+        if exposures:
+            details += f", {exposures} ms"
+        canvas.create_text(cx, y0 + self.THUMB_SIZE + 10, anchor='n', tags="tile", fill='white',
+                           font=("Arial", 9, "bold"), text=f"Pomiar {number}")
+        canvas.create_text(cx, y0 + self.THUMB_SIZE + 26, anchor='n', tags="tile", width=self.TILE_W - 16,
+                           fill='orange' if partial else 'lightgray', font=("Arial", 7), justify=CENTER,
+                           text=name + (" (partial)" if partial else "") + "\n" + details)
+        # Usuwanie: "×" w prawym górnym rogu (obsługa kliknięcia w _on_results_click)
+        canvas.create_text(x1 - 4, y0 + 2, anchor='ne', tags="tile", fill='red', font=("Arial", 10, "bold"), text="×")
+
+    def _on_thumbnail_ready(self, filename, image):
+        """Thumbnail worker callback (worker thread) -> PhotoImage on the Tk thread."""
+        def show():
+            if image is None:
+                return
+            self._thumbnails[filename] = ImageTk.PhotoImage(image)
+            while len(self._thumbnails) > 400:
+                self._thumbnails.popitem(last=False)
+            # Jedno przerysowanie na serię gotowych miniatur
+            if not self._thumbnail_redraw:
+                self._thumbnail_redraw = True
+                self.after(50, self._redraw_after_thumbnails)
+        self.after(0, show)
+
+    def _redraw_after_thumbnails(self):
+        self._thumbnail_redraw = False
+        self._draw_visible_tiles(force=True)
+
+    def _on_results_click(self, event):
+        """Open (or delete via "×") the tile under the mouse."""
+        x = self.results_canvas.canvasx(event.x)
+        y = self.results_canvas.canvasy(event.y)
+        cols = getattr(self, '_results_columns', 1)
+        col, row = int(x // self.TILE_W), int(y // self.TILE_H)
+        if col >= cols:
+            return
+        i = row * cols + col
+        if not 0 <= i < len(self.measurement_files):
+            return
+        x1 = (col + 1) * self.TILE_W - 4
+        y0 = row * self.TILE_H + 4
+        if x > x1 - 20 and y < y0 + 18:
+            self.delete_measurement(i)
+        else:
+            self.show_measurement_by_index(i)
+
+    def close_heatmap_windows(self, filename=None):
+        """Zamknij okna HeatMapWindow sesji (wszystkie przy filename=None) – zwalnia memmap cube.f32."""
+        for window in list(self.heatmap_windows):
+            if filename is None or window.source_file == filename:
+                try:
+                    window.destroy()
+                except Exception:
+                    self.heatmap_windows.discard(window)
 
     def show_measurement_by_index(self, measurement_index):
-        """Show selected measurement by index - load data on demand"""
+        """Show selected measurement by index - float32 cube on disk, built on first open"""
         if 0 <= measurement_index < len(self.measurement_files):
             filename = self.measurement_files[measurement_index]
-            # Load data only when needed
-            measurement_data = self._load_measurement_data_on_demand(filename)
-            HeatMapWindow(self, measurement_index + 1, measurement_data)
+            missing_mode = self.options.get('heatmap_missing', 'interpolate')
+            chunk_rows = int(self.options.get('export_chunk_rows', 1000))
+            if cube_is_current(filename, missing_mode):
+                try:
+                    cube = open_cube(filename, missing_mode)
+                except Exception as e:
+                    print(f"Error opening cube for {filename}: {e}")
+                    messagebox.showerror("Error", f"Cannot open measurement:\n{e}")
+                    return
+                HeatMapWindow(self, measurement_index + 1, cube, source_file=filename)
+                return
+
+            # Pierwsze otwarcie: plik pomiaru przepisywany w tle do kostki float32 na dysku
+            if filename in self._cubes_building:
+                return
+            self._cubes_building.add(filename)
+            # Nieaktualna kostka (np. plik dopisany po wznowieniu) – stare okna trzymają jej memmap
+            self.close_heatmap_windows(filename)
+
+            def progress(done, total):
+                pct = 100.0 * done / total if total else 100.0
+                self.after(0, lambda: self.results_info.config(text=f"Preparing cube: {pct:.0f}%"))
+
+            def worker():
+                try:
+                    result = open_cube(filename, missing_mode, chunk_rows, progress)
+                except Exception as e:
+                    print(f"Error building cube for {filename}: {e}")
+                    result = e
+                self.after(0, lambda: opened(result))
+
+            def opened(result):
+                self._cubes_building.discard(filename)
+                self._update_results_info()
+                if isinstance(result, Exception):
+                    messagebox.showerror("Error", f"Cannot open measurement:\n{result}")
+                else:
+                    HeatMapWindow(self, measurement_index + 1, result, source_file=filename)
+
+            threading.Thread(target=worker, daemon=True).start()
 
     def move_motor(self, direction):
         """Manual motor movement function"""
@@ -3569,6 +3708,146 @@ class SpektrometerApp(CustomTk):
             self.motor_status.config(text=error_msg)
             print(f"Motor movement error: {e}")
 
+    def run_autofocus(self):
+        """Autofocus on the USB camera image with the focus motor (autofocus.py)"""
+        mc = self.motor_controller
+        if not getattr(mc, 'z_connected', False):
+            self.motor_status.config(text="Autofocus: focus motor (port_z) not connected")
+            return
+        if self._usb_camera_frame() is None:
+            self.motor_status.config(text="Autofocus: start the camera first")
+            return
+        if self._sequence_running:
+            return
+        self.motor_status.config(text="Autofocus running...")
+
+        def worker():
+            af = Autofocus(mc, self._usb_camera_frame,
+                           float(self.options.get('autofocus_range_um', 100.0)),
+                           float(self.options.get('autofocus_tol_um', 2.0)))
+            z = af.run()
+            text = f"Focus Z = {z:.1f} μm" if z is not None else "Autofocus failed"
+            self.after(0, lambda: self.motor_status.config(text=text))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def acquire_dark_frames(self):
+        """Master dark frames for every sequence exposure and the current one (slit covered)"""
+        sm = self.spectrometer_manager
+        if not sm.hCamera or self._sequence_running:
+            print("Dark frames: start the PixeLink camera first (no sequence running)")
+            return
+        if not messagebox.askyesno("Dark frames", "Cover the slit / close the shutter and continue?"):
+            return
+        current_ms = float(self.exposure_var.get())
+        exposures = sorted(set([round(float(e), 1) for e in self._get_sequence_exposure_list_ms()] + [round(current_ms, 1)]))
+        gain = float(self.gain_var.get())
+        count = int(self.options.get('calibration_frames', 16))
+
+        def worker():
+            try:
+                for exposure_ms in exposures:
+                    sm.set_exposure(exposure_ms)
+                    frames = collect_frames(sm, count)
+                    if frames:
+                        self.frame_calibration.save_dark(frames, exposure_ms, gain)
+                self.frame_calibration.update_bad_pixels(gain)
+            except Exception as e:
+                print(f"Dark frame error: {e}")
+            finally:
+                sm.set_exposure(current_ms)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def acquire_flat_field(self):
+        """Master flat field at the current exposure (uniform illumination)"""
+        sm = self.spectrometer_manager
+        if not sm.hCamera or self._sequence_running:
+            print("Flat field: start the PixeLink camera first (no sequence running)")
+            return
+        exposure_ms = float(self.exposure_var.get())
+        gain = float(self.gain_var.get())
+        count = int(self.options.get('calibration_frames', 16))
+
+        def worker():
+            try:
+                frames = collect_frames(sm, count)
+                if frames and self.frame_calibration.save_flat(frames, exposure_ms, gain) is not None:
+                    self.frame_calibration.update_bad_pixels(gain)
+            except Exception as e:
+                print(f"Flat field error: {e}")
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def fit_slit_curvature(self):
+        """Fit the slit-curvature (smile) model from a line-lamp frame (smile_correction.py)"""
+        sm = self.spectrometer_manager
+        if not sm.hCamera or self._sequence_running:
+            print("Slit curvature: start the PixeLink camera first (no sequence running)")
+            return
+        if not messagebox.askyesno("Slit curvature", "Illuminate the slit with a line lamp (Hg/Ne) and continue?"):
+            return
+        count = int(self.options.get('calibration_frames', 16))
+
+        def worker():
+            try:
+                frames = collect_frames(sm, count)
+                if not frames:
+                    return
+                model = SmileModel.fit(master_frame(frames))
+                if model is not None:
+                    self.frame_calibration.save_smile(model)
+            except Exception as e:
+                print(f"Slit curvature error: {e}")
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def fit_stripe_profile(self):
+        """Stripe profile for optimal extraction from the current bright frame (optimal_extraction.py)"""
+        frame = getattr(self, 'pixelink_image_data', None)
+        if frame is None:
+            print("Fit stripe: start the PixeLink camera first")
+            return
+        gray = np.asarray(frame)
+        smile = self._smile_model()
+        if smile is not None and smile.shape == gray.shape[:2]:
+            gray = smile.apply(gray)
+        stripe = StripeProfile.fit(gray)
+        if stripe is not None:
+            self.frame_calibration.save_stripe(stripe)
+            self.motor_status.config(text=f"Stripe: rows {stripe.row0}-{stripe.row1 - 1}")
+
+    def calibrate_wavelength(self):
+        """Polynomial pixel -> nm calibration from the current lamp spectrum (wavelength_calibration.py)"""
+        frame = getattr(self, 'pixelink_image_data', None)
+        if frame is None or self._sequence_running:
+            print("λ calibration: start the PixeLink camera first (no sequence running)")
+            return
+        lamp = str(self.options.get('lamp_lines', 'hg-ar'))
+        if lamp not in LAMP_LINES:
+            print(f"λ calibration: unknown lamp_lines '{lamp}' ({', '.join(LAMP_LINES)})")
+            return
+        if not messagebox.askyesno("Calibrate λ", f"Illuminate the slit with the {lamp} lamp and continue?"):
+            return
+        # Pełne widmo (bez ROI); bieżąca oś liniowa/wielomianowa jako przybliżenie
+        spectrum = frame_to_spectrum(frame, correction=self._frame_correction(frame), smile=self._smile_model())
+        guess = spectral_axis(dict(self.options, lambda_calibration_enabled=True)).base
+        result = calibrate(spectrum, LAMP_LINES[lamp], guess, degree=int(self.options.get('lambda_fit_degree', 3)))
+        if result is None:
+            messagebox.showwarning("Calibrate λ", "Not enough lamp lines matched - check lamp_lines and lambda_min/lambda_max")
+            return
+        coeffs, pairs, rms = result
+        base = spectral_axis(dict(self.options, lambda_calibration_enabled=True, lambda_coefficients=coeffs)).base
+        self.options['lambda_coefficients'] = coeffs
+        self.options['lambda_calibration_enabled'] = True
+        self.options['lambda_min'] = round(float(base[0]), 3)
+        self.options['lambda_max'] = round(float(base[-1]), 3)
+        self.save_options()
+        self._update_spectrum_axes()
+        self.spectrum_data = np.zeros(len(self.x_axis))
+        self._update_spectrum_plot()
+        self.motor_status.config(text=f"λ calibration: {len(pairs)} lines, RMS {rms:.3f} nm")
+
     # Duplicate cleanup removed; using unified cleanup above
 
     def _confirm_area(self):
@@ -0,0 +1,289 @@
+import os
+import glob
+import json
+import time
+import sqlite3
+from contextlib import contextmanager
+
+import numpy as np
+
+from sequence_checkpoint import load_checkpoint, points_folder_for
+
+"""Katalog pomiarów (SQLite) zamiast przeglądania folderu measurement_data.
+
+Zakładka Results globowała `*_spectra.csv` i nic o pomiarze nie było wiadomo
+bez czytania pliku. Teraz `measurement_data/catalog.sqlite` trzyma jeden
+wiersz na sesję: siatkę, czasy ekspozycji, oś / ROI, tryb skanu, status,
+czas trwania, datę oraz statystyki widm (min / max / średnia, liczba punktów).
+
+- sekwencja (sequence_engine.py) i reprocess.py dopisują sesję po zapisie,
+  ze statystykami liczonymi w locie,
+- `sync()` uzgadnia katalog z folderem: nowe lub zmienione pliki (inny
+  mtime / rozmiar) są opisywane raz – strumieniowo, porcjami wierszy – a
+  wpisy usuniętych plików znikają,
+- `query()` / `count()` – filtrowanie (fragment nazwy, status), sortowanie
+  i stronicowanie po stronie SQLite, więc zakładka Results nie zależy od
+  liczby sesji.
+
+Każde wywołanie otwiera własne połączenie (katalog jest używany z wątku GUI
+i z wątków w tle); baza działa w trybie WAL.
+"""
+
+CATALOG_FILE = "catalog.sqlite"
+SORT_KEYS = {
+    'date': 'created',
+    'name': 'session_id',
+    'points': 'points',
+    'duration': 'duration_s',
+    'intensity': 'intensity_max',
+}
+STATUSES = ('all', 'completed', 'partial')
+
+_COLUMNS = [
+    ('filename', 'TEXT PRIMARY KEY'),
+    ('session_id', 'TEXT'),
+    ('created', 'REAL'),
+    ('mtime', 'REAL'),
+    ('size', 'INTEGER'),
+    ('status', 'TEXT'),
+    ('scan_mode', 'TEXT'),
+    ('points', 'INTEGER'),
+    ('points_x', 'INTEGER'),
+    ('points_y', 'INTEGER'),
+    ('step_x', 'REAL'),
+    ('step_y', 'REAL'),
+    ('exposures', 'TEXT'),
+    ('spectrum_length', 'INTEGER'),
+    ('axis_min', 'REAL'),
+    ('axis_max', 'REAL'),
+    ('duration_s', 'REAL'),
+    ('intensity_min', 'REAL'),
+    ('intensity_max', 'REAL'),
+    ('intensity_mean', 'REAL'),
+    ('saturated_points', 'INTEGER'),
+    ('source', 'TEXT'),
+]
+COLUMN_NAMES = [c for c, _ in _COLUMNS]
+
+
+def session_created(session_id, fallback):
+    """Czas startu z identyfikatora sesji (RRRRMMDD_GGMMSS...) albo `fallback`."""
+    try:
+        return time.mktime(time.strptime(session_id[:15], '%Y%m%d_%H%M%S'))
+    except (ValueError, OverflowError):
+        return fallback
+
+
+def file_statistics(filename, chunk_rows=2000):
+    """Liczba punktów, wymiary siatki i statystyki widm – plik czytany porcjami wierszy."""
+    points = 0
+    x_max = y_max = -1
+    length = 0
+    i_min, i_max, i_sum, n = np.inf, -np.inf, 0.0, 0
+    with open(filename) as f:
+        while True:
+            try:
+                block = np.loadtxt(f, delimiter=',', max_rows=chunk_rows, ndmin=2)
+            except ValueError:
+                break
+            if block.size == 0:
+                break
+            points += len(block)
+            x_max = max(x_max, int(block[:, 0].max()))
+            y_max = max(y_max, int(block[:, 1].max()))
+            spectra = block[:, 2:]
+            length = spectra.shape[1]
+            if spectra.size:
+                i_min = min(i_min, float(np.nanmin(spectra)))
+                i_max = max(i_max, float(np.nanmax(spectra)))
+                i_sum += float(np.nansum(spectra))
+                n += int(np.count_nonzero(~np.isnan(spectra)))
+            if len(block) < chunk_rows:
+                break
+    return {
+        'points': points,
+        'points_x': x_max + 1 if points else 0,
+        'points_y': y_max + 1 if points else 0,
+        'spectrum_length': length,
+        'intensity_min': i_min if n else None,
+        'intensity_max': i_max if n else None,
+        'intensity_mean': i_sum / n if n else None,
+    }
+
+
+class SpectrumStats:
+    """Statystyki widm liczone w locie przez sekwencję (min / max / suma / liczba)."""
+
+    def __init__(self):
+        self.points = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.sum = 0.0
+        self.count = 0
+
+    def add(self, spectrum):
+        s = np.asarray(spectrum, dtype=np.float64)
+        self.points += 1
+        if s.size:
+            self.min = min(self.min, float(np.nanmin(s)))
+            self.max = max(self.max, float(np.nanmax(s)))
+            self.sum += float(np.nansum(s))
+            self.count += int(np.count_nonzero(~np.isnan(s)))
+
+    def as_fields(self):
+        if not self.count:
+            return {'points': self.points}
+        return {'points': self.points, 'intensity_min': self.min, 'intensity_max': self.max,
+                'intensity_mean': self.sum / self.count}
+
+
+class MeasurementCatalog:
+    """Katalog sesji w <folder>/catalog.sqlite."""
+
+    def __init__(self, folder="measurement_data"):
+        self.folder = folder
+        self.path = os.path.join(folder, CATALOG_FILE)
+        os.makedirs(folder, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(f"CREATE TABLE IF NOT EXISTS sessions ({', '.join(f'{c} {t}' for c, t in _COLUMNS)})")
+            db.execute("CREATE INDEX IF NOT EXISTS sessions_created ON sessions (created)")
+            db.execute("CREATE INDEX IF NOT EXISTS sessions_status ON sessions (status)")
+
+    @contextmanager
+    def _connect(self):
+        """Połączenie na jedno wywołanie: commit (albo rollback przy błędzie) i zamknięcie."""
+        db = sqlite3.connect(self.path, timeout=10.0)
+        db.row_factory = sqlite3.Row
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    @staticmethod
+    def _key(filename):
+        return os.path.normpath(os.path.abspath(filename))
+
+    # --- zapis ---------------------------------------------------------------------
+
+    def describe(self, filename, state=None, stats=None, **fields):
+        """Wiersz katalogu dla pliku: checkpoint sesji + statystyki (podane albo z pliku)."""
+        st = os.stat(filename)
+        base = os.path.basename(filename)
+        session_id = base[len("measurement_"):-len("_spectra.csv")] if base.startswith("measurement_") else base
+        if state is None:
+            state = load_checkpoint(points_folder_for(filename)) or {}
+        row = {
+            'filename': self._key(filename),
+            'session_id': session_id,
+            'created': session_created(session_id, st.st_mtime),
+            'mtime': st.st_mtime,
+            'size': st.st_size,
+            'status': 'completed' if state.get('status', 'completed') == 'completed' else 'partial',
+            'scan_mode': state.get('scan_mode', 'point'),
+            'points_x': state.get('points_x'),
+            'points_y': state.get('points_y'),
+            'step_x': state.get('step_x'),
+            'step_y': state.get('step_y'),
+            'exposures': json.dumps(state.get('exposures_ms') or []),
+            'spectrum_length': state.get('spectrum_length'),
+        }
+        axis = state.get('axis')
+        if axis:
+            row['axis_min'], row['axis_max'] = float(min(axis)), float(max(axis))
+        reprocess = os.path.join(points_folder_for(filename), "reprocess.json")
+        if os.path.exists(reprocess):
+            try:
+                with open(reprocess, encoding="utf-8") as f:
+                    row['source'] = json.load(f).get('source')
+            except Exception:
+                pass
+        if stats is None:
+            stats = file_statistics(filename)
+        for key, value in stats.items():
+            # Siatka z checkpointu ma pierwszeństwo (plik częściowy nie pokrywa całej)
+            if value is not None and (row.get(key) is None or key not in ('points_x', 'points_y', 'spectrum_length')):
+                row[key] = value
+        row.update({k: v for k, v in fields.items() if k in COLUMN_NAMES})
+        return row
+
+    def record(self, filename, state=None, stats=None, **fields):
+        """Dodaj / zaktualizuj sesję (sekwencja, reprocess.py, sync)."""
+        try:
+            row = self.describe(filename, state, stats, **fields)
+        except Exception as e:
+            print(f"Catalog: cannot describe {filename}: {e}")
+            return None
+        with self._connect() as db:
+            names = [c for c in COLUMN_NAMES if c in row]
+            db.execute(f"INSERT OR REPLACE INTO sessions ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+                       [row[c] for c in names])
+        return row
+
+    def remove(self, filename):
+        with self._connect() as db:
+            db.execute("DELETE FROM sessions WHERE filename = ?", (self._key(filename),))
+
+    def sync(self, progress=None):
+        """Uzgodnij katalog z folderem; zwraca (dodane / zmienione, usunięte)."""
+        files = {self._key(f): f for f in glob.glob(os.path.join(self.folder, "*_spectra.csv"))}
+        with self._connect() as db:
+            known = {r['filename']: (r['mtime'], r['size']) for r in db.execute("SELECT filename, mtime, size FROM sessions")}
+        gone = [k for k in known if k not in files]
+        if gone:
+            with self._connect() as db:
+                db.executemany("DELETE FROM sessions WHERE filename = ?", [(k,) for k in gone])
+        changed = []
+        for key, filename in files.items():
+            try:
+                st = os.stat(filename)
+            except OSError:
+                continue
+            if known.get(key) != (st.st_mtime, st.st_size):
+                changed.append(filename)
+        for i, filename in enumerate(changed):
+            # Pola znane tylko sekwencji (czas trwania, nasycenie) zostają ze starego wpisu
+            kept = self._fields(filename, ('duration_s', 'saturated_points'))
+            self.record(filename, **kept)
+            if progress is not None:
+                progress(i + 1, len(changed))
+        return len(changed), len(gone)
+
+    def _fields(self, filename, columns):
+        with self._connect() as db:
+            row = db.execute(f"SELECT {', '.join(columns)} FROM sessions WHERE filename = ?",
+                             (self._key(filename),)).fetchone()
+        return {} if row is None else {c: row[c] for c in columns if row[c] is not None}
+
+    # --- odczyt --------------------------------------------------------------------
+
+    @staticmethod
+    def _where(text, status):
+        clauses, args = [], []
+        if text:
+            clauses.append("session_id LIKE ?")
+            args.append(f"%{text}%")
+        if status in ('completed', 'partial'):
+            clauses.append("status = ?")
+            args.append(status)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", args
+
+    def count(self, text='', status='all'):
+        where, args = self._where(text, status)
+        with self._connect() as db:
+            return db.execute(f"SELECT COUNT(*) FROM sessions{where}", args).fetchone()[0]
+
+    def query(self, text='', status='all', sort='date', descending=True, limit=None, offset=0):
+        """Strona sesji (lista słowników) – filtrowanie, sortowanie i stronicowanie w SQLite."""
+        where, args = self._where(text, status)
+        column = SORT_KEYS.get(sort, 'created')
+        sql = f"SELECT * FROM sessions{where} ORDER BY {column} {'DESC' if descending else 'ASC'}, session_id"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            args += [int(limit), int(offset)]
+        with self._connect() as db:
+            rows = [dict(r) for r in db.execute(sql, args)]
+        for r in rows:
+            r['exposures'] = json.loads(r['exposures'] or '[]')
+        return rows
@@ -0,0 +1,175 @@
+import os
+
+import cv2
+import numpy as np
+
+"""Ekstrakcja optymalna (Horne 1986) widma z pasa na matrycy PixeLink.
+
+Średnia kolumn po wszystkich wierszach klatki dodaje do widma szum każdego
+wiersza tła. Tutaj, raz na kalibrację (przycisk *Fit Stripe*, jasne,
+równomierne widmo), z klatki wyznaczany jest przestrzenny profil pasa
+P(wiersz, kolumna): wiersze pasa (plus margines), profil wygładzony wzdłuż
+kolumn i znormalizowany do sumy 1 w każdej kolumnie. Zapis:
+`calibration/stripe.npz`.
+
+Dla każdej klatki (tylko wiersze pasa):
+
+    D  = klatka − tło (średnia wierszy tła nad i pod pasem, per kolumna)
+    f0 = Σ P·D / Σ P²                         (pierwsze przybliżenie)
+    V  = szum_odczytu² + max(P·f0, 0) / gain  (wariancja piksela, DN²)
+    f  = Σ M·P·D/V / Σ M·P²/V,  var(f) = 1 / Σ M·P²/V
+
+M = maska dobrych pikseli (z FrameCorrection – ciemna klatka, flat field
+i złe piksele są stosowane do wierszy pasa). P sumuje się do 1, więc f to
+całkowity sygnał pasa; dzielimy go przez wysokość klatki, żeby skala była
+taka jak dotychczasowej średniej kolumn (bez tła), ale szum wierszy spoza
+pasa nie wchodzi do widma. Wszystko jest wektorowe, a bufory na wiersze
+pasa są alokowane raz na ekstraktor – każdy wątek (podgląd, sekwencja) ma
+własny OptimalExtractor.
+"""
+
+STRIPE_FILE = "stripe.npz"
+
+
+class StripeProfile:
+    """Profil przestrzenny pasa widma (niezmienny, wspólny dla ekstraktorów)."""
+
+    def __init__(self, profile, row0, shape, bg_rows):
+        self.profile = np.ascontiguousarray(profile, dtype=np.float32)
+        self.row0 = int(row0)
+        self.row1 = self.row0 + self.profile.shape[0]
+        self.shape = tuple(int(s) for s in shape)
+        self.bg_rows = np.asarray(bg_rows, dtype=np.intp)
+
+    @classmethod
+    def fit(cls, frame, threshold=0.05, margin=3, smooth_cols=31, bg_count=32):
+        """Profil z jasnej klatki (None, gdy nie widać pasa)."""
+        gray = np.asarray(frame)
+        if gray.ndim == 3:
+            gray = cv2.cvtColor(gray, cv2.COLOR_BGR2GRAY)
+        gray = gray.astype(np.float32)
+        h, w = gray.shape
+        gray = gray - np.percentile(gray, 20, axis=0)[None, :]
+        rows = gray.sum(axis=1)
+        peak = int(np.argmax(rows))
+        if rows[peak] <= 0:
+            print("Stripe: no signal")
+            return None
+        inside = rows > threshold * rows[peak]
+        r0 = peak
+        while r0 > 0 and inside[r0 - 1]:
+            r0 -= 1
+        r1 = peak + 1
+        while r1 < h and inside[r1]:
+            r1 += 1
+        r0, r1 = max(0, r0 - margin), min(h, r1 + margin)
+        gap = 2 * margin
+        bg_rows = [r for r in range(max(0, r0 - gap - bg_count), max(0, r0 - gap))]
+        bg_rows += [r for r in range(min(h, r1 + gap), min(h, r1 + gap + bg_count))]
+        if not bg_rows:
+            print("Stripe: no background rows outside the stripe")
+            return None
+        profile = cv2.blur(gray[r0:r1], (smooth_cols, 1))
+        np.maximum(profile, 0.0, out=profile)
+        sums = profile.sum(axis=0)
+        empty = sums <= 0
+        profile[:, empty] = 1.0
+        sums[empty] = r1 - r0
+        profile /= sums[None, :]
+        print(f"Stripe: rows {r0}-{r1 - 1} of {h} ({r1 - r0} rows), {len(bg_rows)} background rows")
+        return cls(profile, r0, (h, w), bg_rows)
+
+    def save(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        np.savez(os.path.join(folder, STRIPE_FILE), profile=self.profile, row0=self.row0,
+                 shape=np.asarray(self.shape), bg_rows=self.bg_rows)
+
+    @classmethod
+    def load(cls, folder):
+        """Profil z <folder>/stripe.npz albo None."""
+        path = os.path.join(folder, STRIPE_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            data = np.load(path)
+            return cls(data['profile'], int(data['row0']), data['shape'], data['bg_rows'])
+        except Exception as e:
+            print(f"Stripe file error {path}: {e}")
+            return None
+
+
+class OptimalExtractor:
+    """Ekstrakcja ważona profilem z buforami na wiersze pasa (jeden na wątek)."""
+
+    def __init__(self, stripe, read_noise=2.0, gain_e_per_dn=1.0):
+        self.stripe = stripe
+        self.shape = stripe.shape
+        self.read_noise_sq = float(read_noise) ** 2
+        self.inv_gain = 1.0 / max(float(gain_e_per_dn), 1e-6)
+        n, w = stripe.profile.shape
+        self._data = np.empty((n, w), dtype=np.float32)
+        self._var = np.empty((n, w), dtype=np.float32)
+        self._weight = np.empty((n, w), dtype=np.float32)
+        # Σ P² bez maski (bez korekcji klatek)
+        self._sum_p2 = np.einsum('ij,ij->j', stripe.profile, stripe.profile)
+        self._scale = 1.0 / stripe.shape[0]
+        self.flux = np.zeros(w, dtype=np.float32)
+        self.variance = np.zeros(w, dtype=np.float32)
+
+    def _stripe_rows(self, gray, correction):
+        """Wiersze pasa i tło (per kolumna) po ciemnej klatce / flat field."""
+        s = self.stripe
+        d = self._data
+        bg = gray[s.bg_rows].astype(np.float32)
+        if correction is not None:
+            if correction.dark is not None:
+                np.subtract(gray[s.row0:s.row1], correction.dark[s.row0:s.row1], out=d)
+                bg -= correction.dark[s.bg_rows]
+            else:
+                d[...] = gray[s.row0:s.row1]
+            d *= correction.gain_map[s.row0:s.row1]
+            bg_gain = correction.gain_map[s.bg_rows]
+            bg_count = np.count_nonzero(bg_gain, axis=0)
+            background = (bg * bg_gain).sum(axis=0) / np.maximum(bg_count, 1)
+        else:
+            d[...] = gray[s.row0:s.row1]
+            background = bg.mean(axis=0)
+        d -= background[None, :]
+        return d
+
+    def extract(self, gray, correction=None):
+        """Widmo (długość = szerokość klatki, skala średniej kolumn); wariancja w self.variance."""
+        p = self.stripe.profile
+        d = self._stripe_rows(gray, correction)
+        mask = None
+        if correction is not None:
+            mask = correction.gain_map[self.stripe.row0:self.stripe.row1] > 0
+        v, wgt = self._var, self._weight
+
+        # Pierwsze przybliżenie: równe wariancje
+        if mask is None:
+            f0 = np.einsum('ij,ij->j', p, d) / self._sum_p2
+        else:
+            np.multiply(p, mask, out=wgt)
+            f0 = np.einsum('ij,ij->j', wgt, d) / np.maximum(np.einsum('ij,ij->j', wgt, p), 1e-12)
+
+        # Wariancja pikseli z modelu P·f0 (szum odczytu + szum fotonowy)
+        np.multiply(p, f0[None, :].astype(np.float32), out=v)
+        np.maximum(v, 0.0, out=v)
+        v *= self.inv_gain
+        v += self.read_noise_sq
+        np.divide(p, v, out=wgt)
+        if mask is not None:
+            wgt *= mask
+        den = np.einsum('ij,ij->j', wgt, p)
+        np.maximum(den, 1e-12, out=den)
+        np.divide(np.einsum('ij,ij->j', wgt, d), den, out=self.flux)
+        self.flux *= self._scale
+        np.divide(self._scale ** 2, den, out=self.variance)
+        return self.flux.copy()
+
+    def snr(self):
+        """Mediana S/N ostatniego widma."""
+        if not self.variance.any():
+            return None
+        return float(np.median(self.flux / np.sqrt(np.maximum(self.variance, 1e-24))))
@@ -0,0 +1,127 @@
+import time
+
+import numpy as np
+
+from wavelength_calibration import find_line_centroids
+
+"""Śledzenie pików widma na żywo (podgląd Spectrum i sekwencja).
+
+Piki są wykrywane raz (find_line_centroids – te same maksima co przy
+kalibracji λ), potem w każdej klatce tylko aktualizowane, wektorowo dla
+wszystkich pików naraz:
+
+1. okno ±`half_window` próbek wokół poprzedniej pozycji (jedno
+   indeksowanie tablicą [piki, okno]), nowe maksimum w oknie,
+2. parabola przez logarytm trzech próbek wokół maksimum (nad tłem = minimum
+   okna i próbek ±3·half_window) – wierzchołek to środek z dokładnością subpikselową, krzywizna
+   daje σ gaussa, FWHM = 2,3548·σ, amplituda = wartość w wierzchołku,
+3. środek i FWHM są przeliczane na jednostki osi (nm / px) wg lokalnego
+   kroku osi.
+
+Pik, którego amplituda spadnie poniżej `min_amplitude` ułamka amplitudy
+z detekcji, jest oznaczany NaN w tej klatce (pozycja zostaje). Historia
+(czas, środek, FWHM, amplituda) jest w buforze kołowym o długości
+`history`; aktualizacja kilku pików to ok. 0,2 ms na widmo 2048 punktów.
+"""
+
+FWHM_PER_SIGMA = 2.0 * np.sqrt(2.0 * np.log(2.0))
+
+
+class PeakTracker:
+    """Piki widma: detekcja raz, potem przyrostowa aktualizacja w każdej klatce."""
+
+    def __init__(self, max_peaks=8, half_window=6, history=600, nsigma=6.0, min_amplitude=0.2):
+        self.max_peaks = int(max_peaks)
+        self.half_window = max(2, int(half_window))
+        self.history = max(1, int(history))
+        self.nsigma = float(nsigma)
+        self.min_amplitude = float(min_amplitude)
+        self.reset()
+
+    def reset(self):
+        """Zapomnij piki – następna klatka wykrywa je od nowa."""
+        self.positions = None        # indeksy próbek (float) – stan śledzenia
+        self.reference_amplitude = None
+        self.center = self.fwhm = self.amplitude = None
+        self._t = np.full(self.history, np.nan)
+        self._series = None
+        self._count = 0
+
+    @property
+    def count(self):
+        return 0 if self.positions is None else len(self.positions)
+
+    def detect(self, spectrum):
+        centroids = find_line_centroids(spectrum, nsigma=self.nsigma, min_separation=2 * self.half_window,
+                                        max_lines=self.max_peaks)
+        if not centroids:
+            return False
+        self.positions = np.asarray(centroids, dtype=np.float64)
+        self.reference_amplitude = None
+        self._series = np.full((3, self.history, len(centroids)), np.nan)
+        self._count = 0
+        self._t[:] = np.nan
+        return True
+
+    def update(self, spectrum, axis=None, t=None):
+        """Zaktualizuj piki dla nowego widma; zwraca liczbę śledzonych pików."""
+        s = np.asarray(spectrum, dtype=np.float64)
+        if len(s) < 2 * self.half_window + 3:
+            return 0
+        if self.positions is None and not self.detect(s):
+            return 0
+        n = len(s)
+        hw = self.half_window
+        offsets = np.arange(-hw, hw + 1)
+        base = np.clip(np.rint(self.positions).astype(np.intp), hw + 1, n - hw - 2)
+        idx = base[:, None] + offsets[None, :]
+        win = s[idx]
+        # Tło: minimum okna i próbek 3× dalej (samo okno obcina skrzydła szerszych pików)
+        far = np.clip(base[:, None] + np.array([-3 * hw, 3 * hw])[None, :], 0, n - 1)
+        background = np.minimum(win.min(axis=1), s[far].min(axis=1))
+        peak = idx[np.arange(len(base)), np.argmax(win, axis=1)]
+        peak = np.clip(peak, 1, n - 2)
+
+        a = s[peak - 1] - background
+        b = s[peak] - background
+        c = s[peak + 1] - background
+        with np.errstate(divide='ignore', invalid='ignore'):
+            la, lb, lc = np.log(np.maximum(a, 1e-12)), np.log(np.maximum(b, 1e-12)), np.log(np.maximum(c, 1e-12))
+            curv = la - 2.0 * lb + lc
+            valid = (curv < 0) & (b > 0)
+            delta = np.where(valid, 0.5 * (la - lc) / np.where(valid, curv, -1.0), 0.0)
+            delta = np.clip(delta, -0.5, 0.5)
+            sigma = np.where(valid, np.sqrt(-1.0 / np.where(valid, curv, -1.0)), np.nan)
+            amplitude = np.where(valid, np.exp(lb - 0.25 * (la - lc) * delta), b)
+
+        pos = peak + delta
+        if self.reference_amplitude is None:
+            self.reference_amplitude = np.maximum(amplitude, 1e-12)
+        lost = amplitude < self.min_amplitude * self.reference_amplitude
+        # Zgubiony pik zostaje w poprzednim miejscu (wróci, gdy sygnał wróci)
+        self.positions = np.where(lost, self.positions, pos)
+
+        if axis is not None and len(axis) == n:
+            axis = np.asarray(axis, dtype=np.float64)
+            center = np.interp(pos, np.arange(n), axis)
+            step = np.abs(np.gradient(axis))[peak]
+        else:
+            center, step = pos, 1.0
+        fwhm = FWHM_PER_SIGMA * sigma * step
+        self.center = np.where(lost, np.nan, center)
+        self.fwhm = np.where(lost, np.nan, fwhm)
+        self.amplitude = np.where(lost, np.nan, amplitude)
+
+        i = self._count % self.history
+        self._t[i] = time.time() if t is None else t
+        self._series[:, i, :] = (self.center, self.fwhm, self.amplitude)
+        self._count += 1
+        return len(pos)
+
+    def series(self):
+        """Historia w kolejności czasu: (t, środki, FWHM, amplitudy) – [próbka, pik]."""
+        if self._series is None or self._count == 0:
+            return np.empty(0), np.empty((0, 0)), np.empty((0, 0)), np.empty((0, 0))
+        n = min(self._count, self.history)
+        order = (np.arange(n) + (self._count - n)) % self.history
+        return self._t[order], self._series[0, order], self._series[1, order], self._series[2, order]
@@ -0,0 +1,202 @@
+import os
+import csv
+import zlib
+import queue
+import threading
+
+import numpy as np
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    # Bez pakietu lz4 archiwum używa zlib
+    lz4_frame = None
+
+"""Archiwum surowych klatek sekwencji (pas widma, skompresowany).
+
+Sekwencja zapisuje tylko widmo po ROI / kalibracji / ekstrakcji – po zmianie
+którejkolwiek z nich skan trzeba było powtórzyć. Z `raw_archive` w
+options.json dla każdego punktu i czasu ekspozycji zapisywane są surowe
+klatki (wiersze pasa widma, przed korekcją), z których reprocess.py może
+policzyć widma od nowa:
+
+- points_<sesja>/raw_frames.bin – ciąg niezależnie skompresowanych bloków,
+  jeden blok = wszystkie klatki jednego (x, y, ekspozycja), [klatka, wiersz,
+  kolumna]; dla typów > 1 bajt bajty są przestawiane (shuffle – najpierw
+  młodsze, potem starsze bajty wszystkich pikseli), co wyraźnie poprawia
+  kompresję,
+- points_<sesja>/raw_frames_index.csv – wiersz na blok: klucz, przesunięcie
+  i długość w pliku, kształt, typ, pierwszy wiersz pasa w klatce, kodek.
+
+Kompresja i zapis działają w wątku w tle (RawArchiveWriter): sekwencja
+tylko kopiuje pas do ograniczonej kolejki; gdy dysk nie nadąża, kolejka
+spowalnia sekwencję zamiast zajmować pamięć. Odczyt (RawArchive) ładuje
+sam indeks i czyta dowolny blok jednym seek + read.
+"""
+
+DATA_FILE = "raw_frames.bin"
+INDEX_FILE = "raw_frames_index.csv"
+CODECS = ('zlib', 'lz4')
+INDEX_HEADER = ["x", "y", "exposure_ms", "used_exposure_ms", "offset", "length", "frames", "rows", "cols",
+                "dtype", "row0", "frame_rows", "codec", "shuffle"]
+
+
+def band_rows(stripe, height, rows=None):
+    """Zakres wierszy archiwizowanego pasa: `rows` z opcji, pas widma z tłem albo cała klatka."""
+    if rows:
+        r0, r1 = int(rows[0]), int(rows[1])
+    elif stripe is not None and stripe.shape[0] == height:
+        r0 = min(stripe.row0, int(stripe.bg_rows.min()) if len(stripe.bg_rows) else stripe.row0)
+        r1 = max(stripe.row1, int(stripe.bg_rows.max()) + 1 if len(stripe.bg_rows) else stripe.row1)
+    else:
+        r0, r1 = 0, height
+    r0 = max(0, min(r0, height - 1))
+    return r0, max(r0 + 1, min(r1, height))
+
+
+def _compress(frames, codec, level):
+    shuffle = frames.dtype.itemsize > 1
+    data = frames
+    if shuffle:
+        data = np.ascontiguousarray(frames.reshape(-1).view(np.uint8).reshape(-1, frames.dtype.itemsize).T)
+    raw = memoryview(np.ascontiguousarray(data)).cast('B')
+    if codec == 'lz4':
+        return lz4_frame.compress(raw), shuffle
+    return zlib.compress(raw, level), shuffle
+
+
+def _decompress(blob, codec, shape, dtype, shuffle):
+    if codec == 'lz4':
+        if lz4_frame is None:
+            raise RuntimeError("lz4 package is required to read this archive")
+        raw = lz4_frame.decompress(blob)
+    else:
+        raw = zlib.decompress(blob)
+    dtype = np.dtype(dtype)
+    if shuffle:
+        data = np.frombuffer(raw, dtype=np.uint8).reshape(dtype.itemsize, -1).T
+        return np.ascontiguousarray(data).view(dtype).reshape(shape)
+    return np.frombuffer(raw, dtype=dtype).reshape(shape)
+
+
+class RawArchiveWriter:
+    """Zapis bloków klatek w wątku w tle; dopisuje do istniejącego archiwum (wznowienie)."""
+
+    def __init__(self, folder, codec='zlib', level=1, max_pending=16):
+        if codec == 'lz4' and lz4_frame is None:
+            print("Raw archive: lz4 package not installed - using zlib")
+            codec = 'zlib'
+        self.codec = codec if codec in CODECS else 'zlib'
+        self.level = int(level)
+        self.folder = folder
+        self.blocks = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        os.makedirs(folder, exist_ok=True)
+        self._data = open(os.path.join(folder, DATA_FILE), "ab")
+        index_path = os.path.join(folder, INDEX_FILE)
+        new_index = not os.path.exists(index_path)
+        self._index = open(index_path, "a", newline="")
+        self._rows = csv.writer(self._index)
+        if new_index:
+            self._rows.writerow(INDEX_HEADER)
+        self._queue = queue.Queue(maxsize=max(1, int(max_pending)))
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def put(self, x, y, exposure_ms, frames, row0=0, frame_rows=None, used_exposure_ms=None):
+        """Dodaj klatki punktu ([klatka, wiersz, kolumna] albo jedną klatkę 2D) do kolejki zapisu."""
+        frames = np.asarray(frames)
+        if frames.ndim == 2:
+            frames = frames[None]
+        if frames.size == 0:
+            return
+        used = exposure_ms if used_exposure_ms is None else used_exposure_ms
+        frame_rows = frames.shape[1] if frame_rows is None else frame_rows
+        self._queue.put((x, y, float(exposure_ms), float(used), frames, int(row0), int(frame_rows)))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            x, y, exposure_ms, used_ms, frames, row0, frame_rows = item
+            try:
+                blob, shuffle = _compress(frames, self.codec, self.level)
+                offset = self._data.tell()
+                self._data.write(blob)
+                self._data.flush()
+                # Wiersz indeksu dopiero po zapisie bloku – indeks nie wskazuje na brakujące dane
+                self._rows.writerow([x, y, exposure_ms, used_ms, offset, len(blob)] + list(frames.shape)
+                                    + [frames.dtype.str, row0, frame_rows, self.codec, int(shuffle)])
+                self._index.flush()
+                self.blocks += 1
+                self.raw_bytes += frames.nbytes
+                self.stored_bytes += len(blob)
+            except Exception as e:
+                print(f"Raw archive write error at ({x},{y}): {e}")
+
+    def close(self):
+        """Zapisz oczekujące bloki i zamknij pliki."""
+        self._queue.put(None)
+        self._thread.join()
+        self._data.close()
+        self._index.close()
+        if self.blocks:
+            print(f"Raw archive: {self.blocks} blocks, {self.raw_bytes / 1e6:.1f} MB -> "
+                  f"{self.stored_bytes / 1e6:.1f} MB ({self.codec})")
+
+
+class RawArchive:
+    """Odczyt archiwum: indeks w pamięci, bloki czytane na żądanie."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.entries = {}
+        with open(os.path.join(folder, INDEX_FILE), newline="") as f:
+            for row in csv.DictReader(f):
+                key = (int(row['x']), int(row['y']), float(row['exposure_ms']))
+                # Przy powtórzonym punkcie (wznowienie) obowiązuje ostatni blok
+                self.entries[key] = row
+
+    @staticmethod
+    def exists(folder):
+        return os.path.exists(os.path.join(folder, INDEX_FILE)) and os.path.exists(os.path.join(folder, DATA_FILE))
+
+    def keys(self):
+        """Klucze (x, y, ekspozycja ms) w kolejności zapisu."""
+        return list(self.entries)
+
+    def exposures(self):
+        return sorted({k[2] for k in self.entries})
+
+    def entry(self, x, y, exposure_ms):
+        row = self.entries.get((int(x), int(y), float(exposure_ms)))
+        if row is None:
+            raise KeyError(f"no raw frames for ({x}, {y}) at {exposure_ms} ms")
+        return row
+
+    def frames(self, x, y, exposure_ms):
+        """Klatki punktu: [klatka, wiersz pasa, kolumna]."""
+        row = self.entry(x, y, exposure_ms)
+        with open(os.path.join(self.folder, DATA_FILE), "rb") as f:
+            f.seek(int(row['offset']))
+            blob = f.read(int(row['length']))
+        shape = (int(row['frames']), int(row['rows']), int(row['cols']))
+        return _decompress(blob, row['codec'], shape, row['dtype'], row['shuffle'] == '1')
+
+    def full_frames(self, x, y, exposure_ms, fill='edge'):
+        """Klatki w pełnym rozmiarze matrycy.
+
+        Wiersze spoza pasa: 'edge' – skrajne wiersze pasa (to wiersze tła, więc
+        średnia kolumn wychodzi prawie taka jak z pełnej klatki) albo stała.
+        """
+        row = self.entry(x, y, exposure_ms)
+        band = self.frames(x, y, exposure_ms)
+        row0, height = int(row['row0']), int(row['frame_rows'])
+        if row0 == 0 and band.shape[1] == height:
+            return band
+        after = height - row0 - band.shape[1]
+        if fill == 'edge':
+            return np.pad(band, ((0, 0), (row0, after), (0, 0)), mode='edge')
+        return np.pad(band, ((0, 0), (row0, after), (0, 0)), mode='constant', constant_values=fill)
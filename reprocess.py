@@ -0,0 +1,340 @@
+import os
+import csv
+import sys
+import glob
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from spectrum_processing import frame_to_spectrum
+from sequence_checkpoint import load_checkpoint, save_checkpoint, points_folder_for
+from frame_calibration import FrameCalibration, CALIBRATION_FOLDER
+from optimal_extraction import OptimalExtractor
+from wavelength_calibration import spectral_axis, SPECTRUM_LENGTH
+from raw_archive import RawArchive
+from measurement_catalog import MeasurementCatalog, SpectrumStats
+
+"""Ponowne przeliczenie zapisanych sesji z bieżącymi ustawieniami.
+
+Po zmianie ROI (spectrum_range_min/max), kalibracji λ albo korekcji klatek
+stare skany można przeliczyć zamiast je powtarzać:
+
+    python reprocess.py measurement_data                       # wszystkie sesje
+    python reprocess.py measurement_data/measurement_X_spectra.csv --workers 8
+
+Źródło danych sesji:
+
+- archiwum surowych klatek (raw_archive.py) – widma są liczone od nowa z
+  klatek: korekcja ciemnej klatki / flat field, prostowanie szczeliny,
+  ekstrakcja (średnia albo optymalna), oś λ i ROI wg podanego options.json,
+- bez archiwum – pliki point_xX_yY.csv: widma są tylko przenoszone na nową
+  oś w dziedzinie indeksów piksela (indeksy ROI z sequence_state.json), więc
+  nowa kalibracja λ i węższe ROI są dokładne; punkty nowego ROI spoza starego
+  zakresu to NaN. Korekcji klatek i ekstrakcji nie da się zmienić bez klatek.
+
+Praca jest dzielona na porcje po `--chunk` punktów i liczona w
+ProcessPoolExecutor; każdy proces ładuje kalibrację raz (inicjalizator) i
+sam zapisuje pliki punktów swojej porcji, a proces główny składa tylko
+główny plik CSV w kolejności pomiaru. Wynik jest wersjonowany obok źródła:
+measurement_<sesja>_v<N>_spectra.csv i points_<sesja>_v<N>/ (z
+reprocess.json – źródło i użyte ustawienia). Oryginał nie jest zmieniany.
+"""
+
+_WORKER = {}
+
+
+def find_sessions(paths):
+    """Pliki measurement_*_spectra.csv (albo foldery points_* bez pliku głównego) z podanych ścieżek."""
+    sessions = []
+    for path in paths:
+        if os.path.isfile(path):
+            sessions.append(path)
+        elif os.path.basename(os.path.normpath(path)).startswith("points_"):
+            sessions.append(os.path.normpath(path))
+        elif os.path.isdir(path):
+            found = sorted(glob.glob(os.path.join(path, "measurement_*_spectra.csv")))
+            known = {points_folder_for(f) for f in found}
+            for folder in sorted(glob.glob(os.path.join(path, "points_*"))):
+                if folder not in known and os.path.isdir(folder):
+                    found.append(folder)
+            # Wyniki poprzednich przeliczeń nie są źródłem
+            sessions.extend(f for f in found if not _is_version(f))
+        else:
+            print(f"Not found: {path}")
+    return sessions
+
+
+def _is_version(path):
+    name = os.path.basename(os.path.normpath(path)).replace("_spectra.csv", "")
+    tail = name.rsplit("_", 1)[-1]
+    return tail.startswith("v") and tail[1:].isdigit()
+
+
+def _session_paths(source):
+    """(plik główny albo None, folder punktów, identyfikator sesji)."""
+    if os.path.isdir(source):
+        folder = os.path.normpath(source)
+        session_id = os.path.basename(folder)[len("points_"):]
+        main = os.path.join(os.path.dirname(folder), f"measurement_{session_id}_spectra.csv")
+        return (main if os.path.exists(main) else None), folder, session_id
+    folder = points_folder_for(source)
+    session_id = os.path.basename(folder)[len("points_"):]
+    return source, folder, session_id
+
+
+def next_version(output_folder, session_id):
+    version = 2
+    while (os.path.exists(os.path.join(output_folder, f"measurement_{session_id}_v{version}_spectra.csv"))
+           or os.path.exists(os.path.join(output_folder, f"points_{session_id}_v{version}"))):
+        version += 1
+    return version
+
+
+def _point_keys(main_file, points_folder):
+    """Punkty (x, y) w kolejności pomiaru: z pliku głównego, a bez niego z nazw plików punktów."""
+    keys = []
+    if main_file is not None:
+        with open(main_file, newline="") as f:
+            for row in csv.reader(f):
+                if len(row) >= 2:
+                    try:
+                        keys.append((int(float(row[0])), int(float(row[1]))))
+                    except ValueError:
+                        continue
+        # Powtórzony punkt (wznowienie) – obowiązuje ostatni wiersz
+        return list(dict.fromkeys(keys[::-1]))[::-1]
+    for path in glob.glob(os.path.join(points_folder, "point_x*_y*.csv")):
+        name = os.path.basename(path)[len("point_x"):-len(".csv")]
+        try:
+            x, y = name.split("_y")
+            keys.append((int(x), int(y)))
+        except ValueError:
+            continue
+    return sorted(keys, key=lambda k: (k[1], k[0]))
+
+
+def _old_indices(state, old_axis, opts):
+    """Indeksy pełnego widma (0..2047) kolumn starego pliku."""
+    roi = (state or {}).get('roi_indices')
+    if roi is not None and len(roi) == len(old_axis):
+        return np.asarray(roi, dtype=np.float64)
+    if len(old_axis) == SPECTRUM_LENGTH:
+        return np.arange(SPECTRUM_LENGTH, dtype=np.float64)
+    # Bez indeksów ROI: pozycje starej osi na bieżącej osi bazowej (zakłada niezmienioną kalibrację)
+    base = spectral_axis(opts).base
+    print("⚠️  No ROI indices in the session state - mapping by axis values (calibration assumed unchanged)")
+    return np.interp(old_axis, base, np.arange(len(base), dtype=np.float64))
+
+
+def _init_worker(task):
+    """Inicjalizator procesu: kalibracja, ekstraktor i oś – raz na proces."""
+    opts = task['options']
+    _WORKER.clear()
+    _WORKER.update(task)
+    axis = spectral_axis(opts)
+    _WORKER['axis'] = axis
+    if task['source'] == 'raw':
+        calibration = FrameCalibration(opts.get('calibration_folder', CALIBRATION_FOLDER))
+        _WORKER['calibration'] = calibration
+        _WORKER['archive'] = RawArchive(task['points_folder'])
+        extractor = None
+        if opts.get('extraction', 'mean') == 'optimal' and calibration.stripe is not None:
+            extractor = OptimalExtractor(calibration.stripe, float(opts.get('read_noise_dn', 2.0)),
+                                         float(opts.get('gain_e_per_dn', 1.0)))
+        _WORKER['extractor'] = extractor
+
+
+def _raw_spectrum(x, y, exposure_ms):
+    """Widmo punktu z surowych klatek (pełne 2048 punktów, średnia klatek)."""
+    w = _WORKER
+    opts = w['options']
+    archive, calibration = w['archive'], w['calibration']
+    entry = archive.entry(x, y, exposure_ms)
+    used_ms = float(entry['used_exposure_ms'])
+    frames = archive.full_frames(x, y, exposure_ms)
+    shape = frames.shape[1:]
+    smile_on = bool(opts.get('smile_correction', False)) and calibration.smile is not None
+    smile = calibration.smile if smile_on else None
+    correction = None
+    if opts.get('frame_calibration', False):
+        correction = calibration.correction(used_ms, w['gain'], shape, straightened=smile_on)
+    spectra = np.stack([frame_to_spectrum(f, correction=correction, smile=smile, extractor=w['extractor'])
+                        for f in frames])
+    planes = max(1, int(w['z_stack_count']))
+    if planes > 1 and len(spectra) % planes == 0:
+        # Stos Z: płaszczyzna z największym sygnałem, jak w sekwencji
+        per_plane = spectra.reshape(planes, -1, spectra.shape[1]).mean(axis=1)
+        spectrum = per_plane[int(np.argmax(per_plane.sum(axis=1)))]
+    else:
+        spectrum = spectra.mean(axis=0)
+    # Punkt zmierzony krótszą ekspozycją (saturation_action='reduce')
+    return spectrum * (exposure_ms / used_ms), frames.nbytes
+
+
+def _file_spectra(x, y):
+    """Widma punktu z point_xX_yY.csv przeniesione na nową oś (dziedzina indeksów piksela)."""
+    w = _WORKER
+    path = os.path.join(w['points_folder'], f"point_x{x}_y{y}.csv")
+    data = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+    old_idx = w.get('old_indices')
+    if old_idx is None or len(old_idx) != len(data):
+        old_idx = _old_indices(w['state'], data[:, 0], w['options'])
+        w['old_indices'] = old_idx
+    new_idx = w['axis'].roi_indices.astype(np.float64)
+    spectra = [np.interp(new_idx, old_idx, data[:, i], left=np.nan, right=np.nan) for i in range(1, data.shape[1])]
+    return spectra, os.path.getsize(path)
+
+
+def _format_rows(table):
+    """Tablica 2D -> tekst CSV jedną operacją formatowania (kilka razy szybciej niż np.savetxt)."""
+    row = ",".join(["%.10g"] * table.shape[1]) + "\n"
+    return (row * table.shape[0]) % tuple(table.ravel().tolist())
+
+
+def _process_chunk(keys):
+    """Porcja punktów: widma na nowej osi, zapis plików punktów; zwraca [(x, y, widmo 1. ekspozycji)], bajty."""
+    w = _WORKER
+    axis = w['axis']
+    exposures = w['exposures_ms']
+    out = []
+    read_bytes = 0
+    for x, y in keys:
+        try:
+            if w['source'] == 'raw':
+                spectra = []
+                for e in exposures:
+                    spectrum, nbytes = _raw_spectrum(x, y, e)
+                    spectra.append(spectrum[axis.roi_indices])
+                    read_bytes += nbytes
+            else:
+                spectra, nbytes = _file_spectra(x, y)
+                read_bytes += nbytes
+        except Exception as e:
+            print(f"Reprocess error at ({x},{y}): {e}")
+            continue
+        point_file = os.path.join(w['output_points'], f"point_x{x}_y{y}.csv")
+        table = np.column_stack([axis.axis] + list(spectra))
+        header = ",".join(["lambda"] + [f"I_{exp:.1f}ms" for exp in exposures[:len(spectra)]])
+        with open(point_file, "w", newline="") as pf:
+            pf.write(header + "\n" + _format_rows(table))
+        out.append((x, y, spectra[0]))
+    return out, read_bytes
+
+
+def reprocess_session(source, opts, workers=None, chunk=64, use_raw=True):
+    """Przelicz jedną sesję; zwraca ścieżkę nowego pliku głównego albo None."""
+    main_file, points_folder, session_id = _session_paths(source)
+    if not os.path.isdir(points_folder):
+        print(f"{source}: no points folder {points_folder}")
+        return None
+    state = load_checkpoint(points_folder) or {}
+    keys = _point_keys(main_file, points_folder)
+    if not keys:
+        print(f"{source}: no measured points")
+        return None
+    output_folder = os.path.dirname(points_folder)
+    version = next_version(output_folder, session_id)
+    out_id = f"{session_id}_v{version}"
+    out_main = os.path.join(output_folder, f"measurement_{out_id}_spectra.csv")
+    out_points = os.path.join(output_folder, f"points_{out_id}")
+    os.makedirs(out_points, exist_ok=True)
+
+    raw = use_raw and RawArchive.exists(points_folder)
+    if raw:
+        archive = RawArchive(points_folder)
+        exposures = [float(e) for e in state.get('exposures_ms') or archive.exposures()]
+        available = set(archive.keys())
+        keys = [k for k in keys if all((k[0], k[1], e) in available for e in exposures)]
+    else:
+        exposures = [float(e) for e in state.get('exposures_ms') or []]
+        if not exposures:
+            # Czasy z nagłówka pierwszego pliku punktu (I_10.0ms, ...)
+            with open(os.path.join(points_folder, f"point_x{keys[0][0]}_y{keys[0][1]}.csv")) as f:
+                header = f.readline().strip().split(",")[1:]
+            exposures = [float(h[2:-2]) for h in header if h.startswith("I_") and h.endswith("ms")]
+    task = {
+        'source': 'raw' if raw else 'files',
+        'options': opts,
+        'points_folder': points_folder,
+        'output_points': out_points,
+        'state': state,
+        'exposures_ms': exposures,
+        'gain': state.get('gain', opts.get('gain')),
+        'z_stack_count': state.get('z_stack_count', 1),
+    }
+    chunks = [keys[i:i + max(1, chunk)] for i in range(0, len(keys), max(1, chunk))]
+    workers = workers or os.cpu_count() or 1
+    print(f"Reprocessing {session_id} ({len(keys)} points, {len(exposures)} exposures, "
+          f"{'raw frames' if raw else 'point files'}) -> v{version}, {workers} workers")
+
+    t0 = time.perf_counter()
+    done = 0
+    read_bytes = 0
+    stats = SpectrumStats()
+    with open(out_main, "w", newline="") as f, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(task,)) as pool:
+        # map zachowuje kolejność porcji – plik główny w kolejności pomiaru
+        for results, nbytes in pool.map(_process_chunk, chunks):
+            if results:
+                f.write(_format_rows(np.array([[x, y] + list(spectrum) for x, y, spectrum in results])))
+                for _, _, spectrum in results:
+                    stats.add(spectrum)
+            done += len(results)
+            read_bytes += nbytes
+    elapsed = max(time.perf_counter() - t0, 1e-9)
+
+    axis = spectral_axis(opts)
+    new_state = dict(state)
+    new_state.update(session_id=out_id, filename=out_main, points_folder=out_points, status='completed',
+                     exposures_ms=exposures, roi_indices=[int(i) for i in axis.roi_indices],
+                     axis=[float(a) for a in axis.axis], spectrum_length=int(len(axis.axis)))
+    save_checkpoint(out_points, new_state)
+    with open(os.path.join(out_points, "reprocess.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            'source': main_file or points_folder,
+            'source_type': task['source'],
+            'version': version,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'points': done,
+            'options': {k: opts.get(k) for k in (
+                'lambda_calibration_enabled', 'lambda_min', 'lambda_max', 'lambda_coefficients',
+                'spectrum_range_min', 'spectrum_range_max', 'frame_calibration', 'smile_correction',
+                'extraction', 'read_noise_dn', 'gain_e_per_dn', 'calibration_folder')},
+        }, f, indent=4)
+    MeasurementCatalog(output_folder).record(out_main, state=new_state, stats=stats.as_fields())
+    print(f"✅ {out_main}: {done}/{len(keys)} points in {elapsed:.1f} s "
+          f"({done / elapsed:.1f} points/s, {read_bytes / 1e6 / elapsed:.1f} MB/s read)")
+    return out_main
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute saved sessions with the current settings")
+    parser.add_argument('paths', nargs='*', default=['measurement_data'],
+                        help="measurement_*_spectra.csv files, points_* folders or data folders")
+    parser.add_argument('--options', default='options.json', help="options file (default: options.json)")
+    parser.add_argument('--workers', type=int, help="worker processes (default: CPU count)")
+    parser.add_argument('--chunk', type=int, default=64, help="points per work unit")
+    parser.add_argument('--no-raw', action='store_true', help="use point files even when raw frames are archived")
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.options, 'r', encoding='utf-8') as f:
+            opts = json.load(f)
+    except Exception:
+        opts = {}
+    sessions = find_sessions(args.paths)
+    if not sessions:
+        print("No sessions to reprocess")
+        return 1
+    t0 = time.perf_counter()
+    outputs = [reprocess_session(s, opts, args.workers, args.chunk, not args.no_raw) for s in sessions]
+    ok = sum(o is not None for o in outputs)
+    print(f"Reprocessed {ok}/{len(sessions)} sessions in {time.perf_counter() - t0:.1f} s")
+    return 0 if ok == len(sessions) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
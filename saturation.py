@@ -0,0 +1,78 @@
+import numpy as np
+
+"""Wykrywanie nasyconych i gorących pikseli w klatce PixeLink.
+
+W uint8 nasycony piksel to po prostu 255 – bez sprawdzenia trafia do widma
+jako zaniżona wartość. Kontrola jest liczona przy ekstrakcji widma, na
+surowej klatce (przed prostowaniem i korekcją):
+
+1. gray.max() – jedno szybkie przejście; gdy max < poziomu nasycenia
+   (zwykły przypadek), na tym koniec,
+2. w przeciwnym razie maska gray >= poziom i liczba takich pikseli
+   w każdej kolumnie (np.count_nonzero(axis=0)),
+3. piksele ze znanej maski złych pikseli (FrameCorrection) oraz
+   pojedyncze, izolowane w pionie piksele (bez nasyconego sąsiada nad i pod
+   – gorący piksel / promień kosmiczny, a nie nasycona linia widma) są
+   liczone osobno jako `hot` i nie oznaczają nasycenia.
+
+Poziom nasycenia: `saturation_level` z options.json albo maksimum typu
+klatki (255 dla uint8, 65535 dla uint16).
+"""
+
+SATURATION_ACTIONS = ('flag', 'reject', 'reduce')
+SATURATION_FILE = "saturation.csv"
+
+
+def full_scale(frame):
+    """Maksymalna wartość piksela dla typu klatki."""
+    if np.issubdtype(frame.dtype, np.integer):
+        return int(np.iinfo(frame.dtype).max)
+    return float(np.max(frame))
+
+
+class SaturationMonitor:
+    """Statystyka nasycenia ostatniej klatki (jeden monitor na wątek akwizycji)."""
+
+    def __init__(self, level=0):
+        self.level = level or 0
+        self.width = 0
+        self.reset()
+
+    def reset(self):
+        self.pixels = 0
+        self.hot = 0
+        self.columns = 0
+        self.column_counts = None
+
+    def check(self, gray, gain_map=None):
+        """Policz nasycone piksele w klatce; zwraca liczbę nasyconych (bez gorących).
+
+        gain_map - FrameCorrection.gain_map tej klatki (0 = znany zły piksel).
+        """
+        level = self.level or full_scale(gray)
+        self.width = gray.shape[1]
+        if gray.max() < level:
+            self.reset()
+            return 0
+        hits = gray >= level
+        # Izolowane w pionie = gorący piksel, nie nasycona linia widma
+        neighbour = np.zeros_like(hits)
+        neighbour[1:] |= hits[:-1]
+        neighbour[:-1] |= hits[1:]
+        hot = hits & ~neighbour
+        if gain_map is not None and gain_map.shape == hits.shape:
+            hot |= hits & (gain_map == 0)
+        hits &= ~hot
+        counts = np.count_nonzero(hits, axis=0)
+        self.hot = int(np.count_nonzero(hot))
+        self.pixels = int(counts.sum())
+        self.columns = int(np.count_nonzero(counts))
+        self.column_counts = counts if self.pixels else None
+        return self.pixels
+
+    def spectrum_mask(self, length):
+        """Punkty widma (po przeskalowaniu do `length`) z nasyconą kolumną źródłową."""
+        if self.column_counts is None or self.width == 0:
+            return np.zeros(length, dtype=bool)
+        cols = np.rint(np.linspace(0, self.width - 1, length)).astype(np.intp)
+        return self.column_counts[cols] > 0
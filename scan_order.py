@@ -0,0 +1,123 @@
+import numpy as np
+
+"""Kolejność odwiedzania punktów siatki i czasów ekspozycji w sekwencji.
+
+Tryby `exposure_order`:
+- 'point' – w każdym punkcie wszystkie czasy ekspozycji (zmiana ekspozycji
+  przy każdym pomiarze, gdy czasów jest kilka),
+- 'row'   – każdy wiersz przejeżdżany raz na czas ekspozycji (kolejne
+  przejazdy w przeciwnych kierunkach), ekspozycja zmienia się na końcu
+  przejazdu, a nie zmienia przy przejściu do następnego wiersza,
+- 'pass'  – cały obszar skanowany osobno dla każdego czasu; kolejne przejścia
+  idą wężem wstecz, więc stolik nie wraca do narożnika.
+
+Wynik zawsze trafia do tego samego układu plików (punkt -> wszystkie czasy),
+bo sekwencja buforuje widma punktu aż do zebrania kompletu.
+"""
+
+EXPOSURE_ORDERS = ('point', 'row', 'pass')
+
+
+def _row_grid_y(iy, points_y, starting_corner):
+    if starting_corner in ['top-left', 'top-right']:
+        return iy
+    return (points_y - 1) - iy
+
+
+def _row_columns(forward, points_x):
+    """Kolumny wiersza: forward = od lewej (grid_x rośnie)."""
+    return list(range(points_x)) if forward else list(range(points_x - 1, -1, -1))
+
+
+def snake_points(points_x, points_y, starting_corner='top-left'):
+    """Lista (grid_x, grid_y) w kolejności węża – jak pętla punktowa sekwencji."""
+    forward = starting_corner in ['top-left', 'bottom-left']
+    order = []
+    for iy in range(points_y):
+        grid_y = _row_grid_y(iy, points_y, starting_corner)
+        order.extend((gx, grid_y) for gx in _row_columns(forward, points_x))
+        forward = not forward
+    return order
+
+
+def build_visits(points_x, points_y, starting_corner='top-left', n_exposures=1, order='point'):
+    """Lista pomiarów (grid_x, grid_y, indeks ekspozycji) w kolejności wykonania."""
+    n_exposures = max(1, int(n_exposures))
+    if order not in EXPOSURE_ORDERS:
+        raise ValueError(f"Unknown exposure order: {order}")
+
+    if order == 'point' or n_exposures == 1:
+        return [(gx, gy, k) for gx, gy in snake_points(points_x, points_y, starting_corner)
+                for k in range(n_exposures)]
+
+    if order == 'pass':
+        path = snake_points(points_x, points_y, starting_corner)
+        visits = []
+        for k in range(n_exposures):
+            ordered = path if k % 2 == 0 else path[::-1]
+            visits.extend((gx, gy, k) for gx, gy in ordered)
+        return visits
+
+    # 'row': n_exposures przejazdów każdego wiersza; kolejny wiersz zaczyna
+    # się po tej stronie, na której skończył się poprzedni.
+    forward = starting_corner in ['top-left', 'bottom-left']
+    visits = []
+    for iy in range(points_y):
+        grid_y = _row_grid_y(iy, points_y, starting_corner)
+        # Co drugi wiersz czasy w odwrotnej kolejności – na granicy wierszy
+        # ekspozycja zostaje bez zmiany
+        exposure_indices = range(n_exposures) if iy % 2 == 0 else range(n_exposures - 1, -1, -1)
+        for k in exposure_indices:
+            visits.extend((gx, grid_y, k) for gx in _row_columns(forward, points_x))
+            forward = not forward
+    return visits
+
+
+def count_exposure_changes(visits):
+    """Liczba zmian ekspozycji (pierwsze ustawienie nie jest liczone)."""
+    return sum(1 for prev, cur in zip(visits, visits[1:]) if prev[2] != cur[2])
+
+
+def count_position_changes(visits):
+    return sum(1 for prev, cur in zip(visits, visits[1:]) if prev[:2] != cur[:2])
+
+
+def revisit_agreement(reference, spectrum):
+    """Zgodność widma z pomiarem referencyjnym tego samego punktu (R², 0..1).
+
+    Przy powrocie do punktu z innym czasem ekspozycji widmo powinno różnić się
+    tylko skalą i offsetem (ciemny poziom), więc dopasowujemy
+    spectrum ≈ a·reference + b i zwracamy R². Niska wartość oznacza, że stolik
+    nie wrócił w to samo miejsce albo próbka/oświetlenie się zmieniły.
+    Dla płaskich widm (sam szum) zwraca None.
+    """
+    ref = np.asarray(reference, dtype=float)
+    spec = np.asarray(spectrum, dtype=float)
+    if ref.shape != spec.shape or ref.size < 3:
+        return None
+    ref_c = ref - ref.mean()
+    spec_c = spec - spec.mean()
+    ref_var = float(ref_c @ ref_c)
+    spec_var = float(spec_c @ spec_c)
+    if ref_var <= 1e-12 or spec_var <= 1e-12:
+        return None
+    a = float(ref_c @ spec_c) / ref_var
+    resid = spec_c - a * ref_c
+    return max(0.0, 1.0 - float(resid @ resid) / spec_var)
+
+
+def build_path_visits(path, n_exposures=1, order='point'):
+    """Lista pomiarów dla dowolnej ścieżki punktów (region skanu, scan_path.py).
+
+    'pass' – cała ścieżka na każdy czas ekspozycji (co drugi raz wstecz);
+    'point' i 'row' – wszystkie czasy w punkcie (ścieżka regionu nie ma wierszy).
+    """
+    n_exposures = max(1, int(n_exposures))
+    path = [tuple(p) for p in path]
+    if order == 'pass' and n_exposures > 1:
+        visits = []
+        for k in range(n_exposures):
+            ordered = path if k % 2 == 0 else path[::-1]
+            visits.extend((gx, gy, k) for gx, gy in ordered)
+        return visits
+    return [(gx, gy, k) for gx, gy in path for k in range(n_exposures)]
@@ -0,0 +1,183 @@
+import os
+import json
+import time
+
+import numpy as np
+
+"""Optymalizacja ścieżki stolika dla dowolnego zbioru punktów siatki.
+
+Zamiast węża po całym prostokącie (bounding box) skanujemy tylko punkty
+regionu: listę punktów, wielokąt albo maskę (obraz / .npy), a kolejność
+odwiedzania wyznacza heurystyka najbliższego sąsiada poprawiana 2-opt.
+
+Koszt przejazdu między punktami to czas: osie X i Y mają osobne sterowniki i
+ruszają równolegle, więc t = max(|dx|·step_x / v_x, |dy|·step_y / v_y)
++ stała na ruch. Współrzędne punktów to indeksy siatki (jak x, y w pliku
+pomiaru), (0, 0) w lewym górnym rogu obszaru skanu.
+
+Plik regionu (`scan_region` w options.json):
+- .json: {"points": [[x, y], ...]} albo {"polygon": [[x, y], ...]},
+- .npy / .png / .bmp / .jpg: maska – niezerowe piksele to obszar próbki,
+  skalowana do rozmiaru siatki.
+"""
+
+MOVE_OVERHEAD_S = 0.01
+
+
+def travel_cost(a, b, step_x, step_y, speed_x, speed_y):
+    """Czas przejazdu (s) między punktami siatki a i b (tablice [..., 2])."""
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    tx = np.abs(a[..., 0] - b[..., 0]) * step_x / speed_x
+    ty = np.abs(a[..., 1] - b[..., 1]) * step_y / speed_y
+    moving = (tx > 0) | (ty > 0)
+    return np.maximum(tx, ty) + MOVE_OVERHEAD_S * moving
+
+
+def path_cost(path, step_x, step_y, speed_x, speed_y, start=None):
+    pts = np.asarray(path, dtype=float)
+    if len(pts) == 0:
+        return 0.0
+    total = float(np.sum(travel_cost(pts[:-1], pts[1:], step_x, step_y, speed_x, speed_y)))
+    if start is not None:
+        total += float(travel_cost(np.asarray(start, dtype=float), pts[0], step_x, step_y, speed_x, speed_y))
+    return total
+
+
+def nearest_neighbour_path(points, start, step_x, step_y, speed_x, speed_y):
+    """Zachłanna ścieżka: zawsze najbliższy (w czasie) nieodwiedzony punkt."""
+    pts = np.asarray(points, dtype=float)
+    n = len(pts)
+    if n == 0:
+        return []
+    visited = np.zeros(n, dtype=bool)
+    order = []
+    current = np.asarray(start if start is not None else pts[0], dtype=float)
+    for _ in range(n):
+        cost = travel_cost(current, pts, step_x, step_y, speed_x, speed_y)
+        cost[visited] = np.inf
+        idx = int(np.argmin(cost))
+        visited[idx] = True
+        order.append(idx)
+        current = pts[idx]
+    return [tuple(int(v) for v in pts[i]) for i in order]
+
+
+def two_opt(path, step_x, step_y, speed_x, speed_y, start=None, max_time=2.0):
+    """Popraw ścieżkę otwartą ruchami 2-opt (odwracanie odcinków).
+
+    Dla każdej krawędzi (i, i+1) sprawdzamy wektorowo wszystkie krawędzie
+    (j, j+1); ostatni punkt ścieżki jest wolny (ścieżka nie wraca do startu).
+    Przerywa po `max_time` sekundach – dla dużych zbiorów wynik NN jest już
+    dobry, a 2-opt usuwa głównie skrzyżowania.
+    """
+    pts = [tuple(p) for p in path]
+    if start is not None:
+        pts = [tuple(start)] + pts
+    arr = np.asarray(pts, dtype=float)
+    n = len(arr)
+    if n < 4:
+        return list(path)
+
+    def cost(a, b):
+        return travel_cost(a, b, step_x, step_y, speed_x, speed_y)
+
+    deadline = time.perf_counter() + max_time
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(0, n - 2):
+            a, b = arr[i], arr[i + 1]
+            c = arr[i + 2:]
+            d = arr[i + 3:]
+            d_ab = cost(a, b)
+            # Krawędzie (j, j+1) dla j = i+2 .. n-2, plus wolny koniec (j = n-1)
+            delta = np.empty(len(c))
+            delta[:-1] = cost(a, c[:-1]) + cost(b, d) - d_ab - cost(c[:-1], d)
+            delta[-1] = cost(a, c[-1]) - d_ab
+            j = int(np.argmin(delta))
+            if delta[j] < -1e-9:
+                j += i + 2
+                arr[i + 1:j + 1] = arr[i + 1:j + 1][::-1].copy()
+                improved = True
+            if time.perf_counter() >= deadline:
+                break
+
+    result = [tuple(int(v) for v in p) for p in arr]
+    return result[1:] if start is not None else result
+
+
+def optimise_path(points, start, step_x, step_y, speed_x, speed_y, max_time=2.0):
+    """NN + 2-opt; zwraca listę (grid_x, grid_y)."""
+    path = nearest_neighbour_path(points, start, step_x, step_y, speed_x, speed_y)
+    return two_opt(path, step_x, step_y, speed_x, speed_y, start=start, max_time=max_time)
+
+
+def polygon_points(polygon, points_x, points_y):
+    """Punkty siatki wewnątrz wielokąta (wierzchołki w indeksach siatki)."""
+    from matplotlib.path import Path
+    gx, gy = np.meshgrid(np.arange(points_x), np.arange(points_y), indexing='ij')
+    grid = np.column_stack([gx.ravel(), gy.ravel()])
+    inside = Path(np.asarray(polygon, dtype=float)).contains_points(grid, radius=1e-9)
+    return [tuple(int(v) for v in p) for p in grid[inside]]
+
+
+def mask_points(mask, points_x, points_y):
+    """Punkty siatki, dla których maska (skalowana do siatki) jest niezerowa."""
+    mask = np.asarray(mask)
+    if mask.ndim == 3:
+        mask = mask.max(axis=2)
+    h, w = mask.shape
+    # Środek komórki siatki -> piksel maski (najbliższy sąsiad)
+    cols = np.minimum(((np.arange(points_x) + 0.5) * w / points_x).astype(int), w - 1)
+    rows = np.minimum(((np.arange(points_y) + 0.5) * h / points_y).astype(int), h - 1)
+    sampled = mask[np.ix_(rows, cols)] > 0
+    ys, xs = np.nonzero(sampled)
+    return [(int(x), int(y)) for x, y in zip(xs, ys)]
+
+
+def load_region(path, points_x, points_y):
+    """Wczytaj region skanu z pliku; zwraca listę punktów siatki (bez duplikatów)."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.json':
+        with open(path, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+        if 'polygon' in spec:
+            points = polygon_points(spec['polygon'], points_x, points_y)
+        else:
+            points = [(int(p[0]), int(p[1])) for p in spec.get('points', [])]
+    elif ext == '.npy':
+        points = mask_points(np.load(path), points_x, points_y)
+    else:
+        from PIL import Image
+        points = mask_points(np.asarray(Image.open(path).convert('L')), points_x, points_y)
+    seen = set()
+    result = []
+    for p in points:
+        if 0 <= p[0] < points_x and 0 <= p[1] < points_y and p not in seen:
+            seen.add(p)
+            result.append(p)
+    return result
+
+
+def compare_with_snake(path, points_x, points_y, step_x, step_y, speed_x, speed_y,
+                       start=None, dwell_s=0.0, starting_corner='top-left'):
+    """Porównaj ścieżkę regionu z wężem po całym prostokącie siatki.
+
+    `dwell_s` – czas pomiaru w punkcie (np. suma oczekiwań na ekspozycje).
+    """
+    from scan_order import snake_points
+    snake = snake_points(points_x, points_y, starting_corner)
+    snake_travel = path_cost(snake, step_x, step_y, speed_x, speed_y)
+    region_travel = path_cost(path, step_x, step_y, speed_x, speed_y, start=start)
+    snake_total = snake_travel + len(snake) * dwell_s
+    region_total = region_travel + len(path) * dwell_s
+    return {
+        'snake_points': len(snake),
+        'region_points': len(path),
+        'snake_travel_s': snake_travel,
+        'region_travel_s': region_travel,
+        'snake_total_s': snake_total,
+        'region_total_s': region_total,
+        'saved_s': snake_total - region_total,
+    }
@@ -0,0 +1,377 @@
+import io
+import csv
+import json
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import numpy as np
+
+from generate_sequence_like_measurements import _get_sequence_exposure_list_ms
+from scan_order import build_visits, build_path_visits, count_exposure_changes, count_position_changes
+
+"""Planer skanu: czas trwania, objętość danych i pamięć przed startem sekwencji.
+
+Uruchom z katalogu projektu (czyta options.json):
+
+    python scan_planner.py
+
+Model czasu odtwarza to, co faktycznie robi sekwencja w index.py:
+- w trybie punktowym każdy pomiar czeka max(sequence_sleep, ekspozycja + 0.1 s),
+  a każda zmiana ekspozycji (PxLApi.setFeature) kosztuje exposure_change_time;
+  liczba zmian zależy od kolejności ekspozycji (exposure_order, scan_order.py),
+  ruch do kolejnego punktu jest asynchroniczny i nakłada się na oczekiwanie,
+- w trybie ciągłym (continuous_scan.py) wiersz to przejazd ze stałą
+  prędkością wybraną tak, by na komórkę przypadało N klatek,
+- przed skanem jest przejazd po obwodzie obszaru, po skanie powrót do środka.
+
+Prędkości silników (μm/s) pochodzą z motor_speed_x / motor_speed_y
+(zmierzone przyciskiem "Measure Motor Speed"), a w ich braku z motor_speed.
+"""
+
+# Stałe odtwarzające opóźnienia zaszyte w sekwencji (index.py)
+POINT_SETTLE_S = 0.01          # pauza po ruchu do kolejnego punktu
+EXPOSURE_MARGIN_S = 0.1        # ekspozycja + ~100 ms buforu
+PREVIEW_FIXED_S = 1.0 + 4 * 0.2 + 1.0  # pauzy w przejeździe po obwodzie + po potwierdzeniu
+FS_BLOCK_BYTES = 4096          # zaokrąglenie rozmiaru pliku do bloku systemu plików
+FRAME_BYTES = 2048 * 2048      # bufor klatki PixeLink (uint8)
+CUBE_CHUNK_ROWS = 1000         # wiersze pliku pomiaru na porcję przy budowie kostki (export_chunk_rows)
+
+
+@dataclass
+class ScanParameters:
+    """Parametry skanu w jednostkach sekwencji (μm stolika, ms, s)."""
+    step_x: int = 20
+    step_y: int = 20
+    sample_width: float = 200.0
+    sample_height: float = 200.0
+    lens_magnification: float = 1.0
+    exposures_ms: List[float] = field(default_factory=lambda: [10.0])
+    sequence_sleep: float = 0.1
+    motor_speed_x: float = 2000.0
+    motor_speed_y: float = 2000.0
+    exposure_change_s: float = 0.05
+    spectrum_length: int = 2048
+    continuous_frames_per_cell: int = 3
+    continuous_frame_overhead: float = 0.01
+    continuous_start_latency: float = 0.05
+    continuous_max_speed: Optional[float] = None
+    frames_per_point: int = 1
+    scan_region: str = ''
+
+    @classmethod
+    def from_options(cls, opts, exposures_ms=None, spectrum_length=None):
+        """Zbuduj parametry z options.json (lub słownika opcji aplikacji)."""
+        opts = opts or {}
+        default_speed = float(opts.get('motor_speed', 2000.0))
+        if exposures_ms is None:
+            exposures_ms = _get_sequence_exposure_list_ms(opts)
+        if spectrum_length is None:
+            spectrum_length = _roi_length(opts)
+        max_speed = float(opts.get('continuous_max_speed', 0.0) or 0.0)
+        return cls(
+            step_x=max(1, int(float(opts.get('step_x', 20)))),
+            step_y=max(1, int(float(opts.get('step_y', 20)))),
+            sample_width=max(1.0, float(opts.get('width', 200))),
+            sample_height=max(1.0, float(opts.get('height', 200))),
+            lens_magnification=float(opts.get('lens_magnification', 1.0)) or 1.0,
+            exposures_ms=list(exposures_ms),
+            sequence_sleep=float(opts.get('sequence_sleep', 0.1)),
+            motor_speed_x=float(opts.get('motor_speed_x', default_speed)),
+            motor_speed_y=float(opts.get('motor_speed_y', default_speed)),
+            exposure_change_s=float(opts.get('exposure_change_time', 0.05)),
+            spectrum_length=int(spectrum_length),
+            continuous_frames_per_cell=int(opts.get('continuous_frames_per_cell', 3)),
+            continuous_frame_overhead=float(opts.get('continuous_frame_overhead', 0.01)),
+            continuous_start_latency=float(opts.get('continuous_start_latency', 0.05)),
+            continuous_max_speed=max_speed or None,
+            frames_per_point=max(1, int(opts.get('frames_per_point', 1))),
+            scan_region=str(opts.get('scan_region', '') or ''),
+        )
+
+    @property
+    def scan_width(self):
+        mag = self.lens_magnification if self.lens_magnification > 0 else 1.0
+        return int(self.sample_width * mag)
+
+    @property
+    def scan_height(self):
+        mag = self.lens_magnification if self.lens_magnification > 0 else 1.0
+        return int(self.sample_height * mag)
+
+    @property
+    def points_x(self):
+        return (self.scan_width // self.step_x) + 1
+
+    @property
+    def points_y(self):
+        return (self.scan_height // self.step_y) + 1
+
+    @property
+    def total_points(self):
+        return self.points_x * self.points_y
+
+
+def _roi_length(opts):
+    """Długość widma po ROI – ta sama oś co w generatorze / sekwencji."""
+    try:
+        from generate_sequence_like_measurements import _compute_axis_with_roi
+        return len(_compute_axis_with_roi(opts))
+    except Exception:
+        return 2048
+
+
+def _move_time(distance_um, speed_um_s):
+    return abs(distance_um) / speed_um_s if speed_um_s > 0 else 0.0
+
+
+def estimate_overhead(p):
+    """Przejazd do narożnika + obwód + powrót do środka (s)."""
+    w, h = p.scan_width, p.scan_height
+    to_corner = max(_move_time(w / 2, p.motor_speed_x), _move_time(h / 2, p.motor_speed_y))
+    perimeter = 2 * _move_time(w, p.motor_speed_x) + 2 * _move_time(h, p.motor_speed_y)
+    back = _move_time(w / 2, p.motor_speed_x) + _move_time(h / 2, p.motor_speed_y)
+    return PREVIEW_FIXED_S + to_corner + perimeter + back
+
+
+def _point_waits(p):
+    """Czas w punkcie na każdą ekspozycję: oczekiwanie + dodatkowe klatki (frames_per_point)."""
+    return [max(p.sequence_sleep, e / 1000.0 + EXPOSURE_MARGIN_S)
+            + (p.frames_per_point - 1) * (e / 1000.0 + p.continuous_frame_overhead)
+            for e in p.exposures_ms]
+
+
+def estimate_point_scan(p, snake=True, order='point'):
+    """Czas skanu punkt-po-punkcie (s) oraz ostrzeżenia.
+
+    `order` to kolejność czasów ekspozycji (scan_order.py); liczba zmian
+    ekspozycji i ruchów jest liczona z tej samej listy pomiarów, którą
+    wykonuje sekwencja.
+    """
+    warnings = []
+    waits = _point_waits(p)
+    visits = build_visits(p.points_x, p.points_y, 'top-left', len(p.exposures_ms), order)
+    changes = count_exposure_changes(visits) + 1
+    moves = count_position_changes(visits)
+
+    step_move_x = _move_time(p.step_x, p.motor_speed_x)
+    if waits and step_move_x > waits[0]:
+        warnings.append(
+            f"X step takes {step_move_x:.2f}s but only {waits[0]:.2f}s is waited before "
+            f"the first exposure - spectra may be taken while moving (raise sequence_sleep)"
+        )
+
+    total = p.total_points * sum(waits) + changes * p.exposure_change_s + moves * POINT_SETTLE_S
+    if not snake:
+        # Powrót na początek wiersza (flyback) zamiast zmiany kierunku
+        flyback = _move_time((p.points_x - 1) * p.step_x, p.motor_speed_x)
+        total += (p.points_y - 1) * flyback
+    total += estimate_overhead(p)
+    return total, warnings
+
+
+def estimate_region_scan(p, order='point'):
+    """Czas skanu samego regionu (scan_region) po ścieżce NN + 2-opt (scan_path.py).
+
+    Przy skoku dalszym niż sąsiedni punkt sekwencja czeka na koniec ruchu,
+    więc czas przejazdu jest doliczany do oczekiwania w punkcie.
+    """
+    from scan_path import load_region, optimise_path, travel_cost
+    warnings = []
+    try:
+        region = load_region(p.scan_region, p.points_x, p.points_y)
+    except Exception as e:
+        total, w = estimate_point_scan(p)
+        return total, w + [f"Cannot load scan region {p.scan_region}: {e}"]
+    if not region:
+        total, w = estimate_point_scan(p)
+        return total, w + [f"Scan region {p.scan_region} contains no grid points"]
+    path = optimise_path(region, (0, 0), p.step_x, p.step_y, p.motor_speed_x, p.motor_speed_y, max_time=0.5)
+    if order == 'row':
+        order = 'point'
+    waits = _point_waits(p)
+    visits = build_path_visits(path, len(p.exposures_ms), order)
+    changes = count_exposure_changes(visits) + 1
+    moves = count_position_changes(visits)
+
+    jumps = 0.0
+    arr = np.asarray([v[:2] for v in visits], dtype=float)
+    if len(arr) > 1:
+        far = np.max(np.abs(arr[1:] - arr[:-1]), axis=1) > 1
+        jumps = float(np.sum(travel_cost(arr[:-1][far], arr[1:][far], p.step_x, p.step_y,
+                                         p.motor_speed_x, p.motor_speed_y)))
+    total = len(path) * sum(waits) + changes * p.exposure_change_s + moves * POINT_SETTLE_S + jumps
+    total += estimate_overhead(p)
+    return total, warnings
+
+
+def continuous_row_velocity(p, exposure_ms):
+    from continuous_scan import choose_row_velocity
+    frame_period = exposure_ms / 1000.0 + p.continuous_frame_overhead
+    return choose_row_velocity(p.step_x, frame_period, p.continuous_frames_per_cell, p.continuous_max_speed)
+
+
+def estimate_continuous_scan(p):
+    """Czas skanu ciągłego (s): jeden przejazd wiersza na czas ekspozycji."""
+    warnings = []
+    span = (p.points_x - 1) * p.step_x
+    row = 0.0
+    for e in p.exposures_ms:
+        exposure_s = e / 1000.0
+        velocity = continuous_row_velocity(p, e)
+        if velocity > p.motor_speed_x:
+            warnings.append(
+                f"Continuous sweep for {e:.1f} ms needs {velocity:.0f} μm/s, above motor speed "
+                f"{p.motor_speed_x:.0f} μm/s - cells will get fewer frames"
+            )
+        row += (p.exposure_change_s + exposure_s + p.continuous_frame_overhead
+                + p.continuous_start_latency + span / velocity + max(0.1, 2.0 * exposure_s))
+    y_move = max(0.1, p.step_y / p.motor_speed_y + 0.05) if p.motor_speed_y > 0 else 0.1
+    total = p.points_y * row + (p.points_y - 1) * y_move + estimate_overhead(p)
+    return total, warnings
+
+
+def _csv_bytes(rows):
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    return len(buf.getvalue().encode('utf-8'))
+
+
+def estimate_data_volume(p, sample_points=4, seed=0):
+    """Szacowany rozmiar danych na dysku (bajty): plik główny + pliki punktowe.
+
+    Długość zapisu liczb zależy od wartości, więc zamiast stałej "bajtów na
+    liczbę" formatujemy kilka syntetycznych punktów tym samym csv.writer co
+    sekwencja i skalujemy wynik.
+    """
+    rng = np.random.default_rng(seed)
+    L = p.spectrum_length
+    n_exp = max(1, len(p.exposures_ms))
+    axis = np.linspace(0.0, 2048.0, L)
+
+    main_rows = []
+    point_bytes = []
+    for _ in range(sample_points):
+        spectra = [rng.uniform(0.0, 255.0, L) for _ in range(n_exp)]
+        main_rows.append([0, 0] + spectra[0].tolist())
+        header = [["lambda"] + [f"I_{e:.1f}ms" for e in p.exposures_ms]]
+        body = [[float(axis[i])] + [float(s[i]) for s in spectra] for i in range(L)]
+        size = _csv_bytes(header + body)
+        point_bytes.append(-(-size // FS_BLOCK_BYTES) * FS_BLOCK_BYTES)
+
+    main = _csv_bytes(main_rows) / sample_points * p.total_points
+    points = float(np.mean(point_bytes)) * p.total_points
+    return {'main_file': main, 'point_files': points, 'total': main + points,
+            'files': p.total_points + 1}
+
+
+def estimate_memory(p, continuous=False):
+    """Szczytowe zużycie pamięci (bajty) przy akwizycji i przy otwarciu heatmapy."""
+    L = p.spectrum_length
+    acquisition = 2 * FRAME_BYTES  # bufor kamery + kopia w pixelink_image_data
+    if continuous:
+        velocity = min(continuous_row_velocity(p, e) for e in p.exposures_ms)
+        span = (p.points_x - 1) * p.step_x
+        frames_per_row = span / velocity / (min(p.exposures_ms) / 1000.0 + p.continuous_frame_overhead) + 1
+        # widma klatek wiersza + macierz binowania + wynik dla każdej ekspozycji
+        acquisition += frames_per_row * L * 8 + frames_per_row * p.points_x * 8
+        acquisition += len(p.exposures_ms) * p.points_x * L * 8
+    # HeatMapWindow (session_cube.py): kostka float32 [lambda, y, x] na dysku,
+    # w RAM jedno pasmo (+ przy budowie kostki porcja wierszy pliku pomiaru)
+    band = p.total_points * 4 * 2
+    build = CUBE_CHUNK_ROWS * (L + 2) * 8 + p.total_points
+    viewer = max(band, build) + L * 8
+    viewer_disk = p.total_points * L * 4
+    return {'acquisition': acquisition, 'viewer': viewer, 'viewer_disk': viewer_disk}
+
+
+def plan_scan(p):
+    """Porównaj strategie skanu; wynik posortowany od najszybszej."""
+    candidates = [
+        ('point (snake)', lambda: estimate_point_scan(p, snake=True)),
+        ('point (raster, flyback)', lambda: estimate_point_scan(p, snake=False)),
+    ]
+    if len(p.exposures_ms) > 1:
+        candidates += [
+            ('point, exposure per row', lambda: estimate_point_scan(p, order='row')),
+            ('point, exposure per pass', lambda: estimate_point_scan(p, order='pass')),
+        ]
+    if p.scan_region:
+        candidates.append(('point (region path)', lambda: estimate_region_scan(p)))
+        if len(p.exposures_ms) > 1:
+            candidates.append(('region, exposure per pass', lambda: estimate_region_scan(p, order='pass')))
+    candidates.append(('continuous', lambda: estimate_continuous_scan(p)))
+
+    strategies = []
+    for name, fn in candidates:
+        seconds, warnings = fn()
+        strategies.append({'name': name, 'seconds': seconds, 'warnings': warnings})
+    baseline = strategies[0]['seconds']
+    strategies.sort(key=lambda s: s['seconds'])
+    return {
+        'params': p,
+        'strategies': strategies,
+        'baseline_seconds': baseline,
+        'data': estimate_data_volume(p),
+        'memory_point': estimate_memory(p, continuous=False),
+        'memory_continuous': estimate_memory(p, continuous=True),
+    }
+
+
+def format_bytes(n):
+    n = float(n)
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024.0 or unit == 'GB':
+            return f"{n:.1f} {unit}" if unit != 'B' else f"{int(n)} B"
+        n /= 1024.0
+
+
+def format_seconds(seconds):
+    s = int(max(0, round(seconds)))
+    h, rem = divmod(s, 3600)
+    m, s = divmod(rem, 60)
+    if h > 0:
+        return f"{h:d}h {m:02d}m {s:02d}s"
+    if m > 0:
+        return f"{m:d}m {s:02d}s"
+    return f"{s:d}s"
+
+
+def format_plan(plan):
+    """Czytelny raport planu (konsola aplikacji / CLI)."""
+    p = plan['params']
+    lines = [
+        f"Scan plan: {p.points_x} x {p.points_y} = {p.total_points} points, "
+        f"area {p.scan_width}x{p.scan_height} μm (stage), step {p.step_x}/{p.step_y} μm",
+        f"Exposures (ms): {', '.join(f'{e:.1f}' for e in p.exposures_ms)}; "
+        f"motor speed X/Y: {p.motor_speed_x:.0f}/{p.motor_speed_y:.0f} μm/s",
+    ]
+    fastest = plan['strategies'][0]['seconds']
+    baseline = plan.get('baseline_seconds', fastest)
+    for s in plan['strategies']:
+        rel = s['seconds'] / fastest if fastest > 0 else 1.0
+        saving = baseline - s['seconds']
+        note = f", saves {format_seconds(saving)} vs point (snake)" if saving >= 1.0 else ""
+        lines.append(f"  {s['name']:<26} {format_seconds(s['seconds']):>12}  (x{rel:.2f}{note})")
+        for w in s['warnings']:
+            lines.append(f"    warning: {w}")
+    d = plan['data']
+    lines.append(
+        f"Data on disk: {format_bytes(d['total'])} in {d['files']} files "
+        f"(main {format_bytes(d['main_file'])}, points {format_bytes(d['point_files'])})"
+    )
+    mp, mc = plan['memory_point'], plan['memory_continuous']
+    lines.append(
+        f"Peak memory: acquisition {format_bytes(mp['acquisition'])} point / "
+        f"{format_bytes(mc['acquisition'])} continuous, heatmap viewer {format_bytes(mp['viewer'])} "
+        f"(+ cube {format_bytes(mp['viewer_disk'])} on disk)"
+    )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    try:
+        with open("options.json", "r", encoding="utf-8") as f:
+            opts = json.load(f)
+    except Exception:
+        opts = {}
+    print(format_plan(plan_scan(ScanParameters.from_options(opts))))
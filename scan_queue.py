@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import uuid
+from dataclasses import dataclass, field, asdict, fields
+from typing import List
+
+"""Kolejka zadań skanowania (praca bez operatora, np. przez noc).
+
+Zadania są zapisywane w `measurement_data/scan_queue.json` i przeżywają
+restart programu. Każde zadanie to osobna sekwencja (własny plik pomiaru i
+folder punktów) z własnym obszarem, krokami i czasami ekspozycji; przy
+zadaniach z kolejki nie ma podglądu obwodu ani pytania "Czy obszar się
+zgadza?".
+
+Przesunięcie obszaru (offset_x / offset_y, μm stolika) liczone jest od
+punktu startu kolejki (pozycja stolika w chwili "Start Queue"), jak w
+sekwencji: x rośnie w prawo ('r'), y w dół ('d'). Szerokość i wysokość są
+w płaszczyźnie próbki (przeliczane przez lens_magnification, jak w Settings).
+Między zadaniami stolik jedzie prosto z ostatniego punktu do narożnika
+startowego następnego zadania (bez powrotu do środka); narożnik 'nearest'
+wybiera narożnik najbliższy bieżącej pozycji.
+"""
+
+QUEUE_FILE = "scan_queue.json"
+JOB_STATUSES = ('pending', 'running', 'completed', 'interrupted', 'failed')
+CORNERS = ('top-left', 'top-right', 'bottom-left', 'bottom-right')
+
+
+@dataclass
+class ScanJob:
+    """Definicja jednego skanu w kolejce i jego stan."""
+    name: str = ''
+    offset_x: float = 0.0
+    offset_y: float = 0.0
+    width: float = 200.0
+    height: float = 200.0
+    step_x: int = 20
+    step_y: int = 20
+    exposures_ms: List[float] = field(default_factory=lambda: [10.0])
+    frames_per_point: int = 1
+    starting_corner: str = 'nearest'
+    scan_mode: str = 'point'
+    exposure_order: str = 'point'
+    job_id: str = ''
+    status: str = 'pending'
+    filename: str = ''
+    points_folder: str = ''
+    started: str = ''
+    finished: str = ''
+    message: str = ''
+
+    def __post_init__(self):
+        if not self.job_id:
+            self.job_id = uuid.uuid4().hex[:8]
+        if not self.name:
+            self.name = f"job_{self.job_id}"
+
+    @classmethod
+    def from_dict(cls, d):
+        known = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in d.items() if k in known})
+
+    def to_dict(self):
+        return asdict(self)
+
+    def describe(self):
+        exps = ", ".join(f"{e:g}" for e in self.exposures_ms)
+        return (f"{self.name}: {self.width:g}x{self.height:g} μm @ ({self.offset_x:g}, {self.offset_y:g}), "
+                f"step {self.step_x}/{self.step_y}, exp [{exps}] ms x{self.frames_per_point}, {self.scan_mode}")
+
+
+def corner_offset(corner, scan_width, scan_height):
+    """Położenie narożnika startowego względem środka obszaru (μm stolika)."""
+    ox = scan_width // 2 if corner in ['top-right', 'bottom-right'] else -scan_width // 2
+    oy = scan_height // 2 if corner in ['bottom-left', 'bottom-right'] else -scan_height // 2
+    return ox, oy
+
+
+def nearest_corner(position, center, scan_width, scan_height, speed_x=1.0, speed_y=1.0):
+    """Narożnik obszaru, do którego stolik dojedzie najszybciej (osie równolegle)."""
+    def travel(corner):
+        ox, oy = corner_offset(corner, scan_width, scan_height)
+        return max(abs(center[0] + ox - position[0]) / speed_x, abs(center[1] + oy - position[1]) / speed_y)
+    return min(CORNERS, key=travel)
+
+
+class ScanQueue:
+    """Trwała lista zadań (plik JSON zapisywany atomowo po każdej zmianie)."""
+
+    def __init__(self, folder="measurement_data"):
+        self.path = os.path.join(folder, QUEUE_FILE)
+        self.jobs = []
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.jobs = [ScanJob.from_dict(d) for d in json.load(f).get('jobs', [])]
+        except Exception:
+            self.jobs = []
+        # Zadanie przerwane zamknięciem programu nie jest już uruchomione
+        for job in self.jobs:
+            if job.status == 'running':
+                job.status = 'interrupted'
+        return self.jobs
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({'jobs': [job.to_dict() for job in self.jobs]}, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def get(self, job_id):
+        for job in self.jobs:
+            if job.job_id == job_id:
+                return job
+        return None
+
+    def add(self, job):
+        self.jobs.append(job)
+        self.save()
+        return job
+
+    def remove(self, job_id):
+        self.jobs = [job for job in self.jobs if job.job_id != job_id or job.status == 'running']
+        self.save()
+
+    def move(self, job_id, delta):
+        """Przesuń zadanie w kolejce o `delta` pozycji (-1 = wyżej)."""
+        for i, job in enumerate(self.jobs):
+            if job.job_id == job_id:
+                j = max(0, min(len(self.jobs) - 1, i + delta))
+                self.jobs.insert(j, self.jobs.pop(i))
+                self.save()
+                return
+
+    def reset(self, job_id):
+        """Przywróć zadanie do stanu 'pending' (wyniki poprzedniego przebiegu zostają na dysku)."""
+        job = self.get(job_id)
+        if job is not None and job.status != 'running':
+            job.status = 'pending'
+            job.message = ''
+            self.save()
+
+    def next_pending(self):
+        for job in self.jobs:
+            if job.status == 'pending':
+                return job
+        return None
+
+    def update(self, job_id, **values):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        for key, value in values.items():
+            setattr(job, key, value)
+        if values.get('status') == 'running':
+            job.started = time.strftime('%Y-%m-%d %H:%M:%S')
+        elif values.get('status') in ('completed', 'interrupted', 'failed'):
+            job.finished = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.save()
+        return job
@@ -0,0 +1,139 @@
+import os
+import csv
+import glob
+import json
+import time
+
+"""Punkty kontrolne sekwencji pomiarowej (wznawianie przerwanego skanu).
+
+Stan sekwencji jest zapisywany w `points_<session>/sequence_state.json`:
+parametry siatki, czasy ekspozycji, ROI i oś widma z chwili startu, ostatni
+ukończony punkt oraz śledzona pozycja stolika względem środka obszaru
+(pos_x/pos_y) i – jeśli stolik był zbazowany – położenie środka od bazy.
+
+Źródłem prawdy o ukończonych punktach jest główny plik CSV (wiersze są
+zapisywane i flushowane po każdym punkcie); checkpoint mówi, jak go
+kontynuować. Przerwany skan zostaje na dysku ze statusem 'interrupted'
+i jest oznaczany w zakładce Results jako częściowy.
+"""
+
+CHECKPOINT_FILE = "sequence_state.json"
+STATE_VERSION = 1
+
+
+def checkpoint_path(points_folder):
+    return os.path.join(points_folder, CHECKPOINT_FILE)
+
+
+def save_checkpoint(points_folder, state):
+    """Zapisz stan atomowo (plik tymczasowy + os.replace)."""
+    path = checkpoint_path(points_folder)
+    tmp = path + ".tmp"
+    state = dict(state)
+    state['version'] = STATE_VERSION
+    state['updated'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def load_checkpoint(points_folder):
+    try:
+        with open(checkpoint_path(points_folder), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def points_folder_for(measurement_file):
+    """measurement_<id>_spectra.csv -> points_<id>"""
+    folder = os.path.dirname(measurement_file)
+    base = os.path.basename(measurement_file)
+    session_id = base[len("measurement_"):-len("_spectra.csv")] if base.startswith("measurement_") else base
+    return os.path.join(folder, f"points_{session_id}")
+
+
+def is_partial(measurement_file):
+    """Czy plik pomiaru pochodzi z nieukończonego (przerwanego) skanu."""
+    state = load_checkpoint(points_folder_for(measurement_file))
+    return state is not None and state.get('status') != 'completed'
+
+
+def find_interrupted(folder="measurement_data"):
+    """Przerwane sekwencje (najnowsze pierwsze), które mają dane do wznowienia."""
+    states = []
+    for path in glob.glob(os.path.join(folder, "points_*", CHECKPOINT_FILE)):
+        state = load_checkpoint(os.path.dirname(path))
+        if not state or state.get('status') == 'completed':
+            continue
+        if not os.path.exists(state.get('filename', '')):
+            continue
+        states.append(state)
+    states.sort(key=lambda st: st.get('session_id', ''), reverse=True)
+    return states
+
+
+def recover_completed_points(state):
+    """Wczytaj ukończone punkty z głównego CSV i uporządkuj pliki do wznowienia.
+
+    Punkt jest ukończony, gdy ma pełny wiersz w głównym pliku i plik
+    punktowy. Główny plik jest przepisywany bez uciętego ostatniego wiersza
+    i bez punktów, którym brakuje pliku punktowego (zostaną zmierzone
+    ponownie). Zwraca zbiór (grid_x, grid_y).
+    """
+    filename = state['filename']
+    points_folder = state['points_folder']
+    expected_len = 2 + int(state.get('spectrum_length', 0))
+
+    rows = []
+    done = set()
+    with open(filename, "r", newline="") as f:
+        for row in csv.reader(f):
+            if expected_len > 2 and len(row) != expected_len:
+                continue
+            try:
+                gx, gy = int(float(row[0])), int(float(row[1]))
+                [float(v) for v in row[2:]]
+            except (ValueError, IndexError):
+                continue
+            point_file = os.path.join(points_folder, f"point_x{gx}_y{gy}.csv")
+            if (gx, gy) in done or not os.path.exists(point_file):
+                continue
+            done.add((gx, gy))
+            rows.append(row)
+
+    tmp = filename + ".tmp"
+    with open(tmp, "w", newline="") as f:
+        csv.writer(f).writerows(rows)
+    os.replace(tmp, filename)
+    return done
+
+
+class SequenceCheckpoint:
+    """Okresowy zapis stanu sekwencji (nie częściej niż co `min_interval` s)."""
+
+    def __init__(self, points_folder, state, min_interval=1.0):
+        self.points_folder = points_folder
+        self.state = dict(state)
+        self.state.setdefault('status', 'running')
+        self.state.setdefault('completed_count', 0)
+        self.min_interval = float(min_interval)
+        self._last_save = 0.0
+
+    def point_done(self, grid_x, grid_y, pos_x, pos_y):
+        self.state['completed_count'] = int(self.state.get('completed_count', 0)) + 1
+        self.state['last_point'] = [int(grid_x), int(grid_y)]
+        self.state['pos'] = [pos_x, pos_y]
+        if time.time() - self._last_save >= self.min_interval:
+            self.save()
+
+    def save(self):
+        try:
+            save_checkpoint(self.points_folder, self.state)
+            self._last_save = time.time()
+        except Exception as e:
+            print(f"Checkpoint save error: {e}")
+
+    def finish(self, status):
+        self.state['status'] = status
+        self.save()
@@ -0,0 +1,1541 @@
+import os
+import csv
+import sys
+import json
+import time
+import shutil
+import threading
+import argparse
+from dataclasses import dataclass, field, replace
+from typing import List, Optional
+
+import numpy as np
+
+from spectrum_processing import frame_to_spectrum, frame_to_gray
+from continuous_scan import ContinuousRowScanner, choose_row_velocity, bin_row, descriptor_exposure_ms, exposure_matches
+from scan_order import EXPOSURE_ORDERS, build_visits, build_path_visits, count_exposure_changes, revisit_agreement
+from sequence_checkpoint import SequenceCheckpoint, find_interrupted, recover_completed_points
+from adaptive_scan import AdaptiveGridPlanner, order_path
+from scan_path import load_region, optimise_path, compare_with_snake
+from drift_tracker import DriftTracker
+from autofocus import Autofocus, z_stack_offsets
+from frame_calibration import FrameCalibration, CALIBRATION_FOLDER
+from wavelength_calibration import spectral_axis
+from optimal_extraction import OptimalExtractor
+from peak_tracker import PeakTracker
+from saturation import SaturationMonitor, SATURATION_FILE
+from raw_archive import RawArchiveWriter, band_rows
+from measurement_catalog import MeasurementCatalog, SpectrumStats
+
+"""Silnik sekwencji pomiarowej niezależny od Tk.
+
+Cała logika skanu (podgląd obwodu, tryby point / continuous / adaptive,
+region, kolejność ekspozycji, punkty kontrolne, zapis plików) działa na
+jawnej konfiguracji `SequenceConfig` i steruje bezpośrednio
+`SpectrometerManager` i `MotorController` (hardware.py). GUI (index.py) jest
+jednym z klientów: buduje konfigurację z pól Settings i uruchamia silnik w
+wątku. Bez ekranu:
+
+    python sequence_engine.py --width 500 --height 300 --exposures "10, 50" --yes
+    python sequence_engine.py --resume
+
+Pliki wynikowe są takie same jak z GUI: measurement_<sesja>_spectra.csv
+(x, y, widmo pierwszego czasu) i points_<sesja>/point_xX_yY.csv.
+"""
+
+CORNERS = ('top-left', 'top-right', 'bottom-left', 'bottom-right')
+MIN_EXPOSURE_MS = 0.1  # najkrótsza ekspozycja przy saturation_action='reduce'
+
+
+def roi_from_options(opts):
+    """Indeksy ROI i oś (lambda / piksele) wg options.json – wspólna SpectralAxis z GUI."""
+    axis = spectral_axis(opts)
+    return [int(i) for i in axis.roi_indices], [float(a) for a in axis.axis]
+
+
+@dataclass
+class SequenceConfig:
+    """Parametry jednej sekwencji (μm stolika, ms, s)."""
+    step_x: int = 20
+    step_y: int = 20
+    scan_width: int = 200            # szerokość próbki × lens_magnification
+    scan_height: int = 200
+    lens_magnification: float = 1.0
+    exposures_ms: List[float] = field(default_factory=lambda: [10.0])
+    starting_corner: str = 'top-left'
+    scan_mode: str = 'point'         # 'point', 'continuous' albo 'adaptive'
+    exposure_order: str = 'point'
+    scan_region: str = ''
+    adaptive_coarse_stride: int = 4
+    adaptive_threshold: float = 0.1
+    frames_per_point: int = 1
+    sequence_sleep: float = 0.5
+    frame_timeout: float = 2.0       # s (ponad ekspozycję) na nową klatkę ze strumienia
+    first_frame_timeout: float = 10.0  # s na pierwszą klatkę po starcie sekwencji
+    repeatability_threshold: float = 0.9
+    motor_speed: float = 2000.0
+    motor_speed_x: Optional[float] = None
+    motor_speed_y: Optional[float] = None
+    continuous_frames_per_cell: int = 3
+    continuous_max_speed: Optional[float] = None
+    continuous_frame_overhead: float = 0.01
+    continuous_start_latency: float = 0.05
+    drift_compensation: bool = False  # korekta dryfu z kamery USB na granicach wierszy
+    drift_um_per_px: float = 1.0     # μm stolika na piksel kamery USB przy 1×
+    drift_axis_sign: tuple = (1, 1)
+    drift_check_rows: int = 1
+    drift_min_um: float = 2.0        # mniejsze przesunięcia (< 1 impuls) są pomijane
+    drift_max_um: float = 50.0
+    autofocus: str = 'off'           # 'off', 'start' (raz na starcie) albo 'row' (co wiersz)
+    autofocus_range_um: float = 100.0
+    autofocus_tol_um: float = 2.0
+    z_stack_count: int = 1           # > 1: stos Z w każdym punkcie (zstack_xX_yY.npy)
+    z_stack_step_um: float = 5.0
+    frame_calibration: bool = False  # ciemna klatka / flat field / złe piksele (frame_calibration.py)
+    calibration_folder: str = CALIBRATION_FOLDER
+    smile_correction: bool = False  # prostowanie krzywizny szczeliny (smile_correction.py)
+    extraction: str = 'mean'         # 'mean' albo 'optimal' (optimal_extraction.py)
+    read_noise_dn: float = 2.0
+    gain_e_per_dn: float = 1.0
+    peak_tracking: bool = False      # środek / FWHM / amplituda pików w każdym punkcie -> peaks.csv
+    peak_max_count: int = 8
+    saturation_action: str = 'flag'  # nasycona klatka: 'flag' (tylko zapis), 'reject' (powtórz), 'reduce' (krótsza ekspozycja)
+    saturation_level: int = 0        # 0 = maksimum typu klatki (255 dla uint8)
+    saturation_max_pixels: int = 0   # tyle nasyconych pikseli w klatce jest jeszcze dopuszczalne
+    saturation_retries: int = 3
+    raw_archive: bool = False        # surowe klatki (pas widma) każdego punktu -> raw_frames.bin (raw_archive.py)
+    raw_archive_codec: str = 'zlib'  # 'zlib' albo 'lz4' (gdy pakiet lz4 jest zainstalowany)
+    raw_archive_rows: Optional[List[int]] = None  # [r0, r1] archiwizowanych wierszy; None = pas widma z tłem
+    roi_indices: Optional[List[int]] = None
+    axis: Optional[List[float]] = None
+    output_folder: str = 'measurement_data'
+    preview_perimeter: bool = True   # przejazd po obwodzie i potwierdzenie obszaru
+    return_to_center: bool = True    # powrót do środka obszaru po skanie
+    start_pos: tuple = (0.0, 0.0)    # pozycja stolika względem środka obszaru na starcie
+    job_id: Optional[str] = None
+
+    @classmethod
+    def from_options(cls, opts, **overrides):
+        """Konfiguracja z options.json; `overrides` nadpisują pojedyncze pola."""
+        from generate_sequence_like_measurements import _get_sequence_exposure_list_ms
+        opts = opts or {}
+        lens_mag = float(opts.get('lens_magnification', 1.0) or 1.0)
+        if lens_mag <= 0:
+            lens_mag = 1.0
+        roi_indices, axis = roi_from_options(opts)
+        max_speed = float(opts.get('continuous_max_speed', 0.0) or 0.0)
+        config = cls(
+            step_x=max(1, int(float(opts.get('step_x', 20)))),
+            step_y=max(1, int(float(opts.get('step_y', 20)))),
+            scan_width=int(float(opts.get('width', 200)) * lens_mag),
+            scan_height=int(float(opts.get('height', 200)) * lens_mag),
+            lens_magnification=lens_mag,
+            exposures_ms=[float(e) for e in _get_sequence_exposure_list_ms(opts)],
+            starting_corner=str(opts.get('starting_corner', 'top-left')),
+            scan_mode=str(opts.get('scan_mode', 'point')),
+            exposure_order=str(opts.get('exposure_order', 'point')),
+            scan_region=str(opts.get('scan_region', '') or ''),
+            adaptive_coarse_stride=int(opts.get('adaptive_coarse_stride', 4)),
+            adaptive_threshold=float(opts.get('adaptive_threshold', 0.1)),
+            frames_per_point=max(1, int(opts.get('frames_per_point', 1))),
+            sequence_sleep=float(opts.get('sequence_sleep', 0.5)),
+            repeatability_threshold=float(opts.get('repeatability_threshold', 0.9)),
+            frame_timeout=float(opts.get('frame_timeout', 2.0)),
+            first_frame_timeout=float(opts.get('first_frame_timeout', 10.0)),
+            motor_speed=float(opts.get('motor_speed', 2000.0)),
+            motor_speed_x=opts.get('motor_speed_x'),
+            motor_speed_y=opts.get('motor_speed_y'),
+            continuous_frames_per_cell=int(opts.get('continuous_frames_per_cell', 3)),
+            continuous_max_speed=max_speed or None,
+            continuous_frame_overhead=float(opts.get('continuous_frame_overhead', 0.01)),
+            continuous_start_latency=float(opts.get('continuous_start_latency', 0.05)),
+            drift_compensation=bool(opts.get('drift_compensation', False)),
+            drift_um_per_px=float(opts.get('drift_um_per_px', 1.0)),
+            drift_axis_sign=tuple(opts.get('drift_axis_sign', (1, 1))),
+            drift_check_rows=max(1, int(opts.get('drift_check_rows', 1))),
+            drift_min_um=float(opts.get('drift_min_um', 2.0)),
+            drift_max_um=float(opts.get('drift_max_um', 50.0)),
+            autofocus=str(opts.get('autofocus', 'off')),
+            autofocus_range_um=float(opts.get('autofocus_range_um', 100.0)),
+            autofocus_tol_um=float(opts.get('autofocus_tol_um', 2.0)),
+            z_stack_count=max(1, int(opts.get('z_stack_count', 1))),
+            z_stack_step_um=float(opts.get('z_stack_step_um', 5.0)),
+            frame_calibration=bool(opts.get('frame_calibration', False)),
+            calibration_folder=str(opts.get('calibration_folder', CALIBRATION_FOLDER)),
+            smile_correction=bool(opts.get('smile_correction', False)),
+            extraction=str(opts.get('extraction', 'mean')),
+            read_noise_dn=float(opts.get('read_noise_dn', 2.0)),
+            gain_e_per_dn=float(opts.get('gain_e_per_dn', 1.0)),
+            peak_tracking=bool(opts.get('peak_tracking', False)),
+            peak_max_count=int(opts.get('peak_max_count', 8)),
+            saturation_action=str(opts.get('saturation_action', 'flag')),
+            saturation_level=int(opts.get('saturation_level', 0) or 0),
+            saturation_max_pixels=max(0, int(opts.get('saturation_max_pixels', 0))),
+            saturation_retries=max(0, int(opts.get('saturation_retries', 3))),
+            raw_archive=bool(opts.get('raw_archive', False)),
+            raw_archive_codec=str(opts.get('raw_archive_codec', 'zlib')),
+            raw_archive_rows=opts.get('raw_archive_rows') or None,
+            roi_indices=roi_indices,
+            axis=axis,
+        )
+        return replace(config, **overrides) if overrides else config
+
+    @classmethod
+    def from_checkpoint(cls, state, opts=None):
+        """Konfiguracja przerwanej sekwencji (sequence_checkpoint.py) do wznowienia."""
+        config = cls.from_options(opts or {})
+        return replace(
+            config,
+            step_x=int(state['step_x']),
+            step_y=int(state['step_y']),
+            scan_width=int(state['scan_width']),
+            scan_height=int(state['scan_height']),
+            lens_magnification=float(state.get('lens_magnification', config.lens_magnification)),
+            exposures_ms=[float(e) for e in state['exposures_ms']],
+            starting_corner=state['starting_corner'],
+            scan_mode=state.get('scan_mode', 'point'),
+            exposure_order=state.get('exposure_order', 'point'),
+            scan_region=state.get('scan_region', '') or '',
+            adaptive_coarse_stride=int(state.get('adaptive_coarse_stride', config.adaptive_coarse_stride)),
+            adaptive_threshold=float(state.get('adaptive_threshold', config.adaptive_threshold)),
+            roi_indices=state.get('roi_indices'),
+            axis=state.get('axis'),
+            preview_perimeter=False,
+            job_id=state.get('job_id'),
+        )
+
+    @property
+    def points_x(self):
+        return (self.scan_width // self.step_x) + 1
+
+    @property
+    def points_y(self):
+        return (self.scan_height // self.step_y) + 1
+
+    @property
+    def speed_x(self):
+        return float(self.motor_speed_x or self.motor_speed)
+
+    @property
+    def speed_y(self):
+        return float(self.motor_speed_y or self.motor_speed)
+
+
+class NoFrameError(RuntimeError):
+    """Brak klatki ze spektrometru – punkt nie może zostać zapisany."""
+
+
+class SequenceEngine:
+    """Jedna sekwencja pomiarowa: ruch stolika, akwizycja, zapis, checkpoint.
+
+    spectrometer - SpectrometerManager (set_exposure, strumień klatek),
+    motors - MotorController (None lub niepodłączony = symulacja bez ruchu),
+    frame_source - fn() -> aktualna klatka; domyślnie ostatnia klatka ze
+        strumienia spektrometru,
+    spectrum_fallback - fn() -> widmo, gdy nie ma klatki (GUI: bieżące widmo),
+    confirm_area - fn() -> bool po przejeździe po obwodzie (blokujące),
+    should_stop - fn() -> bool, dodatkowy warunek przerwania (poza stop()),
+    camera_frame_source - fn() -> klatka kamery USB (dryf, autofokus),
+    calibration - FrameCalibration (wspólna pamięć podręczna z GUI); domyślnie
+        nowa dla config.calibration_folder, gdy sekwencja używa korekcji
+        klatek, prostowania albo ekstrakcji optymalnej.
+    """
+
+    def __init__(self, config, spectrometer=None, motors=None, frame_source=None,
+                 spectrum_fallback=None, confirm_area=None, should_stop=None,
+                 camera_frame_source=None, calibration=None):
+        self.config = config
+        self.spectrometer = spectrometer
+        self.motors = motors
+        self.frame_source = frame_source
+        self.spectrum_fallback = spectrum_fallback
+        self.confirm_area = confirm_area
+        self.should_stop = should_stop
+        self.camera_frame_source = camera_frame_source
+        if config.frame_calibration or config.smile_correction or config.extraction == 'optimal' or config.raw_archive:
+            self.calibration = calibration or FrameCalibration(config.calibration_folder)
+        else:
+            self.calibration = None
+        # Własne bufory ekstrakcji (podgląd GUI ma osobny ekstraktor)
+        self.extractor = None
+        if config.extraction == 'optimal':
+            if self.calibration.stripe is not None:
+                self.extractor = OptimalExtractor(self.calibration.stripe, config.read_noise_dn, config.gain_e_per_dn)
+            else:
+                print("Optimal extraction: no stripe profile (Fit Stripe) - using column mean")
+        self.peaks = PeakTracker(config.peak_max_count, history=1) if config.peak_tracking else None
+        self.saturation = SaturationMonitor(config.saturation_level)
+        self.frame_saturation = 0
+        self.saturated_points = 0
+        self.archive = None
+        self.archive_frames = []
+        self.stats = SpectrumStats()
+        self.used_exposure_ms = None
+        self._band = None
+        self._last_frame = None
+        self.drift = None
+        self.focus = None
+        self.focus_z = None
+        self.z_offsets = None
+        self.z_stacks = {}
+        self.motor_connected = bool(motors is not None and getattr(motors, 'connected', False))
+        self._stop_requested = False
+        # Klatki ze strumienia spektrometru (listener): numer ostatniej i ostatnio użytej
+        self._listening = False
+        self._frame_cond = threading.Condition()
+        self._latest_frame = None
+        self._frame_seq = 0
+        self._frame_used = 0
+        self._frame_exposure_ms = None
+        # Pozycja stolika względem środka obszaru (μm): x w prawo, y w dół
+        self.pos_x, self.pos_y = config.start_pos
+        self.completed_points = set()
+        self.exposure_change_times = []
+
+    # --- sterowanie ---------------------------------------------------------------
+
+    def stop(self):
+        self._stop_requested = True
+
+    def stopped(self):
+        return self._stop_requested or bool(self.should_stop and self.should_stop())
+
+    # --- ruch stolika -------------------------------------------------------------
+
+    def move_tracked(self, direction, distance_um):
+        """Move motors and track relative position from center (only if connected)."""
+        if not self.motor_connected:
+            # In simulation mode we do not physically move, but we also
+            # do not change the logical position so that returning
+            # to center is a no-op.
+            return
+        try:
+            self.motors.move(direction, distance_um)
+            if direction == 'r':
+                self.pos_x += distance_um
+            elif direction == 'l':
+                self.pos_x -= distance_um
+            elif direction == 'd':
+                self.pos_y += distance_um
+            elif direction == 'u':
+                self.pos_y -= distance_um
+        except Exception as e:
+            print(f"Motor move error (tracked): {e}")
+
+    def return_to_center(self):
+        """Return stage to center based on tracked position."""
+        if not self.motor_connected:
+            return
+        try:
+            # First correct X
+            if self.pos_x > 0:
+                self.motors.move('l', self.pos_x)
+            elif self.pos_x < 0:
+                self.motors.move('r', -self.pos_x)
+            # Then correct Y
+            if self.pos_y > 0:
+                self.motors.move('u', self.pos_y)
+            elif self.pos_y < 0:
+                self.motors.move('d', -self.pos_y)
+        except Exception as e:
+            print(f"Return to center error: {e}")
+        finally:
+            self.pos_x = 0
+            self.pos_y = 0
+
+    def wait_for_travel(self, dx_um, dy_um):
+        """Odczekaj przejazd na odległość dx/dy (μm) – ruchy są asynchroniczne."""
+        if not self.motor_connected:
+            return
+        time.sleep(abs(dx_um) / self.config.speed_x + abs(dy_um) / self.config.speed_y + 0.1)
+
+    def goto_grid(self, grid_x, grid_y, wait=False):
+        """Przejedź do punktu siatki wg śledzonej pozycji (pos_x/pos_y względem środka)."""
+        target_x = self.offset_x + (grid_x - self.corner_gx) * self.config.step_x
+        target_y = self.offset_y + (grid_y - self.corner_gy) * self.config.step_y
+        dx = target_x - self.pos_x
+        dy = target_y - self.pos_y
+        if dx:
+            self.move_tracked('r' if dx > 0 else 'l', abs(dx))
+        if dy:
+            self.move_tracked('d' if dy > 0 else 'u', abs(dy))
+        if wait and (dx or dy):
+            self.wait_for_travel(dx, dy)
+
+    def preview_perimeter(self):
+        """Przejazd do narożnika startowego i dookoła obszaru (kończy w narożniku)."""
+        c = self.config
+        try:
+            print("🔁 Performing perimeter pass around scan area...")
+
+            # 1) Move from current center to selected starting corner of scan area
+            if self.offset_x != 0:
+                self.move_tracked('l' if self.offset_x < 0 else 'r', abs(self.offset_x))
+            if self.offset_y != 0:
+                self.move_tracked('u' if self.offset_y < 0 else 'd', abs(self.offset_y))
+
+            # Allow motors to finish initial move
+            time.sleep(1)
+
+            # 2) Perimeter pass: drive around the edges of the scan area once
+            w, h = c.scan_width, c.scan_height
+            perim_moves = {
+                'top-left': [('r', w), ('d', h), ('l', w), ('u', h)],
+                'top-right': [('l', w), ('d', h), ('r', w), ('u', h)],
+                'bottom-left': [('r', w), ('u', h), ('l', w), ('d', h)],
+                'bottom-right': [('l', w), ('u', h), ('r', w), ('d', h)],
+            }.get(c.starting_corner, [])
+
+            # Execute perimeter moves with small pauses for stabilization
+            for d, s in perim_moves:
+                print(f"➡️ Perimeter move: {d} {s} μm")
+                try:
+                    self.move_tracked(d, s)
+                except Exception as _e:
+                    print(f"Perimeter move failed: {_e}")
+                # small delay to allow mechanical movement (may be adjusted)
+                time.sleep(0.2)
+            print("🔁 Perimeter pass completed")
+            print("✅ Preview finished, stage at starting corner")
+        except Exception as e:
+            print(f"Perimeter pass error: {e}")
+
+    # --- dryf ---------------------------------------------------------------------
+
+    def _goto_drift_reference(self):
+        reference = (self.corner_gx, self.corner_gy)
+        self.goto_grid(*reference, wait=True)
+        self.stage_state['position'] = reference
+        time.sleep(0.2)
+
+    def start_drift_tracking(self):
+        """Klatka odniesienia kamery USB w narożniku startowym (drift_tracker.py)."""
+        c = self.config
+        if c.scan_mode == 'adaptive' or c.scan_region:
+            print("Drift compensation works on row scans only - disabled for adaptive / region scans")
+            return
+        if self.camera_frame_source is None or not self.motor_connected:
+            print("Drift compensation needs the USB camera and connected motors - disabled")
+            return
+        tracker = DriftTracker(self.camera_frame_source, c.drift_um_per_px, c.lens_magnification,
+                               c.drift_axis_sign, max_shift_um=c.drift_max_um)
+        self._goto_drift_reference()
+        if tracker.set_reference():
+            self.drift = tracker
+            self.drift_rows = 0
+            print(f"Drift compensation: reference at grid ({self.corner_gx}, {self.corner_gy}), "
+                  f"check every {c.drift_check_rows} rows")
+
+    def row_boundary(self, row):
+        """Koniec wiersza: korekta dryfu i (autofocus 'row') ponowne ogniskowanie."""
+        if self.stopped():
+            return
+        self.compensate_drift(row)
+        if self.focus is not None and self.config.autofocus == 'row':
+            self.refocus()
+
+    def compensate_drift(self, row):
+        """Co drift_check_rows wierszy pomiar dryfu w punkcie odniesienia i korekta."""
+        c = self.config
+        if self.drift is None:
+            return
+        self.drift_rows += 1
+        if self.drift_rows % c.drift_check_rows:
+            return
+        self._goto_drift_reference()
+        measured = self.drift.measure()
+        if measured is None:
+            print(f"Drift after row {row}: no USB camera frame")
+            return
+        dx, dy, response = measured
+        applied = self.drift.accept(dx, dy, response, c.drift_min_um)
+        if applied:
+            # Korekta bez zmiany pos_x/pos_y: siatka przesuwa się razem z próbką
+            try:
+                if dx:
+                    self.motors.move('r' if dx > 0 else 'l', abs(dx))
+                if dy:
+                    self.motors.move('d' if dy > 0 else 'u', abs(dy))
+                self.wait_for_travel(dx, dy)
+            except Exception as e:
+                print(f"Drift correction move error: {e}")
+                applied = False
+        self.drift.record(row, dx, dy, response, applied)
+        print(f"🎯 Drift after row {row}: ({dx:+.2f}, {dy:+.2f}) μm, correlation {response:.2f}"
+              + (" - corrected" if applied else ""))
+
+    # --- ostrość (oś Z) -------------------------------------------------------------
+
+    def start_focus(self):
+        """Autofokus na starcie skanu i przygotowanie stosów Z (autofocus.py)."""
+        c = self.config
+        if c.autofocus == 'off' and c.z_stack_count <= 1:
+            return
+        if self.motors is None or not getattr(self.motors, 'z_connected', False):
+            print("Autofocus / Z-stack need the focus motor (port_z) - disabled")
+            return
+        self.focus_z = self.motors.position_z_um
+        if c.autofocus != 'off':
+            if self.camera_frame_source is None:
+                print("Autofocus needs the USB camera - disabled")
+            else:
+                self.focus = Autofocus(self.motors, self.camera_frame_source,
+                                       c.autofocus_range_um, c.autofocus_tol_um)
+                self.refocus()
+        if c.z_stack_count > 1:
+            if c.scan_mode == 'continuous':
+                print("Z-stack is not available in continuous mode - disabled")
+                return
+            self.z_offsets = z_stack_offsets(c.z_stack_count, c.z_stack_step_um)
+            self._z_forward = True
+            print(f"Z-stack: {len(self.z_offsets)} planes, step {c.z_stack_step_um:g} μm")
+            try:
+                np.savetxt(os.path.join(self.points_folder, "zstack_offsets.csv"),
+                           np.asarray(self.z_offsets), delimiter=",", header="z_offset_um")
+            except Exception as e:
+                print(f"Z-stack offsets save error: {e}")
+
+    def refocus(self):
+        z = self.focus.run(self.focus_z)
+        if z is not None:
+            self.focus_z = z
+
+    def _acquire_z_stack(self, grid_x, grid_y, exp_index, exposure_time_s, settle_s):
+        """Widma w płaszczyznach stosu Z; zwraca płaszczyznę z największym sygnałem."""
+        n = len(self.z_offsets)
+        # Kolejne stosy na przemian w górę i w dół – bez powrotu na początek stosu
+        order = range(n) if self._z_forward else range(n - 1, -1, -1)
+        self._z_forward = not self._z_forward
+        planes = [None] * n
+        worst = 0
+        for i in order:
+            self.motors.move_z_to(self.focus_z + self.z_offsets[i])
+            time.sleep(settle_s)
+            planes[i] = np.asarray(self._acquire_frames(exposure_time_s), dtype=float)
+            worst = max(worst, self.frame_saturation)
+        self.frame_saturation = worst
+        stack = np.vstack(planes)
+        self.z_stacks.setdefault((grid_x, grid_y), {})[exp_index] = stack
+        # Do plików głównych: płaszczyzna z największym sygnałem (defokus = utrata sygnału)
+        return stack[int(np.argmax(stack.sum(axis=1)))]
+
+    # --- akwizycja ----------------------------------------------------------------
+
+    def _on_frame(self, frame_buffer, descriptor):
+        frame = frame_buffer.copy()
+        exposure_ms = descriptor_exposure_ms(descriptor)
+        with self._frame_cond:
+            self._latest_frame = frame
+            self._frame_seq += 1
+            self._frame_exposure_ms = exposure_ms
+            self._frame_cond.notify_all()
+
+    def wait_first_frame(self, timeout_s):
+        """Czekaj na pierwszą klatkę ze strumienia; False po `timeout_s` albo przy przerwaniu."""
+        deadline = time.perf_counter() + timeout_s
+        with self._frame_cond:
+            while self._frame_seq == 0:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or self.stopped():
+                    return False
+                self._frame_cond.wait(min(remaining, 0.1))
+        return True
+
+    def next_frame(self, exposure_ms=None, timeout_s=None, strict=False):
+        """Nowa (jeszcze nieużyta) klatka ze strumienia; None, gdy nie przyjdzie w czasie.
+
+        exposure_ms - klatki o innej ekspozycji w deskryptorze (naświetlane
+        przed zmianą) są pomijane; strict - także klatki bez ekspozycji
+        w deskryptorze.
+        """
+        if timeout_s is None:
+            timeout_s = (exposure_ms or 0.0) / 1000.0 + self.config.frame_timeout
+        deadline = time.perf_counter() + timeout_s
+        with self._frame_cond:
+            while True:
+                if self._frame_seq > self._frame_used:
+                    self._frame_used = self._frame_seq
+                    actual = self._frame_exposure_ms
+                    if exposure_ms is None or (actual is None and not strict) or (
+                            actual is not None and exposure_matches(actual, exposure_ms)):
+                        return self._latest_frame
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or self.stopped():
+                    return None
+                self._frame_cond.wait(min(remaining, 0.1))
+
+    def apply_roi(self, spectrum_array):
+        """Zastosuj ROI z chwili startu sekwencji (stałe dla całego skanu)."""
+        try:
+            if spectrum_array is None:
+                return spectrum_array
+            arr = np.asarray(spectrum_array)
+            if self.roi_indices is None:
+                return arr
+            # Upewnij się, że nie wychodzimy poza długość tablicy
+            valid_idx = [i for i in self.roi_indices if i < len(arr)]
+            if not valid_idx:
+                return arr
+            return arr[valid_idx]
+        except Exception:
+            return np.asarray(spectrum_array)
+
+    def frame_correction(self, frame):
+        """Korekcja dla bieżącej ekspozycji / wzmocnienia spektrometru (None = bez korekcji)."""
+        sm = self.spectrometer
+        if not self.config.frame_calibration or self.calibration is None or sm is None:
+            return None
+        return self.calibration.correction(sm.exposure_ms, sm.gain, np.shape(frame)[:2],
+                                           straightened=self.config.smile_correction)
+
+    def extract(self, frame):
+        """Klatka -> widmo 2048 punktów -> ROI sekwencji."""
+        smile = self.calibration.smile if self.config.smile_correction and self.calibration else None
+        return self.apply_roi(frame_to_spectrum(frame, correction=self.frame_correction(frame), smile=smile,
+                                                extractor=self.extractor, saturation=self.saturation))
+
+    def acquire_spectrum(self, exposure_ms=None, strict_exposure=False):
+        """Widmo z nowej klatki PixeLink (ROI sekwencji); NoFrameError, gdy klatki nie ma.
+
+        Przy strumieniu spektrometru klatka pochodzi z listenera (nowsza niż
+        poprzednio użyta), bez strumienia – z frame_source / spectrum_fallback.
+        Zerowe widmo nigdy nie trafia do pliku jako pomiar. strict_exposure -
+        tylko klatka z ekspozycją exposure_ms w deskryptorze (bez strumienia:
+        brak klatki).
+        """
+        if self._listening:
+            frame = self.next_frame(exposure_ms, strict=strict_exposure)
+        elif strict_exposure:
+            frame = None
+        else:
+            frame = self.frame_source() if self.frame_source else None
+        self._last_frame = frame
+        if frame is not None:
+            # Uśrednienie w pionie + ROI zamrożone przy starcie sekwencji
+            return self.extract(frame)
+        if not self._listening and not strict_exposure and self.spectrum_fallback is not None:
+            spectrum = self.spectrum_fallback()
+            if spectrum is not None and len(spectrum) > 0 and np.any(spectrum):
+                return np.asarray(spectrum).copy()
+        raise NoFrameError("no frame from the PixeLink camera"
+                           + (f" at {exposure_ms:.2f} ms" if exposure_ms is not None else ""))
+
+    def set_exposure(self, exp_ms):
+        try:
+            if self.spectrometer is not None:
+                t_set = time.perf_counter()
+                self.spectrometer.set_exposure(exp_ms)
+                self.exposure_change_times.append(time.perf_counter() - t_set)
+                # Klatka naświetlana w chwili zmiany jeszcze nie ma nowej ekspozycji
+                with self._frame_cond:
+                    self._frame_used = self._frame_seq + 1
+        except Exception as e:
+            print(f"Exposure set error in sequence: {e}")
+
+    def measure_at(self, grid_x, grid_y, exp_index):
+        """Dojedź do punktu, ustaw ekspozycję (tylko przy zmianie) i zmierz widmo."""
+        c = self.config
+        # RUCH: przejście do kolejnego punktu siatki; przy skoku dalszym niż
+        # sąsiedni punkt (region, wznowienie) czekamy na koniec przejazdu
+        previous = self.stage_state['position']
+        if (grid_x, grid_y) != previous:
+            far = previous is None or max(abs(grid_x - previous[0]), abs(grid_y - previous[1])) > 1
+            self.goto_grid(grid_x, grid_y, wait=far)
+            self.stage_state['position'] = (grid_x, grid_y)
+            # Krótka pauza na ustabilizowanie po ruchu
+            time.sleep(0.01)
+
+        exp_ms = self.exposures_ms[exp_index]
+
+        # Ustaw ekspozycję w kamerze tylko przy zmianie
+        if exp_index != self.stage_state['exp_index']:
+            self.set_exposure(exp_ms)
+            self.stage_state['exp_index'] = exp_index
+
+        # Smart delay bazujący na aktualnym czasie ekspozycji
+        exposure_time_ms = float(exp_ms)
+        exposure_time_s = exposure_time_ms / 1000.0
+        min_frame_time = exposure_time_s + 0.1  # ekspozycja + ~100 ms buforu
+        actual_sleep = max(c.sequence_sleep, min_frame_time)
+
+        print(f"🕒 Point ({grid_x},{grid_y}) exp {exposure_time_ms:.1f} ms -> wait {actual_sleep:.2f}s")
+        self.archive_frames = []
+        self.used_exposure_ms = exp_ms
+        if self.z_offsets is not None:
+            spectrum = self._acquire_z_stack(grid_x, grid_y, exp_index, exposure_time_s, actual_sleep)
+            if self.frame_saturation > c.saturation_max_pixels:
+                # Stosu Z nie powtarzamy – tylko zapis w saturation.csv
+                self.write_saturation(grid_x, grid_y, exp_ms, exp_ms, self.frame_saturation, self.frame_saturation)
+        else:
+            time.sleep(actual_sleep)
+            spectrum = self._acquire_frames(exposure_time_s)
+            if self.frame_saturation > c.saturation_max_pixels:
+                spectrum = self._handle_saturation(grid_x, grid_y, exp_ms, spectrum)
+        if self.archive is not None and self.archive_frames:
+            # Stos Z: klatki wszystkich płaszczyzn po kolei
+            self.archive.put(grid_x, grid_y, exp_ms, np.stack(self.archive_frames), row0=self._band[0],
+                             frame_rows=self._band[2], used_exposure_ms=self.used_exposure_ms)
+        return spectrum
+
+    def _archive_last_frame(self):
+        """Kopia pasa widma ostatniej klatki do archiwum surowych klatek punktu."""
+        gray = frame_to_gray(self._last_frame)
+        if gray is None:
+            return
+        height = gray.shape[0]
+        if self._band is None or self._band[2] != height:
+            stripe = self.calibration.stripe if self.calibration is not None else None
+            r0, r1 = band_rows(stripe, height, self.config.raw_archive_rows)
+            self._band = (r0, r1, height)
+        self.archive_frames.append(gray[self._band[0]:self._band[1]].copy())
+
+    def _acquire_frames(self, exposure_time_s, strict_exposure=False):
+        """Widmo uśrednione z frames_per_point różnych klatek; najgorsze nasycenie w self.frame_saturation."""
+        c = self.config
+        if self._listening:
+            # Klatki sprzed dojazdu / pauzy nie wchodzą do pomiaru punktu
+            with self._frame_cond:
+                self._frame_used = max(self._frame_used, self._frame_seq)
+        self.saturation.reset()
+        spectrum = self.acquire_spectrum(exposure_time_s * 1000.0, strict_exposure)
+        if self.archive is not None:
+            self._archive_last_frame()
+        worst = self.saturation.pixels
+        if c.frames_per_point > 1:
+            # Kolejne klatki tej samej ekspozycji – średnia
+            total = np.asarray(spectrum, dtype=float)
+            frame_wait = exposure_time_s + c.continuous_frame_overhead
+            for _ in range(c.frames_per_point - 1):
+                if not self._listening:
+                    # frame_source bez numerów klatek – odczekaj czas klatki
+                    time.sleep(frame_wait)
+                self.saturation.reset()
+                total = total + np.asarray(self.acquire_spectrum(exposure_time_s * 1000.0, strict_exposure), dtype=float)
+                if self.archive is not None:
+                    self._archive_last_frame()
+                worst = max(worst, self.saturation.pixels)
+            spectrum = total / c.frames_per_point
+        self.frame_saturation = worst
+        return spectrum
+
+    def _handle_saturation(self, grid_x, grid_y, exp_ms, spectrum):
+        """Nasycony punkt wg saturation_action; zwraca widmo do zapisu.
+
+        'reject' – ponowny pomiar w tej samej ekspozycji (np. przejściowy
+        odblask), 'reduce' – ekspozycja o połowę krótsza, aż klatka przestanie
+        być nasycona; widmo jest przeskalowane do ekspozycji siatki
+        (exp_ms / użyta), co jest dokładne przy korekcji ciemnej klatki.
+        Punkt, który nadal jest nasycony, zostaje w saturation.csv jako 'saturated'.
+
+        Każda próba czeka na nową klatkę ze strumienia; przy 'reduce' klatka
+        musi mieć w deskryptorze skróconą ekspozycję. Gdy takiej klatki nie
+        ma, zostaje poprzedni pomiar (oznaczony, bez przeskalowania).
+        """
+        c = self.config
+        first = self.frame_saturation
+        used_ms = exp_ms
+        camera_ms = exp_ms
+        for _ in range(c.saturation_retries):
+            if self.stopped() or self.frame_saturation <= c.saturation_max_pixels:
+                break
+            if c.saturation_action == 'reject':
+                try_ms = used_ms
+            elif c.saturation_action == 'reduce' and self.spectrometer is not None and used_ms / 2.0 >= MIN_EXPOSURE_MS:
+                try_ms = used_ms / 2.0
+                self.set_exposure(try_ms)
+                camera_ms = try_ms
+            else:
+                break
+            # Archiwum: tylko klatki pomiaru, który zostaje zapisany
+            kept_frames, kept_saturation, kept_hot = self.archive_frames, self.frame_saturation, self.saturation.hot
+            self.archive_frames = []
+            try:
+                spectrum = self._acquire_frames(try_ms / 1000.0, strict_exposure=try_ms != exp_ms)
+            except NoFrameError as e:
+                print(f"⚠️  Saturation retry at ({grid_x},{grid_y}): {e} - point stays flagged")
+                self.archive_frames, self.frame_saturation = kept_frames, kept_saturation
+                self.saturation.hot = kept_hot
+                break
+            used_ms = try_ms
+        if camera_ms != exp_ms:
+            # Ekspozycja siatki wraca – stage_state['exp_index'] pozostaje aktualny
+            self.set_exposure(exp_ms)
+        if used_ms != exp_ms:
+            spectrum = np.asarray(spectrum, dtype=float) * (exp_ms / used_ms)
+        self.used_exposure_ms = used_ms
+        self.write_saturation(grid_x, grid_y, exp_ms, used_ms, first, self.frame_saturation)
+        return spectrum
+
+    def write_saturation(self, grid_x, grid_y, exp_ms, used_ms, first_pixels, final_pixels):
+        """Wiersz <points>/saturation.csv dla punktu z nasyconą klatką."""
+        saturated = final_pixels > self.config.saturation_max_pixels
+        self.saturated_points += int(saturated)
+        print(f"⚠️  Saturation at ({grid_x},{grid_y}) {exp_ms:.1f} ms: {first_pixels} px"
+              + (f" -> {final_pixels} px at {used_ms:.2f} ms" if used_ms != exp_ms or final_pixels != first_pixels else ""))
+        try:
+            path = os.path.join(self.points_folder, SATURATION_FILE)
+            new_file = not os.path.exists(path)
+            with open(path, "a", newline="") as f:
+                w = csv.writer(f)
+                if new_file:
+                    w.writerow(["x", "y", "exposure_ms", "used_exposure_ms", "saturated_pixels",
+                                "final_saturated_pixels", "hot_pixels", "status"])
+                w.writerow([grid_x, grid_y, exp_ms, round(used_ms, 4), first_pixels, final_pixels,
+                            self.saturation.hot, 'saturated' if saturated else 'recovered'])
+        except Exception as e:
+            print(f"Error writing saturation flag for ({grid_x},{grid_y}): {e}")
+
+    # --- zapis --------------------------------------------------------------------
+
+    def write_point(self, grid_x, grid_y, spectra_for_point):
+        """Zapisz punkt: wiersz głównego pliku + plik punktowy (lambda, I_t1, I_t2, ...)."""
+        # Dla kompatybilności z istniejącym GUI zapisujemy w głównym pliku
+        # tylko widmo dla pierwszego czasu ekspozycji.
+        primary_spectrum = np.asarray(spectra_for_point[0])
+
+        # Save measurement data with grid coordinates (x_pixel, y_pixel, spectrum_values)
+        self.writer.writerow([grid_x, grid_y] + primary_spectrum.tolist())
+        self.stats.add(primary_spectrum)
+
+        # Dodatkowo zapisz osobny plik dla tego punktu (x,y) z kolumnami:
+        # lambda, I_t1, I_t2, ...
+        try:
+            point_file = os.path.join(self.points_folder, f"point_x{grid_x}_y{grid_y}.csv")
+            with open(point_file, "w", newline="") as pf:
+                pw = csv.writer(pf)
+                header = ["lambda"] + [f"I_{exp:.1f}ms" for exp in self.exposures_ms]
+                pw.writerow(header)
+
+                for idx in range(len(self.axis_vals)):
+                    row = [float(self.axis_vals[idx])]
+                    for spec in spectra_for_point:
+                        row.append(float(spec[idx]))
+                    pw.writerow(row)
+        except Exception as e:
+            print(f"Error writing point file for ({grid_x},{grid_y}): {e}")
+
+        if self.peaks is not None:
+            self.write_peaks(grid_x, grid_y, primary_spectrum)
+
+        stacks = self.z_stacks.pop((grid_x, grid_y), None)
+        if stacks:
+            # Stos Z punktu: [ekspozycja, płaszczyzna, widmo]
+            try:
+                np.save(os.path.join(self.points_folder, f"zstack_x{grid_x}_y{grid_y}.npy"),
+                        np.stack([stacks[k] for k in sorted(stacks)]))
+            except Exception as e:
+                print(f"Error writing Z-stack for ({grid_x},{grid_y}): {e}")
+
+        # Wiersz musi być na dysku, zanim checkpoint uzna punkt za ukończony
+        self.main_file.flush()
+        self.completed_points.add((grid_x, grid_y))
+        self.checkpoint.point_done(grid_x, grid_y, self.pos_x, self.pos_y)
+
+    def write_peaks(self, grid_x, grid_y, spectrum):
+        """Piki widma punktu (peak_tracker.py) -> wiersz <points>/peaks.csv.
+
+        Piki są wykrywane w pierwszym punkcie i śledzone z punktu do punktu.
+        """
+        try:
+            if not self.peaks.update(spectrum, self.axis_vals):
+                return
+            path = os.path.join(self.points_folder, "peaks.csv")
+            new_file = not os.path.exists(path)
+            with open(path, "a", newline="") as f:
+                w = csv.writer(f)
+                n = self.peaks.count
+                if new_file:
+                    w.writerow(["x", "y"] + [f"center_{i}" for i in range(n)]
+                               + [f"fwhm_{i}" for i in range(n)] + [f"amplitude_{i}" for i in range(n)])
+                w.writerow([grid_x, grid_y] + [round(float(v), 4) for v in
+                                               np.concatenate([self.peaks.center, self.peaks.fwhm, self.peaks.amplitude])])
+        except Exception as e:
+            print(f"Peak tracking error at ({grid_x},{grid_y}): {e}")
+
+    def _progress_eta(self, done, total):
+        elapsed = time.time() - self.start_time
+        return (elapsed / done * (total - done)) if done > 0 else 0
+
+    # --- tryby skanu --------------------------------------------------------------
+
+    def run_point_scan(self, path=None):
+        """Skan punkt-po-punkcie (wąż) w zadanej kolejności czasów ekspozycji.
+
+        'point' – wszystkie czasy w każdym punkcie; 'row' / 'pass' –
+        ekspozycja zmienia się tylko na końcu przejazdu wiersza / całego
+        obszaru (scan_order.py). Widma punktu są buforowane do zebrania
+        kompletu, więc układ plików jest taki sam dla każdej kolejności.
+        `path` – zoptymalizowana ścieżka regionu zamiast węża po prostokącie.
+        """
+        from scan_planner import format_seconds
+        c = self.config
+        exposures_ms = self.exposures_ms
+        order = self.exposure_order
+        if path is not None:
+            visits = build_path_visits(path, len(exposures_ms), order)
+        else:
+            visits = build_visits(self.points_x, self.points_y, c.starting_corner, len(exposures_ms), order)
+        if self.completed_points:
+            visits = [v for v in visits if v[:2] not in self.completed_points]
+        total_visits = len(visits)
+        print(
+            f"Exposure order: {order} - {count_exposure_changes(visits)} exposure changes, "
+            f"{total_visits} acquisitions"
+        )
+
+        pending = {}
+        threshold = c.repeatability_threshold
+        poor_points = []
+
+        previous_row = None
+        for visit_index, (grid_x, grid_y, exp_index) in enumerate(visits):
+            # Check for stop request
+            if self.stopped():
+                break
+            if path is None:
+                if previous_row is not None and grid_y != previous_row:
+                    self.row_boundary(previous_row)
+                previous_row = grid_y
+
+            exposure_time_ms = float(exposures_ms[exp_index])
+            spectra_for_point = pending.setdefault((grid_x, grid_y), [None] * len(exposures_ms))
+            spectra_for_point[exp_index] = self.measure_at(grid_x, grid_y, exp_index)
+
+            # Progress update
+            done = visit_index + 1
+            progress = (done / total_visits) * 100
+            eta_str = format_seconds(self._progress_eta(done, total_visits))
+
+            if any(spec is None for spec in spectra_for_point):
+                print(
+                    f"📊 Pomiar {done}/{total_visits} ({progress:.1f}%) - "
+                    f"Siatka: ({grid_x}, {grid_y}) exp {exposure_time_ms:.1f} ms - ETA: {eta_str}"
+                )
+                continue
+            del pending[(grid_x, grid_y)]
+
+            # Sprawdzenie powtarzalności: powrót do punktu z innym czasem
+            # powinien dać to samo widmo z dokładnością do skali i offsetu
+            if order != 'point' and len(spectra_for_point) > 1:
+                scores = [revisit_agreement(spectra_for_point[0], spec) for spec in spectra_for_point[1:]]
+                scores = [sc for sc in scores if sc is not None]
+                if scores and min(scores) < threshold:
+                    poor_points.append((grid_x, grid_y))
+                    print(f"⚠️  Point ({grid_x},{grid_y}): revisit agreement R²={min(scores):.3f} below {threshold:.2f}")
+
+            self.write_point(grid_x, grid_y, spectra_for_point)
+            self.point_index += 1
+
+            print(
+                f"📊 Punkt {self.point_index}/{self.total_points} ({progress:.1f}%) - "
+                f"Siatka: ({grid_x}, {grid_y}) μm - ETA: {eta_str}"
+            )
+
+        if poor_points:
+            print(f"⚠️  Repeatability check: {len(poor_points)} of {self.point_index} points below R²={threshold:.2f}")
+
+    def plan_region_path(self):
+        """Punkty regionu (scan_region) w kolejności NN + 2-opt; None przy błędzie."""
+        from scan_planner import format_seconds
+        c = self.config
+        try:
+            region = load_region(c.scan_region, self.points_x, self.points_y)
+        except Exception as e:
+            print(f"ERROR: Cannot load scan region {c.scan_region}: {e}")
+            return None
+        if not region:
+            print(f"ERROR: Scan region {c.scan_region} contains no grid points")
+            return None
+        start = (self.corner_gx, self.corner_gy)
+        path = optimise_path(region, start, c.step_x, c.step_y, c.speed_x, c.speed_y)
+        waits = [max(c.sequence_sleep, e / 1000.0 + 0.1) for e in self.exposures_ms]
+        cmp = compare_with_snake(path, self.points_x, self.points_y, c.step_x, c.step_y, c.speed_x, c.speed_y,
+                                 start=start, dwell_s=sum(waits), starting_corner=c.starting_corner)
+        print(
+            f"Scan region: {cmp['region_points']} of {cmp['snake_points']} grid points, "
+            f"travel {cmp['region_travel_s']:.1f}s vs {cmp['snake_travel_s']:.1f}s (snake), "
+            f"estimated {format_seconds(cmp['region_total_s'])} vs "
+            f"{format_seconds(cmp['snake_total_s'])} - saves {format_seconds(cmp['saved_s'])}"
+        )
+        if self.exposure_order == 'row':
+            print("Exposure order 'row' does not apply to region paths - using 'point'")
+        return path
+
+    def run_continuous_scan(self):
+        """Skan ciągły: stolik X przejeżdża cały wiersz, kamera strumieniuje.
+
+        Dla każdego czasu ekspozycji wykonywany jest osobny przejazd
+        wiersza (kolejne przejazdy w przeciwnych kierunkach), a klatki
+        są przypisywane do komórek siatki wg czasu z deskryptora.
+        Zwraca False, gdy skanu nie dało się wykonać.
+        """
+        from scan_planner import format_seconds
+        c = self.config
+        sm = self.spectrometer
+        if sm is None or not sm.running:
+            print("ERROR: Continuous scan requires a streaming PixeLink camera")
+            return False
+
+        points_x, points_y = self.points_x, self.points_y
+        exposures_ms = self.exposures_ms
+        span = (points_x - 1) * c.step_x
+        frame_overhead = c.continuous_frame_overhead
+        travel_speed = c.motor_speed
+        scanner = ContinuousRowScanner(sm, self.motors, self.extract, start_latency=c.continuous_start_latency)
+        first_sweep_right = c.starting_corner in ['top-left', 'bottom-left']
+
+        try:
+            with scanner:
+                for iy in range(points_y):
+                    if self.stopped():
+                        break
+
+                    if c.starting_corner in ['top-left', 'top-right']:
+                        grid_y = iy
+                    else:
+                        grid_y = (points_y - 1) - iy
+
+                    # Wznowienie: wiersze zapisane przed przerwą są pomijane
+                    if all((gx, grid_y) in self.completed_points for gx in range(points_x)):
+                        continue
+                    # Kierunek przejazdu zmienia się po każdym przejeździe
+                    sweep_right = first_sweep_right if (iy * len(exposures_ms)) % 2 == 0 else not first_sweep_right
+                    if self.motor_connected:
+                        self.motors.set_speed('x', travel_speed)
+                    self.goto_grid(0 if sweep_right else points_x - 1, grid_y, wait=True)
+
+                    row_spectra = []
+                    for exp_ms in exposures_ms:
+                        if self.stopped():
+                            break
+                        previous_ms = self._frame_exposure_ms or 0.0
+                        self.set_exposure(exp_ms)
+                        exposure_s = float(exp_ms) / 1000.0
+                        # Przejazd dopiero po klatce z nową ekspozycją – klatka naświetlana
+                        # w chwili zmiany (stara ekspozycja) może przyjść dużo później
+                        timeout_s = (previous_ms + exp_ms) / 1000.0 + c.frame_timeout
+                        if self.next_frame(exp_ms, timeout_s=timeout_s, strict=True) is None:
+                            if self.stopped():
+                                break
+                            print(f"ERROR: No frame at {exp_ms:.1f} ms within {timeout_s:.1f} s - continuous scan aborted")
+                            return False
+
+                        velocity = choose_row_velocity(
+                            c.step_x, exposure_s + frame_overhead,
+                            c.continuous_frames_per_cell, c.continuous_max_speed
+                        )
+                        if self.motor_connected:
+                            self.motors.set_speed('x', velocity)
+
+                        # Przejazd bez klatek (np. opóźniona klatka po zmianie ekspozycji)
+                        # jest powtarzany raz, w przeciwnym kierunku
+                        for attempt in range(2):
+                            direction = 'r' if sweep_right else 'l'
+                            print(f"➡️ Row {grid_y} exp {exp_ms:.1f} ms: sweep {direction} {span} μm at {velocity:.1f} μm/s")
+                            positions, spectra = scanner.scan_row(
+                                self.move_tracked, direction, span, velocity, exposure_s,
+                                should_stop=self.stopped
+                            )
+                            if self.stopped() or spectra.size > 0 or attempt == 1:
+                                break
+                            print(f"⚠️  No frames received during row {grid_y} - repeating the sweep")
+                            sweep_right = not sweep_right
+                        if self.stopped():
+                            break
+                        if spectra.size == 0:
+                            print(f"ERROR: No frames received during row {grid_y} (after retry) - continuous scan aborted")
+                            return False
+
+                        binned, counts = bin_row(positions, spectra, c.step_x, points_x)
+                        if not sweep_right:
+                            # Pozycje liczone od prawej krawędzi -> odwróć do kolejności grid_x
+                            binned = binned[::-1]
+                            counts = counts[::-1]
+                        empty = int(np.sum(counts == 0))
+                        if empty:
+                            print(f"⚠️  Row {grid_y}: {empty} cells without frames (interpolated) - lower continuous_max_speed")
+                        row_spectra.append(binned)
+                        sweep_right = not sweep_right
+
+                    if len(row_spectra) != len(exposures_ms):
+                        break
+
+                    for grid_x in range(points_x):
+                        self.write_point(grid_x, grid_y, [rs[grid_x] for rs in row_spectra])
+                    self.point_index += points_x
+
+                    progress = (self.point_index / self.total_points) * 100
+                    measured = self.point_index - self.resumed_points
+                    eta = self._progress_eta(measured, self.total_points - self.resumed_points)
+                    print(
+                        f"📊 Wiersz {iy + 1}/{points_y} ({progress:.1f}%) - "
+                        f"Punkty: {self.point_index}/{self.total_points} - ETA: {format_seconds(eta)}"
+                    )
+
+                    # Przejście do kolejnego wiersza z normalną prędkością
+                    if iy != points_y - 1:
+                        # Prędkość przejazdów przed granicą wiersza – dojazd do punktu
+                        # odniesienia dryfu (wait_for_travel) zakłada speed_x
+                        if self.motor_connected:
+                            self.motors.set_speed('x', travel_speed)
+                        self.row_boundary(grid_y)
+                        if c.starting_corner in ['top-left', 'top-right']:
+                            self.move_tracked('d', c.step_y)
+                        else:
+                            self.move_tracked('u', c.step_y)
+                        time.sleep(max(0.1, c.step_y / travel_speed + 0.05))
+        finally:
+            if self.motor_connected:
+                self.motors.set_speed('x', travel_speed)
+        return True
+
+    def _read_main_rows(self):
+        """(x, y, widmo) z głównego pliku pomiaru (wznowienie skanu adaptacyjnego)."""
+        rows = []
+        try:
+            raw = np.loadtxt(self.filename, delimiter=',', ndmin=2)
+            for row in raw:
+                if len(row) >= 3:
+                    rows.append((int(row[0]), int(row[1]), row[2:]))
+        except Exception as e:
+            print(f"Error loading file {self.filename}: {e}")
+        return rows
+
+    def run_adaptive_scan(self):
+        """Skan adaptacyjny: siatka zgrubna, potem zagęszczanie komórek o dużej
+        różnicy widm (adaptive_scan.py). Każdy punkt – wszystkie czasy ekspozycji.
+        """
+        c = self.config
+        planner = AdaptiveGridPlanner(self.points_x, self.points_y, c.adaptive_coarse_stride, c.adaptive_threshold)
+        if self.completed_points:
+            # Wznowienie: odtwórz widma już zmierzonych punktów z głównego pliku
+            self.main_file.flush()
+            for gx, gy, spectrum in self._read_main_rows():
+                planner.add(gx, gy, spectrum)
+        print(
+            f"Adaptive scan: coarse stride {c.adaptive_coarse_stride}, threshold {c.adaptive_threshold:.3f}, "
+            f"full grid {self.points_x} x {self.points_y}"
+        )
+
+        batch = planner.coarse_points(c.starting_corner)
+        while batch and not self.stopped():
+            todo = [pt for pt in batch if pt not in self.completed_points]
+            print(f"🔎 Adaptive level {planner.level}: {len(todo)} points")
+            for i, (grid_x, grid_y) in enumerate(todo):
+                if self.stopped():
+                    break
+                spectra_for_point = []
+                for exp_index in range(len(self.exposures_ms)):
+                    if self.stopped():
+                        break
+                    spectra_for_point.append(self.measure_at(grid_x, grid_y, exp_index))
+                if len(spectra_for_point) != len(self.exposures_ms):
+                    break
+                self.write_point(grid_x, grid_y, spectra_for_point)
+                planner.add(grid_x, grid_y, spectra_for_point[0])
+                self.point_index += 1
+                print(
+                    f"📊 Poziom {planner.level}: {i + 1}/{len(todo)} - "
+                    f"zmierzone {self.point_index}/{self.total_points} punktów siatki - ({grid_x}, {grid_y})"
+                )
+            if self.stopped():
+                break
+            batch = order_path(planner.refine(), self.stage_state['position'])
+
+        planner.finish()
+        try:
+            planner.save(self.points_folder)
+        except Exception as e:
+            print(f"Adaptive grid save error: {e}")
+        print(
+            f"Adaptive scan: measured {len(planner.measured)} of {self.total_points} grid points "
+            f"({100.0 * len(planner.measured) / max(1, self.total_points):.1f}%)"
+        )
+
+    # --- przebieg -----------------------------------------------------------------
+
+    def _prepare(self, resume_state):
+        """Pliki, siatka i punkt kontrolny sekwencji."""
+        c = self.config
+        self.exposures_ms = [float(e) for e in c.exposures_ms]
+        self.exposure_order = c.exposure_order if c.exposure_order in EXPOSURE_ORDERS else 'point'
+        try:
+            print(f"Sequence exposure times (ms): {', '.join(f'{e:.1f}' for e in self.exposures_ms)}")
+        except Exception:
+            pass
+
+        # Zamroź ROI dla całej sekwencji (długość widma w pliku = zakres ROI, nie pełne 2048)
+        self.roi_indices = np.asarray(c.roi_indices, dtype=int) if c.roi_indices is not None else None
+        if c.axis is not None:
+            self.axis_vals = np.asarray(c.axis, dtype=float)
+        else:
+            self.axis_vals = np.arange(len(self.apply_roi(np.zeros(2048))), dtype=float)
+
+        # Create data folder
+        os.makedirs(c.output_folder, exist_ok=True)
+        if resume_state:
+            # Kontynuacja przerwanej sesji w tych samych plikach
+            self.session_id = resume_state['session_id']
+            self.filename = resume_state['filename']
+            self.points_folder = resume_state['points_folder']
+            self.completed_points = recover_completed_points(resume_state)
+            print(f"Resuming session {self.session_id}: {len(self.completed_points)} points already measured")
+        else:
+            self.session_id = time.strftime('%Y%m%d_%H%M%S')
+            self.filename = os.path.join(c.output_folder, f"measurement_{self.session_id}_spectra.csv")
+            self.points_folder = os.path.join(c.output_folder, f"points_{self.session_id}")
+        os.makedirs(self.points_folder, exist_ok=True)
+        if c.raw_archive:
+            # Przy wznowieniu bloki są dopisywane do tego samego archiwum
+            self.archive = RawArchiveWriter(self.points_folder, c.raw_archive_codec)
+
+        self.points_x, self.points_y = c.points_x, c.points_y
+        self.total_points = self.points_x * self.points_y
+        print(f"Scan points: {self.points_x} x {self.points_y} = {self.total_points} points "
+              f"(area {c.scan_width}x{c.scan_height} μm, step {c.step_x}/{c.step_y} μm)")
+
+        # Narożnik startowy względem środka obszaru i jego indeks w siatce
+        self.offset_x = c.scan_width // 2 if c.starting_corner in ['top-right', 'bottom-right'] else -c.scan_width // 2
+        self.offset_y = c.scan_height // 2 if c.starting_corner in ['bottom-left', 'bottom-right'] else -c.scan_height // 2
+        self.corner_gx = 0 if c.starting_corner in ['top-left', 'bottom-left'] else self.points_x - 1
+        self.corner_gy = 0 if c.starting_corner in ['top-left', 'top-right'] else self.points_y - 1
+
+        # Punkt kontrolny: wszystko, czego potrzeba do wznowienia skanu
+        if resume_state:
+            state = dict(resume_state)
+            state['completed_count'] = len(self.completed_points)
+        else:
+            m = self.motors
+            homed = self.motor_connected and getattr(m, 'homed', False)
+            state = {
+                'session_id': self.session_id,
+                'filename': self.filename,
+                'points_folder': self.points_folder,
+                'step_x': c.step_x,
+                'step_y': c.step_y,
+                'scan_width': c.scan_width,
+                'scan_height': c.scan_height,
+                'lens_magnification': c.lens_magnification,
+                'points_x': self.points_x,
+                'points_y': self.points_y,
+                'starting_corner': c.starting_corner,
+                'scan_mode': c.scan_mode,
+                'exposure_order': self.exposure_order,
+                'scan_region': c.scan_region,
+                'adaptive_coarse_stride': c.adaptive_coarse_stride,
+                'adaptive_threshold': c.adaptive_threshold,
+                'exposures_ms': list(self.exposures_ms),
+                'roi_indices': None if self.roi_indices is None else [int(i) for i in self.roi_indices],
+                'axis': [float(a) for a in self.axis_vals],
+                'spectrum_length': int(len(self.axis_vals)),
+                # Do ponownego przeliczenia surowych klatek (reprocess.py)
+                'frames_per_point': c.frames_per_point,
+                'z_stack_count': c.z_stack_count,
+                'gain': getattr(self.spectrometer, 'gain', None),
+                # Środek obszaru względem bazy stolika (tylko gdy stolik był zbazowany);
+                # pos_y rośnie w dół, a position_um[1] w górę
+                'stage_center_um': [m.position_um[0] - self.pos_x, m.position_um[1] + self.pos_y] if homed else None,
+                'job_id': c.job_id,
+            }
+        state['status'] = 'running'
+        self.checkpoint = SequenceCheckpoint(self.points_folder, state)
+        self.checkpoint.save()
+
+    def _rehome_for_resume(self, resume_state):
+        """Pozycja sprzed przerwy jest niepewna: bazowanie i powrót do środka."""
+        center = resume_state.get('stage_center_um')
+        if center is None:
+            print("⚠️  Stage was not homed when this scan started - assuming it is back at the scan center")
+            return True
+        print("🏠 Re-homing stage before resuming...")
+        if not self.motors.home():
+            print("ERROR: Stage homing failed - cannot resume at the correct position")
+            return False
+        self.motors.move_to(center[0], center[1])
+        self.wait_for_travel(center[0], center[1])
+        return True
+
+    def run(self, resume_state=None):
+        """Wykonaj sekwencję (blokujące). Zwraca słownik wyniku:
+
+        status ('completed', 'interrupted', 'cancelled', 'failed'), filename,
+        points_folder, points, end_pos (pozycja stolika względem środka
+        obszaru), exposure_change_time (mediana, s) i stopped.
+        """
+        from scan_planner import format_seconds
+        c = self.config
+        result = {'status': 'failed', 'filename': '', 'points_folder': '', 'points': 0,
+                  'end_pos': tuple(c.start_pos), 'exposure_change_time': None, 'stopped': False}
+        scan_completed = False
+        cancelled = False
+        # Przy działającym strumieniu klatki zawsze z własnego listenera (klatka
+        # podglądu GUI odświeża się co poll_interval i mogłaby się powtórzyć)
+        listening = self.spectrometer is not None and bool(getattr(self.spectrometer, 'running', False))
+        self._listening = listening
+        saved_poll_interval = None
+        if listening:
+            self.spectrometer.add_frame_listener(self._on_frame)
+            # Każda klatka kamery do listenera (domyślnie pętla GUI czeka 0.5 s
+            # między klatkami, więc kolejne klatki punktu byłyby rzadkie)
+            saved_poll_interval = getattr(self.spectrometer, 'poll_interval', None)
+            self.spectrometer.poll_interval = 0.0
+        if not self.motor_connected:
+            print("Motor controller not connected — running in simulation (no moves).")
+        try:
+            self._prepare(resume_state)
+            if listening and not self.wait_first_frame(c.first_frame_timeout):
+                if not self.stopped():
+                    print(f"ERROR: No frame from the PixeLink camera within {c.first_frame_timeout:.0f} s - scan not started")
+                return result
+            self.start_time = time.time()
+
+            with open(self.filename, "a" if resume_state else "w", newline="") as f:
+                # NO HEADER - format compatible with existing measurements
+                # Format: x_pixel, y_pixel, spectrum_value_0, spectrum_value_1, ...
+                self.main_file = f
+                self.writer = csv.writer(f)
+
+                # Perform preview perimeter pass if motor controller is connected.
+                # Przy wznowieniu i w kolejce zadań – bez podglądu i bez pytania.
+                if c.preview_perimeter and not resume_state:
+                    if self.motor_connected:
+                        self.preview_perimeter()
+                    ok = True
+                    if self.confirm_area is not None:
+                        try:
+                            ok = bool(self.confirm_area())
+                        except Exception:
+                            ok = False
+                    if not ok:
+                        print("Sequence cancelled by user after area preview. Returning to center...")
+                        cancelled = True
+                        return result
+                    if self.motor_connected:
+                        # Small pause to let mechanics settle before measurements
+                        time.sleep(1)
+
+                if self.motor_connected and resume_state and not self._rehome_for_resume(resume_state):
+                    return result
+
+                self.point_index = len(self.completed_points)
+                self.resumed_points = self.point_index
+                # Gdzie stoi stolik (punkt siatki) i jaka ekspozycja jest ustawiona.
+                # Po podglądzie obwodu stolik stoi w narożniku startowym; w innym
+                # przypadku pozycja jest niepewna (dojazd z oczekiwaniem).
+                previewed = c.preview_perimeter and not resume_state
+                self.stage_state = {
+                    'position': (self.corner_gx, self.corner_gy) if previewed else None,
+                    'exp_index': None,
+                }
+
+                # Najpierw ognisko, potem obraz odniesienia dryfu (już ostry)
+                self.start_focus()
+                if c.drift_compensation:
+                    self.start_drift_tracking()
+
+                if c.scan_mode == 'continuous':
+                    print("Scan mode: continuous (on-the-fly rows)")
+                    if not self.run_continuous_scan():
+                        return result
+                elif c.scan_mode == 'adaptive':
+                    print("Scan mode: adaptive (coarse-to-fine)")
+                    self.run_adaptive_scan()
+                elif c.scan_region:
+                    path = self.plan_region_path()
+                    if path is None:
+                        return result
+                    self.total_points = len(path)
+                    self.run_point_scan(path=path)
+                else:
+                    self.run_point_scan()
+
+            # If we reached this point and no stop was requested, the scan finished
+            if not self.stopped():
+                print("SCAN COMPLETED!")
+                print(f"Saved {len(self.completed_points)} measurements to: {self.filename}")
+                print(f"Scan time: {format_seconds(time.time() - self.start_time)}")
+                scan_completed = True
+                self.checkpoint.finish('completed')
+                if self.exposure_change_times:
+                    result['exposure_change_time'] = round(float(np.median(self.exposure_change_times)), 4)
+                if self.saturated_points:
+                    print(f"⚠️  {self.saturated_points} saturated points - see {SATURATION_FILE}")
+                    result['saturated_points'] = self.saturated_points
+
+        except Exception as e:
+            print(f"Sequence error: {e}")
+        finally:
+            if listening:
+                self.spectrometer.remove_frame_listener(self._on_frame)
+                if saved_poll_interval is not None:
+                    self.spectrometer.poll_interval = saved_poll_interval
+            if self.z_offsets is not None:
+                # Stolik zostaje w ognisku
+                self.motors.move_z_to(self.focus_z)
+            if self.drift is not None:
+                try:
+                    self.drift.save(self.points_folder)
+                    print(f"Drift: total correction ({self.drift.total_um[0]:+.1f}, {self.drift.total_um[1]:+.1f}) μm")
+                except Exception as e:
+                    print(f"Drift log save error: {e}")
+            if self.archive is not None:
+                self.archive.close()
+                self.archive = None
+            # Always try to return to the center of the scan area
+            # (kolejka zadań: następne zadanie rusza z bieżącej pozycji)
+            if c.return_to_center or cancelled:
+                try:
+                    print("🔙 Returning to center position...")
+                    self.return_to_center()
+                    print("✅ Returned to center")
+                except Exception as e:
+                    print(f"Error while returning to center: {e}")
+            result['end_pos'] = (self.pos_x, self.pos_y)
+            result['stopped'] = self.stopped()
+
+            # Przerwany skan z zapisanymi punktami zostaje na dysku jako częściowy
+            # (status 'interrupted' w checkpoincie) i można go wznowić.
+            has_checkpoint = hasattr(self, 'checkpoint')
+            keep_partial = not scan_completed and has_checkpoint and bool(self.completed_points)
+            if keep_partial:
+                self.checkpoint.finish('interrupted')
+                print(f"⏸️  Partial scan kept ({len(self.completed_points)} points): {self.filename}")
+                print("   Use 'Resume Sequence' to continue from the last completed point")
+
+            if scan_completed or keep_partial:
+                result.update(status='completed' if scan_completed else 'interrupted',
+                              filename=self.filename, points_folder=self.points_folder,
+                              points=len(self.completed_points))
+                self.record_in_catalog(resume_state)
+            else:
+                if cancelled:
+                    result['status'] = 'cancelled'
+                # If scan was interrupted before any point was saved, delete the empty file
+                try:
+                    if hasattr(self, 'filename') and os.path.exists(self.filename):
+                        os.remove(self.filename)
+                except Exception:
+                    pass
+                # Usuń również folder punktów (z checkpointem)
+                try:
+                    if hasattr(self, 'points_folder') and os.path.isdir(self.points_folder):
+                        shutil.rmtree(self.points_folder)
+                except Exception as e:
+                    print(f"Error while removing point folder {self.points_folder}: {e}")
+        return result
+
+
+    def record_in_catalog(self, resume_state=None):
+        """Sesja -> measurement_data/catalog.sqlite (measurement_catalog.py).
+
+        Statystyki z tego przebiegu; przy wznowieniu plik zawiera też wcześniejsze
+        punkty, więc statystyki są liczone z pliku.
+        """
+        try:
+            stats = None if resume_state else self.stats.as_fields()
+            duration = time.time() - self.start_time if hasattr(self, 'start_time') else None
+            MeasurementCatalog(os.path.dirname(self.filename) or '.').record(
+                self.filename, stats=stats, duration_s=duration, saturated_points=self.saturated_points)
+        except Exception as e:
+            print(f"Catalog update error: {e}")
+
+
+def _confirm_on_terminal():
+    try:
+        return input("Czy obszar się zgadza? [y/N] ").strip().lower() in ('y', 'yes', 't', 'tak')
+    except EOFError:
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless measurement sequence (no GUI)")
+    parser.add_argument('--options', default='options.json', help="options file (default: options.json)")
+    parser.add_argument('--resume', action='store_true', help="resume the latest interrupted sequence")
+    parser.add_argument('--simulated', action='store_true', help="use the simulated camera backend")
+    parser.add_argument('--no-motors', action='store_true', help="do not connect the stage (no moves)")
+    parser.add_argument('--yes', action='store_true', help="do not ask for area confirmation")
+    parser.add_argument('--no-preview', action='store_true', help="skip the perimeter preview")
+    parser.add_argument('--step-x', type=int)
+    parser.add_argument('--step-y', type=int)
+    parser.add_argument('--width', type=float, help="sample-plane width (μm)")
+    parser.add_argument('--height', type=float, help="sample-plane height (μm)")
+    parser.add_argument('--exposures', help="exposure times in ms, e.g. \"10, 50, 200\"")
+    parser.add_argument('--corner', choices=CORNERS)
+    parser.add_argument('--mode', choices=['point', 'continuous', 'adaptive'])
+    parser.add_argument('--order', choices=EXPOSURE_ORDERS)
+    parser.add_argument('--region', help="scan region file (.json / .npy / mask image)")
+    parser.add_argument('--frames', type=int, help="frames averaged per point")
+    parser.add_argument('--output', default='measurement_data')
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.options, 'r', encoding='utf-8') as f:
+            opts = json.load(f)
+    except Exception:
+        opts = {}
+    for key, value in (('step_x', args.step_x), ('step_y', args.step_y), ('width', args.width),
+                       ('height', args.height), ('sequence_exposure_times', args.exposures),
+                       ('starting_corner', args.corner), ('scan_mode', args.mode),
+                       ('exposure_order', args.order), ('scan_region', args.region),
+                       ('frames_per_point', args.frames)):
+        if value is not None:
+            opts[key] = value
+    if args.simulated:
+        opts['camera_backend'] = 'simulated'
+
+    resume_state = None
+    if args.resume:
+        states = find_interrupted(args.output)
+        if not states:
+            print("No interrupted sequences to resume")
+            return 1
+        resume_state = states[0]
+        config = SequenceConfig.from_checkpoint(resume_state, opts)
+    else:
+        config = SequenceConfig.from_options(opts, output_folder=args.output,
+                                             preview_perimeter=not args.no_preview)
+
+    from hardware import SpectrometerManager, MotorController, create_camera_api
+    spectrometer = SpectrometerManager(api=create_camera_api(opts))
+    if spectrometer.initialize():
+        # Bez GUI klatki nie są nigdzie wyświetlane – krótka pauza między klatkami
+        spectrometer.poll_interval = 0.05
+        spectrometer.start()
+        try:
+            spectrometer.set_exposure(float(config.exposures_ms[0]))
+        except Exception:
+            pass
+    else:
+        print("WARNING: PixeLink not ready - spectra will be empty")
+    motors = None
+    if not args.no_motors:
+        motors = MotorController(opts.get('port_x', 'COM10'), opts.get('port_y', 'COM11'), options=opts,
+                                 port_z=opts.get('port_z') or None)
+
+    camera = None
+    if config.drift_compensation or config.autofocus != 'off':
+        from hardware import CameraManager
+        camera = CameraManager(camera_index=int(opts.get('camera_index', 0)), motion_method='off')
+        if not camera.start():
+            camera = None
+
+    engine = SequenceEngine(config, spectrometer=spectrometer, motors=motors,
+                            confirm_area=None if args.yes else _confirm_on_terminal,
+                            camera_frame_source=camera.get_raw_frame if camera else None)
+    try:
+        result = engine.run(resume_state)
+    except KeyboardInterrupt:
+        engine.stop()
+        result = {'status': 'interrupted'}
+    finally:
+        spectrometer.stop()
+        if camera is not None:
+            camera.stop()
+        if motors is not None:
+            motors.close()
+    print(f"Sequence {result['status']}: {result.get('filename', '')}")
+    return 0 if result['status'] == 'completed' else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
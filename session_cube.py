@@ -0,0 +1,204 @@
+import os
+import json
+
+import numpy as np
+
+from adaptive_scan import load_leaves, fill_from_leaves
+from exporter import scan_session, read_chunks
+from sequence_checkpoint import points_folder_for
+
+"""Kostka hiperspektralna sesji na dysku (float32, memmap) dla okna HeatMapWindow.
+
+Okno mapy budowało z pliku pomiaru kostkę float64 [x, y, lambda] w pamięci
+(500 x 500 x 2048 punktów to ok. 4 GB) i przy otwarciu liczyło min / max po
+całości. Teraz plik `*_spectra.csv` jest raz, porcjami wierszy, przepisywany
+do `points_<sesja>/cube.f32`:
+
+- układ pasmo po paśmie [lambda, y, x] (BSQ) – przekrój dla jednej długości
+  fali to jeden ciągły odczyt z dysku,
+- punkty siatki bez pomiaru mają NaN; przy skanie adaptacyjnym i
+  `heatmap_missing = 'interpolate'` są uzupełniane z liści już w pliku,
+- `points_<sesja>/cube.json` – kształt, początek siatki, liczba brakujących /
+  uzupełnionych punktów oraz statystyki policzone przy budowie (min / max
+  całości, średnie widmo), więc otwarcie okna niczego nie przelicza.
+
+Nagłówek zapisuje mtime / rozmiar pliku pomiaru i tryb brakujących
+punktów; gdy się nie zgadzają, kostka jest budowana od nowa. Okno otwiera
+plik w trybie tylko do odczytu (np.memmap 'r') – w pamięci jest tylko
+aktualnie rysowane pasmo.
+"""
+
+CUBE_FILE = "cube.f32"
+CUBE_HEADER = "cube.json"
+CUBE_VERSION = 1
+
+
+def cube_paths(filename):
+    folder = points_folder_for(filename)
+    return os.path.join(folder, CUBE_FILE), os.path.join(folder, CUBE_HEADER)
+
+
+def _source_key(filename):
+    st = os.stat(filename)
+    return {'source_mtime_ns': st.st_mtime_ns, 'source_size': st.st_size}
+
+
+def cube_is_current(filename, missing_mode='interpolate'):
+    """Czy zapisana kostka odpowiada obecnemu plikowi pomiaru i trybowi brakujących punktów."""
+    data_path, header_path = cube_paths(filename)
+    try:
+        with open(header_path, encoding="utf-8") as f:
+            header = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if not os.path.exists(data_path):
+        return False
+    expected = dict(_source_key(filename), version=CUBE_VERSION, missing_mode=missing_mode)
+    return all(header.get(k) == v for k, v in expected.items())
+
+
+def _band_statistics(mm):
+    """Min / max całości i średnie widmo – pasmo po paśmie (pamięć: jedno pasmo)."""
+    bands = mm.shape[0]
+    profile = np.full(bands, np.nan)
+    vmin, vmax = np.inf, -np.inf
+    for b in range(bands):
+        band = mm[b]
+        finite = band[np.isfinite(band)]
+        if finite.size:
+            profile[b] = float(finite.mean(dtype=np.float64))
+            vmin = min(vmin, float(finite.min()))
+            vmax = max(vmax, float(finite.max()))
+    if vmin > vmax:
+        vmin, vmax = 0.0, 1.0
+    return vmin, vmax, profile
+
+
+def build_cube(filename, missing_mode='interpolate', chunk_rows=1000, progress=None):
+    """Przepisz plik pomiaru do kostki [lambda, y, x] float32 + nagłówek; zwraca ścieżkę nagłówka.
+
+    progress(zrobione, wszystkie) - postęp w wierszach pliku pomiaru.
+    """
+    data_path, header_path = cube_paths(filename)
+    source = _source_key(filename)
+    info = scan_session(filename)
+    if info['rows'] == 0 or info['length'] <= 0:
+        raise ValueError(f"no points in {filename}")
+    x0, y0 = info['x_min'], info['y_min']
+    nx, ny, bands = info['nx'] - x0, info['ny'] - y0, info['length']
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+    tmp_path = data_path + ".tmp"
+    mm = np.memmap(tmp_path, dtype='<f4', mode='w+', shape=(bands, ny, nx))
+    try:
+        for b in range(bands):
+            mm[b] = np.nan
+        view = mm.transpose(2, 1, 0)  # [x, y, lambda] – jak w adaptive_scan.fill_from_leaves
+        measured = np.zeros((nx, ny), dtype=bool)
+        done = 0
+        for block in read_chunks(filename, chunk_rows):
+            x = block[:, 0].astype(np.intp) - x0
+            y = block[:, 1].astype(np.intp) - y0
+            spectra = block[:, 2:2 + bands]
+            if spectra.shape[1] < bands:
+                spectra = np.pad(spectra, ((0, 0), (0, bands - spectra.shape[1])), constant_values=np.nan)
+            view[x, y, :] = spectra
+            measured[x, y] = True
+            done += len(block)
+            if progress is not None:
+                progress(done, info['rows'])
+        missing = int((~measured).sum())
+        interpolated = 0
+        if missing and missing_mode == 'interpolate':
+            leaves = load_leaves(points_folder_for(filename))
+            if leaves:
+                # Liście są w indeksach siatki skanu; przesuń do indeksów kostki
+                shifted = [(lx0 - x0, ly0 - y0, lx1 - x0, ly1 - y0) for lx0, ly0, lx1, ly1 in leaves
+                           if lx0 >= x0 and ly0 >= y0]
+                interpolated = fill_from_leaves(view, measured, shifted)
+        del view
+        mm.flush()
+        vmin, vmax, profile = _band_statistics(mm)
+    finally:
+        del mm
+    os.replace(tmp_path, data_path)
+    header = dict(source, **{
+        'version': CUBE_VERSION,
+        'missing_mode': missing_mode,
+        'dtype': 'float32',
+        'byte_order': 'little',
+        'interleave': 'bsq',
+        'shape': [bands, ny, nx],
+        'x_min': x0,
+        'y_min': y0,
+        'points': info['rows'],
+        'missing_cells': missing,
+        'interpolated_cells': interpolated,
+        'vmin': vmin,
+        'vmax': vmax,
+        'mean_profile': [None if np.isnan(v) else float(v) for v in profile],
+    })
+    tmp_header = header_path + ".tmp"
+    with open(tmp_header, "w", encoding="utf-8") as f:
+        json.dump(header, f)
+    os.replace(tmp_header, header_path)
+    return header_path
+
+
+def remove_cube(filename):
+    """Usuń kostkę sesji (po skasowaniu pomiaru)."""
+    for path in cube_paths(filename):
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError:
+            pass
+
+
+class SessionCube:
+    """Kostka sesji otwarta tylko do odczytu: `data` [lambda, y, x] (memmap) + statystyki z nagłówka."""
+
+    def __init__(self, filename):
+        data_path, header_path = cube_paths(filename)
+        with open(header_path, encoding="utf-8") as f:
+            self.header = json.load(f)
+        self.shape = tuple(int(n) for n in self.header['shape'])
+        self.data = np.memmap(data_path, dtype='<f4', mode='r', shape=self.shape)
+        self.vmin = float(self.header['vmin'])
+        self.vmax = float(self.header['vmax'])
+        self.mean_profile = np.array([np.nan if v is None else v for v in self.header['mean_profile']])
+        self.missing_cells = int(self.header.get('missing_cells', 0))
+        self.interpolated_cells = int(self.header.get('interpolated_cells', 0))
+
+    @property
+    def bands(self):
+        return self.shape[0]
+
+    @property
+    def ny(self):
+        return self.shape[1]
+
+    @property
+    def nx(self):
+        return self.shape[2]
+
+    def band(self, index):
+        """Mapa [y, x] dla jednej długości fali (jeden ciągły odczyt)."""
+        return np.array(self.data[index])
+
+    def close(self):
+        """Zwolnij mapowanie pliku – w Windows zmapowanego pliku nie da się usunąć ani podmienić."""
+        data, self.data = self.data, None
+        mm = getattr(data, '_mmap', None)
+        del data
+        if mm is not None:
+            try:
+                mm.close()
+            except (BufferError, ValueError):
+                pass
+
+
+def open_cube(filename, missing_mode='interpolate', chunk_rows=1000, progress=None):
+    """Kostka sesji; budowana, gdy jej brak albo jest nieaktualna."""
+    if not cube_is_current(filename, missing_mode):
+        build_cube(filename, missing_mode, chunk_rows, progress)
+    return SessionCube(filename)
@@ -0,0 +1,165 @@
+import os
+
+import cv2
+import numpy as np
+
+"""Korekcja krzywizny obrazu szczeliny ("smile") spektrografu.
+
+Obraz szczeliny na matrycy PixeLink jest wygięty: linia widmowa o stałej
+długości fali leży w kolumnie przesuniętej o dx(wiersz, kolumna) względem
+środka klatki. Proste uśrednienie kolumn rozmywa wtedy linie i pogarsza
+rozdzielczość.
+
+Kalibracja (klatka z lampy liniowej, np. Hg/Ne):
+
+1. linie = wyraźne maksima profilu środkowego pasa wierszy,
+2. każda linia jest śledzona w pasach po `bin_rows` wierszy (środek ciężkości
+   w oknie ±`half_window` px), dx = położenie − położenie w środkowym wierszu,
+3. dx(r, c) dopasowujemy wielomianem: stopień 2 w wierszu, w kolumnie
+   stopień zależny od liczby linii (0 dla jednej, 1 dla dwóch, 2 dla więcej).
+
+Model (współczynniki + rozmiar klatki) leży w `calibration/smile.npz`. Dla
+danego rozmiaru klatki mapy cv2.remap (float32) są liczone raz, więc
+prostowanie klatki to jedno wywołanie cv2.remap – ok. 6 ms dla klatki
+1024×2048 uint8, czyli w czasie klatki podglądu. (Mapy stałoprzecinkowe
+z cv2.convertMaps okazały się tu ~2,5× wolniejsze.)
+"""
+
+SMILE_FILE = "smile.npz"
+
+
+def _basis(r, c, row_degree, col_degree):
+    """Jednomiany r^i·c^j (r, c znormalizowane do ok. [-1, 1])."""
+    return np.stack([r ** i * c ** j for i in range(row_degree + 1) for j in range(col_degree + 1)], axis=-1)
+
+
+def _normalized(rows, cols, shape):
+    h, w = shape
+    return (rows - (h - 1) / 2.0) / (h / 2.0), (cols - (w - 1) / 2.0) / (w / 2.0)
+
+
+def find_lines(profile, max_lines=8, min_separation=20, nsigma=8.0):
+    """Kolumny wyraźnych linii w profilu (lokalne maksima ponad tło)."""
+    profile = np.asarray(profile, dtype=np.float64)
+    med = float(np.median(profile))
+    mad = float(np.median(np.abs(profile - med))) * 1.4826
+    threshold = med + nsigma * max(mad, 1e-6)
+    inner = profile[1:-1]
+    peaks = np.where((inner > profile[:-2]) & (inner >= profile[2:]) & (inner > threshold))[0] + 1
+    chosen = []
+    for p in peaks[np.argsort(profile[peaks])[::-1]]:
+        if all(abs(p - q) >= min_separation for q in chosen):
+            chosen.append(int(p))
+        if len(chosen) >= max_lines:
+            break
+    return sorted(chosen)
+
+
+def _centroid(segment, offset):
+    seg = segment - segment.min()
+    total = seg.sum()
+    if total <= 0:
+        return None
+    return offset + float(np.dot(np.arange(len(seg)), seg) / total)
+
+
+def trace_line(gray, column, bin_rows=8, half_window=12, min_contrast=0.2):
+    """Położenie linii w pasach wierszy: listy (środek pasa, kolumna)."""
+    h, w = gray.shape
+    lo = max(0, column - half_window)
+    hi = min(w, column + half_window + 1)
+    window = gray[:, lo:hi].astype(np.float64)
+    ref_height = float(np.ptp(window[h // 2 - bin_rows:h // 2 + bin_rows].mean(axis=0)))
+    rows, cols = [], []
+    for start in range(0, h - bin_rows + 1, bin_rows):
+        band = window[start:start + bin_rows].mean(axis=0)
+        if np.ptp(band) < min_contrast * ref_height:
+            continue
+        pos = _centroid(band, lo)
+        if pos is not None:
+            rows.append(start + (bin_rows - 1) / 2.0)
+            cols.append(pos)
+    return np.asarray(rows), np.asarray(cols)
+
+
+class SmileModel:
+    """dx(wiersz, kolumna) – przesunięcie linii względem środkowego wiersza (px)."""
+
+    def __init__(self, coeffs, shape, row_degree=2, col_degree=1):
+        self.coeffs = np.asarray(coeffs, dtype=np.float64)
+        self.shape = tuple(int(s) for s in shape)
+        self.row_degree = int(row_degree)
+        self.col_degree = int(col_degree)
+        self._maps = None
+
+    @classmethod
+    def fit(cls, frame, bin_rows=8, half_window=12, max_lines=8):
+        """Dopasuj krzywiznę z klatki lampy liniowej (None, gdy brak linii)."""
+        gray = np.asarray(frame)
+        if gray.ndim == 3:
+            gray = cv2.cvtColor(gray, cv2.COLOR_BGR2GRAY)
+        h, w = gray.shape
+        band = gray[h // 2 - h // 8:h // 2 + h // 8 + 1].astype(np.float64)
+        lines = find_lines(band.mean(axis=0), max_lines=max_lines, min_separation=2 * half_window)
+        samples = []
+        for column in lines:
+            rows, cols = trace_line(gray, column, bin_rows, half_window)
+            if len(rows) < 4:
+                continue
+            # Położenie w środkowym wierszu z paraboli przez cały ślad linii
+            center = float(np.polyval(np.polyfit(rows, cols, 2), (h - 1) / 2.0))
+            samples.extend((r, center, c - center) for r, c in zip(rows, cols))
+        used = len({round(s[1]) for s in samples})
+        if used == 0:
+            print("Smile: no lamp lines found")
+            return None
+        col_degree = min(2, used - 1)
+        r, c, dx = (np.asarray(v) for v in zip(*samples))
+        rn, cn = _normalized(r, c, (h, w))
+        coeffs, *_ = np.linalg.lstsq(_basis(rn, cn, 2, col_degree), dx, rcond=None)
+        model = cls(coeffs, (h, w), 2, col_degree)
+        residual = dx - model.shift(r, c)
+        print(f"Smile: {used} lines, max shift {model.max_shift():.2f} px, "
+              f"residual RMS {float(np.sqrt(np.mean(residual ** 2))):.3f} px")
+        return model
+
+    def shift(self, rows, cols):
+        rn, cn = _normalized(np.asarray(rows, dtype=np.float64), np.asarray(cols, dtype=np.float64), self.shape)
+        return _basis(rn, cn, self.row_degree, self.col_degree) @ self.coeffs
+
+    def max_shift(self):
+        h, w = self.shape
+        rows, cols = np.meshgrid(np.linspace(0, h - 1, 9), np.linspace(0, w - 1, 9), indexing='ij')
+        return float(np.max(np.abs(self.shift(rows, cols))))
+
+    def maps(self):
+        """Mapy cv2.remap (liczone raz)."""
+        if self._maps is None:
+            h, w = self.shape
+            rows, cols = np.meshgrid(np.arange(h, dtype=np.float64), np.arange(w, dtype=np.float64), indexing='ij')
+            map_x = (cols + self.shift(rows, cols)).astype(np.float32)
+            self._maps = (map_x, rows.astype(np.float32))
+        return self._maps
+
+    def apply(self, gray):
+        """Wyprostowana klatka: każda długość fali w jednej kolumnie."""
+        map_x, map_y = self.maps()
+        return cv2.remap(gray, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+    def save(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        np.savez(os.path.join(folder, SMILE_FILE), coeffs=self.coeffs, shape=np.asarray(self.shape),
+                 degrees=np.asarray([self.row_degree, self.col_degree]))
+
+    @classmethod
+    def load(cls, folder):
+        """Model z <folder>/smile.npz albo None."""
+        path = os.path.join(folder, SMILE_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            data = np.load(path)
+            return cls(data['coeffs'], data['shape'], *[int(d) for d in data['degrees']])
+        except Exception as e:
+            print(f"Smile file error {path}: {e}")
+            return None
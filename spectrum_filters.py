@@ -0,0 +1,123 @@
+import numpy as np
+
+"""Filtry czasowe widma na żywo (zakładka Spectrum).
+
+Pojedyncza klatka jest zaszumiona; do ustawiania optyki wygodniej patrzeć
+na widmo uśrednione w czasie, bez obniżania liczby klatek na sekundę:
+
+- `ema`    – średnia wykładnicza, y = y + α·(x − y),
+- `mean`   – średnia z ostatnich N klatek: bufor kołowy N×L i suma bieżąca
+             (odejmij najstarszą, dodaj nową); co `RESUM_EVERY` klatek suma
+             jest liczona od nowa, żeby nie narastał błąd zaokrągleń,
+- `median` – mediana z ostatnich N klatek z tego samego bufora kołowego
+             (np.median – O(N·L), odporna na pojedyncze zakłócenia).
+
+Stan (bufory) jest alokowany raz; ema i mean kosztują O(L) na klatkę.
+Zmiana długości widma (np. ROI) zeruje stan filtra.
+"""
+
+FILTERS = ('off', 'ema', 'mean', 'median')
+RESUM_EVERY = 1024
+
+
+class SpectrumFilter:
+    """Filtr przepustowy ('off') i wspólna obsługa zmiany długości widma."""
+
+    def __init__(self):
+        self.length = None
+        self.count = 0
+
+    def reset(self):
+        self.length = None
+        self.count = 0
+
+    def _check(self, x):
+        if self.length != len(x):
+            self._allocate(len(x))
+            self.length = len(x)
+            self.count = 0
+
+    def _allocate(self, length):
+        pass
+
+    def update(self, spectrum):
+        return np.asarray(spectrum, dtype=np.float64)
+
+
+class EMAFilter(SpectrumFilter):
+    def __init__(self, alpha=0.2):
+        super().__init__()
+        self.alpha = min(1.0, max(1e-3, float(alpha)))
+
+    def _allocate(self, length):
+        self.state = np.zeros(length, dtype=np.float64)
+        self._delta = np.empty(length, dtype=np.float64)
+
+    def update(self, spectrum):
+        x = np.asarray(spectrum, dtype=np.float64)
+        self._check(x)
+        if self.count == 0:
+            self.state[:] = x
+        else:
+            np.subtract(x, self.state, out=self._delta)
+            self._delta *= self.alpha
+            self.state += self._delta
+        self.count += 1
+        return self.state.copy()
+
+
+class RingFilter(SpectrumFilter):
+    """Bufor kołowy ostatnich N widm."""
+
+    def __init__(self, frames=8):
+        super().__init__()
+        self.frames = max(1, int(frames))
+
+    def _allocate(self, length):
+        self.ring = np.zeros((self.frames, length), dtype=np.float64)
+
+    def _slot(self):
+        """Indeks wiersza bufora dla nowego widma (najstarszy, gdy bufor pełny)."""
+        return self.count % self.frames
+
+
+class RunningMeanFilter(RingFilter):
+    def _allocate(self, length):
+        super()._allocate(length)
+        self.total = np.zeros(length, dtype=np.float64)
+
+    def update(self, spectrum):
+        x = np.asarray(spectrum, dtype=np.float64)
+        self._check(x)
+        i = self._slot()
+        if self.count >= self.frames:
+            self.total -= self.ring[i]
+        self.ring[i] = x
+        self.total += x
+        self.count += 1
+        if self.count % RESUM_EVERY == 0:
+            np.sum(self.ring, axis=0, out=self.total)
+        return self.total / min(self.count, self.frames)
+
+
+class MedianFilter(RingFilter):
+    def update(self, spectrum):
+        x = np.asarray(spectrum, dtype=np.float64)
+        self._check(x)
+        self.ring[self._slot()] = x
+        self.count += 1
+        n = min(self.count, self.frames)
+        if n == 1:
+            return x.copy()
+        return np.median(self.ring[:n], axis=0)
+
+
+def make_filter(kind, frames=8, alpha=0.2):
+    """Filtr wg nazwy z FILTERS (nieznana nazwa = 'off')."""
+    if kind == 'ema':
+        return EMAFilter(alpha)
+    if kind == 'mean':
+        return RunningMeanFilter(frames)
+    if kind == 'median':
+        return MedianFilter(frames)
+    return SpectrumFilter()
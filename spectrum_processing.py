@@ -0,0 +1,69 @@
+import cv2
+import numpy as np
+
+"""Wspólne przeliczanie klatki PixeLink na widmo.
+
+Ta sama logika była powielona w SpektrometerApp._calculate_spectrum_from_frame
+(podgląd na żywo) i w sekwencji pomiarowej; teraz korzystają z niej oba
+miejsca oraz skan ciągły (continuous_scan.py), który nie ma dostępu do GUI.
+Opcjonalna korekcja ciemnej klatki / flat field / złych pikseli
+(frame_calibration.FrameCorrection) jest liczona w tym samym przejściu
+co uśrednienie w pionie; wcześniej klatkę można wyprostować modelem
+krzywizny szczeliny (smile_correction.SmileModel, jeden cv2.remap).
+Zamiast średniej kolumn można użyć ekstrakcji optymalnej ważonej profilem
+pasa (optimal_extraction.OptimalExtractor). Nasycenie jest sprawdzane na
+surowej klatce (saturation.SaturationMonitor), zanim cokolwiek ją zmieni.
+"""
+
+SPECTRUM_LENGTH = 2048
+
+
+def frame_to_gray(frame):
+    """Zwróć obraz jednokanałowy (klatka kolorowa -> skala szarości)."""
+    if frame is None:
+        return None
+    if frame.ndim == 3:
+        if frame.shape[2] == 3:
+            return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return frame[:, :, 0]
+    return frame
+
+
+def frame_to_spectrum(frame, length=SPECTRUM_LENGTH, correction=None, smile=None, extractor=None,
+                      saturation=None):
+    """Uśrednij klatkę w pionie i przeskaluj profil do `length` punktów.
+
+    correction - FrameCorrection (frame_calibration.py) dla rozmiaru tej klatki,
+    smile - SmileModel (smile_correction.py): klatka prostowana przed uśrednieniem;
+        correction musi być wtedy zbudowana dla klatek prostowanych,
+    extractor - OptimalExtractor: suma ważona profilem pasa zamiast średniej kolumn,
+    saturation - SaturationMonitor: statystyka nasyconych pikseli tej klatki.
+    """
+    frame_gray = frame_to_gray(frame)
+    if frame_gray is None or frame_gray.size == 0:
+        return None
+
+    if saturation is not None:
+        # Maska złych pikseli pasuje do surowej klatki tylko bez prostowania
+        gain_map = None
+        if correction is not None and smile is None and correction.shape == frame_gray.shape:
+            gain_map = correction.gain_map
+        saturation.check(frame_gray, gain_map)
+
+    if smile is not None and smile.shape == frame_gray.shape:
+        frame_gray = smile.apply(frame_gray)
+
+    if correction is not None and correction.shape != frame_gray.shape:
+        correction = None
+    if extractor is not None and extractor.shape == frame_gray.shape:
+        spectrum_profile = extractor.extract(frame_gray, correction)
+    elif correction is not None:
+        spectrum_profile = correction.apply(frame_gray)
+    else:
+        spectrum_profile = np.mean(frame_gray, axis=0)
+
+    if len(spectrum_profile) != length:
+        x_old = np.linspace(0, 1, len(spectrum_profile))
+        x_new = np.linspace(0, 1, length)
+        spectrum_profile = np.interp(x_new, x_old, spectrum_profile)
+    return spectrum_profile
@@ -0,0 +1,140 @@
+import os
+import glob
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+"""Miniatury map pomiarów dla zakładki Results (liczone w tle, cache na dysku).
+
+Miniatura to mapa całkowitej intensywności punktów (suma widma) z głównego
+pliku pomiaru, skala 1–99 percentyl, paleta viridis, brakujące punkty
+ciemnoszare. Plik jest czytany porcjami wierszy, więc pamięć nie zależy od
+rozmiaru skanu.
+
+Cache: `measurement_data/.thumbnails/<skrót ścieżki>_<mtime_ns>_<rozmiar>.png`
+– zmiana pliku pomiaru (nowy mtime) unieważnia miniaturę, stare wersje są
+usuwane przy zapisie nowej. Wszystko (także odczyt PNG z dysku) dzieje się
+w jednym wątku roboczym; wynik (PIL.Image) trafia do callbacku, a GUI
+zamienia go na PhotoImage w wątku Tk. Zadania dla kafelków, które zniknęły
+z widoku przed startem, są pomijane (`still_needed`).
+"""
+
+THUMBNAIL_FOLDER = ".thumbnails"
+MISSING_RGB = (45, 45, 45)
+
+
+def session_heatmap(filename, chunk_rows=2000):
+    """Mapa [y, x] sumy widma w punktach (NaN = punkt niezmierzony)."""
+    xs, ys, totals = [], [], []
+    with open(filename) as f:
+        while True:
+            try:
+                block = np.loadtxt(f, delimiter=',', max_rows=chunk_rows, ndmin=2)
+            except ValueError:
+                break
+            if block.size == 0:
+                break
+            xs.append(block[:, 0].astype(np.intp))
+            ys.append(block[:, 1].astype(np.intp))
+            totals.append(np.nansum(block[:, 2:], axis=1))
+            if len(block) < chunk_rows:
+                break
+    if not xs:
+        return None
+    x, y, total = np.concatenate(xs), np.concatenate(ys), np.concatenate(totals)
+    keep = (x >= 0) & (y >= 0)
+    x, y, total = x[keep], y[keep], total[keep]
+    if len(x) == 0:
+        return None
+    grid = np.full((int(y.max()) + 1, int(x.max()) + 1), np.nan)
+    grid[y, x] = total
+    return grid
+
+
+def render_thumbnail(grid, size=96, cmap='viridis'):
+    """Mapa -> obraz RGB mieszczący się w kwadracie `size` (piksele mapy powiększone bez wygładzania)."""
+    from matplotlib import colormaps
+    finite = np.isfinite(grid)
+    rgb = np.empty(grid.shape + (3,), dtype=np.uint8)
+    rgb[...] = MISSING_RGB
+    if finite.any():
+        lo, hi = np.percentile(grid[finite], [1, 99])
+        norm = np.clip((grid[finite] - lo) / (hi - lo if hi > lo else 1.0), 0.0, 1.0)
+        rgb[finite] = (colormaps[cmap](norm)[:, :3] * 255).astype(np.uint8)
+    h, w = grid.shape
+    scale = size / max(h, w)
+    new_size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+    return Image.fromarray(rgb).resize(new_size, Image.NEAREST)
+
+
+class ThumbnailCache:
+    """Miniatury pomiarów z cache na dysku; generowanie w wątku w tle."""
+
+    def __init__(self, folder="measurement_data", size=96):
+        self.folder = os.path.join(folder, THUMBNAIL_FOLDER)
+        self.size = int(size)
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def _prefix(self, filename):
+        return hashlib.sha1(os.path.abspath(filename).encode('utf-8')).hexdigest()[:16]
+
+    def path_for(self, filename):
+        st = os.stat(filename)
+        return os.path.join(self.folder, f"{self._prefix(filename)}_{st.st_mtime_ns}_{self.size}.png")
+
+    def load(self, filename):
+        """Miniatura z cache albo wyliczona i zapisana (blokuje – do wywołania w tle)."""
+        path = self.path_for(filename)
+        if os.path.exists(path):
+            with Image.open(path) as img:
+                return img.copy()
+        grid = session_heatmap(filename)
+        if grid is None:
+            return None
+        img = render_thumbnail(grid, self.size)
+        os.makedirs(self.folder, exist_ok=True)
+        for old in glob.glob(os.path.join(self.folder, f"{self._prefix(filename)}_*.png")):
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+        img.save(path)
+        return img
+
+    def request(self, filename, callback, still_needed=None):
+        """Zleć miniaturę; callback(filename, PIL.Image albo None) z wątku roboczego."""
+        with self._lock:
+            if filename in self._pending:
+                return
+            self._pending.add(filename)
+        self._executor.submit(self._job, filename, callback, still_needed)
+
+    def _job(self, filename, callback, still_needed):
+        try:
+            if still_needed is not None and not still_needed(filename):
+                return
+            img = self.load(filename)
+        except Exception as e:
+            print(f"Thumbnail error {filename}: {e}")
+            img = None
+        finally:
+            with self._lock:
+                self._pending.discard(filename)
+        if still_needed is None or still_needed(filename):
+            callback(filename, img)
+
+    def forget(self, filename):
+        """Usuń miniatury pliku (po skasowaniu pomiaru)."""
+        for old in glob.glob(os.path.join(self.folder, f"{self._prefix(filename)}_*.png")):
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,206 @@
+import numpy as np
+
+"""Kalibracja długości fali: piksel widma -> λ (nm) z linii lampy wzorcowej.
+
+Dotąd oś była liniowa (np.linspace(lambda_min, lambda_max, 2048)) i każde
+miejsce – wykres na żywo, zapis sekwencji, heatmapa, generatory danych –
+budowało ją samo. Teraz:
+
+- `spectral_axis(options)` zwraca jeden obiekt SpectralAxis (pełna oś
+  2048 punktów, indeksy ROI, oś po ROI, opisy), liczony raz dla danego zestawu
+  opcji i trzymany w pamięci podręcznej; tablice są tylko do odczytu,
+- gdy w options.json jest `lambda_coefficients` (wielomian np.polyval,
+  argument = indeks 0..2047 widma), oś to ten wielomian; w przeciwnym razie
+  dawna oś liniowa lambda_min..lambda_max,
+- `calibrate(spectrum, reference_nm, guess_axis)` znajduje linie lampy
+  (maksima ponad tło, położenie subpikselowe z paraboli przez logarytm trzech
+  punktów – dokładne dla linii gaussowskiej), paruje je z liniami wzorcowymi
+  (bieżąca oś służy tylko za przybliżenie) i dopasowuje wielomian stopnia
+  `degree`.
+"""
+
+SPECTRUM_LENGTH = 2048
+
+# Linie lamp wzorcowych w zakresie czułości matrycy (nm, powietrze)
+LAMP_LINES = {
+    'hg-ar': [404.656, 435.833, 546.074, 576.960, 579.066, 696.543, 706.722,
+              738.398, 750.387, 763.511, 772.376, 794.818, 811.531],
+    'ne': [540.056, 585.249, 588.190, 594.483, 607.434, 614.306, 626.650, 633.443,
+           640.225, 650.653, 659.895, 667.828, 692.947, 703.241, 717.394, 724.517],
+}
+
+_AXIS_CACHE = {}
+
+
+def find_line_centroids(spectrum, nsigma=6.0, min_separation=5, max_lines=40):
+    """Subpikselowe położenia linii (indeksy widma), rosnąco."""
+    s = np.asarray(spectrum, dtype=np.float64)
+    med = float(np.median(s))
+    mad = float(np.median(np.abs(s - med))) * 1.4826
+    threshold = med + nsigma * max(mad, 1e-9)
+    inner = s[1:-1]
+    peaks = np.where((inner > s[:-2]) & (inner >= s[2:]) & (inner > threshold))[0] + 1
+    chosen = []
+    for p in peaks[np.argsort(s[peaks])[::-1]]:
+        if all(abs(p - q) >= min_separation for q in chosen):
+            chosen.append(int(p))
+        if len(chosen) >= max_lines:
+            break
+    centroids = []
+    for p in sorted(chosen):
+        a, b, c = s[p - 1] - med, s[p] - med, s[p + 1] - med
+        if min(a, b, c) > 0:
+            # Parabola przez ln(y) – wierzchołek gaussa
+            la, lb, lc = np.log(a), np.log(b), np.log(c)
+            denom = la - 2.0 * lb + lc
+            delta = 0.5 * (la - lc) / denom if denom < 0 else 0.0
+        else:
+            denom = a - 2.0 * b + c
+            delta = 0.5 * (a - c) / denom if denom < 0 else 0.0
+        centroids.append(p + float(np.clip(delta, -0.5, 0.5)))
+    return centroids
+
+
+def match_lines(centroids, reference_nm, axis, tolerance_nm):
+    """Pary (piksel, λ wzorcowa): najbliższa linia wzorcowa w tolerancji, bez powtórzeń."""
+    axis = np.asarray(axis, dtype=np.float64)
+    pixels = np.arange(len(axis), dtype=np.float64)
+    pairs = {}
+    for c in centroids:
+        estimate = float(np.interp(c, pixels, axis))
+        ref = min(reference_nm, key=lambda r: abs(r - estimate))
+        err = abs(ref - estimate)
+        if err <= tolerance_nm and (ref not in pairs or err < pairs[ref][1]):
+            pairs[ref] = (c, err)
+    return sorted((c, ref) for ref, (c, _) in pairs.items())
+
+
+def _initial_line(centroids, reference_nm, axis, tolerance_nm):
+    """Prosta piksel -> λ przez dwie linie, zgodna z największą liczbą linii wzorcowych.
+
+    Przeszukiwane są wszystkie pary (dwie linie widma, dwie linie wzorcowe),
+    których nachylenie i środek osi różnią się od bieżącej osi o mniej niż
+    ~20% – bieżąca oś może więc być tylko przybliżona. Ocena prostej to
+    Σ max(0, 1 − (błąd/tolerancja)²) po liniach widma.
+    """
+    n = len(axis)
+    guess_slope = (axis[-1] - axis[0]) / (n - 1)
+    guess_center = float(axis[n // 2])
+    refs = np.asarray(sorted(reference_nm), dtype=np.float64)
+    cs = np.asarray(centroids, dtype=np.float64)
+    best, best_score = None, 0.0
+    for i in range(len(cs)):
+        for j in range(i + 1, len(cs)):
+            for a in range(len(refs)):
+                for b in range(a + 1, len(refs)):
+                    slope = (refs[b] - refs[a]) / (cs[j] - cs[i])
+                    if not 0.8 < slope / guess_slope < 1.25:
+                        continue
+                    offset = refs[a] - slope * cs[i]
+                    if abs(offset + slope * (n // 2) - guess_center) > 0.2 * abs(guess_slope) * n:
+                        continue
+                    predicted = offset + slope * cs
+                    err = np.min(np.abs(predicted[:, None] - refs[None, :]), axis=1)
+                    # Miękka ocena: bliższe dopasowania ważą więcej niż ledwo mieszczące się w tolerancji
+                    score = float(np.sum(np.clip(1.0 - (err / tolerance_nm) ** 2, 0.0, None)))
+                    if score > best_score:
+                        best, best_score = (slope, offset), score
+    if best is None:
+        return None
+    return best[1] + best[0] * np.arange(n, dtype=np.float64)
+
+
+def calibrate(spectrum, reference_nm, guess_axis, degree=3, tolerance_nm=10.0):
+    """Wielomian piksel -> λ z widma lampy.
+
+    Start: prosta przez dwie linie zgodna z największą liczbą linii wzorcowych
+    (_initial_line), potem stopniowo: parowanie wg bieżącej osi w coraz
+    węższej tolerancji i wielomian coraz wyższego stopnia, aż do `degree`
+    (obniżany, gdy par jest za mało). Zwraca (współczynniki, pary, RMS nm)
+    albo None.
+    """
+    centroids = find_line_centroids(spectrum)
+    pixels = np.arange(len(guess_axis), dtype=np.float64)
+    axis = _initial_line(centroids, reference_nm, np.asarray(guess_axis, dtype=np.float64), tolerance_nm)
+    if axis is None:
+        print(f"λ calibration: {len(centroids)} lines found, no match with the lamp list")
+        return None
+    pairs = []
+    for step in range(1, max(1, int(degree)) + 1):
+        pairs = match_lines(centroids, reference_nm, axis, tolerance_nm / 2.0 ** (step - 1))
+        deg = min(step, len(pairs) - 2)
+        if deg < 1:
+            print(f"λ calibration: {len(centroids)} lines found, only {len(pairs)} matched to the lamp list")
+            return None
+        px, nm = (np.asarray(v) for v in zip(*pairs))
+        coeffs = np.polyfit(px, nm, deg)
+        axis = np.polyval(coeffs, pixels)
+    rms = float(np.sqrt(np.mean((np.polyval(coeffs, px) - nm) ** 2)))
+    print(f"λ calibration: {len(pairs)} lines, degree {len(coeffs) - 1}, RMS {rms:.3f} nm, "
+          f"{axis[0]:.1f}-{axis[-1]:.1f} nm")
+    return [float(c) for c in coeffs], pairs, rms
+
+
+class SpectralAxis:
+    """Oś widma dla danego zestawu opcji – wspólna dla wszystkich odbiorców (tylko do odczytu)."""
+
+    def __init__(self, base, calibrated, roi_min=None, roi_max=None):
+        base = np.asarray(base, dtype=np.float64)
+        self.calibrated = bool(calibrated)
+        self.unit = "nm" if calibrated else "px"
+        self.xlabel = "Wavelength (nm)" if calibrated else "Pixel"
+        self.base_min = float(base[0])
+        self.base_max = float(base[-1])
+        if roi_min is None or roi_max is None or roi_min >= roi_max:
+            roi_min, roi_max = self.base_min, self.base_max
+        self.roi_min, self.roi_max = float(roi_min), float(roi_max)
+        mask = (base >= self.roi_min) & (base <= self.roi_max)
+        if not np.any(mask):
+            mask = np.ones_like(base, dtype=bool)
+        self.base = base
+        self.roi_indices = np.where(mask)[0]
+        self.axis = base[self.roi_indices]
+        self._resampled = {}
+        for a in (self.base, self.roi_indices, self.axis):
+            a.setflags(write=False)
+
+    @property
+    def full_range(self):
+        return self.roi_min == self.base_min and self.roi_max == self.base_max
+
+    def resampled(self, length):
+        """Oś ROI o `length` punktach (np. dla starszych plików o innej długości widma)."""
+        if length == len(self.axis):
+            return self.axis
+        if length not in self._resampled:
+            x_new = np.linspace(0.0, len(self.axis) - 1.0, length)
+            axis = np.interp(x_new, np.arange(len(self.axis)), self.axis)
+            axis.setflags(write=False)
+            self._resampled[length] = axis
+        return self._resampled[length]
+
+
+def axis_key(opts):
+    calibrated = bool(opts.get('lambda_calibration_enabled', False)) and 'lambda_min' in opts and 'lambda_max' in opts
+    coeffs = tuple(float(c) for c in (opts.get('lambda_coefficients') or [])) if calibrated else ()
+    if calibrated:
+        base_min, base_max = float(opts['lambda_min']), float(opts['lambda_max'])
+    else:
+        base_min, base_max = 0.0, float(SPECTRUM_LENGTH)
+    return (calibrated, base_min, base_max, coeffs,
+            float(opts.get('spectrum_range_min', base_min)), float(opts.get('spectrum_range_max', base_max)))
+
+
+def spectral_axis(opts):
+    """SpectralAxis dla options.json (z pamięci podręcznej, gdy opcje się nie zmieniły)."""
+    key = axis_key(opts)
+    axis = _AXIS_CACHE.get(key)
+    if axis is None:
+        calibrated, base_min, base_max, coeffs, roi_min, roi_max = key
+        if coeffs:
+            base = np.polyval(coeffs, np.arange(SPECTRUM_LENGTH, dtype=np.float64))
+        else:
+            base = np.linspace(base_min, base_max, SPECTRUM_LENGTH)
+        axis = SpectralAxis(base, calibrated, roi_min, roi_max)
+        _AXIS_CACHE[key] = axis
+    return axis